@@ -1,23 +1,73 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, send_file
 from flask_cors import CORS
 from flasgger import Swagger
 from dotenv import load_dotenv
+import json
 import os
+from contextlib import ExitStack
 from datetime import datetime, timedelta
+from urllib.parse import quote
 from utils.supabase_admin import get_supabase_admin
-from utils.auth import get_user_from_token
+from utils.auth import get_user_from_token, invalidate_user_cache
 
 # 新的 middleware 和 schemas
 from src.api.middleware.auth import require_auth, require_admin, require_permission
 from src.api.middleware.validation import validate_request, get_validated_data
 from src.api.schemas.user import UserCreateSchema, UserUpdateSchema, BulkUserUpdateSchema
 from src.api.schemas.review import ReviewCreateSchema
-from src.api.schemas.carbon import CarbonCalculateRequest
+from src.api.schemas.carbon import (
+    CarbonCalculateRequest, CarbonBatchCalculateRequest, CarbonBreakdownRequest, LeakageCalculateRequest,
+    UncertaintyAnalysisRequest, RecalculationJobRequest
+)
 from src.api.schemas.submission import EntrySubmitRequest, EntryUpdateRequest
-from src.api.schemas.file_upload import FileUploadMetadata, FileUploadResponse
-from src.services.carbon_service import calculate_total_carbon
+from src.api.schemas.unit import UnitConvertRequest
+from src.api.schemas.bill import BillDistributeRequest
+from src.api.schemas.report import EmissionRollupParams, EmissionTrendRequest
+from src.api.schemas.file_upload import FileUploadMetadata, FileUploadResponse, UploadSessionCreateRequest
+from src.api.schemas.entry import EntryListParams
+from src.api.schemas.common import PaginatedResponse
+from src.api.schemas.export import EntryExportSchema, EvidenceExportSchema
+from src.services.carbon_service import (
+    calculate_total_carbon, calculate_carbon_batch, calculate_gas_breakdown, get_entry_gas_breakdown
+)
+from src.services.emission_factor_service import (
+    get_factor_registry, publish_factor_registry, sync_factor_registry,
+    EmissionFactorError, UnknownFactorVersionError
+)
+from src.services.leakage_service import calculate_leakage_for_year
+from src.services.uncertainty_service import calculate_inventory_uncertainty
+from src.services.recalculation_service import (
+    create_recalculation_job, get_recalculation_job, start_recalculation_job, diff_factor_registries,
+    RecalculationJobError
+)
+from src.services.unit_service import convert_values, normalize_unit, get_canonical_unit, UnitConversionError
+from src.services.bill_service import distribute_bills, BillDistributionError
 from src.services.entry_service import create_energy_entry, update_energy_entry
-from src.services.file_service import upload_evidence_file, delete_evidence_file
+from src.services.file_service import (
+    upload_evidence_file, upload_evidence_batch, delete_evidence_file, spool_upload_stream,
+    sweep_unreferenced_blobs, MAX_FILE_SIZE, MAX_BATCH_FILES, UPLOAD_FORM_OVERHEAD
+)
+from src.services.derivative_service import (
+    schedule_derivatives, resolve_thumbnail, load_thumbnail, UnrenderableFileError,
+    THUMBNAIL_MIME_TYPE, THUMBNAIL_MAX_AGE
+)
+from src.services.upload_session_service import (
+    create_upload_session, get_upload_session, upload_session_chunk, complete_upload_session,
+    abort_upload_session, sweep_expired_upload_sessions, UploadSessionError, UploadSessionStateError,
+    UPLOAD_SESSION_CHUNK_SIZE
+)
+from src.services.user_service import list_users_with_entry_counts
+from src.services.dashboard_service import get_dashboard_summary
+from src.services.rollup_service import query_rollup, record_rollup_write, get_rollup_cache, RollupQueryError
+from src.services.analytics_service import get_emission_trends, ScenarioError
+from src.services.entry_query_service import (
+    list_entries_page, iter_entries, iter_ndjson, build_entry_columns, EntryQueryError,
+    ALL_ENTRIES_COLUMNS, USER_ENTRIES_COLUMNS
+)
+from src.services.export_service import (
+    get_or_build_entries_export, stream_evidence_zip, count_export_entries, NoExportDataError,
+    XLSX_MIMETYPE, ZIP_MIMETYPE
+)
 
 load_dotenv()
 
@@ -65,6 +115,26 @@ swagger_template = {
 
 swagger = Swagger(app, config=swagger_config, template=swagger_template)
 
+# 啟動時預先載入排放係數查詢表
+get_factor_registry()
+
+
+@app.before_request
+def sync_emission_factors():
+    """同步共用係數表（其他 worker 發佈新係數後，本程序在 EMISSION_FACTOR_SYNC_SECONDS 內跟進）"""
+    try:
+        sync_factor_registry(get_supabase_admin())
+    except Exception as e:
+        print(f"Emission factor sync failed: {str(e)}")
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+def wants_ndjson() -> bool:
+    """請求是否要求 NDJSON 串流輸出（Accept: application/x-ndjson）"""
+    return request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+
 @app.route('/', methods=['GET'])
 def index():
     return jsonify({
@@ -198,16 +268,27 @@ def calculate_carbon():
               type: integer
               example: 2024
               description: 年份
+            factor_version:
+              type: string
+              example: "6.0.4"
+              description: 指定排放係數版本（未指定時依年份選擇）
     responses:
       200:
         description: 計算成功
         schema:
           type: object
           properties:
-            total_carbon:
+            total_emission:
               type: number
-            monthly_carbon:
+            monthly_emission:
               type: object
+            emission_factor:
+              type: number
+            factor_version:
+              type: string
+              description: 套用的排放係數版本
+            formula:
+              type: string
       400:
         description: 請求驗證失敗
       401:
@@ -223,11 +304,17 @@ def calculate_carbon():
         result = calculate_total_carbon(
             page_key=validated_data.page_key,
             monthly_data=validated_data.monthly_data,
-            year=validated_data.year
+            year=validated_data.year,
+            factor_version=validated_data.factor_version
         )
 
         return jsonify(result), 200
 
+    except UnknownFactorVersionError as e:
+        return jsonify({
+            "error": str(e),
+            "code": "VALIDATION_ERROR"
+        }), 400
     except Exception as e:
         import traceback
         print(f"Carbon calculation error: {str(e)}")
@@ -238,6 +325,347 @@ def calculate_carbon():
             "message": str(e)
         }), 500
 
+@app.route('/api/carbon/calculate-batch', methods=['POST'])
+@require_auth
+@validate_request(CarbonBatchCalculateRequest)
+def calculate_carbon_batch_endpoint():
+    """
+    批次計算碳排放量（一次計算多個用戶/能源類別/年份）
+    ---
+    tags:
+      - Carbon
+    security:
+      - Bearer: []
+    parameters:
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: object
+          required:
+            - items
+          properties:
+            items:
+              type: array
+              description: 計算項目（最多 5000 筆）
+              items:
+                type: object
+                required:
+                  - page_key
+                  - monthly_data
+                  - year
+                properties:
+                  owner_id:
+                    type: string
+                    description: 用戶 ID（原樣回傳）
+                  page_key:
+                    type: string
+                    example: diesel
+                  monthly_data:
+                    type: object
+                    example:
+                      "1": 100.5
+                      "2": 120.3
+                  year:
+                    type: integer
+                    example: 2024
+                  factor_version:
+                    type: string
+                    description: 指定排放係數版本（選填）
+    responses:
+      200:
+        description: 計算成功
+        schema:
+          type: object
+          properties:
+            items:
+              type: array
+              description: 每個項目的計算結果（順序與請求相同）
+            total_emission:
+              type: number
+            count:
+              type: integer
+      400:
+        description: 請求驗證失敗
+      401:
+        description: 未授權
+      500:
+        description: 計算錯誤
+    """
+    try:
+        validated_data = get_validated_data()
+
+        result = calculate_carbon_batch([item.dict() for item in validated_data.items])
+
+        return jsonify(result), 200
+
+    except ValueError as e:
+        return jsonify({
+            "error": str(e),
+            "code": "VALIDATION_ERROR"
+        }), 400
+    except Exception as e:
+        import traceback
+        print(f"Batch carbon calculation error: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({
+            "error": "Internal server error",
+            "code": "CALCULATION_ERROR",
+            "message": str(e)
+        }), 500
+
+@app.route('/api/carbon/breakdown', methods=['POST'])
+@require_auth
+@validate_request(CarbonBreakdownRequest)
+def calculate_carbon_breakdown():
+    """
+    計算分氣體（CO2 / CH4 / N2O）排放與 GWP 加權結果
+    ---
+    tags:
+      - Carbon
+    security:
+      - Bearer: []
+    parameters:
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: object
+          required:
+            - page_key
+            - monthly_data
+            - year
+          properties:
+            page_key:
+              type: string
+              example: diesel
+            monthly_data:
+              type: object
+              example:
+                "1": 100.5
+                "2": 120.3
+            year:
+              type: integer
+              example: 2024
+            gwp_set:
+              type: string
+              example: AR5
+              description: GWP 版本（AR4 / AR5 / AR6）
+            factor_version:
+              type: string
+              description: 指定排放係數版本（選填）
+    responses:
+      200:
+        description: 計算成功
+        schema:
+          type: object
+          properties:
+            breakdown_available:
+              type: boolean
+              description: 該能源類型是否有分氣體係數（否則以綜合係數計算）
+            gwp_set:
+              type: string
+            gases:
+              type: object
+              description: 各氣體排放質量 (kg) 與 CO2e
+            monthly_emission:
+              type: object
+            monthly_gases:
+              type: object
+            total_emission:
+              type: number
+      400:
+        description: 請求驗證失敗或 GWP / 係數版本不存在
+      401:
+        description: 未授權
+      500:
+        description: 計算錯誤
+    """
+    try:
+        validated_data = get_validated_data()
+
+        result = calculate_gas_breakdown(
+            page_key=validated_data.page_key,
+            monthly_data=validated_data.monthly_data,
+            year=validated_data.year,
+            gwp_set=validated_data.gwp_set,
+            factor_version=validated_data.factor_version
+        )
+
+        return jsonify(result), 200
+
+    except EmissionFactorError as e:
+        return jsonify({
+            "error": str(e),
+            "code": "VALIDATION_ERROR"
+        }), 400
+    except Exception as e:
+        import traceback
+        print(f"Carbon breakdown error: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({
+            "error": "Internal server error",
+            "code": "CALCULATION_ERROR",
+            "message": str(e)
+        }), 500
+
+@app.route('/api/units/convert', methods=['POST'])
+@require_auth
+@validate_request(UnitConvertRequest)
+def convert_units():
+    """
+    批次單位換算（kg / g、L / m³、kWh / MWh 等）
+    ---
+    tags:
+      - Units
+    security:
+      - Bearer: []
+    parameters:
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: object
+          required:
+            - values
+          properties:
+            values:
+              type: array
+              items:
+                type: number
+              example: [1200, 800]
+            from_unit:
+              type: string
+              description: 來源單位（所有數值相同，與 from_units 擇一）
+              example: gram
+            from_units:
+              type: array
+              items:
+                type: string
+              description: 逐筆來源單位（與 values 等長）
+            to_unit:
+              type: string
+              description: 目標單位（未指定時換算為標準單位）
+              example: kg
+            page_key:
+              type: string
+              description: 能源類型（決定標準單位）
+    responses:
+      200:
+        description: 換算成功
+        schema:
+          type: object
+          properties:
+            values:
+              type: array
+              items:
+                type: number
+            unit:
+              type: string
+            total:
+              type: number
+      400:
+        description: 請求驗證失敗或單位無法換算
+      401:
+        description: 未授權
+    """
+    try:
+        data = get_validated_data()
+
+        if data.to_unit:
+            to_unit = normalize_unit(data.to_unit)
+            if to_unit is None:
+                raise UnitConversionError(f'Unknown unit: {data.to_unit}')
+        else:
+            to_unit = get_canonical_unit(data.from_unit, data.page_key)
+            if to_unit is None:
+                raise UnitConversionError(f'Unknown unit: {data.from_unit}')
+
+        converted = convert_values(data.values, data.from_unit or data.from_units, to_unit)
+
+        return jsonify({
+            'values': [round(value, 6) for value in converted.tolist()],
+            'unit': to_unit,
+            'total': round(float(converted.sum()), 6)
+        }), 200
+
+    except UnitConversionError as e:
+        return jsonify({"error": str(e), "code": "VALIDATION_ERROR"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/bills/distribute', methods=['POST'])
+@require_auth
+@validate_request(BillDistributeRequest)
+def distribute_bill_usage():
+    """
+    將帳單用量依計費天數分配到各月份（外購電力、天然氣）
+    ---
+    tags:
+      - Bills
+    security:
+      - Bearer: []
+    parameters:
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: object
+          required:
+            - year
+            - bills
+          properties:
+            year:
+              type: integer
+              example: 2024
+              description: 盤查年度（西元年）
+            bills:
+              type: array
+              items:
+                type: object
+                properties:
+                  billingStart:
+                    type: string
+                    example: 112/12/15
+                  billingEnd:
+                    type: string
+                    example: 113/02/14
+                  billingUnits:
+                    type: number
+                    example: 620
+                  meterId:
+                    type: string
+    responses:
+      200:
+        description: 分配成功
+        schema:
+          type: object
+          properties:
+            monthly:
+              type: object
+              description: 月份用量（只含大於 0 的月份）
+            meters:
+              type: object
+              description: 各表號的月份用量
+            total:
+              type: number
+            count:
+              type: integer
+      400:
+        description: 請求驗證失敗或帳單日期錯誤
+      401:
+        description: 未授權
+    """
+    try:
+        data = get_validated_data()
+        result = distribute_bills([bill.dict() for bill in data.bills], data.year)
+        return jsonify(result), 200
+
+    except BillDistributionError as e:
+        return jsonify({"error": str(e), "code": "VALIDATION_ERROR"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 # Energy Entry Submission API
 @app.route('/api/entries/submit', methods=['POST'])
 @require_auth
@@ -340,6 +768,8 @@ def submit_energy_entry():
             'message': 'Entry created successfully'
         }), 201
 
+    except BillDistributionError as e:
+        return jsonify({"error": str(e), "code": "VALIDATION_ERROR"}), 400
     except Exception as e:
         import traceback
         print(f"Entry submission error: {str(e)}")
@@ -436,6 +866,8 @@ def update_entry(entry_id):
             'message': 'Entry updated successfully'
         }), 200
 
+    except BillDistributionError as e:
+        return jsonify({"error": str(e), "code": "VALIDATION_ERROR"}), 400
     except Exception as e:
         import traceback
         print(f"Entry update error: {str(e)}")
@@ -446,32 +878,97 @@ def update_entry(entry_id):
             "message": str(e)
         }), 500
 
-# File Upload API
-@app.route('/api/files/upload', methods=['POST'])
+@app.route('/api/entries/<entry_id>/emissions', methods=['GET'])
 @require_auth
-def upload_file():
+def get_entry_emissions(entry_id):
     """
-    上傳證據檔案
+    取得條目的分氣體排放（CO2 / CH4 / N2O）
     ---
     tags:
-      - Files
+      - Entries
     security:
       - Bearer: []
-    consumes:
-      - multipart/form-data
     parameters:
-      - in: formData
-        name: file
-        type: file
-        required: true
-        description: 要上傳的檔案
-      - in: formData
-        name: page_key
+      - in: path
+        name: entry_id
         type: string
         required: true
-        description: 頁面類型
-      - in: formData
-        name: period_year
+        description: 條目 ID
+      - in: query
+        name: gwp_set
+        type: string
+        required: false
+        description: GWP 版本（AR4 / AR5 / AR6，預設 AR5）
+    responses:
+      200:
+        description: 成功取得分氣體排放
+      400:
+        description: GWP 版本不存在
+      401:
+        description: 未授權
+      403:
+        description: 條目不屬於該用戶
+      404:
+        description: 條目不存在
+      500:
+        description: 計算錯誤
+    """
+    try:
+        supabase = get_supabase_admin()
+        user = request.user
+        user_id = None if user.get('role') == 'admin' else user['id']
+
+        result = get_entry_gas_breakdown(
+            supabase,
+            entry_id,
+            gwp_set=request.args.get('gwp_set'),
+            user_id=user_id
+        )
+
+        return jsonify(result), 200
+
+    except EmissionFactorError as e:
+        return jsonify({"error": str(e), "code": "VALIDATION_ERROR"}), 400
+    except PermissionError as e:
+        return jsonify({"error": str(e), "code": "FORBIDDEN"}), 403
+    except LookupError as e:
+        return jsonify({"error": str(e), "code": "NOT_FOUND"}), 404
+    except Exception as e:
+        import traceback
+        print(f"Entry emissions error: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({
+            "error": "Internal server error",
+            "code": "CALCULATION_ERROR",
+            "message": str(e)
+        }), 500
+
+# File Upload API
+@app.route('/api/files/upload', methods=['POST'])
+@require_auth
+def upload_file():
+    """
+    上傳證據檔案
+    ---
+    tags:
+      - Files
+    security:
+      - Bearer: []
+    consumes:
+      - multipart/form-data
+    parameters:
+      - in: formData
+        name: file
+        type: file
+        required: true
+        description: 要上傳的檔案
+      - in: formData
+        name: page_key
+        type: string
+        required: true
+        description: 頁面類型
+      - in: formData
+        name: period_year
         type: integer
         required: true
         description: 盤查年度
@@ -517,6 +1014,9 @@ def upload_file():
               type: string
             file_size:
               type: integer
+            deduplicated:
+              type: boolean
+              description: 相同內容已存在，未寫入 Storage
             message:
               type: string
       400:
@@ -530,6 +1030,14 @@ def upload_file():
         supabase = get_supabase_admin()
         user_id = request.user['id']
 
+        # 解析 multipart 之前先以 Content-Length 拒絕明顯過大的請求
+        if request.content_length and request.content_length > MAX_FILE_SIZE + UPLOAD_FORM_OVERHEAD:
+            return jsonify({
+                "error": "File validation failed",
+                "code": "VALIDATION_ERROR",
+                "message": f"File size exceeds maximum limit of {MAX_FILE_SIZE / 1024 / 1024}MB"
+            }), 400
+
         # 檢查是否有檔案
         if 'file' not in request.files:
             return jsonify({
@@ -563,27 +1071,29 @@ def upload_file():
                 "message": str(e)
             }), 400
 
-        # 讀取檔案數據
-        file_data = file.read()
-        file_size = len(file_data)
         mime_type = file.content_type or ''
 
-        # 呼叫 file service 上傳
-        result = upload_evidence_file(
-            supabase=supabase,
-            user_id=user_id,
-            entry_id=metadata.entry_id,
-            file_data=file_data,
-            filename=file.filename,
-            file_size=file_size,
-            mime_type=mime_type,
-            page_key=metadata.page_key,
-            period_year=metadata.period_year,
-            file_type=metadata.file_type,
-            standard=metadata.standard,
-            month=metadata.month,
-            record_id=metadata.record_id
-        )
+        # 分塊讀取檔案（邊讀邊檢查大小），暫存檔以串流方式上傳到 Storage
+        with spool_upload_stream(file.stream) as (file_data, file_size, content_sha256):
+            result = upload_evidence_file(
+                supabase=supabase,
+                user_id=user_id,
+                entry_id=metadata.entry_id,
+                file_data=file_data,
+                filename=file.filename,
+                file_size=file_size,
+                mime_type=mime_type,
+                page_key=metadata.page_key,
+                period_year=metadata.period_year,
+                file_type=metadata.file_type,
+                standard=metadata.standard,
+                month=metadata.month,
+                record_id=metadata.record_id,
+                content_sha256=content_sha256
+            )
+
+        # 背景產生預覽縮圖
+        schedule_derivatives(supabase, [result])
 
         return jsonify({
             'success': True,
@@ -591,6 +1101,7 @@ def upload_file():
             'file_path': result['file_path'],
             'file_name': result['file_name'],
             'file_size': result['file_size'],
+            'deduplicated': result['deduplicated'],
             'message': 'File uploaded successfully'
         }), 201
 
@@ -616,6 +1127,222 @@ def upload_file():
             "message": str(e)
         }), 500
 
+@app.route('/api/files/upload/batch', methods=['POST'])
+@require_auth
+def upload_files_batch():
+    """
+    批次上傳證據檔案（全部成功或全部回滾）
+    ---
+    tags:
+      - Files
+    security:
+      - Bearer: []
+    consumes:
+      - multipart/form-data
+    parameters:
+      - in: formData
+        name: files
+        type: file
+        required: true
+        description: 要上傳的檔案（可重複多個 files 欄位）
+      - in: formData
+        name: metadata
+        type: string
+        required: true
+        description: JSON 陣列，依檔案順序提供元數據（欄位同 /api/files/upload 的表單欄位）
+    responses:
+      201:
+        description: 全部檔案上傳成功
+        schema:
+          type: object
+          properties:
+            success:
+              type: boolean
+            files:
+              type: array
+              items:
+                type: object
+                properties:
+                  file_id:
+                    type: string
+                  file_path:
+                    type: string
+                  file_name:
+                    type: string
+                  file_size:
+                    type: integer
+                  deduplicated:
+                    type: boolean
+            count:
+              type: integer
+      400:
+        description: 請求驗證失敗或任一檔案驗證失敗（未寫入任何檔案）
+      401:
+        description: 未授權
+      500:
+        description: 上傳錯誤（已上傳的檔案已回滾）
+    """
+    try:
+        supabase = get_supabase_admin()
+        user_id = request.user['id']
+
+        # 解析 multipart 之前先以 Content-Length 拒絕明顯過大的請求
+        max_request_size = MAX_BATCH_FILES * (MAX_FILE_SIZE + UPLOAD_FORM_OVERHEAD)
+        if request.content_length and request.content_length > max_request_size:
+            return jsonify({
+                "error": "File validation failed",
+                "code": "VALIDATION_ERROR",
+                "message": f"Batch exceeds maximum size of {max_request_size / 1024 / 1024:.0f}MB"
+            }), 400
+
+        files = [file for file in request.files.getlist('files') if file.filename]
+        if not files:
+            return jsonify({
+                "error": "No file provided",
+                "code": "MISSING_FILE"
+            }), 400
+
+        # 驗證每個檔案的元數據
+        try:
+            raw_metadata = json.loads(request.form.get('metadata') or '[]')
+            if not isinstance(raw_metadata, list) or len(raw_metadata) != len(files):
+                raise ValueError(f'metadata must be a JSON array with one object per file ({len(files)})')
+            metadata = [FileUploadMetadata(**item) for item in raw_metadata]
+        except Exception as e:
+            return jsonify({
+                "error": "Invalid metadata",
+                "code": "VALIDATION_ERROR",
+                "message": str(e)
+            }), 400
+
+        # 全部檔案分塊暫存（邊讀邊檢查大小並計算摘要）後一次上傳
+        with ExitStack() as stack:
+            items = []
+            for index, (file, meta) in enumerate(zip(files, metadata)):
+                try:
+                    file_data, file_size, content_sha256 = stack.enter_context(spool_upload_stream(file.stream))
+                except ValueError as e:
+                    raise ValueError(f"File {index + 1} ({file.filename}): {str(e)}")
+
+                items.append({
+                    'file_data': file_data,
+                    'filename': file.filename,
+                    'file_size': file_size,
+                    'mime_type': file.content_type or '',
+                    'content_sha256': content_sha256,
+                    **meta.dict()
+                })
+
+            results = upload_evidence_batch(supabase, user_id, items)
+
+        schedule_derivatives(supabase, results)
+
+        return jsonify({
+            'success': True,
+            'files': results,
+            'count': len(results),
+            'message': 'Files uploaded successfully'
+        }), 201
+
+    except ValueError as e:
+        import traceback
+        print(f"Batch file validation error: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({
+            "error": "File validation failed",
+            "code": "VALIDATION_ERROR",
+            "message": str(e)
+        }), 400
+
+    except Exception as e:
+        import traceback
+        print(f"Batch file upload error: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({
+            "error": "Failed to upload files",
+            "code": "UPLOAD_ERROR",
+            "message": str(e)
+        }), 500
+
+@app.route('/api/files/<file_id>/thumbnail', methods=['GET'])
+@require_auth
+def get_file_thumbnail(file_id):
+    """
+    取得證據檔案的預覽縮圖（WebP，圖片縮圖或 PDF 第一頁）
+    ---
+    tags:
+      - Files
+    security:
+      - Bearer: []
+    produces:
+      - image/webp
+    parameters:
+      - in: path
+        name: file_id
+        type: string
+        required: true
+        description: 檔案 ID
+      - in: header
+        name: If-None-Match
+        type: string
+        required: false
+        description: 先前取得的 ETag（未變更時回傳 304）
+    responses:
+      200:
+        description: 縮圖（含 ETag 與 Cache-Control，可由瀏覽器快取）
+      202:
+        description: 縮圖產生中，稍後重試（Retry-After）
+      304:
+        description: 縮圖未變更
+      401:
+        description: 未授權
+      403:
+        description: 權限不足
+      404:
+        description: 檔案不存在或類型不支援預覽
+      415:
+        description: 檔案內容無法算繪（損毀、加密或像素過多），不會再重試
+    """
+    try:
+        supabase = get_supabase_admin()
+        thumbnail = resolve_thumbnail(
+            supabase,
+            user_id=request.user['id'],
+            file_id=file_id,
+            is_admin=request.user.get('role') == 'admin'
+        )
+
+        cache_control = f"private, max-age={THUMBNAIL_MAX_AGE}"
+
+        # 條件請求：ETag 相同時不讀取縮圖內容
+        if request.if_none_match.contains(thumbnail['etag']):
+            response = Response(status=304)
+        else:
+            content = load_thumbnail(supabase, thumbnail)
+            if content is None:
+                response = jsonify({"status": "pending", "message": "Thumbnail is being generated"})
+                response.status_code = 202
+                response.headers['Retry-After'] = '2'
+                return response
+
+            response = Response(content, mimetype=THUMBNAIL_MIME_TYPE)
+
+        response.set_etag(thumbnail['etag'])
+        response.headers['Cache-Control'] = cache_control
+        return response
+
+    except UnrenderableFileError as e:
+        return jsonify({"error": str(e), "code": "UNSUPPORTED_MEDIA_TYPE"}), 415
+    except PermissionError as e:
+        return jsonify({"error": str(e), "code": "FORBIDDEN"}), 403
+    except LookupError as e:
+        return jsonify({"error": str(e), "code": "NOT_FOUND"}), 404
+    except Exception as e:
+        import traceback
+        print(f"Thumbnail error: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/files/<file_id>', methods=['DELETE'])
 @require_auth
 def delete_file(file_id):
@@ -633,245 +1360,1417 @@ def delete_file(file_id):
         required: true
         description: 檔案 ID
     responses:
-      200:
-        description: 檔案刪除成功
+      200:
+        description: 檔案刪除成功
+        schema:
+          type: object
+          properties:
+            success:
+              type: boolean
+            file_id:
+              type: string
+            message:
+              type: string
+      401:
+        description: 未授權
+      403:
+        description: 權限不足
+      404:
+        description: 檔案不存在
+      500:
+        description: 刪除錯誤
+    """
+    try:
+        supabase = get_supabase_admin()
+        user_id = request.user['id']
+
+        # 呼叫 file service 刪除
+        result = delete_evidence_file(
+            supabase=supabase,
+            user_id=user_id,
+            file_id=file_id
+        )
+
+        return jsonify({
+            'success': True,
+            'file_id': file_id,
+            'message': 'File deleted successfully'
+        }), 200
+
+    except Exception as e:
+        import traceback
+        print(f"File deletion error: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({
+            "error": "Failed to delete file",
+            "code": "DELETION_ERROR",
+            "message": str(e)
+        }), 500
+
+@app.route('/api/files/uploads', methods=['POST'])
+@require_auth
+@validate_request(UploadSessionCreateRequest)
+def create_upload():
+    """
+    建立可續傳的分塊上傳工作階段
+    ---
+    tags:
+      - Files
+    security:
+      - Bearer: []
+    parameters:
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: object
+          required:
+            - filename
+            - file_size
+            - page_key
+            - period_year
+            - file_type
+          properties:
+            filename:
+              type: string
+            file_size:
+              type: integer
+              description: 檔案大小（bytes）
+            mime_type:
+              type: string
+            page_key:
+              type: string
+            period_year:
+              type: integer
+            file_type:
+              type: string
+            month:
+              type: integer
+            entry_id:
+              type: string
+            record_id:
+              type: string
+            standard:
+              type: string
+              default: "64"
+    responses:
+      201:
+        description: 工作階段已建立（依 chunk_size 切塊，以 PUT /api/files/uploads/{session_id}/chunks 上傳）
+      400:
+        description: 請求驗證失敗或檔案過大
+      401:
+        description: 未授權
+      500:
+        description: 伺服器錯誤
+    """
+    try:
+        data = get_validated_data()
+
+        session = create_upload_session(
+            get_supabase_admin(),
+            user_id=request.user['id'],
+            filename=data.filename,
+            file_size=data.file_size,
+            mime_type=data.mime_type,
+            page_key=data.page_key,
+            period_year=data.period_year,
+            file_type=data.file_type,
+            standard=data.standard,
+            month=data.month,
+            entry_id=data.entry_id,
+            record_id=data.record_id
+        )
+
+        return jsonify(session), 201
+
+    except ValueError as e:
+        return jsonify({"error": str(e), "code": "VALIDATION_ERROR"}), 400
+    except Exception as e:
+        import traceback
+        print(f"Upload session error: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/files/uploads/<session_id>', methods=['GET'])
+@require_auth
+def get_upload(session_id):
+    """
+    查詢分塊上傳進度（連線中斷後依 missing_offsets 續傳）
+    ---
+    tags:
+      - Files
+    security:
+      - Bearer: []
+    parameters:
+      - in: path
+        name: session_id
+        type: string
+        required: true
+    responses:
+      200:
+        description: 工作階段與已收到的區塊
+        schema:
+          type: object
+          properties:
+            status:
+              type: string
+            chunk_size:
+              type: integer
+            total_chunks:
+              type: integer
+            received_chunks:
+              type: array
+              items:
+                type: integer
+            missing_offsets:
+              type: array
+              items:
+                type: integer
+            progress:
+              type: number
+      401:
+        description: 未授權
+      403:
+        description: 權限不足
+      404:
+        description: 工作階段不存在
+    """
+    try:
+        return jsonify(get_upload_session(get_supabase_admin(), request.user['id'], session_id)), 200
+
+    except PermissionError as e:
+        return jsonify({"error": str(e), "code": "FORBIDDEN"}), 403
+    except LookupError as e:
+        return jsonify({"error": str(e), "code": "NOT_FOUND"}), 404
+    except Exception as e:
+        import traceback
+        print(f"Upload session error: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/files/uploads/<session_id>/chunks', methods=['PUT'])
+@require_auth
+def put_upload_chunk(session_id):
+    """
+    上傳一個區塊（請求本文為區塊的原始位元組；重送同一 offset 會覆寫）
+    ---
+    tags:
+      - Files
+    security:
+      - Bearer: []
+    consumes:
+      - application/octet-stream
+    parameters:
+      - in: path
+        name: session_id
+        type: string
+        required: true
+      - in: query
+        name: offset
+        type: integer
+        required: true
+        description: 區塊起始位置（chunk_size 的倍數）
+    responses:
+      200:
+        description: 區塊已接收，回傳最新進度
+      400:
+        description: offset 或區塊大小不符
+      401:
+        description: 未授權
+      403:
+        description: 權限不足
+      404:
+        description: 工作階段不存在
+      409:
+        description: 工作階段已完成、組合中或已過期
+      500:
+        description: 上傳錯誤
+    """
+    try:
+        try:
+            offset = int(request.args.get('offset', ''))
+        except ValueError:
+            return jsonify({"error": "offset must be an integer", "code": "VALIDATION_ERROR"}), 400
+
+        if request.content_length is not None and request.content_length > UPLOAD_SESSION_CHUNK_SIZE:
+            return jsonify({
+                "error": f"Chunk exceeds chunk size of {UPLOAD_SESSION_CHUNK_SIZE} bytes",
+                "code": "VALIDATION_ERROR"
+            }), 400
+
+        session = upload_session_chunk(
+            get_supabase_admin(),
+            user_id=request.user['id'],
+            session_id=session_id,
+            offset=offset,
+            stream=request.stream
+        )
+
+        return jsonify(session), 200
+
+    except UploadSessionError as e:
+        return jsonify({"error": str(e), "code": "VALIDATION_ERROR"}), 400
+    except PermissionError as e:
+        return jsonify({"error": str(e), "code": "FORBIDDEN"}), 403
+    except LookupError as e:
+        return jsonify({"error": str(e), "code": "NOT_FOUND"}), 404
+    except UploadSessionStateError as e:
+        return jsonify({"error": str(e), "code": "CONFLICT"}), 409
+    except Exception as e:
+        import traceback
+        print(f"Upload chunk error: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({
+            "error": "Failed to upload chunk",
+            "code": "UPLOAD_ERROR",
+            "message": str(e)
+        }), 500
+
+@app.route('/api/files/uploads/<session_id>/complete', methods=['POST'])
+@require_auth
+def complete_upload(session_id):
+    """
+    完成分塊上傳：組合全部區塊並建立檔案記錄
+    ---
+    tags:
+      - Files
+    security:
+      - Bearer: []
+    parameters:
+      - in: path
+        name: session_id
+        type: string
+        required: true
+    responses:
+      201:
+        description: 檔案上傳成功（格式同 POST /api/files/upload；重複呼叫回傳相同結果）
+      401:
+        description: 未授權
+      403:
+        description: 權限不足
+      404:
+        description: 工作階段不存在
+      409:
+        description: 區塊未到齊、正在組合或已過期
+      500:
+        description: 上傳錯誤（工作階段保留，可再次完成）
+    """
+    try:
+        supabase = get_supabase_admin()
+        result = complete_upload_session(supabase, request.user['id'], session_id)
+
+        schedule_derivatives(supabase, [result])
+
+        return jsonify({
+            'success': True,
+            'file_id': result['file_id'],
+            'file_path': result['file_path'],
+            'file_name': result['file_name'],
+            'file_size': result['file_size'],
+            'deduplicated': result.get('deduplicated', False),
+            'message': 'File uploaded successfully'
+        }), 201
+
+    except PermissionError as e:
+        return jsonify({"error": str(e), "code": "FORBIDDEN"}), 403
+    except LookupError as e:
+        return jsonify({"error": str(e), "code": "NOT_FOUND"}), 404
+    except UploadSessionStateError as e:
+        return jsonify({"error": str(e), "code": "CONFLICT"}), 409
+    except Exception as e:
+        import traceback
+        print(f"Upload completion error: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({
+            "error": "Failed to upload file",
+            "code": "UPLOAD_ERROR",
+            "message": str(e)
+        }), 500
+
+@app.route('/api/files/uploads/<session_id>', methods=['DELETE'])
+@require_auth
+def abort_upload(session_id):
+    """
+    取消分塊上傳並刪除已上傳的區塊
+    ---
+    tags:
+      - Files
+    security:
+      - Bearer: []
+    parameters:
+      - in: path
+        name: session_id
+        type: string
+        required: true
+    responses:
+      200:
+        description: 已取消
+      401:
+        description: 未授權
+      403:
+        description: 權限不足
+      404:
+        description: 工作階段不存在
+      409:
+        description: 工作階段已完成或正在組合
+    """
+    try:
+        return jsonify(abort_upload_session(get_supabase_admin(), request.user['id'], session_id)), 200
+
+    except PermissionError as e:
+        return jsonify({"error": str(e), "code": "FORBIDDEN"}), 403
+    except LookupError as e:
+        return jsonify({"error": str(e), "code": "NOT_FOUND"}), 404
+    except UploadSessionStateError as e:
+        return jsonify({"error": str(e), "code": "CONFLICT"}), 409
+    except Exception as e:
+        import traceback
+        print(f"Upload session error: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
+
+# Admin API Routes
+@app.route('/api/admin/users', methods=['GET'])
+@require_auth
+@require_admin
+def get_all_users():
+    """
+    獲取所有用戶列表
+    ---
+    tags:
+      - Admin - Users
+    security:
+      - Bearer: []
+    responses:
+      200:
+        description: 成功獲取用戶列表
+        schema:
+          type: object
+          properties:
+            users:
+              type: array
+              items:
+                type: object
+                properties:
+                  id:
+                    type: string
+                  email:
+                    type: string
+                  display_name:
+                    type: string
+                  role:
+                    type: string
+                  is_active:
+                    type: boolean
+                  company:
+                    type: string
+                  entries_count:
+                    type: integer
+      401:
+        description: 未授權
+      403:
+        description: 權限不足
+    """
+    try:
+        # request.user 已由 @require_auth 設置
+        supabase = get_supabase_admin()
+
+        # profiles、填報數量、auth email 各以一次批次查詢取得後合併
+        users_with_counts = list_users_with_entry_counts(supabase)
+
+        return jsonify({"users": users_with_counts})
+    except Exception as e:
+        print(f"Error in get_all_users: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/admin/users/<user_id>/entries', methods=['GET'])
+@require_auth
+@require_admin
+@validate_request(EntryListParams, location='query')
+def get_user_entries(user_id):
+    """
+    獲取指定用戶的填報記錄
+    ---
+    tags:
+      - Admin - Users
+    security:
+      - Bearer: []
+    parameters:
+      - in: path
+        name: user_id
+        type: string
+        required: true
+        description: 用戶 ID
+      - in: query
+        name: from
+        type: string
+        required: false
+        description: 起始日期 (YYYY-MM-DD)
+      - in: query
+        name: to
+        type: string
+        required: false
+        description: 結束日期 (YYYY-MM-DD)
+      - in: query
+        name: category
+        type: string
+        required: false
+        description: 類別篩選
+      - in: query
+        name: page_size
+        type: integer
+        required: false
+        default: 20
+        description: 每頁數量 (1-100)
+      - in: query
+        name: cursor
+        type: string
+        required: false
+        description: 上一頁回傳的 next_cursor
+      - in: query
+        name: include_total
+        type: boolean
+        required: false
+        default: false
+        description: 是否回傳估計總筆數
+      - in: query
+        name: fields
+        type: string
+        required: false
+        description: 逗號分隔的欄位（id, category, status, amount, owner, reviews ...），未指定時回傳所有欄位
+      - in: query
+        name: include_payload
+        type: string
+        required: false
+        description: true / false / 逗號分隔的 payload 欄位（monthly, unit, records ...）
+      - in: header
+        name: Accept
+        type: string
+        required: false
+        description: 設為 application/x-ndjson 時以串流逐行輸出所有符合條件的條目（忽略 page_size、include_total）
+    responses:
+      200:
+        description: 成功獲取填報記錄
+        schema:
+          type: object
+          properties:
+            success:
+              type: boolean
+            data:
+              type: array
+            pagination:
+              type: object
+              properties:
+                page_size:
+                  type: integer
+                next_cursor:
+                  type: string
+                has_more:
+                  type: boolean
+                total:
+                  type: integer
+      400:
+        description: 查詢參數、游標或欄位無效
+      401:
+        description: 未授權
+      403:
+        description: 權限不足
+      500:
+        description: 伺服器錯誤
+    """
+    try:
+        supabase = get_supabase_admin()
+        params = get_validated_data()
+
+        columns = build_entry_columns(params.fields, params.include_payload, USER_ENTRIES_COLUMNS)
+
+        if wants_ndjson():
+            rows = iter_entries(
+                supabase=supabase,
+                columns=columns,
+                owner_id=user_id,
+                from_date=params.from_date,
+                to_date=params.to_date,
+                category=params.category,
+                cursor=params.cursor
+            )
+            return Response(stream_with_context(iter_ndjson(rows)), mimetype=NDJSON_MIMETYPE)
+
+        page = list_entries_page(
+            supabase=supabase,
+            columns=columns,
+            owner_id=user_id,
+            from_date=params.from_date,
+            to_date=params.to_date,
+            category=params.category,
+            page_size=params.page_size,
+            cursor=params.cursor,
+            include_total=params.include_total
+        )
+
+        return jsonify(PaginatedResponse.create_cursor(
+            data=page['entries'],
+            page_size=params.page_size,
+            next_cursor=page['next_cursor'],
+            total=page['total']
+        ).dict())
+    except EntryQueryError as e:
+        return jsonify({"error": str(e), "code": e.code}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/admin/entries', methods=['GET'])
+@require_auth
+@require_admin
+@validate_request(EntryListParams, location='query')
+def get_all_entries():
+    """
+    獲取所有填報記錄
+    ---
+    tags:
+      - Admin - Entries
+    security:
+      - Bearer: []
+    parameters:
+      - in: query
+        name: from
+        type: string
+        required: false
+        description: 起始日期 (YYYY-MM-DD)
+      - in: query
+        name: to
+        type: string
+        required: false
+        description: 結束日期 (YYYY-MM-DD)
+      - in: query
+        name: category
+        type: string
+        required: false
+        description: 類別篩選
+      - in: query
+        name: page_size
+        type: integer
+        required: false
+        default: 20
+        description: 每頁數量 (1-100)
+      - in: query
+        name: cursor
+        type: string
+        required: false
+        description: 上一頁回傳的 next_cursor
+      - in: query
+        name: include_total
+        type: boolean
+        required: false
+        default: false
+        description: 是否回傳估計總筆數
+      - in: query
+        name: fields
+        type: string
+        required: false
+        description: 逗號分隔的欄位（id, category, status, amount, owner, reviews ...），未指定時回傳所有欄位
+      - in: query
+        name: include_payload
+        type: string
+        required: false
+        description: true / false / 逗號分隔的 payload 欄位（monthly, unit, records ...）
+      - in: header
+        name: Accept
+        type: string
+        required: false
+        description: 設為 application/x-ndjson 時以串流逐行輸出所有符合條件的條目（忽略 page_size、include_total）
+    responses:
+      200:
+        description: 成功獲取所有填報記錄
+        schema:
+          type: object
+          properties:
+            success:
+              type: boolean
+            data:
+              type: array
+            pagination:
+              type: object
+              properties:
+                page_size:
+                  type: integer
+                next_cursor:
+                  type: string
+                has_more:
+                  type: boolean
+                total:
+                  type: integer
+      400:
+        description: 查詢參數、游標或欄位無效
+      401:
+        description: 未授權
+      403:
+        description: 權限不足
+      500:
+        description: 伺服器錯誤
+    """
+    try:
+        supabase = get_supabase_admin()
+        params = get_validated_data()
+
+        columns = build_entry_columns(params.fields, params.include_payload, ALL_ENTRIES_COLUMNS)
+
+        if wants_ndjson():
+            rows = iter_entries(
+                supabase=supabase,
+                columns=columns,
+                from_date=params.from_date,
+                to_date=params.to_date,
+                category=params.category,
+                cursor=params.cursor
+            )
+            return Response(stream_with_context(iter_ndjson(rows)), mimetype=NDJSON_MIMETYPE)
+
+        page = list_entries_page(
+            supabase=supabase,
+            columns=columns,
+            from_date=params.from_date,
+            to_date=params.to_date,
+            category=params.category,
+            page_size=params.page_size,
+            cursor=params.cursor,
+            include_total=params.include_total
+        )
+
+        return jsonify(PaginatedResponse.create_cursor(
+            data=page['entries'],
+            page_size=params.page_size,
+            next_cursor=page['next_cursor'],
+            total=page['total']
+        ).dict())
+    except EntryQueryError as e:
+        return jsonify({"error": str(e), "code": e.code}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/admin/exports/entries', methods=['POST'])
+@require_auth
+@require_admin
+@validate_request(EntryExportSchema)
+def export_entries_excel():
+    """
+    匯出填報資料為多工作表 Excel
+    ---
+    tags:
+      - Admin - Entries
+    security:
+      - Bearer: []
+    consumes:
+      - application/json
+    produces:
+      - application/vnd.openxmlformats-officedocument.spreadsheetml.sheet
+    parameters:
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: object
+          required:
+            - user_ids
+            - year
+          properties:
+            user_ids:
+              type: array
+              items:
+                type: string
+              minItems: 1
+              maxItems: 200
+              example: ["550e8400-e29b-41d4-a716-446655440000"]
+              description: 用戶 ID 列表
+            year:
+              type: integer
+              example: 2024
+              description: 填報年份
+            page_key:
+              type: string
+              example: diesel
+              description: 只匯出指定類別（可選）
+    responses:
+      200:
+        description: Excel 檔案（每個能源類別一個工作表）
+        schema:
+          type: file
+      400:
+        description: 請求驗證失敗
+      401:
+        description: 未授權
+      403:
+        description: 權限不足
+      404:
+        description: 沒有可匯出的資料
+      500:
+        description: 伺服器錯誤
+    """
+    try:
+        data = get_validated_data()
+        supabase = get_supabase_admin()
+
+        path = get_or_build_entries_export(supabase, data.user_ids, data.year, data.page_key)
+
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        return send_file(
+            path,
+            mimetype=XLSX_MIMETYPE,
+            as_attachment=True,
+            download_name=f"能源填報資料_{data.year}_{timestamp}.xlsx",
+            max_age=0
+        )
+    except NoExportDataError as e:
+        return jsonify({"error": str(e), "code": "NO_DATA"}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/admin/exports/evidence', methods=['POST'])
+@require_auth
+@require_admin
+@validate_request(EvidenceExportSchema)
+def export_evidence_zip():
+    """
+    匯出佐證檔案為 ZIP（串流下載）
+    ---
+    tags:
+      - Admin - Entries
+    security:
+      - Bearer: []
+    consumes:
+      - application/json
+    produces:
+      - application/zip
+    parameters:
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: object
+          required:
+            - user_ids
+            - year
+          properties:
+            user_ids:
+              type: array
+              items:
+                type: string
+              minItems: 1
+              maxItems: 200
+              example: ["550e8400-e29b-41d4-a716-446655440000"]
+              description: 用戶 ID 列表
+            year:
+              type: integer
+              example: 2024
+              description: 填報年份
+            page_key:
+              type: string
+              example: diesel
+              description: 只匯出指定類別（可選）
+            include_excel:
+              type: boolean
+              default: true
+              description: 是否附上填報資料 Excel
+    responses:
+      200:
+        description: ZIP 檔案（佐證檔案依類別分資料夾，下載失敗的檔案列於 下載失敗清單.txt）
+        schema:
+          type: file
+      400:
+        description: 請求驗證失敗
+      401:
+        description: 未授權
+      403:
+        description: 權限不足
+      404:
+        description: 沒有可匯出的資料
+      500:
+        description: 伺服器錯誤
+    """
+    try:
+        data = get_validated_data()
+        supabase = get_supabase_admin()
+
+        if count_export_entries(supabase, data.user_ids, data.year, data.page_key) == 0:
+            return jsonify({"error": "沒有可匯出的資料", "code": "NO_DATA"}), 404
+
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        download_name = quote(f"能源填報資料_{data.year}_{timestamp}.zip")
+
+        stream = stream_evidence_zip(
+            supabase,
+            data.user_ids,
+            data.year,
+            page_key=data.page_key,
+            include_excel=data.include_excel
+        )
+        return Response(
+            stream_with_context(stream),
+            mimetype=ZIP_MIMETYPE,
+            headers={'Content-Disposition': f"attachment; filename*=UTF-8''{download_name}"}
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/admin/storage/sweep', methods=['POST'])
+@require_auth
+@require_admin
+def sweep_storage():
+    """
+    清除已無參考的證據檔案與過期的分塊上傳工作階段（供排程定期呼叫）
+    ---
+    tags:
+      - Admin - Files
+    security:
+      - Bearer: []
+    responses:
+      200:
+        description: 清除完成
+        schema:
+          type: object
+          properties:
+            blobs_removed:
+              type: integer
+              description: 刪除的共用檔案數（ref_count 歸零超過 BLOB_SWEEP_GRACE_SECONDS）
+            upload_sessions_removed:
+              type: integer
+              description: 刪除的過期上傳工作階段數（含暫存區塊）
+      401:
+        description: 未授權
+      403:
+        description: 權限不足
+      500:
+        description: 伺服器錯誤
+    """
+    try:
+        supabase = get_supabase_admin()
+        return jsonify({
+            'blobs_removed': sweep_unreferenced_blobs(supabase),
+            'upload_sessions_removed': sweep_expired_upload_sessions(supabase)
+        }), 200
+
+    except Exception as e:
+        import traceback
+        print(f"Storage sweep error: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/admin/users/bulk-update', methods=['PUT'])
+@require_auth
+@require_admin
+@validate_request(BulkUserUpdateSchema)
+def bulk_update_users():
+    """
+    批量更新用戶狀態
+    ---
+    tags:
+      - Admin - Users
+    security:
+      - Bearer: []
+    parameters:
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: object
+          required:
+            - user_ids
+            - is_active
+          properties:
+            user_ids:
+              type: array
+              items:
+                type: string
+              minItems: 1
+              maxItems: 100
+              example: ["uuid-1", "uuid-2"]
+              description: 用戶 ID 列表
+            is_active:
+              type: boolean
+              example: false
+              description: 是否啟用
+    responses:
+      200:
+        description: 批量更新成功
+        schema:
+          type: object
+          properties:
+            success:
+              type: boolean
+            updated_count:
+              type: integer
+      400:
+        description: 請求驗證失敗
+      401:
+        description: 未授權
+      403:
+        description: 權限不足
+      500:
+        description: 伺服器錯誤
+    """
+    try:
+        # 從已驗證的數據取得參數
+        data = get_validated_data()
+        user_ids = data.user_ids
+        is_active = data.is_active
+
+        supabase = get_supabase_admin()
+
+        # 批次更新用戶狀態
+        result = supabase.table('profiles').update({
+            'is_active': is_active
+        }).in_('id', user_ids).execute()
+
+        # 清除快取，讓停用/啟用立即生效
+        for user_id in user_ids:
+            invalidate_user_cache(user_id)
+
+        return jsonify({"success": True, "updated_count": len(result.data)})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/admin/carbon/leakage', methods=['POST'])
+@require_auth
+@require_admin
+@validate_request(LeakageCalculateRequest)
+def calculate_leakage():
+    """
+    計算冷媒與 SF6 設備逸散排放（所有用戶的所有設備一次計算）
+    ---
+    tags:
+      - Admin - Carbon
+    security:
+      - Bearer: []
+    parameters:
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: object
+          required:
+            - year
+          properties:
+            year:
+              type: integer
+              example: 2024
+            user_ids:
+              type: array
+              items:
+                type: string
+              description: 只計算指定用戶（未指定時計算全部）
+            gwp_set:
+              type: string
+              example: AR5
+              description: GWP 版本（AR4 / AR5 / AR6）
+            include_devices:
+              type: boolean
+              default: false
+              description: 是否回傳每台設備的明細
+    responses:
+      200:
+        description: 計算成功
+        schema:
+          type: object
+          properties:
+            year:
+              type: integer
+            gwp_set:
+              type: string
+            entries:
+              type: array
+              description: 各條目的逸散排放（含未知冷媒種類）
+            device_count:
+              type: integer
+            total_emission:
+              type: number
+      400:
+        description: 請求驗證失敗或 GWP 版本不存在
+      401:
+        description: 未授權
+      403:
+        description: 權限不足
+      500:
+        description: 計算錯誤
+    """
+    try:
+        data = get_validated_data()
+        supabase = get_supabase_admin()
+
+        result = calculate_leakage_for_year(
+            supabase,
+            data.year,
+            owner_ids=data.user_ids,
+            gwp_set=data.gwp_set,
+            include_devices=data.include_devices
+        )
+
+        return jsonify(result), 200
+
+    except EmissionFactorError as e:
+        return jsonify({"error": str(e), "code": "VALIDATION_ERROR"}), 400
+    except Exception as e:
+        import traceback
+        print(f"Leakage calculation error: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({
+            "error": "Internal server error",
+            "code": "CALCULATION_ERROR",
+            "message": str(e)
+        }), 500
+
+@app.route('/api/admin/carbon/uncertainty', methods=['POST'])
+@require_auth
+@require_admin
+@validate_request(UncertaintyAnalysisRequest)
+def calculate_uncertainty():
+    """
+    盤查不確定性分析（ISO 14064-1，蒙地卡羅法）
+    ---
+    tags:
+      - Admin - Carbon
+    security:
+      - Bearer: []
+    parameters:
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: object
+          required:
+            - year
+          properties:
+            year:
+              type: integer
+              example: 2024
+            user_ids:
+              type: array
+              items:
+                type: string
+              description: 只計算指定用戶（未指定時計算全部）
+            draws:
+              type: integer
+              default: 10000
+              description: 抽樣次數（100 ~ 200000）
+            seed:
+              type: integer
+              description: 亂數種子（未指定時使用固定預設值，結果可重現）
+            confidence_level:
+              type: number
+              default: 0.95
+              description: 信賴水準
+    responses:
+      200:
+        description: 計算成功
+        schema:
+          type: object
+          properties:
+            year:
+              type: integer
+            total:
+              type: object
+              description: 總排放量的點估計、平均值、信賴區間上下限與不確定性百分比
+            scopes:
+              type: object
+              description: 各範疇的信賴區間
+            categories:
+              type: object
+              description: 各能源類型的信賴區間
+            draws:
+              type: integer
+            seed:
+              type: integer
+            entry_count:
+              type: integer
+      400:
+        description: 請求驗證失敗
+      401:
+        description: 未授權
+      403:
+        description: 權限不足
+      500:
+        description: 計算錯誤
+    """
+    try:
+        data = get_validated_data()
+        supabase = get_supabase_admin()
+
+        result = calculate_inventory_uncertainty(
+            supabase,
+            data.year,
+            owner_ids=data.user_ids,
+            draws=data.draws,
+            seed=data.seed,
+            confidence_level=data.confidence_level
+        )
+
+        return jsonify(result), 200
+
+    except ValueError as e:
+        return jsonify({"error": str(e), "code": "VALIDATION_ERROR"}), 400
+    except Exception as e:
+        import traceback
+        print(f"Uncertainty analysis error: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({
+            "error": "Internal server error",
+            "code": "CALCULATION_ERROR",
+            "message": str(e)
+        }), 500
+
+@app.route('/api/admin/carbon/recalculations', methods=['POST'])
+@require_auth
+@require_admin
+@validate_request(RecalculationJobRequest)
+def create_recalculation():
+    """
+    建立排放係數重算工作（係數修正或採用新版係數表後，不需用戶重新提交）
+    ---
+    tags:
+      - Admin - Carbon
+    security:
+      - Bearer: []
+    parameters:
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: object
+          properties:
+            page_keys:
+              type: array
+              items:
+                type: string
+              example: ["electricity"]
+              description: 受影響的能源類型（未指定時為全部）
+            period_years:
+              type: array
+              items:
+                type: integer
+              example: [2024]
+              description: 受影響的年份（未指定時為全部）
+            factor_version:
+              type: string
+              description: 指定係數版本（未指定時依年份套用）
+            reason:
+              type: string
+              description: 重算原因
+            reload_factors:
+              type: boolean
+              default: false
+              description: 重新載入係數資料檔並發佈給所有 worker，只重算與上次發佈相比係數有變動的能源類型與年份
+            run:
+              type: boolean
+              default: true
+              description: 建立後立即在背景執行
+    responses:
+      202:
+        description: 工作已建立（進度由 GET /api/admin/carbon/recalculations/{job_id} 查詢）
         schema:
           type: object
           properties:
-            success:
-              type: boolean
-            file_id:
-              type: string
-            message:
-              type: string
+            job:
+              type: object
+            changed:
+              type: object
+              description: 係數有變動的能源類型與年份（reload_factors 時）
+      200:
+        description: 係數沒有變動，不需重算
+      400:
+        description: 請求驗證失敗或係數版本不存在
       401:
         description: 未授權
       403:
         description: 權限不足
-      404:
-        description: 檔案不存在
       500:
-        description: 刪除錯誤
+        description: 伺服器錯誤
     """
     try:
+        data = get_validated_data()
         supabase = get_supabase_admin()
-        user_id = request.user['id']
 
-        # 呼叫 file service 刪除
-        result = delete_evidence_file(
-            supabase=supabase,
-            user_id=user_id,
-            file_id=file_id
+        page_keys, period_years, changed = data.page_keys, data.period_years, None
+
+        if data.reload_factors:
+            previous, registry = publish_factor_registry(supabase, created_by=request.user['id'])
+            changed = diff_factor_registries(previous, registry, data.period_years)
+            if data.page_keys:
+                changed = {key: years for key, years in changed.items() if key in data.page_keys}
+            if not changed:
+                return jsonify({'job': None, 'changed': {}, 'message': 'No emission factor changes'}), 200
+
+            page_keys = sorted(changed)
+            period_years = sorted({year for years in changed.values() for year in years})
+
+        if data.factor_version and data.factor_version not in get_factor_registry().version_names:
+            raise UnknownFactorVersionError(f'Unknown factor version: {data.factor_version}')
+
+        job = create_recalculation_job(
+            supabase,
+            page_keys=page_keys,
+            period_years=period_years,
+            factor_version=data.factor_version,
+            reason=data.reason,
+            created_by=request.user['id']
         )
 
-        return jsonify({
-            'success': True,
-            'file_id': file_id,
-            'message': 'File deleted successfully'
-        }), 200
+        if data.run:
+            start_recalculation_job(supabase, job['id'])
 
+        return jsonify({'job': job, 'changed': changed}), 202
+
+    except EmissionFactorError as e:
+        return jsonify({"error": str(e), "code": "VALIDATION_ERROR"}), 400
     except Exception as e:
         import traceback
-        print(f"File deletion error: {str(e)}")
+        print(f"Recalculation job error: {str(e)}")
         print(traceback.format_exc())
-        return jsonify({
-            "error": "Failed to delete file",
-            "code": "DELETION_ERROR",
-            "message": str(e)
-        }), 500
+        return jsonify({"error": str(e)}), 500
 
-# Admin API Routes
-@app.route('/api/admin/users', methods=['GET'])
+@app.route('/api/admin/carbon/recalculations/<job_id>', methods=['GET'])
 @require_auth
 @require_admin
-def get_all_users():
+def get_recalculation(job_id):
     """
-    獲取所有用戶列表
+    查詢排放係數重算工作進度
     ---
     tags:
-      - Admin - Users
+      - Admin - Carbon
     security:
       - Bearer: []
+    parameters:
+      - in: path
+        name: job_id
+        type: string
+        required: true
     responses:
       200:
-        description: 成功獲取用戶列表
-        schema:
-          type: object
-          properties:
-            users:
-              type: array
-              items:
-                type: object
-                properties:
-                  id:
-                    type: string
-                  email:
-                    type: string
-                  display_name:
-                    type: string
-                  role:
-                    type: string
-                  is_active:
-                    type: boolean
-                  company:
-                    type: string
-                  entries_count:
-                    type: integer
+        description: 工作資料（status、processed_count、total_count、progress）
       401:
         description: 未授權
       403:
         description: 權限不足
+      404:
+        description: 工作不存在
     """
     try:
-        # request.user 已由 @require_auth 設置
-        supabase = get_supabase_admin()
-        
-        # 直接查詢 profiles 表取得所有用戶
-        profiles_result = supabase.table('profiles').select('*').execute()
-        
-        if not profiles_result.data:
-            return jsonify({"users": []})
-        
-        users_with_counts = []
-        
-        # 為每個用戶取得填報數量和 email
-        for profile in profiles_result.data:
-            # 取得填報數量
-            entries_result = supabase.table('energy_entries').select('id').eq('owner_id', profile['id']).execute()
-            entries_count = len(entries_result.data) if entries_result.data else 0
-            
-            # 嘗試從 auth.users 取得 email（可能會失敗，所以用 try-catch）
-            email = 'N/A'
-            try:
-                auth_result = supabase.auth.admin.get_user_by_id(profile['id'])
-                if auth_result.user:
-                    email = auth_result.user.email
-            except:
-                pass
-            
-            users_with_counts.append({
-                'id': profile['id'],
-                'email': email,
-                'display_name': profile.get('display_name', 'N/A'),
-                'role': profile.get('role', 'user'),
-                'is_active': profile.get('is_active', True),
-                'company': profile.get('company', 'N/A'),  # 如果沒有 company 欄位則顯示 N/A
-                'entries_count': entries_count
-            })
-        
-        return jsonify({"users": users_with_counts})
+        job = get_recalculation_job(get_supabase_admin(), job_id)
+        if job is None:
+            return jsonify({"error": "Recalculation job not found", "code": "NOT_FOUND"}), 404
+        return jsonify(job), 200
     except Exception as e:
-        print(f"Error in get_all_users: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/admin/users/<user_id>/entries', methods=['GET'])
+@app.route('/api/admin/carbon/recalculations/<job_id>/resume', methods=['POST'])
 @require_auth
 @require_admin
-def get_user_entries(user_id):
+def resume_recalculation(job_id):
     """
-    獲取指定用戶的填報記錄
+    繼續中斷或失敗的排放係數重算工作（從上次處理到的條目繼續）
     ---
     tags:
-      - Admin - Users
+      - Admin - Carbon
     security:
       - Bearer: []
     parameters:
       - in: path
-        name: user_id
+        name: job_id
         type: string
         required: true
-        description: 用戶 ID
-      - in: query
-        name: from
-        type: string
-        required: false
-        description: 起始日期 (YYYY-MM-DD)
-      - in: query
-        name: to
-        type: string
-        required: false
-        description: 結束日期 (YYYY-MM-DD)
-      - in: query
-        name: category
-        type: string
-        required: false
-        description: 類別篩選
     responses:
+      202:
+        description: 已在背景繼續執行
       200:
-        description: 成功獲取填報記錄
-        schema:
-          type: object
-          properties:
-            entries:
-              type: array
+        description: 工作已完成
       401:
         description: 未授權
       403:
         description: 權限不足
-      500:
-        description: 伺服器錯誤
+      404:
+        description: 工作不存在
+      409:
+        description: 工作正在執行
     """
     try:
         supabase = get_supabase_admin()
-        
-        # 取得查詢參數
-        from_date = request.args.get('from')
-        to_date = request.args.get('to')
-        category = request.args.get('category')
-        
-        query = supabase.table('energy_entries').select(
-            '*', 
-            'entry_reviews(*)'
-        ).eq('owner_id', user_id).order('period_start', desc=True)
-        
-        if from_date:
-            query = query.gte('period_start', from_date)
-        if to_date:
-            query = query.lte('period_start', to_date)
-        if category:
-            query = query.eq('category', category)
-            
-        result = query.execute()
-        
-        return jsonify({"entries": result.data})
+        job = get_recalculation_job(supabase, job_id)
+        if job is None:
+            return jsonify({"error": "Recalculation job not found", "code": "NOT_FOUND"}), 404
+        if job['status'] == 'completed':
+            return jsonify(job), 200
+
+        start_recalculation_job(supabase, job_id)
+        return jsonify(job), 202
+
+    except RecalculationJobError as e:
+        return jsonify({"error": str(e), "code": "CONFLICT"}), 409
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/admin/entries', methods=['GET'])
+@app.route('/api/admin/reports/emissions', methods=['GET'])
 @require_auth
 @require_admin
-def get_all_entries():
+@validate_request(EmissionRollupParams, location='query')
+def get_emission_rollup():
     """
-    獲取所有填報記錄
+    組織排放彙總（公司 × 範疇 × 類別 × 月份 × 年度），可切片並依維度分組
     ---
     tags:
-      - Admin - Entries
+      - Admin - Reports
     security:
       - Bearer: []
     parameters:
       - in: query
-        name: from
+        name: companies
         type: string
         required: false
-        description: 起始日期 (YYYY-MM-DD)
+        description: 逗號分隔的公司名稱
       - in: query
-        name: to
+        name: scopes
         type: string
         required: false
-        description: 結束日期 (YYYY-MM-DD)
+        description: 逗號分隔的範疇 (1, 2, 3)
       - in: query
-        name: category
+        name: categories
         type: string
         required: false
-        description: 類別篩選
+        description: 逗號分隔的能源類型 page_key
+      - in: query
+        name: months
+        type: string
+        required: false
+        description: 逗號分隔的月份 (1-12)
+      - in: query
+        name: years
+        type: string
+        required: false
+        description: 逗號分隔的年度
+      - in: query
+        name: group_by
+        type: string
+        required: false
+        default: scope
+        description: 逗號分隔的分組維度 (company, scope, category, month, year)；空字串只回傳總量
     responses:
       200:
-        description: 成功獲取所有填報記錄
+        description: 彙總結果（kgCO2e）
         schema:
           type: object
           properties:
-            entries:
+            rows:
+              type: array
+              items:
+                type: object
+            total:
+              type: number
+            group_by:
               type: array
+              items:
+                type: string
+            axes:
+              type: object
+              description: 各維度可用的值
+      400:
+        description: 查詢參數無效
       401:
         description: 未授權
       403:
@@ -880,42 +2779,24 @@ def get_all_entries():
         description: 伺服器錯誤
     """
     try:
-        supabase = get_supabase_admin()
-        
-        # 取得查詢參數
-        from_date = request.args.get('from')
-        to_date = request.args.get('to')
-        category = request.args.get('category')
-        
-        query = supabase.table('energy_entries').select(
-            '*',
-            'profiles!energy_entries_owner_id_fkey(display_name)',
-            'entry_reviews(*)'
-        ).order('period_start', desc=True)
-        
-        if from_date:
-            query = query.gte('period_start', from_date)
-        if to_date:
-            query = query.lte('period_start', to_date)
-        if category:
-            query = query.eq('category', category)
-            
-        result = query.execute()
-        
-        return jsonify({"entries": result.data})
+        params = get_validated_data()
+        result = query_rollup(get_supabase_admin(), params.filters(), params.group_by)
+        return jsonify(result), 200
+
+    except RollupQueryError as e:
+        return jsonify({"error": str(e), "code": "VALIDATION_ERROR"}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/admin/users/bulk-update', methods=['PUT'])
+@app.route('/api/analytics/emission-trends', methods=['POST'])
 @require_auth
-@require_admin
-@validate_request(BulkUserUpdateSchema)
-def bulk_update_users():
+@validate_request(EmissionTrendRequest)
+def get_emission_trends_endpoint():
     """
-    批量更新用戶狀態
+    逐年排放比較與減量目標情境推估
     ---
     tags:
-      - Admin - Users
+      - Analytics
     security:
       - Bearer: []
     parameters:
@@ -924,34 +2805,161 @@ def bulk_update_users():
         required: true
         schema:
           type: object
-          required:
-            - user_ids
-            - is_active
           properties:
-            user_ids:
+            companies:
               type: array
               items:
                 type: string
-              minItems: 1
-              maxItems: 100
-              example: ["uuid-1", "uuid-2"]
-              description: 用戶 ID 列表
-            is_active:
-              type: boolean
-              example: false
-              description: 是否啟用
+              description: 只計算指定公司（僅管理員；一般用戶固定為自己的公司）
+            base_year:
+              type: integer
+              description: 推估基準年（預設為最近有排放的年度）
+            target_year:
+              type: integer
+              example: 2030
+            target_reduction_percent:
+              type: number
+              example: 30
+              description: 目標年相對基準年的減量百分比
+            scenarios:
+              type: array
+              items:
+                type: object
+                properties:
+                  name:
+                    type: string
+                    example: 節能 3%
+                  efficiency_percent:
+                    type: number
+                    description: 全部類別每年節能百分比
+                  category_efficiency:
+                    type: object
+                    description: 指定類別每年節能百分比
+                  fuel_switches:
+                    type: array
+                    items:
+                      type: object
+                      properties:
+                        from_category:
+                          type: string
+                          example: diesel
+                        to_category:
+                          type: string
+                          example: electricity
+                        share:
+                          type: number
+                          example: 0.5
+                        conversion:
+                          type: number
+                          example: 3.5
+                          description: 每單位原能源需要的新能源單位數
     responses:
       200:
-        description: 批量更新成功
+        description: 分析結果
         schema:
           type: object
           properties:
-            success:
-              type: boolean
-            updated_count:
+            years:
+              type: array
+              items:
+                type: integer
+            by_year:
+              type: array
+              description: 各年度總排放與前一年度比較
+            by_category:
+              type: array
+              description: 各類別逐年增減
+            projection:
+              type: object
+              description: 基準年、目標排放量、每年需減少百分比與各情境減量路徑
+      400:
+        description: 請求驗證失敗或情境參數錯誤
+      401:
+        description: 未授權
+      403:
+        description: 用戶未設定公司
+      500:
+        description: 伺服器錯誤
+    """
+    try:
+        data = get_validated_data()
+
+        if request.user.get('role') == 'admin':
+            companies = data.companies
+        else:
+            company = (request.user.get('company') or '').strip()
+            if not company:
+                return jsonify({"error": "Company is not set for this user", "code": "FORBIDDEN"}), 403
+            companies = [company]
+
+        result = get_emission_trends(
+            get_supabase_admin(),
+            companies=companies,
+            scenarios=[scenario.dict() for scenario in data.scenarios],
+            base_year=data.base_year,
+            target_year=data.target_year,
+            target_reduction_percent=data.target_reduction_percent
+        )
+        return jsonify(result), 200
+
+    except ScenarioError as e:
+        return jsonify({"error": str(e), "code": "VALIDATION_ERROR"}), 400
+    except Exception as e:
+        import traceback
+        print(f"Emission trend error: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/admin/dashboard/summary', methods=['GET'])
+@require_auth
+@require_admin
+def get_dashboard_summary_endpoint():
+    """
+    獲取儀表板統計
+    ---
+    tags:
+      - Admin - Dashboard
+    security:
+      - Bearer: []
+    parameters:
+      - in: query
+        name: user_id
+        type: string
+        required: false
+        description: 用戶 ID（指定時另回傳該用戶的填報進度與待填項目）
+      - in: query
+        name: year
+        type: integer
+        required: false
+        description: 填報年份（預設今年）
+    responses:
+      200:
+        description: 成功獲取統計
+        schema:
+          type: object
+          properties:
+            year:
               type: integer
+            submission_statistics:
+              type: object
+              description: 全體條目狀態統計 (submitted / approved / rejected / total)
+            review_statistics:
+              type: object
+              description: 審核記錄數（依審核狀態）
+            recent_activities:
+              type: array
+              items:
+                type: object
+            reporting_progress:
+              type: object
+              description: 用戶填報進度（指定 user_id 時）
+            pending_entries:
+              type: array
+              description: 用戶尚未填寫的項目（指定 user_id 時）
+              items:
+                type: object
       400:
-        description: 請求驗證失敗
+        description: 參數錯誤
       401:
         description: 未授權
       403:
@@ -960,19 +2968,18 @@ def bulk_update_users():
         description: 伺服器錯誤
     """
     try:
-        # 從已驗證的數據取得參數
-        data = get_validated_data()
-        user_ids = data.user_ids
-        is_active = data.is_active
+        user_id = request.args.get('user_id')
+        year = request.args.get('year')
+
+        if year is not None:
+            if not year.isdigit():
+                return jsonify({"error": "Invalid year"}), 400
+            year = int(year)
 
         supabase = get_supabase_admin()
+        summary = get_dashboard_summary(supabase, owner_id=user_id, year=year)
 
-        # 批次更新用戶狀態
-        result = supabase.table('profiles').update({
-            'is_active': is_active
-        }).in_('id', user_ids).execute()
-        
-        return jsonify({"success": True, "updated_count": len(result.data)})
+        return jsonify(summary)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -1046,8 +3053,14 @@ def create_entry_review(entry_id):
             'status': status,
             'note': note
         }).execute()
-        
-        return jsonify({"success": True, "review": result.data[0]})
+
+        review = result.data[0]
+
+        # 只清除條目擁有者所屬公司的彙總快取
+        entry = supabase.table('energy_entries').select('owner_id').eq('id', entry_id).limit(1).execute()
+        record_rollup_write(entry_id, entry.data[0]['owner_id'] if entry.data else None)
+
+        return jsonify({"success": True, "review": review})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -1193,6 +3206,12 @@ def update_user(user_id):
         # 更新 profiles 表
         if profile_updates:
             supabase.table('profiles').update(profile_updates).eq('id', user_id).execute()
+            # 清除快取，讓角色/啟用狀態變更立即生效
+            invalidate_user_cache(user_id)
+
+            # 公司名稱變更會影響組織彙總的分組
+            if 'company' in profile_updates:
+                get_rollup_cache().clear()
 
         return jsonify({"success": True})
 
@@ -1377,6 +3396,9 @@ def force_logout_user(user_id):
 
         deleted_count = len(result.data) if result.data else 0
 
+        # 清除快取並拒絕已簽發的 token
+        invalidate_user_cache(user_id, revoke_tokens=True)
+
         return jsonify({
             "success": True,
             "message": "User sessions cleared successfully",
@@ -0,0 +1,17 @@
+-- 每位用戶的填報數量（管理員用戶列表使用，取代逐一查詢 energy_entries）
+-- 使用索引: idx_entries_owner
+
+CREATE OR REPLACE FUNCTION public.get_entry_counts_by_owner()
+RETURNS TABLE(owner_id UUID, entries_count BIGINT)
+LANGUAGE sql
+STABLE
+SECURITY INVOKER
+SET search_path = public
+AS $function$
+  SELECT e.owner_id, COUNT(*) AS entries_count
+  FROM energy_entries e
+  GROUP BY e.owner_id;
+$function$;
+
+REVOKE ALL ON FUNCTION public.get_entry_counts_by_owner() FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.get_entry_counts_by_owner() TO service_role;
@@ -0,0 +1,8 @@
+-- 管理端條目列表 keyset pagination 索引
+-- 排序: period_start DESC, id DESC
+
+CREATE INDEX IF NOT EXISTS idx_entries_period_start_id
+  ON public.energy_entries (period_start DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_entries_owner_period_start_id
+  ON public.energy_entries (owner_id, period_start DESC, id DESC);
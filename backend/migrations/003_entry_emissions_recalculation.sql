@@ -0,0 +1,49 @@
+-- 條目排放計算結果與排放係數重算工作
+-- 重算工作依 page_key / period_year 篩選條目（使用索引: idx_entries_page_key、idx_entries_owner_year），
+-- 以 id 為游標分批處理，中斷後由 last_entry_id 繼續
+
+CREATE TABLE IF NOT EXISTS public.entry_emissions (
+  entry_id UUID PRIMARY KEY REFERENCES public.energy_entries(id) ON DELETE CASCADE,
+  owner_id UUID NOT NULL,
+  page_key TEXT NOT NULL,
+  period_year INTEGER NOT NULL,
+  total_emission NUMERIC NOT NULL,
+  monthly_emission JSONB NOT NULL DEFAULT '{}'::jsonb,
+  emission_factor NUMERIC NOT NULL,
+  factor_version TEXT NOT NULL,
+  job_id UUID,
+  calculated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_entry_emissions_owner_year
+  ON public.entry_emissions (owner_id, period_year);
+
+CREATE INDEX IF NOT EXISTS idx_entry_emissions_year_page_key
+  ON public.entry_emissions (period_year, page_key);
+
+CREATE TABLE IF NOT EXISTS public.emission_recalculation_jobs (
+  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  status TEXT NOT NULL DEFAULT 'pending'
+    CHECK (status IN ('pending', 'running', 'completed', 'failed')),
+  page_keys TEXT[],
+  period_years INTEGER[],
+  factor_version TEXT,
+  reason TEXT,
+  last_entry_id UUID,
+  processed_count INTEGER NOT NULL DEFAULT 0,
+  total_count INTEGER,
+  error TEXT,
+  created_by UUID REFERENCES public.profiles(id) ON DELETE SET NULL,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  completed_at TIMESTAMPTZ
+);
+
+ALTER TABLE public.entry_emissions ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.emission_recalculation_jobs ENABLE ROW LEVEL SECURITY;
+
+-- 只允許後端 (service_role) 存取
+REVOKE ALL ON public.entry_emissions FROM anon, authenticated;
+REVOKE ALL ON public.emission_recalculation_jobs FROM anon, authenticated;
+GRANT ALL ON public.entry_emissions TO service_role;
+GRANT ALL ON public.emission_recalculation_jobs TO service_role;
@@ -0,0 +1,54 @@
+-- 可續傳的分塊上傳工作階段
+-- 每個區塊先存放在 evidence bucket 的 {owner_id}/_uploads/{session_id}/ 之下，
+-- 區塊狀態記錄在 upload_session_chunks（以主鍵去重，重送同一區塊只會覆寫）；
+-- 全部區塊到齊後由後端組合為正式檔案並建立 entry_files 記錄
+
+CREATE TABLE IF NOT EXISTS public.upload_sessions (
+  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  owner_id UUID NOT NULL REFERENCES public.profiles(id) ON DELETE CASCADE,
+  status TEXT NOT NULL DEFAULT 'uploading'
+    CHECK (status IN ('uploading', 'assembling', 'completed')),
+  file_name TEXT NOT NULL,
+  mime_type TEXT NOT NULL,
+  file_size BIGINT NOT NULL CHECK (file_size > 0),
+  chunk_size INTEGER NOT NULL CHECK (chunk_size > 0),
+  total_chunks INTEGER NOT NULL CHECK (total_chunks > 0),
+  entry_id UUID,
+  page_key TEXT NOT NULL,
+  period_year INTEGER NOT NULL,
+  file_type TEXT NOT NULL,
+  standard TEXT NOT NULL DEFAULT '64',
+  month INTEGER,
+  record_id TEXT,
+  file_id UUID,
+  file_path TEXT,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  expires_at TIMESTAMPTZ NOT NULL,
+  completed_at TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS idx_upload_sessions_owner
+  ON public.upload_sessions (owner_id, created_at DESC);
+
+CREATE INDEX IF NOT EXISTS idx_upload_sessions_expires
+  ON public.upload_sessions (expires_at)
+  WHERE status <> 'completed';
+
+CREATE TABLE IF NOT EXISTS public.upload_session_chunks (
+  session_id UUID NOT NULL REFERENCES public.upload_sessions(id) ON DELETE CASCADE,
+  chunk_index INTEGER NOT NULL CHECK (chunk_index >= 0),
+  chunk_size INTEGER NOT NULL CHECK (chunk_size > 0),
+  storage_path TEXT NOT NULL,
+  received_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (session_id, chunk_index)
+);
+
+ALTER TABLE public.upload_sessions ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.upload_session_chunks ENABLE ROW LEVEL SECURITY;
+
+-- 只允許後端 (service_role) 存取
+REVOKE ALL ON public.upload_sessions FROM anon, authenticated;
+REVOKE ALL ON public.upload_session_chunks FROM anon, authenticated;
+GRANT ALL ON public.upload_sessions TO service_role;
+GRANT ALL ON public.upload_session_chunks TO service_role;
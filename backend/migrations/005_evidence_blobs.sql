@@ -0,0 +1,75 @@
+-- 證據檔案內容定址去重
+-- 後端上傳時計算 SHA-256，相同用戶的相同內容只在 {owner_id}/blobs/{sha256 前兩碼}/{sha256} 存一份，
+-- entry_files.file_path 指向共用的 blob。參考計數由 entry_files 的觸發器維護
+-- （前端直接刪除 entry_files、刪除 energy_entries 連帶刪除也會正確遞減）。計數歸零超過保留期後
+-- 由 POST /api/admin/storage/sweep 定期刪除 Storage 物件與 blob 記錄（避免與同時進行的去重上傳競爭）
+
+ALTER TABLE public.entry_files
+  ADD COLUMN IF NOT EXISTS content_sha256 TEXT;
+
+CREATE TABLE IF NOT EXISTS public.evidence_blobs (
+  owner_id UUID NOT NULL REFERENCES public.profiles(id) ON DELETE CASCADE,
+  sha256 TEXT NOT NULL CHECK (sha256 ~ '^[0-9a-f]{64}$'),
+  storage_path TEXT NOT NULL,
+  file_size BIGINT NOT NULL,
+  ref_count INTEGER NOT NULL DEFAULT 0 CHECK (ref_count >= 0),
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (owner_id, sha256)
+);
+
+-- 定期清除 ref_count 歸零的 blob
+CREATE INDEX IF NOT EXISTS idx_evidence_blobs_unreferenced
+  ON public.evidence_blobs (updated_at)
+  WHERE ref_count = 0;
+
+CREATE OR REPLACE FUNCTION public.evidence_blob_acquire()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $function$
+BEGIN
+  IF NEW.content_sha256 IS NOT NULL THEN
+    INSERT INTO evidence_blobs (owner_id, sha256, storage_path, file_size, ref_count)
+    VALUES (NEW.owner_id, NEW.content_sha256, NEW.file_path, NEW.file_size, 1)
+    ON CONFLICT (owner_id, sha256)
+    DO UPDATE SET ref_count = evidence_blobs.ref_count + 1, updated_at = now();
+  END IF;
+  RETURN NEW;
+END;
+$function$;
+
+CREATE OR REPLACE FUNCTION public.evidence_blob_release()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $function$
+BEGIN
+  IF OLD.content_sha256 IS NOT NULL THEN
+    UPDATE evidence_blobs
+    SET ref_count = GREATEST(ref_count - 1, 0), updated_at = now()
+    WHERE owner_id = OLD.owner_id AND sha256 = OLD.content_sha256;
+  END IF;
+  RETURN OLD;
+END;
+$function$;
+
+DROP TRIGGER IF EXISTS trg_entry_files_blob_acquire ON public.entry_files;
+CREATE TRIGGER trg_entry_files_blob_acquire
+  AFTER INSERT ON public.entry_files
+  FOR EACH ROW EXECUTE FUNCTION public.evidence_blob_acquire();
+
+DROP TRIGGER IF EXISTS trg_entry_files_blob_release ON public.entry_files;
+CREATE TRIGGER trg_entry_files_blob_release
+  AFTER DELETE ON public.entry_files
+  FOR EACH ROW EXECUTE FUNCTION public.evidence_blob_release();
+
+ALTER TABLE public.evidence_blobs ENABLE ROW LEVEL SECURITY;
+
+-- 只允許後端 (service_role) 存取
+REVOKE ALL ON public.evidence_blobs FROM anon, authenticated;
+GRANT ALL ON public.evidence_blobs TO service_role;
+REVOKE ALL ON FUNCTION public.evidence_blob_acquire() FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION public.evidence_blob_release() FROM PUBLIC, anon, authenticated;
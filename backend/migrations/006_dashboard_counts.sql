@@ -0,0 +1,95 @@
+-- 儀表板狀態統計與審核數（GET /api/admin/dashboard/summary 使用）
+-- dashboard_counts 由 energy_entries、entry_reviews 的觸發器逐筆增減
+-- （前端直接核准、退回或刪除的條目也會反映），查詢只讀取這張小表，不掃描資料表
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS public.dashboard_counts (
+  kind TEXT NOT NULL CHECK (kind IN ('entry', 'review')),
+  status TEXT NOT NULL,
+  count BIGINT NOT NULL DEFAULT 0 CHECK (count >= 0),
+  PRIMARY KEY (kind, status)
+);
+
+CREATE OR REPLACE FUNCTION public.dashboard_count_add(p_kind TEXT, p_status TEXT, p_delta INTEGER)
+RETURNS void
+LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public
+AS $function$
+  INSERT INTO dashboard_counts (kind, status, count)
+  VALUES (p_kind, COALESCE(p_status, 'unknown'), GREATEST(p_delta, 0))
+  ON CONFLICT (kind, status)
+  DO UPDATE SET count = GREATEST(dashboard_counts.count + p_delta, 0);
+$function$;
+
+CREATE OR REPLACE FUNCTION public.dashboard_count_track()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $function$
+DECLARE
+  v_kind TEXT := CASE WHEN TG_TABLE_NAME = 'entry_reviews' THEN 'review' ELSE 'entry' END;
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    PERFORM dashboard_count_add(v_kind, NEW.status, 1);
+  ELSIF TG_OP = 'DELETE' THEN
+    PERFORM dashboard_count_add(v_kind, OLD.status, -1);
+  ELSIF NEW.status IS DISTINCT FROM OLD.status THEN
+    PERFORM dashboard_count_add(v_kind, OLD.status, -1);
+    PERFORM dashboard_count_add(v_kind, NEW.status, 1);
+  END IF;
+  RETURN NULL;
+END;
+$function$;
+
+-- 建立觸發器與回填期間鎖住寫入，避免計數重複或遺漏
+LOCK TABLE public.energy_entries, public.entry_reviews IN SHARE ROW EXCLUSIVE MODE;
+
+DROP TRIGGER IF EXISTS trg_energy_entries_dashboard_count ON public.energy_entries;
+CREATE TRIGGER trg_energy_entries_dashboard_count
+  AFTER INSERT OR DELETE OR UPDATE OF status ON public.energy_entries
+  FOR EACH ROW EXECUTE FUNCTION public.dashboard_count_track();
+
+DROP TRIGGER IF EXISTS trg_entry_reviews_dashboard_count ON public.entry_reviews;
+CREATE TRIGGER trg_entry_reviews_dashboard_count
+  AFTER INSERT OR DELETE OR UPDATE OF status ON public.entry_reviews
+  FOR EACH ROW EXECUTE FUNCTION public.dashboard_count_track();
+
+DELETE FROM public.dashboard_counts;
+INSERT INTO public.dashboard_counts (kind, status, count)
+SELECT 'entry', COALESCE(status, 'unknown'), COUNT(*) FROM public.energy_entries GROUP BY 2
+UNION ALL
+SELECT 'review', COALESCE(status, 'unknown'), COUNT(*) FROM public.entry_reviews GROUP BY 2;
+
+COMMIT;
+
+CREATE OR REPLACE FUNCTION public.get_dashboard_counts()
+RETURNS TABLE(kind TEXT, status TEXT, count BIGINT)
+LANGUAGE sql
+STABLE
+SECURITY INVOKER
+SET search_path = public
+AS $function$
+  SELECT c.kind, c.status, c.count
+  FROM dashboard_counts c
+  WHERE c.count > 0;
+$function$;
+
+ALTER TABLE public.dashboard_counts ENABLE ROW LEVEL SECURITY;
+
+-- 只允許後端 (service_role) 存取
+REVOKE ALL ON public.dashboard_counts FROM anon, authenticated;
+GRANT ALL ON public.dashboard_counts TO service_role;
+REVOKE ALL ON FUNCTION public.dashboard_count_add(TEXT, TEXT, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION public.dashboard_count_track() FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION public.get_dashboard_counts() FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.get_dashboard_counts() TO service_role;
+
+-- 全體最近活動（依最後更新 / 審核時間取前幾筆）
+CREATE INDEX IF NOT EXISTS idx_entries_updated_at
+  ON public.energy_entries (updated_at DESC);
+
+CREATE INDEX IF NOT EXISTS idx_entry_reviews_created_at
+  ON public.entry_reviews (created_at DESC);
@@ -0,0 +1,5 @@
+-- 強制登出時間（DELETE /api/admin/users/<user_id>/sessions 寫入）
+-- 所有後端 worker 經 profile 讀取此欄位，拒絕在此時間（含同一秒）之前簽發的 token
+
+ALTER TABLE public.profiles
+  ADD COLUMN IF NOT EXISTS tokens_revoked_at TIMESTAMPTZ;
@@ -0,0 +1,17 @@
+-- 發佈的排放係數表（POST /api/admin/carbon/recalculations 帶 reload_factors 時寫入）
+-- 各 worker 定期比對最新一筆的 checksum，不同時載入 data，所有 worker 使用同一份係數；
+-- 重算工作以最新一筆為變更前的版本比較係數差異
+
+CREATE TABLE IF NOT EXISTS public.emission_factor_tables (
+  id BIGSERIAL PRIMARY KEY,
+  checksum TEXT NOT NULL,
+  data JSONB NOT NULL,
+  created_by UUID REFERENCES public.profiles(id) ON DELETE SET NULL,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+ALTER TABLE public.emission_factor_tables ENABLE ROW LEVEL SECURITY;
+
+-- 只允許後端 (service_role) 存取
+REVOKE ALL ON public.emission_factor_tables FROM anon, authenticated;
+GRANT ALL ON public.emission_factor_tables TO service_role;
@@ -11,6 +11,7 @@ from .entry import (
     EnergyEntryCreateSchema,
     EnergyEntryUpdateSchema,
     EnergyEntryResponseSchema,
+    EntryListParams,
     MonthlyDataSchema
 )
 from .review import (
@@ -18,9 +19,12 @@ from .review import (
     ReviewUpdateSchema,
     ReviewResponseSchema
 )
+from .export import EntryExportSchema, EvidenceExportSchema
 from .common import (
     PaginationParams,
+    CursorPaginationParams,
     DateRangeParams,
+    PaginatedResponse,
     SuccessResponse,
     ErrorResponse
 )
@@ -36,6 +40,7 @@ __all__ = [
     'EnergyEntryCreateSchema',
     'EnergyEntryUpdateSchema',
     'EnergyEntryResponseSchema',
+    'EntryListParams',
     'MonthlyDataSchema',
 
     # Review schemas
@@ -43,9 +48,15 @@ __all__ = [
     'ReviewUpdateSchema',
     'ReviewResponseSchema',
 
+    # Export schemas
+    'EntryExportSchema',
+    'EvidenceExportSchema',
+
     # Common schemas
     'PaginationParams',
+    'CursorPaginationParams',
     'DateRangeParams',
+    'PaginatedResponse',
     'SuccessResponse',
     'ErrorResponse',
 ]
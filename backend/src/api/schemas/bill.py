@@ -0,0 +1,29 @@
+"""
+帳單相關驗證模型
+"""
+from typing import List, Optional
+from pydantic import BaseModel, Field
+
+
+class BillItem(BaseModel):
+    """單筆帳單（計費期間為民國日期）"""
+    billingStart: str = Field(..., description="計費起日（民國格式: 113/01/01）")
+    billingEnd: str = Field(..., description="計費訖日（民國格式: 113/02/28）")
+    billingUnits: float = Field(..., ge=0, description="計費用量")
+    meterId: Optional[str] = Field(None, description="表號 ID")
+
+
+class BillDistributeRequest(BaseModel):
+    """帳單月份分配請求"""
+    year: int = Field(..., ge=2000, le=2100, description="盤查年度（西元年）")
+    bills: List[BillItem] = Field(..., min_items=1, max_items=1000, description="帳單列表")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "year": 2024,
+                "bills": [
+                    {"billingStart": "112/12/15", "billingEnd": "113/02/14", "billingUnits": 620, "meterId": "m-1"}
+                ]
+            }
+        }
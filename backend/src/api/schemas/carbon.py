@@ -1,7 +1,8 @@
 """
 碳排放計算相關驗證模型
 """
-from typing import Dict
+from typing import Dict, List, Optional
+import uuid
 from pydantic import BaseModel, Field, validator
 
 
@@ -10,6 +11,7 @@ class CarbonCalculateRequest(BaseModel):
     page_key: str = Field(..., description="能源類型鍵值 (例如: diesel, gasoline)")
     monthly_data: Dict[str, float] = Field(..., description="月份數據 {month: value}")
     year: int = Field(..., ge=2020, le=2100, description="計算年份")
+    factor_version: Optional[str] = Field(None, description="指定排放係數版本（未指定時依年份選擇）")
 
     @validator('monthly_data')
     def validate_monthly_data(cls, v):
@@ -42,11 +44,124 @@ class CarbonCalculateRequest(BaseModel):
         }
 
 
+class CarbonBatchItem(CarbonCalculateRequest):
+    """批次計算的單一項目"""
+    owner_id: Optional[str] = Field(None, description="用戶 ID（原樣回傳，方便對應結果）")
+
+
+class CarbonBatchCalculateRequest(BaseModel):
+    """批次碳排放計算請求"""
+    items: List[CarbonBatchItem] = Field(..., min_items=1, max_items=5000, description="計算項目列表")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "items": [
+                    {
+                        "owner_id": "user-1",
+                        "page_key": "diesel",
+                        "monthly_data": {"1": 100.5, "2": 150.0},
+                        "year": 2024
+                    },
+                    {
+                        "owner_id": "user-1",
+                        "page_key": "electricity",
+                        "monthly_data": {"1": 1200.0},
+                        "year": 2024
+                    }
+                ]
+            }
+        }
+
+
+class CarbonBreakdownRequest(CarbonCalculateRequest):
+    """分氣體碳排放計算請求"""
+    gwp_set: Optional[str] = Field(None, description="GWP 版本（例如: AR5、AR6，未指定時使用預設）")
+
+
+class LeakageCalculateRequest(BaseModel):
+    """冷媒 / SF6 逸散排放計算請求"""
+    year: int = Field(..., ge=2020, le=2100, description="填報年份")
+    user_ids: Optional[List[str]] = Field(None, max_items=200, description="只計算指定用戶（未指定時計算全部）")
+    gwp_set: Optional[str] = Field(None, description="GWP 版本（例如: AR5、AR6，未指定時使用預設）")
+    include_devices: bool = Field(default=False, description="是否回傳每台設備的明細")
+
+    @validator('user_ids', each_item=True)
+    def validate_user_id(cls, v):
+        """驗證用戶 ID 格式"""
+        try:
+            return str(uuid.UUID(v))
+        except ValueError:
+            raise ValueError(f'Invalid user id: {v}')
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "year": 2024,
+                "gwp_set": "AR5",
+                "include_devices": True
+            }
+        }
+
+
+class UncertaintyAnalysisRequest(BaseModel):
+    """盤查不確定性分析請求（蒙地卡羅法）"""
+    year: int = Field(..., ge=2020, le=2100, description="填報年份")
+    user_ids: Optional[List[str]] = Field(None, max_items=200, description="只計算指定用戶（未指定時計算全部）")
+    draws: int = Field(default=10000, ge=100, le=200000, description="抽樣次數")
+    seed: Optional[int] = Field(None, ge=0, description="亂數種子（未指定時使用固定預設值）")
+    confidence_level: float = Field(default=0.95, ge=0.5, le=0.99, description="信賴水準")
+
+    @validator('user_ids', each_item=True)
+    def validate_user_id(cls, v):
+        """驗證用戶 ID 格式"""
+        try:
+            return str(uuid.UUID(v))
+        except ValueError:
+            raise ValueError(f'Invalid user id: {v}')
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "year": 2024,
+                "draws": 100000,
+                "confidence_level": 0.95
+            }
+        }
+
+
+class RecalculationJobRequest(BaseModel):
+    """排放係數重算工作請求"""
+    page_keys: Optional[List[str]] = Field(None, max_items=50, description="受影響的能源類型（未指定時為全部）")
+    period_years: Optional[List[int]] = Field(None, max_items=100, description="受影響的年份（未指定時為全部）")
+    factor_version: Optional[str] = Field(None, description="指定係數版本（未指定時依年份套用）")
+    reason: Optional[str] = Field(None, max_length=500, description="重算原因")
+    reload_factors: bool = Field(default=False, description="重新載入係數資料檔，只重算係數有變動的能源類型與年份")
+    run: bool = Field(default=True, description="建立後立即在背景執行")
+
+    @validator('period_years', each_item=True)
+    def validate_year(cls, v):
+        """驗證年份範圍"""
+        if v < 2000 or v > 2100:
+            raise ValueError(f'Invalid year: {v}')
+        return v
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "page_keys": ["electricity"],
+                "period_years": [2024],
+                "reason": "採用 2024 年電力排碳係數"
+            }
+        }
+
+
 class CarbonCalculateResponse(BaseModel):
     """碳排放計算響應"""
     total_emission: float = Field(..., description="總碳排量 (kgCO2e)")
     monthly_emission: Dict[str, float] = Field(..., description="每月碳排量")
     emission_factor: float = Field(..., description="使用的排放係數")
+    factor_version: str = Field(..., description="套用的排放係數版本")
     formula: str = Field(..., description="計算公式說明")
 
     class Config:
@@ -58,6 +173,7 @@ class CarbonCalculateResponse(BaseModel):
                     "2": 522.87
                 },
                 "emission_factor": 2.6068,
+                "factor_version": "6.0.4",
                 "formula": "diesel × 2.6068"
             }
         }
@@ -25,6 +25,12 @@ class PaginationParams(BaseModel):
         return self.page_size
 
 
+class CursorPaginationParams(PaginationParams):
+    """游標分頁參數（keyset pagination，提供 cursor 時忽略 page）"""
+    cursor: Optional[str] = Field(None, max_length=512, description="上一頁回傳的 next_cursor")
+    include_total: bool = Field(default=False, description="是否回傳估計總筆數")
+
+
 class DateRangeParams(BaseModel):
     """日期範圍參數"""
     from_date: Optional[date] = Field(None, description="起始日期 (YYYY-MM-DD)")
@@ -79,7 +85,7 @@ class PaginatedResponse(BaseModel, Generic[DataT]):
     """分頁響應格式"""
     success: bool = Field(default=True, description="是否成功")
     data: list[DataT] = Field(..., description="數據列表")
-    pagination: Dict[str, int] = Field(..., description="分頁資訊")
+    pagination: Dict[str, Any] = Field(..., description="分頁資訊")
 
     class Config:
         schema_extra = {
@@ -115,6 +121,25 @@ class PaginatedResponse(BaseModel, Generic[DataT]):
             }
         )
 
+    @classmethod
+    def create_cursor(
+        cls,
+        data: list[DataT],
+        page_size: int,
+        next_cursor: Optional[str],
+        total: Optional[int] = None
+    ):
+        """創建游標分頁響應（total 為估計值，未計算時為 None）"""
+        return cls(
+            data=data,
+            pagination={
+                "page_size": page_size,
+                "next_cursor": next_cursor,
+                "has_more": next_cursor is not None,
+                "total": total
+            }
+        )
+
 
 class IDSchema(BaseModel):
     """ID 驗證模型"""
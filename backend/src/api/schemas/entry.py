@@ -5,6 +5,7 @@ from typing import Optional, Dict, List, Any
 from pydantic import BaseModel, Field, validator
 from datetime import date, datetime
 from enum import Enum
+from .common import CursorPaginationParams, DateRangeParams
 
 
 class EntryStatus(str, Enum):
@@ -121,6 +122,15 @@ class EnergyEntryResponseSchema(BaseModel):
         orm_mode = True
 
 
+class EntryListParams(CursorPaginationParams, DateRangeParams):
+    """管理端條目列表查詢參數"""
+    from_date: Optional[date] = Field(None, alias='from', description="起始日期 (YYYY-MM-DD)")
+    to_date: Optional[date] = Field(None, alias='to', description="結束日期 (YYYY-MM-DD)")
+    category: Optional[str] = Field(None, max_length=50, description="類別篩選")
+    fields: Optional[str] = Field(None, max_length=500, description="逗號分隔的欄位白名單（例如 id,category,status,owner）")
+    include_payload: Optional[str] = Field(None, max_length=200, description="true / false / 逗號分隔的 payload 欄位（例如 monthly,unit）")
+
+
 class EntryStatusUpdateSchema(BaseModel):
     """更新條目狀態請求"""
     status: EntryStatus = Field(..., description="新狀態")
@@ -0,0 +1,34 @@
+"""
+匯出相關驗證模型
+"""
+from typing import List, Optional
+import uuid
+from pydantic import BaseModel, Field, validator
+
+
+class EntryExportSchema(BaseModel):
+    """匯出填報資料請求"""
+    user_ids: List[str] = Field(..., min_items=1, max_items=200, description="要匯出的用戶 ID")
+    year: int = Field(..., ge=2020, le=2100, description="填報年份")
+    page_key: Optional[str] = Field(None, max_length=50, description="只匯出指定類別 (例如: diesel)")
+
+    @validator('user_ids', each_item=True)
+    def validate_user_id(cls, v):
+        """驗證用戶 ID 格式"""
+        try:
+            return str(uuid.UUID(v))
+        except ValueError:
+            raise ValueError(f'Invalid user id: {v}')
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "user_ids": ["550e8400-e29b-41d4-a716-446655440000"],
+                "year": 2024
+            }
+        }
+
+
+class EvidenceExportSchema(EntryExportSchema):
+    """匯出佐證檔案 ZIP 請求"""
+    include_excel: bool = Field(default=True, description="是否附上填報資料 Excel")
@@ -44,6 +44,27 @@ class FileUploadMetadata(BaseModel):
         }
 
 
+class UploadSessionCreateRequest(FileUploadMetadata):
+    """建立分塊上傳工作階段請求"""
+    filename: str = Field(..., min_length=1, max_length=255, description="原始檔案名稱")
+    file_size: int = Field(..., gt=0, description="檔案大小（bytes）")
+    mime_type: str = Field(default='', description="MIME 類型（空白時由副檔名推斷）")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "filename": "evidence.pdf",
+                "file_size": 7340032,
+                "mime_type": "application/pdf",
+                "page_key": "electricity",
+                "period_year": 2024,
+                "file_type": "usage_evidence",
+                "month": 1,
+                "standard": "64"
+            }
+        }
+
+
 class FileUploadResponse(BaseModel):
     """檔案上傳響應"""
     success: bool = Field(..., description="是否成功")
@@ -51,6 +72,7 @@ class FileUploadResponse(BaseModel):
     file_path: str = Field(..., description="儲存路徑")
     file_name: str = Field(..., description="檔案名稱")
     file_size: int = Field(..., description="檔案大小（bytes）")
+    deduplicated: bool = Field(default=False, description="相同內容已存在，未寫入 Storage")
     message: str = Field(default="File uploaded successfully", description="訊息")
 
     class Config:
@@ -0,0 +1,96 @@
+"""
+報表相關驗證模型
+"""
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field, validator
+
+
+class EmissionRollupParams(BaseModel):
+    """組織排放彙總查詢參數（皆為逗號分隔）"""
+    companies: Optional[List[str]] = Field(None, description="公司名稱")
+    scopes: Optional[List[int]] = Field(None, description="範疇 (1, 2, 3)")
+    categories: Optional[List[str]] = Field(None, description="能源類型 page_key")
+    months: Optional[List[int]] = Field(None, description="月份 (1-12)")
+    years: Optional[List[int]] = Field(None, description="年度")
+    group_by: List[str] = Field(default=['scope'], description="分組維度 (company, scope, category, month, year)")
+
+    @validator('companies', 'scopes', 'categories', 'months', 'years', 'group_by', pre=True)
+    def split_comma_separated(cls, v):
+        """拆分逗號分隔的查詢參數"""
+        if isinstance(v, str):
+            return [item.strip() for item in v.split(',') if item.strip()]
+        return v
+
+    @validator('scopes', each_item=True)
+    def validate_scope(cls, v):
+        """驗證範疇"""
+        if v not in (1, 2, 3):
+            raise ValueError(f'Invalid scope: {v}')
+        return v
+
+    @validator('months', each_item=True)
+    def validate_month(cls, v):
+        """驗證月份"""
+        if v < 1 or v > 12:
+            raise ValueError(f'Invalid month: {v}')
+        return v
+
+    def filters(self) -> dict:
+        """轉為 rollup_service 的篩選條件"""
+        return {
+            'company': self.companies,
+            'scope': self.scopes,
+            'category': self.categories,
+            'month': self.months,
+            'year': self.years,
+        }
+
+
+class FuelSwitch(BaseModel):
+    """能源轉換（將部分原能源改用新能源）"""
+    from_category: str = Field(..., description="原能源類型 page_key（例如: diesel）")
+    to_category: str = Field(..., description="新能源類型 page_key（例如: electricity）")
+    share: float = Field(..., gt=0, le=1, description="目標年完成轉換的比例 (0-1)")
+    conversion: float = Field(default=1.0, gt=0, description="每單位原能源需要的新能源單位數（例如: kWh / L）")
+
+
+class ReductionScenario(BaseModel):
+    """減量情境"""
+    name: str = Field(..., min_length=1, max_length=100, description="情境名稱")
+    efficiency_percent: float = Field(default=0, ge=0, le=100, description="全部類別每年節能百分比")
+    category_efficiency: Dict[str, float] = Field(default_factory=dict, description="指定類別每年節能百分比（覆寫全部類別設定）")
+    fuel_switches: List[FuelSwitch] = Field(default_factory=list, max_items=20, description="能源轉換")
+
+    @validator('category_efficiency')
+    def validate_category_efficiency(cls, v):
+        """驗證節能百分比範圍"""
+        for page_key, percent in v.items():
+            if percent < 0 or percent > 100:
+                raise ValueError(f'Invalid efficiency percent for {page_key}: {percent}')
+        return v
+
+
+class EmissionTrendRequest(BaseModel):
+    """逐年排放比較與減量情境推估請求"""
+    companies: Optional[List[str]] = Field(None, max_items=100, description="只計算指定公司（管理員；一般用戶固定為自己的公司）")
+    base_year: Optional[int] = Field(None, ge=2000, le=2100, description="推估基準年（預設為最近有排放的年度）")
+    target_year: Optional[int] = Field(None, ge=2000, le=2150, description="目標年（預設為基準年後 5 年）")
+    target_reduction_percent: Optional[float] = Field(None, ge=0, le=100, description="目標年相對基準年的減量百分比")
+    scenarios: List[ReductionScenario] = Field(default_factory=list, max_items=50, description="減量情境")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "target_year": 2030,
+                "target_reduction_percent": 30,
+                "scenarios": [
+                    {"name": "節能 3%", "efficiency_percent": 3},
+                    {
+                        "name": "公務車電動化",
+                        "fuel_switches": [
+                            {"from_category": "diesel", "to_category": "electricity", "share": 0.5, "conversion": 3.5}
+                        ]
+                    }
+                ]
+            }
+        }
@@ -0,0 +1,39 @@
+"""
+單位換算相關驗證模型
+"""
+from typing import List, Optional
+from pydantic import BaseModel, Field, root_validator
+
+
+class UnitConvertRequest(BaseModel):
+    """批次單位換算請求"""
+    values: List[float] = Field(..., min_items=1, max_items=10000, description="要換算的數值")
+    from_unit: Optional[str] = Field(None, description="來源單位（所有數值相同）")
+    from_units: Optional[List[str]] = Field(None, description="逐筆來源單位（與 values 等長）")
+    to_unit: Optional[str] = Field(None, description="目標單位（未指定時換算為標準單位）")
+    page_key: Optional[str] = Field(None, description="能源類型（決定標準單位，例如天然氣為 m³）")
+
+    @root_validator(skip_on_failure=True)
+    def validate_units(cls, values):
+        """驗證來源單位"""
+        from_unit, from_units = values.get('from_unit'), values.get('from_units')
+
+        if (from_unit is None) == (from_units is None):
+            raise ValueError('Exactly one of from_unit or from_units is required')
+
+        if from_units is not None and len(from_units) != len(values.get('values') or []):
+            raise ValueError('from_units must have the same length as values')
+
+        if values.get('to_unit') is None and from_units is not None:
+            raise ValueError('to_unit is required when from_units is given')
+
+        return values
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "values": [1200, 800],
+                "from_units": ["gram", "kg"],
+                "to_unit": "kg"
+            }
+        }
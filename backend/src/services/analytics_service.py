@@ -0,0 +1,300 @@
+"""
+排放趨勢分析服務
+
+由組織排放立方體取得 (年度 × 類別) 排放矩陣，計算各類別逐年增減，
+並依減量情境（能源轉換、節能百分比）推估到目標年的減量路徑。
+所有情境組成 (情境 × 年度 × 類別) 陣列一次計算；結果依資料版本快取
+"""
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.infrastructure.cache.ttl_cache import TTLCache
+from .carbon_service import round_emissions
+from .dashboard_service import TITLE_MAP
+from .emission_factor_service import get_factor_registry
+from .entry_service import CATEGORY_MAP
+from .rollup_service import CATEGORIES, get_rollup_cache
+
+logger = logging.getLogger(__name__)
+
+# 分析結果快取時間（秒）；快取鍵含資料版本，條目寫入後自動失效
+ANALYTICS_CACHE_TTL = int(os.getenv('ANALYTICS_CACHE_TTL_SECONDS', '900'))
+
+# 未指定目標年時，推估到基準年後幾年
+DEFAULT_PROJECTION_YEARS = 5
+
+MAX_PROJECTION_YEARS = 50
+
+_analytics_cache = TTLCache(maxsize=256, ttl=ANALYTICS_CACHE_TTL)
+
+
+class ScenarioError(ValueError):
+    """減量情境參數錯誤"""
+    pass
+
+
+def category_name(page_key: str) -> str:
+    """取得類別顯示名稱"""
+    return CATEGORY_MAP.get(page_key) or TITLE_MAP.get(page_key, page_key)
+
+
+def _delta_percent(current: np.ndarray, previous: np.ndarray) -> List[Optional[float]]:
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percent = round_emissions(np.where(previous > 0, (current - previous) / previous * 100.0, 0.0))
+    return [float(value) if base > 0 else None for value, base in zip(percent, previous)]
+
+
+def calculate_yoy(years: Sequence[int], matrix: np.ndarray) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    計算逐年增減（與前一個有資料的年度比較）
+
+    Args:
+        years: 年度（遞增）
+        matrix: (年度 × 類別) 排放矩陣
+
+    Returns:
+        {
+            'by_year': [{'year', 'emission', 'previous_year', 'delta', 'delta_percent'}],
+            'by_category': [{'category', 'name', 'year', 'previous_year', 'emission',
+                             'previous_emission', 'delta', 'delta_percent'}]（只含任一年有排放的類別）
+        }
+    """
+    matrix = round_emissions(matrix)
+    totals = round_emissions(matrix.sum(axis=1))
+
+    by_year = []
+    for row, year in enumerate(years):
+        item = {'year': year, 'emission': float(totals[row]), 'previous_year': None, 'delta': None, 'delta_percent': None}
+        if row > 0:
+            item.update({
+                'previous_year': years[row - 1],
+                'delta': float(round_emissions(totals[row:row + 1] - totals[row - 1:row])[0]),
+                'delta_percent': _delta_percent(totals[row:row + 1], totals[row - 1:row])[0]
+            })
+        by_year.append(item)
+
+    by_category = []
+    if len(years) > 1:
+        deltas = round_emissions(np.diff(matrix, axis=0))
+        for row in range(1, len(years)):
+            current, previous = matrix[row], matrix[row - 1]
+            percents = _delta_percent(current, previous)
+            for column in np.flatnonzero((current != 0) | (previous != 0)):
+                page_key = CATEGORIES[column]
+                by_category.append({
+                    'category': page_key,
+                    'name': category_name(page_key),
+                    'year': years[row],
+                    'previous_year': years[row - 1],
+                    'emission': float(current[column]),
+                    'previous_emission': float(previous[column]),
+                    'delta': float(deltas[row - 1, column]),
+                    'delta_percent': percents[column]
+                })
+
+    return {'by_year': by_year, 'by_category': by_category}
+
+
+def build_scenario_arrays(scenarios: Sequence[Dict[str, Any]], base_year: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    將減量情境轉為陣列
+
+    - 節能：每年活動數據減少的百分比（全部類別，或 category_efficiency 指定類別）
+    - 能源轉換：將 from_category 的 share 比例改用 to_category，
+      conversion 為每單位原能源需要的新能源單位數（例如柴油車改電動車: kWh / L）
+
+    Args:
+        scenarios: 情境列表
+        base_year: 基準年（決定轉換前後的排放係數）
+
+    Returns:
+        (efficiency: 情境 × 類別 年減率, switch: 情境 × 類別 × 類別 完全轉換時的排放轉移矩陣)
+
+    Raises:
+        ScenarioError: 類別不存在或轉換比例超過 100%
+    """
+    category_index = {category: index for index, category in enumerate(CATEGORIES)}
+    factors, _ = get_factor_registry().resolve_many(CATEGORIES, [base_year] * len(CATEGORIES))
+
+    efficiency = np.zeros((len(scenarios), len(CATEGORIES)))
+    switch = np.zeros((len(scenarios), len(CATEGORIES), len(CATEGORIES)))
+
+    for row, scenario in enumerate(scenarios):
+        efficiency[row, :] = float(scenario.get('efficiency_percent') or 0) / 100.0
+        for page_key, percent in (scenario.get('category_efficiency') or {}).items():
+            if page_key not in category_index:
+                raise ScenarioError(f'Unknown category: {page_key}')
+            efficiency[row, category_index[page_key]] = float(percent) / 100.0
+
+        for fuel_switch in scenario.get('fuel_switches') or []:
+            source, target = fuel_switch['from_category'], fuel_switch['to_category']
+            if source not in category_index or target not in category_index:
+                raise ScenarioError(f'Unknown category in fuel switch: {source} -> {target}')
+            if source == target:
+                raise ScenarioError(f'Fuel switch must change category: {source}')
+
+            a, b = category_index[source], category_index[target]
+            share = float(fuel_switch['share'])
+            if factors[a] <= 0:
+                raise ScenarioError(f'Cannot switch from {source}: emission factor is zero')
+
+            # 每單位原排放 → 原活動數據 (1 / f_a) → 新能源活動數據 (× conversion) → 新排放 (× f_b)
+            switch[row, a, a] -= share
+            switch[row, a, b] += share * float(fuel_switch.get('conversion') or 1.0) * factors[b] / factors[a]
+
+        if (-switch[row].diagonal() > 1.0 + 1e-9).any():
+            raise ScenarioError(f"Fuel switch shares exceed 100% in scenario {scenario.get('name')}")
+
+    return efficiency, switch
+
+
+def simulate_reduction_paths(
+    base_emissions: np.ndarray,
+    base_year: int,
+    target_year: int,
+    scenarios: Sequence[Dict[str, Any]]
+) -> np.ndarray:
+    """
+    推估各情境的減量路徑
+
+    第 t 年的排放 = (基準排放 + t / T × 基準排放 · 轉移矩陣) × (1 − 年減率)^t；
+    能源轉換在目標年前線性完成，節能逐年複利
+
+    Args:
+        base_emissions: 基準年各類別排放
+        base_year: 基準年
+        target_year: 目標年
+        scenarios: 情境列表
+
+    Returns:
+        (情境 × 年度 × 類別) 排放陣列，年度為 base_year+1 ~ target_year
+    """
+    efficiency, switch = build_scenario_arrays(scenarios, base_year)
+
+    horizon = target_year - base_year
+    steps = np.arange(1, horizon + 1, dtype=np.float64)
+
+    # 完全轉換時各類別排放的增減（情境 × 類別）
+    switched_delta = np.einsum('k,skj->sj', base_emissions, switch)
+
+    switched = base_emissions[None, None, :] + (steps / horizon)[None, :, None] * switched_delta[:, None, :]
+    retained = (1.0 - efficiency[:, None, :]) ** steps[None, :, None]
+
+    return np.maximum(switched * retained, 0.0)
+
+
+def _scenario_results(
+    paths: np.ndarray,
+    scenarios: Sequence[Dict[str, Any]],
+    base_year: int,
+    base_total: float,
+    target_emission: Optional[float]
+) -> List[Dict[str, Any]]:
+    totals = round_emissions(paths.sum(axis=2))
+    finals = round_emissions(paths[:, -1, :])
+    years = list(range(base_year + 1, base_year + 1 + paths.shape[1]))
+
+    results = []
+    for row, scenario in enumerate(scenarios):
+        final_total = float(totals[row, -1])
+        result = {
+            'name': scenario.get('name') or f'scenario-{row + 1}',
+            'path': [{'year': year, 'emission': float(total)} for year, total in zip(years, totals[row])],
+            'final_emission': final_total,
+            'reduction_percent': round((1 - final_total / base_total) * 100, 2) if base_total > 0 else None,
+            'by_category': {
+                CATEGORIES[column]: float(finals[row, column]) for column in np.flatnonzero(finals[row])
+            }
+        }
+        if target_emission is not None:
+            result['meets_target'] = final_total <= target_emission
+            result['gap'] = round(max(final_total - target_emission, 0.0), 2)
+        results.append(result)
+    return results
+
+
+def get_emission_trends(
+    supabase,
+    companies: Optional[Sequence[str]] = None,
+    scenarios: Optional[Sequence[Dict[str, Any]]] = None,
+    base_year: Optional[int] = None,
+    target_year: Optional[int] = None,
+    target_reduction_percent: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    取得逐年排放比較與減量情境推估
+
+    Args:
+        supabase: Supabase client（僅在重建彙總快取時使用）
+        companies: 只計算指定公司（None 表示全部）
+        scenarios: 減量情境列表
+        base_year: 推估基準年（預設為最近一個有排放的年度）
+        target_year: 目標年（預設為基準年後 DEFAULT_PROJECTION_YEARS 年）
+        target_reduction_percent: 目標年相對基準年的減量百分比
+
+    Returns:
+        {'years', 'categories', 'by_year', 'by_category', 'projection'（有基準年時）, 'data_version'}
+
+    Raises:
+        ScenarioError: 情境或年份參數錯誤
+    """
+    scenarios = list(scenarios or [])
+    cube = get_rollup_cache().get_cube(supabase)
+
+    cache_key = json.dumps(
+        [cube.version, sorted(companies or []), scenarios, base_year, target_year, target_reduction_percent],
+        sort_keys=True, ensure_ascii=False
+    )
+    cached = _analytics_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    # (年度 × 類別)：加總公司、範疇、月份
+    selected = [row for row, company in enumerate(cube.companies) if not companies or company in companies]
+    matrix = cube.values[selected].sum(axis=(0, 1, 3)).T if selected else np.zeros((len(cube.years), len(CATEGORIES)))
+
+    result = {
+        'years': cube.years,
+        'categories': [{'category': page_key, 'name': category_name(page_key)} for page_key in CATEGORIES],
+        **calculate_yoy(cube.years, matrix),
+        'data_version': cube.version
+    }
+
+    years_with_data = [year for year, total in zip(cube.years, matrix.sum(axis=1)) if total > 0]
+    base_year = base_year or (years_with_data[-1] if years_with_data else None)
+
+    if base_year is not None:
+        if base_year not in cube.years:
+            raise ScenarioError(f'No emission data for base year {base_year}')
+
+        target_year = target_year or base_year + DEFAULT_PROJECTION_YEARS
+        if not base_year < target_year <= base_year + MAX_PROJECTION_YEARS:
+            raise ScenarioError(f'target_year must be within {MAX_PROJECTION_YEARS} years after {base_year}')
+
+        base_emissions = round_emissions(matrix[cube.years.index(base_year)])
+        base_total = float(round_emissions(np.array([base_emissions.sum()]))[0])
+
+        target_emission = None
+        required = None
+        if target_reduction_percent is not None:
+            target_emission = round(base_total * (1 - target_reduction_percent / 100.0), 2)
+            # 每年需減少的百分比（複利）
+            required = round((1 - (1 - target_reduction_percent / 100.0) ** (1 / (target_year - base_year))) * 100, 2)
+
+        paths = simulate_reduction_paths(base_emissions, base_year, target_year, scenarios) if scenarios else None
+
+        result['projection'] = {
+            'base_year': base_year,
+            'base_emission': base_total,
+            'target_year': target_year,
+            'target_emission': target_emission,
+            'required_annual_reduction_percent': required,
+            'scenarios': _scenario_results(paths, scenarios, base_year, base_total, target_emission) if scenarios else []
+        }
+
+    _analytics_cache.set(cache_key, result)
+    return result
@@ -0,0 +1,237 @@
+"""
+帳單月份分配服務
+
+取代前端 monthlyDistribution.ts：外購電力、天然氣帳單的計費期間以民國日期填寫，
+依計費天數將用量按比例分配到盤查年度的各月份。所有帳單一次轉換日期，
+建立「帳單 × 月份」重疊天數矩陣後以一次矩陣乘法完成分配
+"""
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class BillDistributionError(ValueError):
+    """帳單資料無法分配（日期格式錯誤或計費起日晚於訖日）"""
+    pass
+
+
+# 由帳單計算月份數據的能源類型（payload 中的帳單欄位）
+BILL_PAGE_KEYS = {
+    'electricity': 'billData',
+    'natural_gas': 'billData',
+}
+
+# 民國紀年與西元紀年差
+ROC_YEAR_OFFSET = 1911
+
+MONTHS_PER_YEAR = 12
+
+# 分配結果保留的小數位數
+DISTRIBUTION_DECIMALS = 2
+
+
+def parse_roc_dates(values: Sequence[str]) -> np.ndarray:
+    """
+    批次將民國日期字串轉為日期陣列
+
+    Args:
+        values: 民國日期（例如: "113/01/01"）
+
+    Returns:
+        datetime64[D] 陣列
+
+    Raises:
+        BillDistributionError: 日期格式錯誤或日期不存在（例如: 113/02/30）
+    """
+    iso_dates = []
+    for value in values:
+        try:
+            year, month, day = (int(part) for part in str(value).strip().split('/'))
+        except ValueError:
+            raise BillDistributionError(f'Invalid ROC date: {value}')
+        iso_dates.append(f'{year + ROC_YEAR_OFFSET:04d}-{month:02d}-{day:02d}')
+
+    try:
+        return np.array(iso_dates, dtype='datetime64[D]')
+    except ValueError:
+        raise BillDistributionError(f'Invalid ROC date in: {list(values)}')
+
+
+def get_month_bounds(year: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    取得年度各月份的起訖日
+
+    Args:
+        year: 西元年
+
+    Returns:
+        (各月 1 日, 各月最後一天)，皆為長度 12 的 datetime64[D] 陣列
+    """
+    months = np.arange(f'{year}-01', f'{year + 1}-02', dtype='datetime64[M]')
+    bounds = months.astype('datetime64[D]')
+    return bounds[:-1], bounds[1:] - np.timedelta64(1, 'D')
+
+
+def build_overlap_matrix(starts: np.ndarray, ends: np.ndarray, year: int) -> np.ndarray:
+    """
+    建立帳單計費期間與各月份的重疊天數矩陣
+
+    Args:
+        starts: 計費起日陣列
+        ends: 計費訖日陣列（含當日）
+        year: 西元年
+
+    Returns:
+        bills × 12 重疊天數矩陣
+    """
+    month_starts, month_ends = get_month_bounds(year)
+
+    overlap = (
+        np.minimum(ends[:, None], month_ends[None, :])
+        - np.maximum(starts[:, None], month_starts[None, :])
+    ).astype(np.int64) + 1
+
+    return np.clip(overlap, 0, None)
+
+
+def _usable_bills(bills: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """篩選計費起訖日皆已填寫的帳單（與前端相同，未填寫者略過）"""
+    return [
+        bill for bill in bills
+        if isinstance(bill, dict) and bill.get('billingStart') and bill.get('billingEnd')
+    ]
+
+
+def distribute_bills(bills: Sequence[Dict[str, Any]], year: int) -> Dict[str, Any]:
+    """
+    將帳單用量依計費天數分配到年度各月份
+
+    每筆帳單的每日用量 = 計費度數 / 計費總天數，各月份用量 = Σ 每日用量 × 重疊天數；
+    落在盤查年度以外的天數不計入。跨三個月以上的帳單也會正確分配
+
+    Args:
+        bills: 帳單列表 [{'billingStart', 'billingEnd', 'billingUnits', 'meterId'?}]
+        year: 盤查年度（西元年）
+
+    Returns:
+        {
+            'monthly': {month: value}（只含大於 0 的月份，與前端提交格式相同）,
+            'meters': {meterId: {month: value}},
+            'total': 分配到該年度的總用量,
+            'count': 參與分配的帳單數
+        }
+
+    Raises:
+        BillDistributionError: 日期格式錯誤或計費起日晚於訖日
+    """
+    usable = _usable_bills(bills)
+    if not usable:
+        return {'monthly': {}, 'meters': {}, 'total': 0.0, 'count': 0}
+
+    starts = parse_roc_dates([bill['billingStart'] for bill in usable])
+    ends = parse_roc_dates([bill['billingEnd'] for bill in usable])
+
+    billing_days = (ends - starts).astype(np.int64) + 1
+    invalid = np.flatnonzero(billing_days <= 0)
+    if invalid.size:
+        bill = usable[invalid[0]]
+        raise BillDistributionError(
+            f"billingStart {bill['billingStart']} is after billingEnd {bill['billingEnd']}"
+        )
+
+    try:
+        units = np.array([float(bill.get('billingUnits') or 0) for bill in usable], dtype=np.float64)
+    except (TypeError, ValueError):
+        raise BillDistributionError('billingUnits must be numeric')
+
+    # 每筆帳單分配到各月份的權重（重疊天數 / 計費總天數）
+    weights = build_overlap_matrix(starts, ends, year) / billing_days[:, None]
+
+    # 一次矩陣乘法得到全部帳單的月份合計
+    monthly_totals = units @ weights
+
+    # 依表號彙總：表號 one-hot 矩陣 × 各帳單月份用量
+    meter_ids = [str(bill.get('meterId') or '') for bill in usable]
+    meter_keys, meter_rows = np.unique(np.asarray(meter_ids, dtype=object), return_inverse=True)
+    meter_matrix = np.zeros((len(meter_keys), len(usable)))
+    meter_matrix[meter_rows, np.arange(len(usable))] = 1.0
+    meter_totals = meter_matrix @ (weights * units[:, None])
+
+    return {
+        'monthly': _to_monthly_dict(monthly_totals),
+        'meters': {
+            key: _to_monthly_dict(meter_totals[row])
+            for row, key in enumerate(meter_keys.tolist()) if key
+        },
+        'total': round(float(monthly_totals.sum()), DISTRIBUTION_DECIMALS),
+        'count': len(usable)
+    }
+
+
+def _to_monthly_dict(values: np.ndarray) -> Dict[str, float]:
+    rounded = np.round(values, DISTRIBUTION_DECIMALS)
+    return {
+        str(month): float(value)
+        for month, value in enumerate(rounded.tolist(), start=1) if value > 0
+    }
+
+
+def get_entry_bills(page_key: str, payload: Optional[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+    """
+    取得條目 payload 中用於分配月份的帳單
+
+    Args:
+        page_key: 能源類型
+        payload: 條目 payload
+
+    Returns:
+        帳單列表；非帳單類型或 payload 沒有帳單時回傳 None
+    """
+    field = BILL_PAGE_KEYS.get(page_key)
+    if field is None or not payload:
+        return None
+
+    bills = payload.get(field)
+    if not isinstance(bills, list) or not _usable_bills(bills):
+        return None
+
+    return bills
+
+
+def distribute_entry_bills(
+    page_key: str,
+    period_year: int,
+    payload: Optional[Dict[str, Any]],
+    monthly: Optional[Dict[str, float]] = None
+) -> Optional[Dict[str, float]]:
+    """
+    由條目 payload 中的帳單計算月份數據（伺服器端為月份數據的來源）
+
+    Args:
+        page_key: 能源類型
+        period_year: 盤查年度
+        payload: 條目 payload
+        monthly: 前端提交的月份數據（僅用於比對記錄）
+
+    Returns:
+        分配後的月份數據；非帳單類型或沒有帳單時回傳 None
+    """
+    bills = get_entry_bills(page_key, payload)
+    if bills is None:
+        return None
+
+    distributed = distribute_bills(bills, period_year)['monthly']
+
+    if monthly is not None:
+        client_total = sum(float(value) for value in monthly.values())
+        server_total = sum(distributed.values())
+        if abs(client_total - server_total) > 0.01 * max(len(bills), 1):
+            logger.info(
+                f"Bill distribution for {page_key} {period_year} differs from client: "
+                f"client={client_total:.2f}, server={server_total:.2f}"
+            )
+
+    return distributed
@@ -1,37 +1,39 @@
 """
 碳排放計算服務
 """
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
 import logging
+import os
+import numpy as np
+from src.infrastructure.cache.ttl_cache import TTLCache
+from .emission_factor_service import get_factor_registry, EmissionFactorRegistry
 
 logger = logging.getLogger(__name__)
 
-# 排放係數資料庫（kgCO2e per unit）
-# 來源：台灣環保署溫室氣體排放係數管理表 6.0.4
-# 單位：公斤 CO2e / 公升 (液體燃料)、公斤 CO2e / 度 (電力)
-EMISSION_FACTORS = {
-    # 範疇一：直接排放
-    'diesel': 2.6068,          # 柴油 (移動源)
-    'diesel_generator': 2.6068, # 柴油 (固定源)
-    'gasoline': 2.2683,        # 汽油
-    'natural_gas': 1.8790,     # 天然氣 (單位: kgCO2e/m³)
-    'lpg': 1.7766,             # 液化石油氣
-    'acetylene': 2.9,          # 乙炔 (估計值)
-    'refrigerant': 1.0,        # 冷媒 (依類型不同，需細分)
-    'sf6': 22800.0,            # 六氟化硫 (GWP值)
-    'wd40': 0.5,               # WD-40 (估計值)
-    'fire_extinguisher': 1.0,  # 滅火器 (依類型不同)
-    'welding_rod': 0.8,        # 焊條 (估計值)
-    'urea': 0.732,             # 尿素
-    'septic_tank': 0.0,        # 化糞池 (需要特殊計算)
-
-    # 範疇二：外購電力
-    'electricity': 0.509,      # 電力 (2023年台電係數)
-
-    # 範疇三：其他間接排放
-    'employee_commute': 0.0,   # 員工通勤 (需依交通工具細分)
-    'generator_test': 2.6068,  # 發電機測試 (同柴油)
-}
+
+def resolve_emission_factor(
+    page_key: str,
+    year: int = None,
+    factor_version: str = None
+) -> Tuple[float, str]:
+    """
+    取得排放係數與套用的係數版本
+
+    Args:
+        page_key: 能源類型鍵值 (例如: diesel, gasoline)
+        year: 年份（依年份選擇適用的係數版本，未指定時使用最新版本）
+        factor_version: 指定係數版本（例如: 6.0.4），優先於年份
+
+    Returns:
+        (排放係數 (kgCO2e per unit), 係數版本)
+
+    Raises:
+        UnknownFactorVersionError: 指定的係數版本不存在
+    """
+    factor, version = get_factor_registry().resolve(page_key, year, factor_version)
+    logger.debug(f"Emission factor for {page_key} (year: {year}, version: {version}): {factor}")
+
+    return factor, version
 
 
 def get_emission_factor(page_key: str, year: int = None) -> float:
@@ -40,22 +42,30 @@ def get_emission_factor(page_key: str, year: int = None) -> float:
 
     Args:
         page_key: 能源類型鍵值 (例如: diesel, gasoline)
-        year: 年份 (未來可依年份調整係數)
+        year: 年份 (依年份選擇適用的係數版本)
 
     Returns:
-        排放係數 (kgCO2e per unit)
+        排放係數 (kgCO2e per unit)，未知類型返回預設值 1.0
+    """
+    factor, _ = resolve_emission_factor(page_key, year)
+    return factor
 
-    Raises:
-        KeyError: 當找不到對應的排放係數時
+
+def get_entry_monthly(entry: Dict) -> Dict[str, float]:
     """
-    if page_key not in EMISSION_FACTORS:
-        logger.warning(f"Unknown page_key: {page_key}, using default factor 1.0")
-        return 1.0
+    取得條目的月份數據（優先使用換算為標準單位後的數值）
 
-    factor = EMISSION_FACTORS[page_key]
-    logger.debug(f"Emission factor for {page_key} (year: {year}): {factor}")
+    Args:
+        entry: energy_entries 資料列（需含 payload）
 
-    return factor
+    Returns:
+        月份數據 {month: value}
+    """
+    payload = entry.get('payload') or {}
+    monthly = (payload.get('normalized') or {}).get('monthly')
+    if monthly is None:
+        monthly = payload.get('monthly')
+    return {month: float(value or 0) for month, value in (monthly or {}).items()}
 
 
 def calculate_monthly_emission(monthly_data: Dict[str, float], factor: float) -> Dict[str, float]:
@@ -82,7 +92,8 @@ def calculate_monthly_emission(monthly_data: Dict[str, float], factor: float) ->
 def calculate_total_carbon(
     page_key: str,
     monthly_data: Dict[str, float],
-    year: int
+    year: int,
+    factor_version: str = None
 ) -> Dict:
     """
     計算總碳排放量
@@ -91,6 +102,7 @@ def calculate_total_carbon(
         page_key: 能源類型鍵值
         monthly_data: 月份數據 {month: value}
         year: 計算年份
+        factor_version: 指定係數版本（未指定時依年份選擇）
 
     Returns:
         包含計算結果的字典：
@@ -98,11 +110,15 @@ def calculate_total_carbon(
             'total_emission': float,
             'monthly_emission': Dict[str, float],
             'emission_factor': float,
+            'factor_version': str,
             'formula': str
         }
+
+    Raises:
+        UnknownFactorVersionError: 指定的係數版本不存在
     """
     # 1. 取得排放係數
-    factor = get_emission_factor(page_key, year)
+    factor, version = resolve_emission_factor(page_key, year, factor_version)
 
     # 2. 計算每月排放
     monthly_emission = calculate_monthly_emission(monthly_data, factor)
@@ -115,12 +131,384 @@ def calculate_total_carbon(
 
     logger.info(
         f"Carbon calculation: {page_key} (year: {year}) "
-        f"= {total_emission} kgCO2e (factor: {factor})"
+        f"= {total_emission} kgCO2e (factor: {factor}, version: {version})"
     )
 
     return {
         'total_emission': total_emission,
         'monthly_emission': monthly_emission,
         'emission_factor': factor,
+        'factor_version': version,
         'formula': formula
     }
+
+
+# ============================================
+# 批次計算（NumPy 向量化）
+# ============================================
+
+MONTHS_PER_YEAR = 12
+
+# 單次批次計算的最大項目數
+MAX_BATCH_ITEMS = 5000
+
+# 判斷 NumPy 四捨五入是否可能與 Python round() 不一致的容許誤差
+_ROUNDING_TIE_TOLERANCE = 1e-9
+
+
+def round_emissions(values: np.ndarray, decimals: int = 2) -> np.ndarray:
+    """
+    與 Python round() 結果一致的向量化四捨五入
+
+    np.round 先乘以 10^decimals 再取整，乘法誤差可能讓接近 .5 的值
+    落到另一側；這些少數值改用 Python round() 逐一處理，其餘維持向量化
+
+    Args:
+        values: 要四捨五入的陣列
+        decimals: 小數位數
+
+    Returns:
+        四捨五入後的陣列（與逐一呼叫 round(value, decimals) 相同）
+    """
+    rounded = np.round(values, decimals)
+
+    scaled = values * (10 ** decimals)
+    distance_to_tie = np.abs(scaled - np.floor(scaled) - 0.5)
+    near_tie = distance_to_tie <= _ROUNDING_TIE_TOLERANCE * np.maximum(1.0, np.abs(scaled))
+
+    for index in zip(*np.nonzero(near_tie)):
+        rounded[index] = round(float(values[index]), decimals)
+
+    return rounded
+
+
+def pack_monthly_data(
+    monthly_data_list: List[Dict[str, float]]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    將多筆月份數據打包為 (項目數 × 12) 矩陣
+
+    Args:
+        monthly_data_list: 月份數據列表 [{month: value}, ...]
+
+    Returns:
+        (values, mask)：values 為數值矩陣（缺少的月份為 0），
+        mask 標記該月份是否有提供數據
+
+    Raises:
+        ValueError: 月份不在 1-12 範圍內或重複
+    """
+    item_count = len(monthly_data_list)
+    values = np.zeros((item_count, MONTHS_PER_YEAR), dtype=np.float64)
+    mask = np.zeros((item_count, MONTHS_PER_YEAR), dtype=bool)
+
+    for row, monthly_data in enumerate(monthly_data_list):
+        for month_str, value in monthly_data.items():
+            month = int(month_str)
+            if month < 1 or month > MONTHS_PER_YEAR:
+                raise ValueError(f'Invalid month: {month_str}. Must be 1-12')
+            if mask[row, month - 1]:
+                raise ValueError(f'Duplicate month: {month_str}')
+            values[row, month - 1] = value
+            mask[row, month - 1] = True
+
+    return values, mask
+
+
+def calculate_carbon_batch(items: List[Dict]) -> Dict:
+    """
+    批次計算多筆碳排放量
+
+    所有項目打包為 (項目數 × 12) 矩陣後一次乘上排放係數向量；
+    每月與總量的四捨五入方式與 calculate_total_carbon 相同
+
+    Args:
+        items: 計算項目列表，每筆包含：
+            - page_key: 能源類型鍵值
+            - monthly_data: 月份數據 {month: value}
+            - year: 計算年份
+            - factor_version: 指定係數版本（選填）
+            - owner_id: 用戶 ID（選填，原樣回傳）
+
+    Returns:
+        {
+            'items': [{
+                'owner_id', 'page_key', 'year',
+                'total_emission', 'monthly_emission', 'emission_factor',
+                'factor_version', 'formula'
+            }, ...],
+            'total_emission': float,
+            'count': int
+        }
+
+    Raises:
+        ValueError: 項目數超過上限、月份格式錯誤或係數版本不存在
+    """
+    if len(items) > MAX_BATCH_ITEMS:
+        raise ValueError(f'Too many items: {len(items)}. Maximum is {MAX_BATCH_ITEMS}')
+
+    if not items:
+        return {'items': [], 'total_emission': 0.0, 'count': 0}
+
+    values, mask = pack_monthly_data([item['monthly_data'] for item in items])
+
+    # 係數以陣列索引一次取得（不逐筆查詢）
+    factors, versions = get_factor_registry().resolve_many(
+        [item['page_key'] for item in items],
+        [item['year'] for item in items],
+        [item.get('factor_version') for item in items]
+    )
+
+    # 每月排放 = 數值 × 係數，先四捨五入到小數兩位
+    monthly = round_emissions(values * factors[:, None])
+    monthly[~mask] = 0.0
+
+    # 依月份順序累加已四捨五入的每月排放（月份依序提供時與逐筆加總結果相同）
+    totals = round_emissions(np.add.accumulate(monthly, axis=1)[:, -1])
+
+    results = []
+    for row, item in enumerate(items):
+        factor = float(factors[row])
+        monthly_emission = {
+            month_str: float(monthly[row, int(month_str) - 1])
+            for month_str in item['monthly_data']
+        }
+        results.append({
+            'owner_id': item.get('owner_id'),
+            'page_key': item['page_key'],
+            'year': item['year'],
+            'total_emission': float(totals[row]),
+            'monthly_emission': monthly_emission,
+            'emission_factor': factor,
+            'factor_version': versions[row],
+            'formula': f"{item['page_key']} × {factor}"
+        })
+
+    grand_total = round(sum(result['total_emission'] for result in results), 2)
+
+    logger.info(f"Batch carbon calculation: {len(results)} items = {grand_total} kgCO2e")
+
+    return {
+        'items': results,
+        'total_emission': grand_total,
+        'count': len(results)
+    }
+
+
+# ============================================
+# 分氣體排放（CO2 / CH4 / N2O × GWP）
+# ============================================
+
+# 未指定時使用的 GWP 版本
+DEFAULT_GWP_SET = os.getenv('DEFAULT_GWP_SET', 'AR5')
+
+# 條目分氣體結果快取時間（秒）；條目更新時會主動清除
+GAS_BREAKDOWN_CACHE_TTL = int(os.getenv('GAS_BREAKDOWN_CACHE_TTL_SECONDS', '600'))
+
+# 每個條目的各月氣體質量（與 GWP 無關，切換 GWP 版本時不需重算）
+_gas_mass_cache = TTLCache(maxsize=2048, ttl=GAS_BREAKDOWN_CACHE_TTL)
+
+# 每個 (條目, GWP 版本) 的計算結果
+_gas_breakdown_cache = TTLCache(maxsize=4096, ttl=GAS_BREAKDOWN_CACHE_TTL)
+
+
+def calculate_gas_masses(monthly_data: Dict[str, float], gas_factors: np.ndarray) -> np.ndarray:
+    """
+    計算各月各氣體排放質量
+
+    Args:
+        monthly_data: 月份數據 {month: value}
+        gas_factors: 分氣體係數向量（公斤氣體 / 單位）
+
+    Returns:
+        (月份數 × 氣體數) 質量矩陣（公斤），列順序同 monthly_data
+    """
+    values = np.array(list(monthly_data.values()), dtype=np.float64)
+    return np.outer(values, gas_factors)
+
+
+def _build_gas_breakdown(
+    registry: EmissionFactorRegistry,
+    page_key: str,
+    monthly_data: Dict[str, float],
+    year: Optional[int],
+    factor_version: str,
+    gas_factors: Optional[np.ndarray],
+    masses: Optional[np.ndarray],
+    gwp_set: str
+) -> Dict:
+    """依氣體質量與 GWP 組出分氣體結果；沒有分氣體係數時回退為綜合係數計算"""
+    gwp = registry.gwp_vector(gwp_set)
+    result = {
+        'page_key': page_key,
+        'year': year,
+        'factor_version': factor_version,
+        'gwp_set': gwp_set,
+        'gwp': dict(zip(registry.gases, gwp.tolist())),
+        'breakdown_available': gas_factors is not None
+    }
+
+    if gas_factors is None:
+        carbon = calculate_total_carbon(page_key, monthly_data, year, factor_version)
+        result.update({
+            'gas_factors': {},
+            'gases': {},
+            'monthly_emission': carbon['monthly_emission'],
+            'monthly_gases': {},
+            'total_emission': carbon['total_emission']
+        })
+        return result
+
+    # (月份 × 氣體) 質量乘上 GWP：逐氣體 CO2e 與每月合計（矩陣乘積）
+    gas_emissions = round_emissions(masses * gwp)
+    monthly_totals = round_emissions(masses @ gwp)
+    months = list(monthly_data)
+
+    result.update({
+        'gas_factors': dict(zip(registry.gases, gas_factors.tolist())),
+        'gases': {
+            gas: {
+                'mass': round(float(masses[:, index].sum()), 6),
+                'emission': round(float(gas_emissions[:, index].sum()), 2)
+            }
+            for index, gas in enumerate(registry.gases)
+        },
+        'monthly_emission': dict(zip(months, monthly_totals.tolist())),
+        'monthly_gases': {
+            month: dict(zip(registry.gases, gas_emissions[row].tolist()))
+            for row, month in enumerate(months)
+        },
+        'total_emission': round(sum(monthly_totals.tolist()), 2)
+    })
+    return result
+
+
+def calculate_gas_breakdown(
+    page_key: str,
+    monthly_data: Dict[str, float],
+    year: int,
+    gwp_set: str = None,
+    factor_version: str = None
+) -> Dict:
+    """
+    計算分氣體（CO2 / CH4 / N2O）排放與 GWP 加權結果
+
+    Args:
+        page_key: 能源類型鍵值
+        monthly_data: 月份數據 {month: value}
+        year: 計算年份
+        gwp_set: GWP 版本（例如: AR5、AR6，預設 DEFAULT_GWP_SET）
+        factor_version: 指定係數版本（未指定時依年份選擇）
+
+    Returns:
+        {
+            'page_key', 'year', 'factor_version', 'gwp_set', 'gwp',
+            'breakdown_available': bool,   # 該能源類型是否有分氣體係數
+            'gas_factors': {gas: 公斤氣體/單位},
+            'gases': {gas: {'mass': 公斤, 'emission': kgCO2e}},
+            'monthly_emission': {month: kgCO2e},
+            'monthly_gases': {month: {gas: kgCO2e}},
+            'total_emission': kgCO2e
+        }
+
+    Raises:
+        UnknownGwpSetError: GWP 版本不存在
+        UnknownFactorVersionError: 係數版本不存在
+    """
+    registry = get_factor_registry()
+    gwp_set = gwp_set or DEFAULT_GWP_SET
+    registry.gwp_vector(gwp_set)
+
+    gas_factors, version = registry.resolve_gas_factors(page_key, year, factor_version)
+    masses = calculate_gas_masses(monthly_data, gas_factors) if gas_factors is not None else None
+
+    return _build_gas_breakdown(registry, page_key, monthly_data, year, version, gas_factors, masses, gwp_set)
+
+
+def _get_entry_gas_masses(supabase, entry_id: str, registry: EmissionFactorRegistry) -> Dict:
+    """讀取條目並計算各月氣體質量（依條目快取）"""
+    cached = _gas_mass_cache.get(entry_id)
+    if cached is not None and cached['registry'] is registry:
+        return cached
+
+    result = supabase.table('energy_entries')\
+        .select('id, owner_id, page_key, period_year, payload')\
+        .eq('id', entry_id)\
+        .limit(1)\
+        .execute()
+
+    if not result.data:
+        raise LookupError(f"Entry {entry_id} not found")
+
+    entry = result.data[0]
+    monthly_data = get_entry_monthly(entry)
+    gas_factors, version = registry.resolve_gas_factors(entry['page_key'], entry['period_year'])
+
+    data = {
+        'registry': registry,
+        'owner_id': entry['owner_id'],
+        'page_key': entry['page_key'],
+        'year': entry['period_year'],
+        'monthly_data': monthly_data,
+        'factor_version': version,
+        'gas_factors': gas_factors,
+        'masses': calculate_gas_masses(monthly_data, gas_factors) if gas_factors is not None else None
+    }
+    _gas_mass_cache.set(entry_id, data)
+    return data
+
+
+def get_entry_gas_breakdown(
+    supabase,
+    entry_id: str,
+    gwp_set: str = None,
+    user_id: str = None
+) -> Dict:
+    """
+    取得條目的分氣體排放（依 (條目, GWP 版本) 快取）
+
+    Args:
+        supabase: Supabase client
+        entry_id: 條目 ID
+        gwp_set: GWP 版本（預設 DEFAULT_GWP_SET）
+        user_id: 用戶 ID（用於權限驗證，管理員傳入 None）
+
+    Returns:
+        calculate_gas_breakdown 的結果，另含 entry_id 與 owner_id
+
+    Raises:
+        LookupError: 條目不存在
+        PermissionError: 條目不屬於該用戶
+        UnknownGwpSetError: GWP 版本不存在
+    """
+    registry = get_factor_registry()
+    gwp_set = gwp_set or DEFAULT_GWP_SET
+    registry.gwp_vector(gwp_set)
+
+    cached = _gas_breakdown_cache.get((entry_id, gwp_set))
+    if cached is not None and cached[0] is registry:
+        result = cached[1]
+    else:
+        data = _get_entry_gas_masses(supabase, entry_id, registry)
+        result = _build_gas_breakdown(
+            registry, data['page_key'], data['monthly_data'], data['year'],
+            data['factor_version'], data['gas_factors'], data['masses'], gwp_set
+        )
+        result.update({'entry_id': entry_id, 'owner_id': data['owner_id']})
+        _gas_breakdown_cache.set((entry_id, gwp_set), (registry, result))
+
+    if user_id is not None and result['owner_id'] != user_id:
+        raise PermissionError("Permission denied: entry does not belong to user")
+
+    return result
+
+
+def invalidate_entry_gas_breakdown(entry_id: str) -> None:
+    """
+    清除條目的分氣體快取（條目數據變更時呼叫）
+
+    Args:
+        entry_id: 條目 ID
+    """
+    _gas_mass_cache.delete(entry_id)
+    _gas_breakdown_cache.delete_where(lambda key, value: key[0] == entry_id)
@@ -0,0 +1,231 @@
+"""
+儀表板統計服務
+狀態統計與審核數讀取 dashboard_counts（由 energy_entries、entry_reviews 的觸發器逐筆增減，
+前端直接核准、退回也會反映），最近活動與用戶填報進度只以索引讀取少量資料列，不掃描資料表
+"""
+from typing import Dict, Any, Optional, List
+from collections import Counter
+from datetime import datetime, timezone
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 最近活動筆數
+RECENT_ACTIVITY_LIMIT = 10
+
+OWNER_ENTRY_COLUMNS = 'id, page_key, category, status, updated_at'
+
+# 需填報的項目（與前端 dashboardAPI.ts 的 allCategories 一致）
+REPORTING_CATEGORIES = [
+    {'pageKey': 'wd40', 'title': 'WD-40', 'category': '範疇一', 'scope': '直接排放'},
+    {'pageKey': 'acetylene', 'title': '乙炔', 'category': '範疇一', 'scope': '直接排放'},
+    {'pageKey': 'refrigerant', 'title': '冷媒', 'category': '範疇一', 'scope': '直接排放'},
+    {'pageKey': 'septic_tank', 'title': '化糞池', 'category': '範疇一', 'scope': '直接排放'},
+    {'pageKey': 'natural_gas', 'title': '天然氣', 'category': '範疇一', 'scope': '直接排放'},
+    {'pageKey': 'urea', 'title': '尿素', 'category': '範疇一', 'scope': '直接排放'},
+    {'pageKey': 'diesel_generator', 'title': '柴油(固定源)', 'category': '範疇一', 'scope': '直接排放'},
+    {'pageKey': 'generator_test', 'title': '發電機測試資料', 'category': '範疇一', 'scope': '直接排放'},
+    {'pageKey': 'diesel', 'title': '柴油(移動源)', 'category': '範疇一', 'scope': '直接排放'},
+    {'pageKey': 'gasoline', 'title': '汽油', 'category': '範疇一', 'scope': '直接排放'},
+    {'pageKey': 'sf6', 'title': '六氟化硫', 'category': '範疇一', 'scope': '直接排放'},
+    {'pageKey': 'lpg', 'title': '液化石油氣', 'category': '範疇一', 'scope': '直接排放'},
+    {'pageKey': 'fire_extinguisher', 'title': '滅火器', 'category': '範疇一', 'scope': '直接排放'},
+    {'pageKey': 'welding_rod', 'title': '焊條', 'category': '範疇一', 'scope': '直接排放'},
+    {'pageKey': 'gas_cylinder', 'title': '氣體鋼瓶', 'category': '範疇一', 'scope': '直接排放'},
+    {'pageKey': 'other_energy_sources', 'title': '其他使用能源', 'category': '範疇一', 'scope': '直接排放'},
+    {'pageKey': 'electricity', 'title': '外購電力', 'category': '範疇二', 'scope': '間接排放'},
+    {'pageKey': 'employee_commute', 'title': '員工通勤', 'category': '範疇三', 'scope': '其他間接'}
+]
+
+TITLE_MAP = {category['pageKey']: category['title'] for category in REPORTING_CATEGORIES}
+
+# 狀態顯示文字（與前端 getRecentActivities 一致）
+STATUS_LABELS = {
+    'saved': '已暫存',
+    'submitted': '提交審核',
+    'approved': '審核通過',
+    'rejected': '審核退回',
+    'returned': '要求修正'
+}
+
+PROGRESS_STATUSES = ('submitted', 'approved', 'rejected', 'returned')
+
+REVIEW_LABELS = {
+    'approved': '審核通過',
+    'rejected': '審核退回',
+    'needs_fix': '要求修正'
+}
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def fetch_status_counts(supabase) -> Dict[str, Counter]:
+    """
+    讀取全體條目狀態數與審核記錄數（觸發器維護的 dashboard_counts，不掃描資料表）
+
+    Returns:
+        {'entries': Counter(狀態 → 條目數), 'reviews': Counter(審核狀態 → 記錄數)}
+    """
+    result = supabase.rpc('get_dashboard_counts', {}).execute()
+
+    counts = {'entries': Counter(), 'reviews': Counter()}
+    for row in result.data or []:
+        bucket = counts['reviews'] if row['kind'] == 'review' else counts['entries']
+        bucket[row['status']] += int(row['count'])
+    return counts
+
+
+def build_submission_statistics(entry_counts: Counter) -> Dict[str, Any]:
+    """全體條目狀態統計（對應 getSubmissionStatistics，未知狀態計入 submitted）"""
+    approved = entry_counts['approved']
+    rejected = entry_counts['rejected']
+    total = sum(entry_counts.values())
+    return {
+        'submitted': total - approved - rejected,
+        'approved': approved,
+        'rejected': rejected,
+        'total': total,
+        'lastUpdated': _now_iso()
+    }
+
+
+def fetch_recent_activities(supabase) -> List[Dict[str, Any]]:
+    """全體最近的條目寫入與審核記錄（依時間排序，各只讀取 RECENT_ACTIVITY_LIMIT 筆）"""
+    entries = supabase.table('energy_entries')\
+        .select('owner_id, page_key, category, status, updated_at')\
+        .order('updated_at', desc=True)\
+        .limit(RECENT_ACTIVITY_LIMIT)\
+        .execute()
+
+    reviews = supabase.table('entry_reviews')\
+        .select('status, created_at, energy_entries(owner_id, page_key, category)')\
+        .order('created_at', desc=True)\
+        .limit(RECENT_ACTIVITY_LIMIT)\
+        .execute()
+
+    events = [
+        {**entry, 'type': STATUS_LABELS.get(entry['status'], entry['status']), 'timestamp': entry['updated_at']}
+        for entry in entries.data or []
+    ]
+    for review in reviews.data or []:
+        entry = review.get('energy_entries') or {}
+        events.append({
+            'owner_id': entry.get('owner_id'),
+            'page_key': entry.get('page_key'),
+            'category': entry.get('category'),
+            'status': review['status'],
+            'type': REVIEW_LABELS.get(review['status'], review['status']),
+            'timestamp': review.get('created_at')
+        })
+
+    events.sort(key=lambda event: event['timestamp'] or '', reverse=True)
+    return [
+        {
+            'id': f"{event['page_key']}_{event['timestamp']}",
+            'type': event['type'],
+            'description': f"{TITLE_MAP.get(event['page_key'], event['page_key'])} - {event['category']}",
+            'timestamp': event['timestamp'],
+            'status': event['status'],
+            'ownerId': event['owner_id']
+        }
+        for event in events[:RECENT_ACTIVITY_LIMIT]
+    ]
+
+
+def fetch_owner_entries(supabase, owner_id: str, year: int) -> Dict[str, Dict[str, Any]]:
+    """
+    讀取用戶年度條目（使用索引 idx_entries_owner_year）
+
+    Returns:
+        page_key → 條目（同一類別有多筆時取最後更新的一筆）
+    """
+    result = supabase.table('energy_entries')\
+        .select(OWNER_ENTRY_COLUMNS)\
+        .eq('owner_id', owner_id)\
+        .eq('period_year', year)\
+        .execute()
+
+    entries: Dict[str, Dict[str, Any]] = {}
+    for entry in sorted(result.data or [], key=lambda row: row.get('updated_at') or ''):
+        entries[entry['page_key']] = entry
+    return entries
+
+
+def build_reporting_progress(entries: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """用戶年度填報進度（對應 getReportingProgress）"""
+    by_status = {status: 0 for status in PROGRESS_STATUSES}
+    completed = 0
+
+    for category in REPORTING_CATEGORIES:
+        entry = entries.get(category['pageKey'])
+        if entry and entry['status']:
+            completed += 1
+            if entry['status'] in by_status:
+                by_status[entry['status']] += 1
+
+    return {
+        'total': len(REPORTING_CATEGORIES),
+        'completed': completed,
+        'byStatus': by_status
+    }
+
+
+def build_pending_entries(entries: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """用戶尚未填寫的項目（對應 getPendingEntries）"""
+    return [dict(category) for category in REPORTING_CATEGORIES if category['pageKey'] not in entries]
+
+
+def build_owner_activities(entries: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """用戶最近活動（對應 getRecentActivities，依條目最後更新時間排序）"""
+    recent = sorted(entries.values(), key=lambda entry: entry['updated_at'] or '', reverse=True)
+    return [
+        {
+            'id': f"{entry['page_key']}_{entry['updated_at']}",
+            'type': STATUS_LABELS.get(entry['status'], entry['status']),
+            'description': f"{TITLE_MAP.get(entry['page_key'], entry['page_key'])} - {entry['category']}",
+            'timestamp': entry['updated_at'],
+            'status': entry['status']
+        }
+        for entry in recent[:RECENT_ACTIVITY_LIMIT]
+    ]
+
+
+def get_dashboard_summary(supabase, owner_id: Optional[str] = None, year: Optional[int] = None) -> Dict[str, Any]:
+    """
+    取得儀表板統計
+
+    Args:
+        supabase: Supabase client
+        owner_id: 用戶 ID（指定時另含該用戶的填報進度與待填項目）
+        year: 填報年度（預設今年）
+
+    Returns:
+        {
+            'year': int,
+            'submission_statistics': {...},
+            'review_statistics': {...},
+            'recent_activities': [...],
+            'reporting_progress': {...},   # 僅指定用戶時
+            'pending_entries': [...]       # 僅指定用戶時
+        }
+    """
+    year = year or datetime.now().year
+
+    counts = fetch_status_counts(supabase)
+    summary = {
+        'year': year,
+        'submission_statistics': build_submission_statistics(counts['entries']),
+        'review_statistics': dict(counts['reviews'])
+    }
+
+    if owner_id:
+        entries = fetch_owner_entries(supabase, owner_id, year)
+        summary['recent_activities'] = build_owner_activities(entries)
+        summary['reporting_progress'] = build_reporting_progress(entries)
+        summary['pending_entries'] = build_pending_entries(entries)
+    else:
+        summary['recent_activities'] = fetch_recent_activities(supabase)
+
+    return summary
@@ -0,0 +1,292 @@
+"""
+證據檔案預覽衍生檔服務
+
+上傳完成後在背景執行緒池產生預覽縮圖：圖片縮為 WebP、PDF 算繪第一頁後縮為 WebP，
+存放在 get_thumbnail_path 決定的固定路徑（內容定址檔案的縮圖也只有一份）。
+審核頁面經 GET /api/files/<file_id>/thumbnail 取得數 KB 的縮圖，不必下載原檔。
+無法算繪的檔案（損毀的圖片、加密的 PDF、像素過多的圖片）記錄在失敗快取，
+之後的請求直接回應 415，不再重複下載原檔
+"""
+import io
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Optional, Sequence
+
+import pypdfium2 as pdfium
+from PIL import Image, ImageOps
+
+from src.infrastructure.cache.ttl_cache import TTLCache
+from .file_service import (
+    THUMBNAIL_SIZE,
+    download_file_from_storage,
+    get_thumbnail_path,
+    upload_file_to_storage
+)
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_MIME_TYPE = 'image/webp'
+THUMBNAIL_QUALITY = int(os.getenv('THUMBNAIL_QUALITY', '75'))
+
+# 產生縮圖的背景執行緒數（影像解碼為 CPU 密集工作，不宜過多）
+DERIVATIVE_WORKERS = int(os.getenv('DERIVATIVE_WORKERS', '2'))
+
+# 瀏覽器快取縮圖的秒數；縮圖路徑由原檔決定，內容不會改變
+THUMBNAIL_MAX_AGE = int(os.getenv('THUMBNAIL_MAX_AGE_SECONDS', '86400'))
+
+IMAGE_MIME_TYPES = {'image/jpeg', 'image/jpg', 'image/png', 'image/gif', 'image/webp'}
+PDF_MIME_TYPE = 'application/pdf'
+
+# 最近產生或讀取的縮圖（每張只有數 KB）
+_thumbnail_cache = TTLCache(maxsize=1024, ttl=THUMBNAIL_MAX_AGE)
+
+# 無法算繪的原檔（縮圖路徑 → 錯誤訊息）；原檔內容不變，失敗結果同樣不會改變
+_failed_cache = TTLCache(maxsize=4096, ttl=THUMBNAIL_MAX_AGE)
+
+_executor = ThreadPoolExecutor(max_workers=DERIVATIVE_WORKERS, thread_name_prefix='evidence-derivative')
+
+# 產生中的縮圖（同一路徑只排程一次）
+_pending: Dict[str, Future] = {}
+_pending_lock = threading.Lock()
+
+
+class NoPreviewError(LookupError):
+    """檔案類型不支援預覽縮圖"""
+    pass
+
+
+class UnrenderableFileError(ValueError):
+    """檔案內容無法算繪為縮圖（損毀、加密或像素過多）"""
+    pass
+
+
+def supports_thumbnail(mime_type: Optional[str]) -> bool:
+    """是否可產生預覽縮圖（圖片或 PDF）"""
+    return mime_type in IMAGE_MIME_TYPES or mime_type == PDF_MIME_TYPE
+
+
+def _render_pdf_first_page(content: bytes, size: int) -> Image.Image:
+    pdf = pdfium.PdfDocument(content)
+    try:
+        page = pdf[0]
+        width, height = page.get_size()
+        # 直接以縮圖大小算繪，不產生全尺寸點陣圖
+        bitmap = page.render(scale=size / max(width, height, 1))
+        return bitmap.to_pil().copy()
+    finally:
+        pdf.close()
+
+
+def render_thumbnail(content: bytes, mime_type: str, size: int = THUMBNAIL_SIZE) -> bytes:
+    """
+    產生 WebP 預覽縮圖
+
+    Args:
+        content: 原檔內容
+        mime_type: 原檔 MIME 類型
+        size: 縮圖最長邊像素
+
+    Returns:
+        WebP 圖片內容
+
+    Raises:
+        ValueError: 檔案類型不支援預覽
+        UnrenderableFileError: 檔案內容無法算繪
+    """
+    if not supports_thumbnail(mime_type):
+        raise ValueError(f"Preview not supported for {mime_type}")
+
+    try:
+        if mime_type == PDF_MIME_TYPE:
+            image = _render_pdf_first_page(content, size)
+        else:
+            image = Image.open(io.BytesIO(content))
+            # JPEG 以縮小比例解碼，減少大張掃描檔的記憶體用量
+            image.draft('RGB', (size, size))
+            image = ImageOps.exif_transpose(image)
+
+        image.thumbnail((size, size))
+        if image.mode not in ('RGB', 'RGBA'):
+            has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+    except (OSError, SyntaxError, Image.DecompressionBombError, pdfium.PdfiumError) as e:
+        raise UnrenderableFileError(f"Cannot render preview for {mime_type}: {str(e)}") from e
+
+    output = io.BytesIO()
+    image.save(output, format='WEBP', quality=THUMBNAIL_QUALITY)
+    return output.getvalue()
+
+
+def generate_thumbnail(supabase, file_path: str, mime_type: str, size: int = THUMBNAIL_SIZE) -> Optional[str]:
+    """
+    下載原檔、產生縮圖並存到 Storage
+
+    Args:
+        supabase: Supabase client
+        file_path: 原檔儲存路徑
+        mime_type: 原檔 MIME 類型
+        size: 縮圖最長邊像素
+
+    Returns:
+        縮圖儲存路徑；檔案類型不支援時回傳 None
+
+    Raises:
+        UnrenderableFileError: 檔案內容無法算繪（同時記錄在失敗快取）
+    """
+    if not supports_thumbnail(mime_type):
+        return None
+
+    thumbnail_path = get_thumbnail_path(file_path, size)
+    content = download_file_from_storage(supabase, file_path)
+    try:
+        thumbnail = render_thumbnail(content, mime_type, size)
+    except UnrenderableFileError as e:
+        _failed_cache.set(thumbnail_path, str(e))
+        raise
+
+    upload_file_to_storage(supabase, thumbnail, thumbnail_path, THUMBNAIL_MIME_TYPE)
+    _thumbnail_cache.set(thumbnail_path, thumbnail)
+
+    logger.info(f"Generated thumbnail {thumbnail_path}: {len(content)} -> {len(thumbnail)} bytes")
+    return thumbnail_path
+
+
+def _generate_in_background(supabase, file_path: str, mime_type: str) -> Optional[str]:
+    try:
+        return generate_thumbnail(supabase, file_path, mime_type)
+    except UnrenderableFileError as e:
+        logger.info(f"No thumbnail for {file_path}: {str(e)}")
+        return None
+    except Exception as e:
+        logger.warning(f"Failed to generate thumbnail for {file_path}: {str(e)}")
+        return None
+
+
+def schedule_thumbnail(supabase, file_path: str, mime_type: str) -> Optional[Future]:
+    """
+    在背景執行緒池排程產生縮圖（同一縮圖正在產生時回傳同一個 Future）
+
+    Args:
+        supabase: Supabase client
+        file_path: 原檔儲存路徑
+        mime_type: 原檔 MIME 類型
+
+    Returns:
+        Future；檔案類型不支援或已知無法算繪時回傳 None
+    """
+    if not supports_thumbnail(mime_type):
+        return None
+
+    thumbnail_path = get_thumbnail_path(file_path)
+    if _failed_cache.get(thumbnail_path) is not None:
+        return None
+    with _pending_lock:
+        future = _pending.get(thumbnail_path)
+        if future is not None:
+            return future
+        future = _executor.submit(_generate_in_background, supabase, file_path, mime_type)
+        _pending[thumbnail_path] = future
+
+    def done(_):
+        with _pending_lock:
+            _pending.pop(thumbnail_path, None)
+
+    future.add_done_callback(done)
+    return future
+
+
+def schedule_derivatives(supabase, uploads: Sequence[Dict[str, Any]]) -> int:
+    """
+    上傳完成後排程產生預覽（重複內容沿用既有縮圖）
+
+    Args:
+        supabase: Supabase client
+        uploads: upload_evidence_file / upload_evidence_batch 的結果
+
+    Returns:
+        排程的數量
+    """
+    scheduled = 0
+    for upload in uploads:
+        if upload.get('deduplicated'):
+            continue
+        if schedule_thumbnail(supabase, upload['file_path'], upload.get('mime_type')) is not None:
+            scheduled += 1
+    return scheduled
+
+
+def resolve_thumbnail(supabase, user_id: str, file_id: str, is_admin: bool = False) -> Dict[str, Any]:
+    """
+    取得檔案縮圖的路徑與 ETag（不下載內容，供條件請求直接回應 304）
+
+    Args:
+        supabase: Supabase client
+        user_id: 用戶 ID（用於權限驗證）
+        file_id: 檔案 ID
+        is_admin: 管理員可取得所有檔案的縮圖
+
+    Returns:
+        {'file_path', 'mime_type', 'thumbnail_path', 'etag'}
+
+    Raises:
+        LookupError: 檔案不存在
+        NoPreviewError: 檔案類型不支援預覽
+        PermissionError: 檔案不屬於該用戶
+    """
+    result = supabase.table('entry_files')\
+        .select('id, owner_id, file_path, mime_type, content_sha256')\
+        .eq('id', file_id)\
+        .limit(1)\
+        .execute()
+
+    if not result.data:
+        raise LookupError(f"File {file_id} not found")
+
+    file = result.data[0]
+    if not is_admin and file['owner_id'] != user_id:
+        raise PermissionError("Permission denied: file does not belong to user")
+    if not supports_thumbnail(file.get('mime_type')):
+        raise NoPreviewError(f"Preview not available for {file.get('mime_type')}")
+
+    return {
+        'file_path': file['file_path'],
+        'mime_type': file['mime_type'],
+        'thumbnail_path': get_thumbnail_path(file['file_path']),
+        'etag': f"{file.get('content_sha256') or file['id']}-{THUMBNAIL_SIZE}"
+    }
+
+
+def load_thumbnail(supabase, thumbnail: Dict[str, Any]) -> Optional[bytes]:
+    """
+    讀取縮圖內容；尚未產生時排程產生並回傳 None
+
+    Args:
+        supabase: Supabase client
+        thumbnail: resolve_thumbnail 的結果
+
+    Returns:
+        WebP 圖片內容或 None
+
+    Raises:
+        UnrenderableFileError: 原檔先前已確認無法算繪
+    """
+    thumbnail_path = thumbnail['thumbnail_path']
+
+    cached = _thumbnail_cache.get(thumbnail_path)
+    if cached is not None:
+        return cached
+
+    failure = _failed_cache.get(thumbnail_path)
+    if failure is not None:
+        raise UnrenderableFileError(failure)
+
+    try:
+        content = download_file_from_storage(supabase, thumbnail_path)
+    except Exception:
+        schedule_thumbnail(supabase, thumbnail['file_path'], thumbnail['mime_type'])
+        return None
+
+    _thumbnail_cache.set(thumbnail_path, content)
+    return content
@@ -0,0 +1,518 @@
+"""
+排放係數登錄服務
+
+依 (page_key, 年份, 係數版本) 查詢排放係數。係數表由版本化的資料檔載入，
+啟動時預先展開為密集陣列，查詢只需陣列索引。
+管理員重新載入資料檔時發佈到 emission_factor_tables，各 worker 依最新一筆的
+checksum 定期同步，所有 worker 使用同一份係數
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 係數資料檔位置（相對路徑以 backend 目錄為基準）
+EMISSION_FACTORS_FILE = os.getenv('EMISSION_FACTORS_FILE', os.path.join('data', 'emission_factors.json'))
+
+# 發佈的係數表（所有 worker 共用）
+FACTOR_TABLES_TABLE = 'emission_factor_tables'
+
+# 各 worker 檢查共用係數表版本的間隔（秒）
+FACTOR_SYNC_INTERVAL = int(os.getenv('EMISSION_FACTOR_SYNC_SECONDS', '30'))
+
+# 查詢表涵蓋的年份範圍（範圍外的年份以邊界年份計）
+MIN_FACTOR_YEAR = 2000
+MAX_FACTOR_YEAR = 2100
+
+# 找不到係數時的預設值
+DEFAULT_EMISSION_FACTOR = 1.0
+
+# 分氣體計算的溫室氣體（資料檔未指定時使用）
+DEFAULT_GASES = ('CO2', 'CH4', 'N2O')
+
+
+class EmissionFactorError(ValueError):
+    """排放係數資料或查詢參數錯誤"""
+    pass
+
+
+class UnknownFactorVersionError(EmissionFactorError):
+    """指定的係數版本不存在"""
+    pass
+
+
+class UnknownGwpSetError(EmissionFactorError):
+    """指定的 GWP 版本不存在"""
+    pass
+
+
+class EmissionFactorRegistry:
+    """
+    版本化排放係數登錄表
+
+    - factors: (版本數 × (能源類型數 + 1)) 矩陣，最後一欄為未知類型的預設值
+    - year_versions: 每個年份適用的版本索引
+    - year_table: (年份數 × (能源類型數 + 1)) 矩陣，依年份直接查詢
+    - gas_factors: (版本數 × (能源類型數 + 1) × 氣體數) 分氣體係數（公斤氣體 / 單位）
+    - gwp_matrix: (氣體數 × GWP 版本數) 全球暖化潛勢矩陣
+
+    較新的版本只需列出有變動的係數，其餘沿用前一版本
+    """
+
+    def __init__(
+        self,
+        versions: List[Dict],
+        default_factor: float = DEFAULT_EMISSION_FACTOR,
+        gwp_sets: Optional[Dict[str, Dict[str, float]]] = None,
+        gases: Sequence[str] = DEFAULT_GASES
+    ):
+        """
+        Args:
+            versions: 版本列表，每筆包含 version、effective_from、factors（選填 gas_factors）
+            default_factor: 未知能源類型使用的係數
+            gwp_sets: GWP 版本 {名稱: {氣體: GWP}}
+            gases: 分氣體計算的氣體列表
+
+        Raises:
+            EmissionFactorError: 版本資料格式錯誤
+        """
+        if not versions:
+            raise EmissionFactorError('No emission factor versions defined')
+
+        versions = sorted(versions, key=lambda v: v['effective_from'])
+        self.version_names = [v['version'] for v in versions]
+        if len(set(self.version_names)) != len(self.version_names):
+            raise EmissionFactorError('Duplicate emission factor version')
+
+        self.default_factor = float(default_factor)
+        self.page_keys = sorted({key for v in versions for key in v['factors']})
+        self._key_index = {key: index for index, key in enumerate(self.page_keys)}
+        self._sorted_keys = np.array(self.page_keys, dtype=str)
+        self._unknown_index = len(self.page_keys)
+        self._version_index = {name: index for index, name in enumerate(self.version_names)}
+        self._version_name_array = np.array(self.version_names, dtype=object)
+
+        # 逐版本展開，未列出的係數沿用前一版本
+        self.factors = np.full((len(versions), len(self.page_keys) + 1), self.default_factor, dtype=np.float64)
+        for row, version in enumerate(versions):
+            if row > 0:
+                self.factors[row] = self.factors[row - 1]
+            for key, value in version['factors'].items():
+                self.factors[row, self._key_index[key]] = float(value)
+
+        # 每個年份適用最近一個已生效的版本；早於第一版的年份使用第一版
+        effective_from = np.array([int(v['effective_from']) for v in versions])
+        years = np.arange(MIN_FACTOR_YEAR, MAX_FACTOR_YEAR + 1)
+        self.year_versions = np.maximum(np.searchsorted(effective_from, years, side='right') - 1, 0)
+        self.year_table = self.factors[self.year_versions]
+
+        self.latest_version = self.version_names[-1]
+
+        # 係數資料的 checksum（由 build_factor_registry 設定，用於比對共用版本）
+        self.checksum: Optional[str] = None
+
+        self._build_gas_factors(versions, list(gases))
+        self._build_gwp_matrix(gwp_sets or {})
+
+    def _build_gas_factors(self, versions: List[Dict], gases: List[str]) -> None:
+        """展開分氣體係數；未提供分氣體資料的能源類型以 has_gas_factors 標記"""
+        self.gases = gases
+        self._gas_index = {gas: index for index, gas in enumerate(gases)}
+
+        shape = (len(versions), len(self.page_keys) + 1)
+        self.gas_factors = np.zeros(shape + (len(gases),), dtype=np.float64)
+        self.has_gas_factors = np.zeros(shape, dtype=bool)
+
+        for row, version in enumerate(versions):
+            if row > 0:
+                self.gas_factors[row] = self.gas_factors[row - 1]
+                self.has_gas_factors[row] = self.has_gas_factors[row - 1]
+
+            for key, gas_values in version.get('gas_factors', {}).items():
+                column = self._key_index.get(key)
+                if column is None:
+                    raise EmissionFactorError(f'Gas factors defined for unknown page_key: {key}')
+
+                self.gas_factors[row, column] = self._gas_vector(gas_values)
+                self.has_gas_factors[row, column] = True
+
+    def _build_gwp_matrix(self, gwp_sets: Dict[str, Dict[str, float]]) -> None:
+        """建立 (氣體數 × GWP 版本數) 矩陣"""
+        self.gwp_set_names = list(gwp_sets)
+        self._gwp_index = {name: index for index, name in enumerate(self.gwp_set_names)}
+        self.gwp_matrix = np.zeros((len(self.gases), len(self.gwp_set_names)), dtype=np.float64)
+
+        for column, name in enumerate(self.gwp_set_names):
+            if set(gwp_sets[name]) != set(self.gases):
+                raise EmissionFactorError(f'GWP set {name} must define exactly {self.gases}')
+            self.gwp_matrix[:, column] = self._gas_vector(gwp_sets[name])
+
+    def _gas_vector(self, gas_values: Dict[str, float]) -> np.ndarray:
+        vector = np.zeros(len(self.gases), dtype=np.float64)
+        for gas, value in gas_values.items():
+            if gas not in self._gas_index:
+                raise EmissionFactorError(f'Unknown gas: {gas}')
+            vector[self._gas_index[gas]] = float(value)
+        return vector
+
+    def _year_offset(self, years: np.ndarray) -> np.ndarray:
+        return np.clip(years, MIN_FACTOR_YEAR, MAX_FACTOR_YEAR) - MIN_FACTOR_YEAR
+
+    def _version_row(self, factor_version: str) -> int:
+        try:
+            return self._version_index[factor_version]
+        except KeyError:
+            raise UnknownFactorVersionError(f'Unknown factor version: {factor_version}')
+
+    def key_indices(self, page_keys: Sequence[str]) -> np.ndarray:
+        """
+        將能源類型轉為欄位索引（未知類型對應預設值欄位）
+
+        Args:
+            page_keys: 能源類型鍵值列表
+
+        Returns:
+            欄位索引陣列
+        """
+        keys = np.asarray(page_keys, dtype=str)
+        if not len(self.page_keys):
+            return np.full(len(keys), self._unknown_index, dtype=np.intp)
+
+        indices = np.searchsorted(self._sorted_keys, keys)
+        clipped = np.minimum(indices, self._unknown_index - 1)
+        known = (indices < self._unknown_index) & (self._sorted_keys[clipped] == keys)
+
+        if not known.all():
+            logger.warning(f"Unknown page_keys: {sorted(set(keys[~known].tolist()))}, using default factor {self.default_factor}")
+
+        return np.where(known, indices, self._unknown_index)
+
+    def resolve(
+        self,
+        page_key: str,
+        year: Optional[int] = None,
+        factor_version: Optional[str] = None
+    ) -> Tuple[float, str]:
+        """
+        查詢單一排放係數
+
+        Args:
+            page_key: 能源類型鍵值
+            year: 計算年份（未指定時使用最新版本）
+            factor_version: 指定係數版本（優先於年份）
+
+        Returns:
+            (排放係數, 套用的版本)
+
+        Raises:
+            UnknownFactorVersionError: 指定的版本不存在
+        """
+        row, column = self._locate(page_key, year, factor_version)
+        if column == self._unknown_index:
+            logger.warning(f"Unknown page_key: {page_key}, using default factor {self.default_factor}")
+
+        return float(self.factors[row, column]), self.version_names[row]
+
+    def resolve_gas_factors(
+        self,
+        page_key: str,
+        year: Optional[int] = None,
+        factor_version: Optional[str] = None
+    ) -> Tuple[Optional[np.ndarray], str]:
+        """
+        查詢分氣體排放係數
+
+        Args:
+            page_key: 能源類型鍵值
+            year: 計算年份（未指定時使用最新版本）
+            factor_version: 指定係數版本（優先於年份）
+
+        Returns:
+            (分氣體係數向量（順序同 gases），套用的版本)；
+            該能源類型沒有分氣體資料時向量為 None
+
+        Raises:
+            UnknownFactorVersionError: 指定的版本不存在
+        """
+        row, column = self._locate(page_key, year, factor_version)
+
+        if not self.has_gas_factors[row, column]:
+            return None, self.version_names[row]
+
+        return self.gas_factors[row, column].copy(), self.version_names[row]
+
+    def gwp_vector(self, gwp_set: str) -> np.ndarray:
+        """
+        取得指定 GWP 版本的權重向量
+
+        Args:
+            gwp_set: GWP 版本名稱（例如: AR5）
+
+        Returns:
+            GWP 向量（順序同 gases）
+
+        Raises:
+            UnknownGwpSetError: 指定的 GWP 版本不存在
+        """
+        if gwp_set not in self._gwp_index:
+            raise UnknownGwpSetError(f'Unknown GWP set: {gwp_set}')
+
+        return self.gwp_matrix[:, self._gwp_index[gwp_set]]
+
+    def _locate(self, page_key: str, year: Optional[int], factor_version: Optional[str]) -> Tuple[int, int]:
+        if factor_version is not None:
+            row = self._version_row(factor_version)
+        elif year is None:
+            row = len(self.version_names) - 1
+        else:
+            row = int(self.year_versions[self._year_offset(np.asarray(year))])
+
+        return row, self._key_index.get(page_key, self._unknown_index)
+
+    def resolve_many(
+        self,
+        page_keys: Sequence[str],
+        years: Sequence[int],
+        factor_versions: Optional[Sequence[Optional[str]]] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        批次查詢排放係數（純陣列索引）
+
+        Args:
+            page_keys: 每個項目的能源類型鍵值
+            years: 每個項目的計算年份
+            factor_versions: 每個項目指定的係數版本（None 表示依年份）
+
+        Returns:
+            (排放係數陣列, 套用的版本名稱陣列)
+
+        Raises:
+            UnknownFactorVersionError: 指定的版本不存在
+        """
+        columns = self.key_indices(page_keys)
+        rows = self.year_versions[self._year_offset(np.asarray(years, dtype=np.int64))]
+
+        if factor_versions is not None:
+            for index, factor_version in enumerate(factor_versions):
+                if factor_version is not None:
+                    rows[index] = self._version_row(factor_version)
+
+        return self.factors[rows, columns], self._version_name_array[rows]
+
+    def describe(self) -> Dict:
+        """
+        取得登錄表摘要
+
+        Returns:
+            {'versions': [...], 'latest_version': str, 'page_keys': [...], 'gases': [...], 'gwp_sets': [...]}
+        """
+        return {
+            'versions': list(self.version_names),
+            'latest_version': self.latest_version,
+            'page_keys': list(self.page_keys),
+            'gases': list(self.gases),
+            'gwp_sets': list(self.gwp_set_names)
+        }
+
+
+def factor_checksum(data: Dict) -> str:
+    """係數資料的 checksum（與鍵順序、空白無關）"""
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def build_factor_registry(data: Dict, source: str) -> EmissionFactorRegistry:
+    """
+    由係數資料建立登錄表
+
+    Args:
+        data: 係數資料（資料檔或 emission_factor_tables.data 的內容）
+        source: 資料來源（用於錯誤訊息與記錄）
+
+    Returns:
+        EmissionFactorRegistry（含 checksum）
+
+    Raises:
+        EmissionFactorError: 資料格式錯誤
+    """
+    try:
+        registry = EmissionFactorRegistry(
+            data['versions'],
+            default_factor=data.get('default_factor', DEFAULT_EMISSION_FACTOR),
+            gwp_sets=data.get('gwp_sets'),
+            gases=data.get('gases', DEFAULT_GASES)
+        )
+    except (KeyError, TypeError) as e:
+        raise EmissionFactorError(f'Invalid emission factor data {source}: {e}')
+
+    registry.checksum = factor_checksum(data)
+    logger.info(f"Loaded emission factors from {source}: versions {registry.version_names}")
+    return registry
+
+
+def _read_factor_file(path: str = None) -> Tuple[Dict, str]:
+    path = os.path.join(BACKEND_DIR, path or EMISSION_FACTORS_FILE)
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f), path
+
+
+def load_factor_registry(path: str = None) -> EmissionFactorRegistry:
+    """
+    從資料檔載入排放係數登錄表
+
+    Args:
+        path: 資料檔路徑（預設為 EMISSION_FACTORS_FILE）
+
+    Returns:
+        EmissionFactorRegistry
+
+    Raises:
+        EmissionFactorError: 檔案格式錯誤
+    """
+    data, path = _read_factor_file(path)
+    return build_factor_registry(data, path)
+
+
+_registry: Optional[EmissionFactorRegistry] = None
+_registry_lock = threading.Lock()
+
+# 上次檢查共用係數表的時間（time.monotonic；None 表示尚未檢查）
+_synced_at: Optional[float] = None
+
+
+def get_factor_registry() -> EmissionFactorRegistry:
+    """取得程序內共用的排放係數登錄表（第一次呼叫時載入）"""
+    global _registry
+
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = load_factor_registry()
+
+    return _registry
+
+
+def reload_factor_registry(path: str = None) -> EmissionFactorRegistry:
+    """
+    重新載入排放係數資料檔（只更新本程序；多 worker 部署請用 publish_factor_registry）
+
+    Args:
+        path: 資料檔路徑（預設為 EMISSION_FACTORS_FILE）
+
+    Returns:
+        新的 EmissionFactorRegistry
+    """
+    global _registry
+
+    registry = load_factor_registry(path)
+    with _registry_lock:
+        _registry = registry
+
+    return registry
+
+
+def _fetch_published_registry(supabase, checksum: Optional[str] = None) -> Optional[EmissionFactorRegistry]:
+    """
+    讀取最新發佈的係數表
+
+    Args:
+        supabase: Supabase client
+        checksum: 本程序目前的 checksum（相同時不下載係數資料）
+
+    Returns:
+        最新發佈的登錄表；尚未發佈或與 checksum 相同時回傳 None
+    """
+    latest = supabase.table(FACTOR_TABLES_TABLE)\
+        .select('id, checksum')\
+        .order('id', desc=True)\
+        .limit(1)\
+        .execute()
+
+    if not latest.data or latest.data[0]['checksum'] == checksum:
+        return None
+
+    table_id = latest.data[0]['id']
+    result = supabase.table(FACTOR_TABLES_TABLE).select('data').eq('id', table_id).limit(1).execute()
+    return build_factor_registry(result.data[0]['data'], f'{FACTOR_TABLES_TABLE}#{table_id}')
+
+
+def sync_factor_registry(supabase) -> EmissionFactorRegistry:
+    """
+    依共用係數表同步本程序的登錄表（每 FACTOR_SYNC_INTERVAL 秒最多檢查一次）
+
+    Args:
+        supabase: Supabase client
+
+    Returns:
+        目前使用的 EmissionFactorRegistry
+    """
+    global _registry, _synced_at
+
+    now = time.monotonic()
+    with _registry_lock:
+        due = _synced_at is None or now - _synced_at >= FACTOR_SYNC_INTERVAL
+        if due:
+            _synced_at = now
+
+    current = get_factor_registry()
+    if not due:
+        return current
+
+    published = _fetch_published_registry(supabase, current.checksum)
+    if published is None:
+        return current
+
+    with _registry_lock:
+        _registry = published
+
+    logger.info(f"Synced emission factors {published.checksum[:12]} (was {(current.checksum or '')[:12]})")
+    return published
+
+
+def publish_factor_registry(
+    supabase,
+    path: str = None,
+    created_by: Optional[str] = None
+) -> Tuple[EmissionFactorRegistry, EmissionFactorRegistry]:
+    """
+    重新載入資料檔並發佈給所有 worker（其他 worker 在 FACTOR_SYNC_INTERVAL 內同步）
+
+    Args:
+        supabase: Supabase client
+        path: 資料檔路徑（預設為 EMISSION_FACTORS_FILE）
+        created_by: 發佈者 ID
+
+    Returns:
+        (發佈前的共用登錄表, 新的登錄表)；尚未發佈過時以本程序的登錄表為發佈前版本
+
+    Raises:
+        EmissionFactorError: 檔案格式錯誤
+    """
+    global _registry, _synced_at
+
+    previous = _fetch_published_registry(supabase) or get_factor_registry()
+
+    data, path = _read_factor_file(path)
+    registry = build_factor_registry(data, path)
+
+    if registry.checksum != previous.checksum:
+        supabase.table(FACTOR_TABLES_TABLE).insert({
+            'checksum': registry.checksum,
+            'data': data,
+            'created_by': created_by
+        }).execute()
+
+    with _registry_lock:
+        _registry = registry
+        _synced_at = time.monotonic()
+
+    return previous, registry
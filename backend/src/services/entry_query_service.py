@@ -0,0 +1,374 @@
+"""
+能源條目查詢服務
+管理端列表使用 keyset pagination（依 period_start, id 遞減排序），
+並支援欄位白名單投影（fields / include_payload）
+"""
+from typing import Dict, Any, Optional, Tuple, Sequence, List, Iterator, Iterable
+import base64
+import json
+import logging
+import uuid
+from datetime import date
+
+logger = logging.getLogger(__name__)
+
+# 管理端列表預設欄位
+ALL_ENTRIES_COLUMNS = (
+    '*',
+    'profiles!energy_entries_owner_id_fkey(display_name)',
+    'entry_reviews(*)'
+)
+USER_ENTRIES_COLUMNS = (
+    '*',
+    'entry_reviews(*)'
+)
+
+# 可透過 fields= 選取的欄位（不含 payload）
+ENTRY_FIELDS = (
+    'id', 'owner_id', 'page_key', 'category', 'scope',
+    'period_year', 'period_start', 'period_end',
+    'unit', 'amount', 'total_amount', 'status', 'is_locked', 'notes',
+    'reviewer_id', 'review_notes', 'reviewed_at', 'created_at', 'updated_at'
+)
+
+# 可透過 fields= 選取的關聯資料
+ENTRY_EMBEDS = {
+    'owner': 'profiles!energy_entries_owner_id_fkey(display_name)',
+    'reviews': 'entry_reviews(*)'
+}
+
+# 可透過 include_payload= 投影的 payload 頂層欄位（見 docs/data-contracts-v2.md）
+PAYLOAD_KEYS = (
+    'unit', 'monthly', 'records', 'groups', 'meters', 'msds', 'inspectionRecords', 'notes'
+)
+
+# keyset 游標需要的欄位，一律選取
+KEYSET_FIELDS = ('id', 'period_start')
+
+# payload 投影欄位的別名前綴，回傳前會重新組回 payload 物件
+PAYLOAD_ALIAS_PREFIX = 'payload__'
+
+# 串流輸出時每次向資料庫取的筆數
+STREAM_BATCH_SIZE = 500
+
+
+class EntryQueryError(ValueError):
+    """查詢參數錯誤"""
+    code = 'INVALID_QUERY'
+
+
+class InvalidCursorError(EntryQueryError):
+    """游標格式錯誤"""
+    code = 'INVALID_CURSOR'
+
+
+class InvalidFieldsError(EntryQueryError):
+    """欄位不在白名單內"""
+    code = 'INVALID_FIELDS'
+
+
+def _split_csv(value: str) -> List[str]:
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def build_entry_columns(
+    fields: Optional[str],
+    include_payload: Optional[str],
+    default_columns: Sequence[str]
+) -> Tuple[str, ...]:
+    """
+    將 fields / include_payload 參數轉換為 PostgREST select 欄位
+
+    Args:
+        fields: 逗號分隔的欄位名稱（ENTRY_FIELDS）或關聯名稱（ENTRY_EMBEDS）；
+                None 表示所有欄位及 default_columns 中的關聯
+        include_payload: 'true' 取完整 payload、'false' 不取、
+                         或逗號分隔的 PAYLOAD_KEYS（以 payload->key 投影）；
+                         None 時，未指定 fields 取完整 payload，指定 fields 則不取
+        default_columns: 兩個參數皆未提供時使用的欄位
+
+    Returns:
+        select 欄位 tuple
+
+    Raises:
+        InvalidFieldsError: 欄位不在白名單內
+    """
+    if fields is None and include_payload is None:
+        return tuple(default_columns)
+
+    if fields is None:
+        columns = list(ENTRY_FIELDS) + [column for column in default_columns if column != '*']
+        if include_payload is None:
+            include_payload = 'true'
+    else:
+        requested = _split_csv(fields)
+        unknown = [name for name in requested if name not in ENTRY_FIELDS and name not in ENTRY_EMBEDS]
+        if unknown:
+            raise InvalidFieldsError(f"Unknown fields: {', '.join(unknown)}")
+
+        columns = [name for name in KEYSET_FIELDS if name not in requested]
+        for name in dict.fromkeys(requested):
+            columns.append(ENTRY_EMBEDS.get(name, name))
+
+    payload_option = (include_payload or 'false').strip().lower()
+
+    if payload_option == 'true':
+        columns.append('payload')
+    elif payload_option != 'false':
+        keys = _split_csv(include_payload)
+        unknown = [key for key in keys if key not in PAYLOAD_KEYS]
+        if unknown:
+            raise InvalidFieldsError(f"Unknown payload keys: {', '.join(unknown)}")
+        for key in dict.fromkeys(keys):
+            columns.append(f'{PAYLOAD_ALIAS_PREFIX}{key}:payload->{key}')
+
+    return tuple(columns)
+
+
+def nest_payload_projection(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    將 payload->key 投影的別名欄位組回 payload 物件（保持與完整 payload 相同的結構）
+
+    Args:
+        rows: 查詢結果
+
+    Returns:
+        原地修改後的 rows
+    """
+    for row in rows:
+        projected = [key for key in row if key.startswith(PAYLOAD_ALIAS_PREFIX)]
+        if not projected:
+            continue
+
+        payload = {}
+        for alias in projected:
+            value = row.pop(alias)
+            if value is not None:
+                payload[alias[len(PAYLOAD_ALIAS_PREFIX):]] = value
+        row['payload'] = payload
+
+    return rows
+
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    """
+    將最後一筆資料的排序鍵編碼為游標
+
+    Args:
+        row: 條目資料（需包含 period_start 與 id）
+
+    Returns:
+        URL-safe base64 游標
+    """
+    raw = json.dumps([row['period_start'], row['id']], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    解碼游標
+
+    Args:
+        cursor: encode_cursor 產生的游標
+
+    Returns:
+        (period_start, id)
+
+    Raises:
+        InvalidCursorError: 游標格式錯誤
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        period_start, entry_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        # 驗證格式，避免游標內容被拼接進 PostgREST 篩選條件時造成注入
+        date.fromisoformat(period_start)
+        uuid.UUID(entry_id)
+    except Exception:
+        raise InvalidCursorError(f"Invalid cursor: {cursor}")
+
+    return period_start, entry_id
+
+
+def build_entries_query(
+    supabase,
+    columns: Sequence[str],
+    owner_id: Optional[str] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    category: Optional[str] = None,
+    count: Optional[str] = None,
+    head: bool = False
+):
+    """
+    建立套用篩選條件的 energy_entries 查詢
+
+    Args:
+        supabase: Supabase client
+        columns: select 欄位
+        owner_id: 用戶 ID（可選）
+        from_date: 起始日期（可選）
+        to_date: 結束日期（可選）
+        category: 類別（可選）
+        count: PostgREST count 方式（exact / planned / estimated）
+        head: 只取 count 不取資料
+
+    Returns:
+        PostgREST query builder
+    """
+    query = supabase.table('energy_entries').select(*columns, count=count, head=head)
+
+    if owner_id:
+        query = query.eq('owner_id', owner_id)
+    if from_date:
+        query = query.gte('period_start', str(from_date))
+    if to_date:
+        query = query.lte('period_start', str(to_date))
+    if category:
+        query = query.eq('category', category)
+
+    return query
+
+
+def apply_keyset(query, cursor: Optional[str], page_size: int):
+    """
+    套用 keyset 排序、游標條件與筆數限制（多取一筆判斷是否有下一頁）
+
+    Raises:
+        InvalidCursorError: 游標格式錯誤
+    """
+    if cursor:
+        period_start, entry_id = decode_cursor(cursor)
+        query = query.or_(
+            f'period_start.lt.{period_start},'
+            f'and(period_start.eq.{period_start},id.lt.{entry_id})'
+        )
+
+    return query.order('period_start', desc=True).order('id', desc=True).limit(page_size + 1)
+
+
+def list_entries_page(
+    supabase,
+    columns: Sequence[str] = ALL_ENTRIES_COLUMNS,
+    owner_id: Optional[str] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    category: Optional[str] = None,
+    page_size: int = 20,
+    cursor: Optional[str] = None,
+    include_total: bool = False
+) -> Dict[str, Any]:
+    """
+    取得一頁條目
+
+    Args:
+        supabase: Supabase client
+        columns: select 欄位
+        owner_id: 用戶 ID（可選）
+        from_date: 起始日期（可選）
+        to_date: 結束日期（可選）
+        category: 類別（可選）
+        page_size: 每頁筆數
+        cursor: 上一頁的 next_cursor（第一頁為 None）
+        include_total: 是否計算估計總筆數
+
+    Returns:
+        {'entries': list, 'next_cursor': Optional[str], 'total': Optional[int]}
+
+    Raises:
+        InvalidCursorError: 游標格式錯誤
+    """
+    filters = dict(owner_id=owner_id, from_date=from_date, to_date=to_date, category=category)
+
+    # 第一頁直接在同一查詢上計算總數；之後的頁面因游標條件需另外以 HEAD 查詢
+    count_inline = include_total and not cursor
+    query = build_entries_query(supabase, columns, count='estimated' if count_inline else None, **filters)
+    result = apply_keyset(query, cursor, page_size).execute()
+
+    rows = result.data or []
+    has_more = len(rows) > page_size
+    rows = nest_payload_projection(rows[:page_size])
+    next_cursor = encode_cursor(rows[-1]) if has_more else None
+
+    total = None
+    if count_inline:
+        total = result.count
+    elif include_total:
+        total = build_entries_query(supabase, ('id',), count='estimated', head=True, **filters).execute().count
+
+    logger.info(f"Listed {len(rows)} entries (owner: {owner_id}, has_more: {has_more})")
+
+    return {
+        'entries': rows,
+        'next_cursor': next_cursor,
+        'total': total
+    }
+
+
+def iter_entries(
+    supabase,
+    columns: Sequence[str] = ALL_ENTRIES_COLUMNS,
+    owner_id: Optional[str] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    category: Optional[str] = None,
+    cursor: Optional[str] = None,
+    batch_size: int = STREAM_BATCH_SIZE
+) -> Iterator[Dict[str, Any]]:
+    """
+    依 keyset 逐頁查詢並逐筆產出條目（記憶體中最多只保留一頁）
+
+    游標在呼叫時立即驗證，資料則在迭代時才查詢
+
+    Args:
+        supabase: Supabase client
+        columns: select 欄位
+        owner_id: 用戶 ID（可選）
+        from_date: 起始日期（可選）
+        to_date: 結束日期（可選）
+        category: 類別（可選）
+        cursor: 起始游標（可選）
+        batch_size: 每次查詢筆數
+
+    Returns:
+        條目 iterator
+
+    Raises:
+        InvalidCursorError: 游標格式錯誤
+    """
+    if cursor:
+        decode_cursor(cursor)
+
+    def generate():
+        next_cursor = cursor
+        while True:
+            page = list_entries_page(
+                supabase,
+                columns=columns,
+                owner_id=owner_id,
+                from_date=from_date,
+                to_date=to_date,
+                category=category,
+                page_size=batch_size,
+                cursor=next_cursor
+            )
+            yield from page['entries']
+
+            next_cursor = page['next_cursor']
+            if next_cursor is None:
+                return
+
+    return generate()
+
+
+def iter_ndjson(rows: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """
+    將資料逐筆轉為 NDJSON（每行一筆 JSON）
+
+    中途發生錯誤時輸出一行 {"error": ...} 後結束，讓客戶端能判斷資料不完整
+    """
+    try:
+        for row in rows:
+            yield json.dumps(row, ensure_ascii=False, default=str) + '\n'
+    except Exception as e:
+        logger.error(f"Error while streaming entries: {str(e)}")
+        yield json.dumps({'error': {'code': 'STREAM_ERROR', 'message': str(e)}}) + '\n'
@@ -5,6 +5,11 @@
 from typing import Dict, Any, Optional
 import logging
 from datetime import datetime, date
+from .rollup_service import record_rollup_write
+from .carbon_service import invalidate_entry_gas_breakdown
+from .recalculation_service import refresh_entry_emissions
+from .unit_service import normalize_entry_quantities
+from .bill_service import distribute_entry_bills
 
 logger = logging.getLogger(__name__)
 
@@ -110,6 +115,7 @@ def create_energy_entry(
         創建的條目數據（包含 entry_id）
 
     Raises:
+        BillDistributionError: 帳單日期格式錯誤
         Exception: 創建失敗時拋出異常，並自動回滾
     """
     created_entry_id = None
@@ -117,7 +123,6 @@ def create_energy_entry(
     try:
         # 1. 準備數據
         category = get_category_from_page_key(page_key)
-        amount = calculate_amount(monthly)
         period_start, period_end = get_period_dates(period_year)
 
         # 2. 合併所有數據到 payload（將 monthly 和 extraPayload 都放入 payload）
@@ -131,6 +136,17 @@ def create_energy_entry(
         if extraPayload is not None:
             final_payload.update(extraPayload)
 
+        # 帳單類型（外購電力、天然氣）由伺服器依帳單計算月份數據
+        distributed = distribute_entry_bills(page_key, period_year, final_payload, monthly)
+        if distributed is not None:
+            monthly = distributed
+            final_payload['monthly'] = monthly
+
+        # 換算為排放係數單位並保存換算後總量（unit 欄位與 amount 一致，原始單位留在 payload）
+        normalized = normalize_entry_quantities(page_key, unit, monthly, final_payload)
+        final_payload['normalized'] = normalized
+        amount = calculate_amount(normalized['monthly']) if monthly is not None else 0.0
+
         entry_data = {
             'owner_id': user_id,
             'page_key': page_key,
@@ -138,7 +154,7 @@ def create_energy_entry(
             'period_year': period_year,
             'period_start': period_start,
             'period_end': period_end,
-            'unit': unit,
+            'unit': normalized['unit'],
             'amount': amount,
             'notes': notes,
             'payload': final_payload,
@@ -165,6 +181,11 @@ def create_energy_entry(
 
         logger.info(f"Successfully created entry {created_entry_id}")
 
+        # 清除分氣體與組織彙總快取（upsert 可能覆寫既有條目）
+        invalidate_entry_gas_breakdown(created_entry_id)
+        record_rollup_write(created_entry_id, user_id)
+        refresh_entry_emissions(supabase, created_entry)
+
         return {
             'success': True,
             'entry_id': created_entry_id,
@@ -214,12 +235,13 @@ def update_energy_entry(
         更新結果
 
     Raises:
+        BillDistributionError: 帳單日期格式錯誤
         Exception: 更新失敗或權限不足時拋出異常
     """
     try:
         # 1. 驗證權限：檢查 entry 是否屬於該用戶
         existing = supabase.table('energy_entries')\
-            .select('id, owner_id, payload')\
+            .select('id, owner_id, page_key, period_year, unit, payload')\
             .eq('id', entry_id)\
             .single()\
             .execute()
@@ -233,10 +255,11 @@ def update_energy_entry(
         # 2. 準備更新數據
         update_data = {}
 
-        if monthly is not None:
-            # 更新 amount
-            update_data['amount'] = calculate_amount(monthly)
+        # 前端提交的 monthly 使用原始單位（unit 欄位已是換算後的單位）
+        existing_payload = existing.data.get('payload') or {}
+        source_unit = (existing_payload.get('normalized') or {}).get('source_unit') or existing.data.get('unit')
 
+        if monthly is not None:
             # 更新 payload 中的 monthly
             current_payload = existing.data.get('payload', {})
             current_payload['monthly'] = monthly
@@ -257,6 +280,28 @@ def update_energy_entry(
                 current_payload.update(extraPayload)
                 update_data['payload'] = current_payload
 
+        # 重新換算標準單位（amount 以換算後的 monthly 計算）
+        if 'payload' in update_data:
+            new_payload = update_data['payload']
+
+            # 帳單類型由伺服器依帳單重新計算月份數據
+            distributed = distribute_entry_bills(
+                existing.data.get('page_key'), existing.data.get('period_year'), new_payload, monthly
+            )
+            if distributed is not None:
+                monthly = distributed
+                new_payload['monthly'] = monthly
+
+            source_monthly = monthly if monthly is not None else new_payload.get('monthly')
+            normalized = normalize_entry_quantities(
+                existing.data.get('page_key'), source_unit, source_monthly, new_payload
+            )
+            new_payload['normalized'] = normalized
+
+            if monthly is not None:
+                update_data['unit'] = normalized['unit']
+                update_data['amount'] = calculate_amount(normalized['monthly'])
+
         if status is not None:
             update_data['status'] = status
 
@@ -272,6 +317,12 @@ def update_energy_entry(
 
         logger.info(f"Successfully updated entry {entry_id}")
 
+        # 清除分氣體與組織彙總快取
+        invalidate_entry_gas_breakdown(entry_id)
+        record_rollup_write(entry_id, user_id)
+        if 'payload' in update_data:
+            refresh_entry_emissions(supabase, {**existing.data, 'payload': update_data['payload']})
+
         return {
             'success': True,
             'entry_id': entry_id,
@@ -0,0 +1,1011 @@
+"""
+填報資料匯出服務
+在後端產生多工作表 Excel（對應前端 exportUtils.ts 的 generateMultiSheetExcel），
+使用 openpyxl write-only 模式逐列寫入，並依（用戶集合, 年度, 資料版本）快取產出的檔案；
+佐證檔案則以有上限的執行緒池並行下載，邊下載邊寫入 ZIP 串流
+"""
+from typing import Dict, Any, Optional, List, Iterator, Iterable, Sequence, Set, Callable, Tuple
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import io
+import logging
+import os
+import re
+import tempfile
+import time
+import uuid
+import zipfile
+from openpyxl import Workbook
+from .file_service import download_file_from_storage
+
+logger = logging.getLogger(__name__)
+
+# 匯出格式版本，轉換規則變更時需調整以淘汰舊快取
+EXPORT_FORMAT_VERSION = 1
+
+# 每次向資料庫取的條目筆數
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '200'))
+
+# 查詢 entry_files 時每批的 entry id 數量（避免 URL 過長）
+FILES_QUERY_CHUNK_SIZE = 100
+
+# 匯出檔快取目錄與保留時間（秒）
+EXPORT_CACHE_DIR = os.getenv('EXPORT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'energy-exports'))
+EXPORT_CACHE_TTL = int(os.getenv('EXPORT_CACHE_TTL_SECONDS', '86400'))
+
+# 同時下載的佐證檔案數
+EVIDENCE_DOWNLOAD_WORKERS = int(os.getenv('EVIDENCE_DOWNLOAD_WORKERS', '5'))
+
+# 串流複製檔案時每次讀取的位元組數
+STREAM_CHUNK_SIZE = 64 * 1024
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+ZIP_MIMETYPE = 'application/zip'
+
+FAILED_FILES_LIST_NAME = '下載失敗清單.txt'
+
+# 已壓縮的格式直接存放，不再 deflate
+STORED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif', 'webp', 'heic', 'heif', 'pdf', 'zip', 'xlsx', 'docx', 'pptx'}
+
+EXPORT_ENTRY_COLUMNS = 'id, owner_id, page_key, category, unit, period_year, payload'
+EXPORT_FILE_COLUMNS = (
+    'id, entry_id, owner_id, file_name, file_path, file_type, mime_type, file_size, '
+    'month, record_index, record_id, created_at'
+)
+
+# 工作表名稱（與前端 categoryNameMap 一致）
+CATEGORY_NAME_MAP = {
+    # 範疇一
+    'diesel': '柴油(移動源)',
+    'diesel_generator': '柴油(固定源)',
+    'gasoline': '汽油',
+    'natural_gas': '天然氣',
+    'lpg': '液化石油氣',
+    'acetylene': '乙炔',
+    'refrigerant': '冷媒',
+    'wd40': 'WD-40',
+    'urea': '尿素',
+    'fire_extinguisher': '滅火器',
+    'welding_rod': '焊條',
+    'gas_cylinder': '氣體鋼瓶',
+    'other_energy_sources': '其他使用能源',
+    'septic_tank': '化糞池',
+
+    # 範疇二
+    'electricity': '電費單',
+
+    # 範疇三
+    'employee_commute': '員工通勤'
+}
+
+DIESEL_GENERATOR_REFUEL_SHEET = '柴油發電機（加油）'
+DIESEL_GENERATOR_TEST_SHEET = '柴油發電機（測試）'
+
+# 英文月份縮寫（與前端 monthMap 一致）
+MONTH_ABBREVIATIONS = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12
+}
+
+GROUP_NUMBERS = ['第一組', '第二組', '第三組', '第四組', '第五組', '第六組', '第七組', '第八組', '第九組', '第十組']
+
+# 有 groupId 的頁面（汽油、柴油、柴油發電機加油版）及其記錄欄位
+GROUP_RECORD_KEYS = {
+    'gasoline': ('gasolineData',),
+    'diesel': ('dieselData',),
+    'diesel_generator': ('dieselGeneratorData',),
+}
+
+
+class ExportError(Exception):
+    """匯出失敗"""
+    pass
+
+
+class NoExportDataError(ExportError):
+    """沒有可匯出的資料"""
+    pass
+
+
+# ============================================================================
+# 佐證檔案命名（對應前端 smartFileRename / handleDuplicateFileName）
+# ============================================================================
+
+def _detect_month(file_name: str) -> Optional[str]:
+    """從檔名偵測月份，回傳「N月」"""
+    lower_name = file_name.lower()
+
+    match = re.search(r'([1-9]|1[0-2])月', lower_name)
+    if match:
+        return match.group(0)
+
+    match = re.search(r'(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)', lower_name)
+    if match:
+        return f"{MONTH_ABBREVIATIONS[match.group(1)]}月"
+
+    match = re.search(r'(?:^|_)(0[1-9]|1[0-2])(?:_|$)', lower_name)
+    if match:
+        return f"{int(match.group(1))}月"
+
+    return None
+
+
+def smart_file_rename(
+    original_file_name: str,
+    category_id: str,
+    file: Optional[Dict[str, Any]],
+    group_index: Optional[int] = None,
+    generator_location: Optional[str] = None,
+    month: Optional[int] = None
+) -> str:
+    """
+    依類別與檔案資訊產生易讀的佐證檔名
+
+    Args:
+        original_file_name: 原始檔名
+        category_id: page_key
+        file: entry_files 記錄
+        group_index: 組別編號（0 起算）
+        generator_location: 發電機位置
+        month: 月份（1-12）
+
+    Returns:
+        新檔名（保留原副檔名）
+    """
+    if not category_id:
+        return original_file_name
+
+    category_name = CATEGORY_NAME_MAP.get(category_id, category_id)
+    extension = original_file_name.rsplit('.', 1)[-1] or 'pdf'
+    lower_name = original_file_name.lower()
+
+    if file is None:
+        return f"{category_name}_資料.{extension}"
+
+    # 規則 1：MSDS 檔案
+    if file.get('file_type') == 'msds' or 'msds' in lower_name or 'sds' in lower_name or '安全' in lower_name:
+        return f"{category_name}_MSDS安全資料表.{extension}"
+
+    # 規則 2：柴油發電機測試版
+    if category_id == 'diesel_generator' and generator_location:
+        return f"{generator_location}_發電機佐證銘牌.{extension}"
+
+    # 規則 3：有組別的頁面
+    if category_id in GROUP_RECORD_KEYS and group_index is not None:
+        group_number = GROUP_NUMBERS[group_index] if group_index < len(GROUP_NUMBERS) else f"第{group_index + 1}組"
+        return f"{category_name}_{group_number}.{extension}"
+
+    # 規則 4：月份（優先使用參數，其次資料庫 month 欄位，最後從檔名偵測）
+    month_str = None
+    if month is not None and 1 <= month <= 12:
+        month_str = f"{month}月"
+    elif file.get('month') is not None and 1 <= file['month'] <= 12:
+        month_str = f"{file['month']}月"
+    else:
+        month_str = _detect_month(original_file_name)
+
+    if month_str:
+        return f"{category_name}_{month_str}_使用證明.{extension}"
+
+    # 規則 5：一般檔案
+    return f"{category_name}_資料.{extension}"
+
+
+def handle_duplicate_file_name(file_name: str, existing_names: Set[str]) -> str:
+    """處理重複檔名（第一個不加編號，之後依序加 _1, _2 ...），並記錄到 existing_names"""
+    final_name = file_name
+    counter = 1
+
+    while final_name in existing_names:
+        stem, dot, extension = file_name.rpartition('.')
+        if not dot:
+            final_name = f"{file_name}_{counter}"
+        else:
+            final_name = f"{stem}_{counter}.{extension}"
+        counter += 1
+
+    existing_names.add(final_name)
+    return final_name
+
+
+def format_file_names(files: Sequence[Dict[str, Any]], category_id: str, **context) -> str:
+    """將檔案列表轉為逗號分隔的檔名字串"""
+    existing_names: Set[str] = set()
+    return ', '.join(
+        handle_duplicate_file_name(
+            smart_file_rename(f.get('file_name') or '', category_id, f, **context),
+            existing_names
+        )
+        for f in files
+    )
+
+
+# ============================================================================
+# 條目轉換為 Excel 列（對應前端 convert*Entry）
+# ============================================================================
+
+def _to_number(value: Any) -> Optional[float]:
+    """轉換為數值（整數值保留 int），無法轉換時回傳 None"""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return int(number) if number.is_integer() else number
+
+
+def _month_sort_key(item) -> int:
+    try:
+        return int(item[0])
+    except (TypeError, ValueError):
+        return 0
+
+
+def _find_records(payload: Dict[str, Any], keys: Sequence[str]) -> List[Dict[str, Any]]:
+    """依序尋找 payload 中的記錄陣列（支援直接陣列或 {records: [...]}）"""
+    for key in keys:
+        data = payload.get(key)
+        if isinstance(data, dict):
+            data = data.get('records')
+        if isinstance(data, list) and data:
+            return data
+    return []
+
+
+def _group_index_map(records: Sequence[Dict[str, Any]]) -> Dict[str, int]:
+    """groupId → 組別編號（依第一次出現順序）"""
+    group_index_map: Dict[str, int] = {}
+    for record in records:
+        group_id = record.get('groupId')
+        if group_id and group_id not in group_index_map:
+            group_index_map[group_id] = len(group_index_map)
+    return group_index_map
+
+
+def _filter_files(files, file_type: Optional[str] = None, **fields) -> List[Dict[str, Any]]:
+    return [
+        f for f in files
+        if (file_type is None or f.get('file_type') == file_type)
+        and all(f.get(key) == value for key, value in fields.items())
+    ]
+
+
+def convert_diesel_entry(entry: Dict[str, Any], files: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """柴油、汽油、柴油發電機（加油版）：使用記錄格式"""
+    payload = entry.get('payload') or {}
+    records = _find_records(payload, ('gasolineData', 'dieselGeneratorData', 'dieselData', 'records'))
+    group_index_map = _group_index_map(records)
+
+    rows = []
+    for record in records:
+        quantity = _to_number(record.get('quantity'))
+        if not quantity or quantity <= 0:
+            continue
+
+        record_files = _filter_files(files, 'usage_evidence', record_id=record.get('id'))
+        group_index = group_index_map.get(record['groupId']) if record.get('groupId') else None
+
+        rows.append({
+            '日期': record.get('date') or '',
+            '使用量(L)': quantity,
+            '佐證檔案': format_file_names(record_files, entry['page_key'], group_index=group_index)
+        })
+
+    return rows
+
+
+def convert_diesel_generator_test_entry(entry: Dict[str, Any], files: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """柴油發電機測試版：每台發電機一列"""
+    payload = entry.get('payload') or {}
+    generators = payload.get('generators') or []
+
+    rows = []
+    for generator in generators:
+        generator_files = _filter_files(files, 'other', record_id=generator.get('id'))
+        rows.append({
+            '位置': generator.get('generatorLocation') or '',
+            '功率(kW)': generator.get('powerRating') or 0,
+            '測試頻率': generator.get('testFrequency') or '',
+            '測試時間(分)': generator.get('testDuration') or 0,
+            '年總測試時間(分)': generator.get('annualTestTime') or 0,
+            '佐證檔案': format_file_names(
+                generator_files, entry['page_key'],
+                generator_location=generator.get('generatorLocation')
+            )
+        })
+
+    return rows
+
+
+def convert_electricity_entry(entry: Dict[str, Any], files: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """電費單：電表 + 帳單格式"""
+    payload = entry.get('payload') or {}
+    bill_data = payload.get('billData') or []
+    meters = payload.get('meters') or []
+
+    if not isinstance(bill_data, list):
+        return []
+
+    meter_numbers = {meter.get('id'): meter.get('meterNumber') or '' for meter in meters}
+
+    return [
+        {
+            '電表電號': meter_numbers.get(bill.get('meterId') or '', ''),
+            '計費起日': bill.get('billingStartDate') or '',
+            '計費迄日': bill.get('billingEndDate') or '',
+            '使用度數': bill.get('billingUnits') or 0,
+            '佐證檔案': format_file_names(_filter_files(files, 'usage_evidence', record_index=index), entry['page_key'])
+        }
+        for index, bill in enumerate(bill_data)
+    ]
+
+
+def convert_natural_gas_entry(entry: Dict[str, Any], files: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """天然氣：帳單 + 熱值格式"""
+    payload = entry.get('payload') or {}
+    bill_data = payload.get('billData') or []
+    heat_value = payload.get('heatValue') or 0
+
+    if not isinstance(bill_data, list):
+        return []
+
+    # 熱值佐證（每筆帳單都顯示相同檔案）
+    heat_value_file_names = format_file_names(_filter_files(files, 'other'), entry['page_key'])
+
+    return [
+        {
+            '計費起日': bill.get('billingStartDate') or '',
+            '計費迄日': bill.get('billingEndDate') or '',
+            '使用度數': bill.get('billingUnits') or 0,
+            '熱值(kcal/m³)': heat_value,
+            '帳單佐證': format_file_names(_filter_files(files, 'usage_evidence', record_index=index), entry['page_key']),
+            '熱值佐證': heat_value_file_names
+        }
+        for index, bill in enumerate(bill_data)
+    ]
+
+
+def convert_capacity_quantity_entry(entry: Dict[str, Any], files: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """容量 + 數量格式（乙炔、WD-40、液化石油氣）"""
+    payload = entry.get('payload') or {}
+    page_key = entry['page_key']
+    unit_capacity = payload.get('unitCapacity') or 0
+    carbon_rate = _to_number(payload.get('carbonRate')) or 0
+    monthly_quantity = payload.get('monthlyQuantity') or {}
+    monthly = payload.get('monthly') or {}
+
+    unit_label = entry.get('unit') or 'kg'
+    if page_key == 'wd40':
+        quantity_unit, capacity_label = '罐', '單位容量'
+    else:
+        quantity_unit, capacity_label = '瓶', '單位重量'
+
+    capacity_column = f"{capacity_label}({unit_label}/{quantity_unit})"
+    quantity_column = f"使用數量({quantity_unit})"
+    total_column = f"總使用量({unit_label})"
+
+    rows = []
+    for month, quantity in sorted(monthly_quantity.items(), key=_month_sort_key):
+        quantity = _to_number(quantity)
+        if not quantity or quantity <= 0:
+            continue
+
+        month_number = int(month)
+        row = {
+            '月份': f"{month}月",
+            capacity_column: unit_capacity,
+            quantity_column: quantity,
+            total_column: _to_number(monthly.get(month) or 0)
+        }
+
+        # WD-40 需額外顯示含碳率
+        if page_key == 'wd40' and carbon_rate > 0:
+            row['含碳率(%)'] = carbon_rate
+
+        row['佐證檔案'] = format_file_names(
+            _filter_files(files, 'usage_evidence', month=month_number), page_key, month=month_number
+        )
+        rows.append(row)
+
+    return rows
+
+
+def convert_multi_record_entry(entry: Dict[str, Any], files: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """多記錄格式（冷媒、滅火器）"""
+    payload = entry.get('payload') or {}
+    page_key = entry['page_key']
+
+    if page_key == 'refrigerant':
+        records = _find_records(payload, ('refrigerantData',))
+        return [
+            {
+                '廠牌名稱': record.get('brandName') or '',
+                '型號': record.get('modelNumber') or '',
+                '設備位置': record.get('equipmentLocation') or '',
+                '冷媒類型': record.get('refrigerantType') or '',
+                '填充量': record.get('fillAmount') or 0,
+                '單位': record.get('unit') or 'kg',
+                '佐證檔案': format_file_names(_filter_files(files, 'other', record_id=record.get('id')), page_key)
+            }
+            for record in records
+        ]
+
+    if page_key == 'fire_extinguisher':
+        records = _find_records(payload, ('fireExtinguisherData',))
+
+        # 全年度共用的檢修表（沒有 record_id）
+        inspection_files = [f for f in files if f.get('file_type') == 'other' and not f.get('record_id')]
+        inspection_file_names = format_file_names(inspection_files, page_key)
+
+        return [
+            {
+                '設備類型': record.get('type') or '',
+                '數量': record.get('quantity') or 0,
+                '單位': record.get('unit') or '支',
+                '位置': record.get('location') or '',
+                '該年度是否填充': '是' if record.get('isRefilled') else '否',
+                '使用佐證': format_file_names(_filter_files(files, 'other', record_id=record.get('id')), page_key),
+                '安全檢修表佐證': inspection_file_names
+            }
+            for record in records
+        ]
+
+    return []
+
+
+def convert_simple_monthly_entry(entry: Dict[str, Any], files: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """純月份格式（化糞池等）"""
+    monthly = (entry.get('payload') or {}).get('monthly') or {}
+
+    rows = []
+    for month, value in sorted(monthly.items(), key=_month_sort_key):
+        value = _to_number(value)
+        if not value or value <= 0:
+            continue
+
+        month_number = int(month)
+        rows.append({
+            '月份': f"{month}月",
+            '使用量': value,
+            '佐證檔案': format_file_names(
+                _filter_files(files, 'usage_evidence', month=month_number), entry['page_key'], month=month_number
+            )
+        })
+
+    return rows
+
+
+def convert_urea_entry(entry: Dict[str, Any], files: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """尿素：使用記錄 + MSDS"""
+    usage_records = (entry.get('payload') or {}).get('usageRecords') or []
+    if not isinstance(usage_records, list):
+        return []
+
+    msds_file_names = format_file_names(_filter_files(files, 'msds'), entry['page_key'])
+
+    return [
+        {
+            '日期': record.get('date') or '',
+            '使用量(L)': record.get('quantity') or 0,
+            '使用佐證': format_file_names(
+                _filter_files(files, 'usage_evidence', record_id=record.get('id')), entry['page_key']
+            ),
+            'MSDS佐證': msds_file_names
+        }
+        for record in usage_records
+    ]
+
+
+def convert_welding_rod_entry(entry: Dict[str, Any], files: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """焊條：月份 + 單位重量 + 含碳率 + MSDS"""
+    payload = entry.get('payload') or {}
+    unit_capacity = payload.get('unitCapacity') or 0
+    carbon_rate = payload.get('carbonRate') or 0
+    monthly_quantity = payload.get('monthlyQuantity') or {}
+    monthly = payload.get('monthly') or {}
+
+    msds_file_names = format_file_names(_filter_files(files, 'msds'), entry['page_key'])
+
+    rows = []
+    for month, quantity in sorted(monthly_quantity.items(), key=_month_sort_key):
+        quantity = _to_number(quantity)
+        if not quantity or quantity <= 0:
+            continue
+
+        month_number = int(month)
+        rows.append({
+            '月份': f"{month}月",
+            '單位重量(kg/支)': unit_capacity,
+            '含碳率(%)': carbon_rate,
+            '使用數量(支)': quantity,
+            '總使用量(kg)': _to_number(monthly.get(month) or 0),
+            '使用佐證': format_file_names(
+                _filter_files(files, 'usage_evidence', month=month_number), entry['page_key'], month=month_number
+            ),
+            '檢修報告': msds_file_names
+        })
+
+    return rows
+
+
+def convert_employee_commute_entry(entry: Dict[str, Any], files: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """員工通勤：純月份格式（保留 0 值，不顯示佐證檔案）"""
+    monthly = (entry.get('payload') or {}).get('monthly') or {}
+
+    return [
+        {'月份': f"{month}月", '使用量': _to_number(value)}
+        for month, value in sorted(monthly.items(), key=_month_sort_key)
+        if value is not None and value != ''
+    ]
+
+
+# page_key → 轉換函數（未列出的頁面使用純月份格式）
+ENTRY_CONVERTERS: Dict[str, Callable] = {
+    'diesel': convert_diesel_entry,
+    'gasoline': convert_diesel_entry,
+    'electricity': convert_electricity_entry,
+    'natural_gas': convert_natural_gas_entry,
+    'acetylene': convert_capacity_quantity_entry,
+    'wd40': convert_capacity_quantity_entry,
+    'lpg': convert_capacity_quantity_entry,
+    'refrigerant': convert_multi_record_entry,
+    'fire_extinguisher': convert_multi_record_entry,
+    'urea': convert_urea_entry,
+    'welding_rod': convert_welding_rod_entry,
+    'employee_commute': convert_employee_commute_entry,
+}
+
+
+def convert_entry(entry: Dict[str, Any], files: Sequence[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    將條目轉換為 Excel 列
+
+    Returns:
+        {工作表名稱: 列}；柴油發電機依 mode 分到加油 / 測試兩個工作表
+    """
+    page_key = entry.get('page_key') or 'unknown'
+
+    try:
+        if page_key == 'diesel_generator':
+            if (entry.get('payload') or {}).get('mode') == 'test':
+                return {DIESEL_GENERATOR_TEST_SHEET: convert_diesel_generator_test_entry(entry, files)}
+            return {DIESEL_GENERATOR_REFUEL_SHEET: convert_diesel_entry(entry, files)}
+
+        converter = ENTRY_CONVERTERS.get(page_key, convert_simple_monthly_entry)
+        return {CATEGORY_NAME_MAP.get(page_key, page_key): converter(entry, files)}
+    except Exception as e:
+        logger.warning(f"Failed to convert entry {entry.get('id')} ({page_key}): {str(e)}")
+        return {}
+
+
+# ============================================================================
+# 資料讀取
+# ============================================================================
+
+def _build_export_query(supabase, columns: str, user_ids: Sequence[str], year: int, page_key: Optional[str], **select_options):
+    query = supabase.table('energy_entries')\
+        .select(columns, **select_options)\
+        .in_('owner_id', list(user_ids))\
+        .eq('period_year', year)
+
+    if page_key:
+        query = query.eq('page_key', page_key)
+
+    return query
+
+
+def count_export_entries(supabase, user_ids: Sequence[str], year: int, page_key: Optional[str] = None) -> int:
+    """計算符合匯出條件的條目數"""
+    result = _build_export_query(supabase, 'id', user_ids, year, page_key, count='exact', head=True).execute()
+    return result.count or 0
+
+
+def iter_export_entries(
+    supabase,
+    user_ids: Sequence[str],
+    year: int,
+    page_key: Optional[str] = None,
+    batch_size: int = EXPORT_BATCH_SIZE
+) -> Iterator[Dict[str, Any]]:
+    """依 page_key 排序逐批讀取條目（同一類別的條目連續出現）"""
+    offset = 0
+    while True:
+        result = _build_export_query(supabase, EXPORT_ENTRY_COLUMNS, user_ids, year, page_key)\
+            .order('page_key')\
+            .order('id')\
+            .range(offset, offset + batch_size - 1)\
+            .execute()
+
+        rows = result.data or []
+        yield from rows
+
+        if len(rows) < batch_size:
+            return
+        offset += batch_size
+
+
+def get_files_by_entry(supabase, entry_ids: Sequence[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """批次查詢多筆條目的佐證檔案（依上傳時間遞減，與前端 getEntryFiles 相同）"""
+    files_by_entry: Dict[str, List[Dict[str, Any]]] = {entry_id: [] for entry_id in entry_ids}
+
+    for start in range(0, len(entry_ids), FILES_QUERY_CHUNK_SIZE):
+        chunk = list(entry_ids[start:start + FILES_QUERY_CHUNK_SIZE])
+        result = supabase.table('entry_files')\
+            .select(EXPORT_FILE_COLUMNS)\
+            .in_('entry_id', chunk)\
+            .order('created_at', desc=True)\
+            .execute()
+
+        for file in result.data or []:
+            files_by_entry.setdefault(file['entry_id'], []).append(file)
+
+    return files_by_entry
+
+
+def _iter_page_key_groups(entries: Iterator[Dict[str, Any]]) -> Iterator[List[Dict[str, Any]]]:
+    """將依 page_key 排序的條目切成同類別的群組"""
+    group: List[Dict[str, Any]] = []
+    for entry in entries:
+        if group and entry.get('page_key') != group[0].get('page_key'):
+            yield group
+            group = []
+        group.append(entry)
+    if group:
+        yield group
+
+
+def get_export_data_version(supabase, user_ids: Sequence[str], year: int, page_key: Optional[str] = None) -> str:
+    """
+    計算匯出資料版本
+
+    由條目數、最後更新時間與佐證檔案數、最後上傳時間組成，任何新增、修改、刪除都會改變版本
+    """
+    entries_result = _build_export_query(supabase, 'updated_at', user_ids, year, page_key, count='exact')\
+        .order('updated_at', desc=True)\
+        .limit(1)\
+        .execute()
+
+    files_result = supabase.table('entry_files')\
+        .select('created_at', count='exact')\
+        .in_('owner_id', list(user_ids))\
+        .order('created_at', desc=True)\
+        .limit(1)\
+        .execute()
+
+    parts = [
+        EXPORT_FORMAT_VERSION,
+        entries_result.count,
+        entries_result.data[0]['updated_at'] if entries_result.data else None,
+        files_result.count,
+        files_result.data[0]['created_at'] if files_result.data else None
+    ]
+    return hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()[:16]
+
+
+# ============================================================================
+# Excel 產生與快取
+# ============================================================================
+
+def _collect_headers(rows: Sequence[Dict[str, Any]]) -> List[str]:
+    """依出現順序合併所有列的欄位（與 XLSX.utils.json_to_sheet 相同）"""
+    headers: Dict[str, None] = {}
+    for row in rows:
+        for key in row:
+            headers.setdefault(key, None)
+    return list(headers)
+
+
+def write_entries_workbook(
+    supabase,
+    user_ids: Sequence[str],
+    year: int,
+    output_path: str,
+    page_key: Optional[str] = None
+) -> int:
+    """
+    產生多工作表 Excel 並寫入 output_path
+
+    使用 write-only 工作簿，記憶體中只保留目前處理中的類別
+
+    Returns:
+        工作表數量
+
+    Raises:
+        NoExportDataError: 沒有任何可匯出的資料
+    """
+    workbook = Workbook(write_only=True)
+    sheet_count = 0
+
+    for group in _iter_page_key_groups(iter_export_entries(supabase, user_ids, year, page_key)):
+        files_by_entry = get_files_by_entry(supabase, [entry['id'] for entry in group])
+
+        sheets: Dict[str, List[Dict[str, Any]]] = {}
+        for entry in group:
+            for sheet_name, rows in convert_entry(entry, files_by_entry.get(entry['id'], [])).items():
+                sheets.setdefault(sheet_name, []).extend(rows)
+
+        for sheet_name, rows in sheets.items():
+            if not rows:
+                logger.info(f"Export sheet {sheet_name} has no rows, skipped")
+                continue
+
+            headers = _collect_headers(rows)
+            sheet = workbook.create_sheet(title=sheet_name[:31])
+            sheet.append(headers)
+            for row in rows:
+                sheet.append([row.get(header) for header in headers])
+            sheet_count += 1
+
+    if sheet_count == 0:
+        raise NoExportDataError('沒有可匯出的資料')
+
+    workbook.save(output_path)
+    return sheet_count
+
+
+def _cache_key(user_ids: Sequence[str], year: int, page_key: Optional[str] = None) -> str:
+    raw = f"{year}:{page_key or '*'}:{','.join(sorted(set(user_ids)))}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+
+def _prune_export_cache(cache_key: str, keep_path: str) -> None:
+    """移除同一組條件的舊版本與過期的匯出檔"""
+    now = time.time()
+    for name in os.listdir(EXPORT_CACHE_DIR):
+        path = os.path.join(EXPORT_CACHE_DIR, name)
+        if path == keep_path:
+            continue
+        try:
+            if name.startswith(cache_key) or now - os.path.getmtime(path) > EXPORT_CACHE_TTL:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def get_or_build_entries_export(
+    supabase,
+    user_ids: Sequence[str],
+    year: int,
+    page_key: Optional[str] = None
+) -> str:
+    """
+    取得匯出 Excel 檔路徑（相同用戶集合、年度與資料版本時直接使用快取）
+
+    Args:
+        supabase: Supabase client
+        user_ids: 用戶 ID 列表
+        year: 填報年度
+        page_key: 只匯出指定類別（可選）
+
+    Returns:
+        Excel 檔案路徑
+
+    Raises:
+        NoExportDataError: 沒有任何可匯出的資料
+    """
+    os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
+
+    cache_key = _cache_key(user_ids, year, page_key)
+    data_version = get_export_data_version(supabase, user_ids, year, page_key)
+    cache_path = os.path.join(EXPORT_CACHE_DIR, f"{cache_key}_{data_version}.xlsx")
+
+    if os.path.exists(cache_path):
+        logger.info(f"Export cache hit: {cache_key} (version {data_version})")
+        return cache_path
+
+    # 先寫入暫存檔再原子性改名，避免併發請求讀到寫一半的檔案
+    tmp_path = os.path.join(EXPORT_CACHE_DIR, f".{cache_key}_{uuid.uuid4().hex}.tmp")
+    try:
+        sheet_count = write_entries_workbook(supabase, user_ids, year, tmp_path, page_key)
+        os.replace(tmp_path, cache_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    logger.info(f"Export built: {cache_key} (version {data_version}, {sheet_count} sheets)")
+    _prune_export_cache(cache_key, cache_path)
+    return cache_path
+
+
+# ============================================================================
+# 佐證檔案 ZIP 串流（對應前端 exportUserEntriesWithFiles / exportSingleCategoryWithFiles）
+# ============================================================================
+
+def build_file_naming_context(entry: Dict[str, Any], file: Dict[str, Any]) -> Dict[str, Any]:
+    """依條目內容計算佐證檔名需要的組別、發電機位置與月份"""
+    page_key = entry.get('page_key')
+    payload = entry.get('payload') or {}
+    context: Dict[str, Any] = {}
+
+    if page_key == 'diesel_generator' and payload.get('mode') == 'test':
+        for generator in payload.get('generators') or []:
+            if generator.get('id') == file.get('record_id') and generator.get('generatorLocation'):
+                context['generator_location'] = generator['generatorLocation']
+                break
+    elif page_key in GROUP_RECORD_KEYS:
+        records = _find_records(payload, GROUP_RECORD_KEYS[page_key])
+        group_index_map = _group_index_map(records)
+        for record in records:
+            if record.get('id') == file.get('record_id'):
+                if record.get('groupId') in group_index_map:
+                    context['group_index'] = group_index_map[record['groupId']]
+                break
+
+    month = file.get('month')
+    if month is not None and 1 <= month <= 12:
+        context['month'] = month
+
+    return context
+
+
+def iter_evidence_files(
+    supabase,
+    user_ids: Sequence[str],
+    year: int,
+    page_key: Optional[str] = None
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    逐類別產生 (ZIP 內路徑, entry_files 記錄)
+
+    路徑為「類別名稱/新檔名」，新檔名依 smart_file_rename 規則產生且全域不重複
+    """
+    existing_names: Set[str] = set()
+
+    for group in _iter_page_key_groups(iter_export_entries(supabase, user_ids, year, page_key)):
+        files_by_entry = get_files_by_entry(supabase, [entry['id'] for entry in group])
+
+        for entry in group:
+            category_id = entry.get('page_key') or 'unknown'
+            folder = CATEGORY_NAME_MAP.get(category_id, category_id)
+
+            for file in files_by_entry.get(entry['id'], []):
+                new_name = smart_file_rename(
+                    file.get('file_name') or '', category_id, file,
+                    **build_file_naming_context(entry, file)
+                )
+                yield f"{folder}/{handle_duplicate_file_name(new_name, existing_names)}", file
+
+
+def download_evidence(supabase, file: Dict[str, Any]) -> bytes:
+    """
+    下載單一佐證檔案
+
+    Raises:
+        ExportError: 檔案路徑無效或檔案為空
+    """
+    file_path = file.get('file_path')
+    if not file_path or file_path in ('null', 'undefined'):
+        raise ExportError('檔案路徑無效')
+    if file.get('file_size') == 0:
+        raise ExportError('檔案大小為 0')
+
+    content = download_file_from_storage(supabase, file_path)
+    if not content:
+        raise ExportError('下載的檔案大小為 0')
+    return content
+
+
+def iter_downloaded_evidence(
+    supabase,
+    tasks: Iterable[Tuple[str, Dict[str, Any]]],
+    max_workers: int = EVIDENCE_DOWNLOAD_WORKERS
+) -> Iterator[Tuple[str, Dict[str, Any], Optional[bytes], Optional[str]]]:
+    """
+    並行下載佐證檔案，依輸入順序產出 (路徑, 記錄, 內容, 錯誤訊息)
+
+    同時最多只有 max_workers * 2 個檔案在下載或等待寫出，記憶體用量有上限
+    """
+    max_pending = max_workers * 2
+    pending: deque = deque()
+
+    def collect(item):
+        arcname, file, future = item
+        try:
+            return arcname, file, future.result(), None
+        except Exception as e:
+            logger.warning(f"Failed to download evidence {file.get('file_path')}: {str(e)}")
+            return arcname, file, None, str(e)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='evidence-export')
+    try:
+        for arcname, file in tasks:
+            pending.append((arcname, file, executor.submit(download_evidence, supabase, file)))
+            if len(pending) >= max_pending:
+                yield collect(pending.popleft())
+
+        while pending:
+            yield collect(pending.popleft())
+    finally:
+        # 客戶端中斷時取消尚未開始的下載
+        for _, _, future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+class _ZipStreamBuffer(io.RawIOBase):
+    """ZipFile 的輸出目標（不可 seek），暫存寫入的位元組供串流取出"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _compress_type(arcname: str) -> int:
+    extension = arcname.rsplit('.', 1)[-1].lower()
+    return zipfile.ZIP_STORED if extension in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+
+def stream_evidence_zip(
+    supabase,
+    user_ids: Sequence[str],
+    year: int,
+    page_key: Optional[str] = None,
+    include_excel: bool = True
+) -> Iterator[bytes]:
+    """
+    產生佐證檔案 ZIP 串流
+
+    佐證檔案依類別放在「類別名稱/」資料夾，下載完成一個就寫出一個；
+    最後加入填報資料 Excel 與下載失敗清單（若有）
+
+    Args:
+        supabase: Supabase client
+        user_ids: 用戶 ID 列表
+        year: 填報年度
+        page_key: 只匯出指定類別（可選）
+        include_excel: 是否附上填報資料 Excel
+
+    Returns:
+        ZIP 位元組 iterator
+    """
+    buffer = _ZipStreamBuffer()
+    failures: List[str] = []
+    success_count = 0
+
+    with zipfile.ZipFile(buffer, mode='w') as archive:
+        try:
+            tasks = iter_evidence_files(supabase, user_ids, year, page_key)
+            for arcname, file, content, error in iter_downloaded_evidence(supabase, tasks):
+                if error:
+                    failures.append(f"{file.get('file_name')}: {error}")
+                    continue
+
+                archive.writestr(arcname, content, compress_type=_compress_type(arcname))
+                success_count += 1
+                yield buffer.drain()
+
+            if include_excel:
+                try:
+                    excel_path = get_or_build_entries_export(supabase, user_ids, year, page_key)
+                    with open(excel_path, 'rb') as source, archive.open(f"能源填報資料_{year}.xlsx", 'w') as target:
+                        for chunk in iter(lambda: source.read(STREAM_CHUNK_SIZE), b''):
+                            target.write(chunk)
+                            yield buffer.drain()
+                except NoExportDataError:
+                    logger.info('Evidence export has no Excel rows, skipped workbook')
+        except Exception as e:
+            # 已送出的資料無法收回，改以失敗清單註記並正常結束 ZIP
+            logger.error(f"Evidence export interrupted: {str(e)}")
+            failures.append(f"匯出中斷: {str(e)}")
+
+        if failures:
+            archive.writestr(FAILED_FILES_LIST_NAME, '\n'.join(failures))
+
+    logger.info(f"Evidence export finished: {success_count} files, {len(failures)} failures")
+    yield buffer.drain()
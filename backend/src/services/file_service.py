@@ -2,12 +2,16 @@
 檔案上傳服務
 包含 pseudo-transaction 模式的錯誤回滾機制
 """
-from typing import Dict, Any, Optional, BinaryIO
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, List, Optional, BinaryIO, Sequence, Tuple, Union
+import hashlib
 import logging
 import os
+import tempfile
 import time
 import re
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
 logger = logging.getLogger(__name__)
 
@@ -32,6 +36,26 @@ ALLOWED_MIME_TYPES = {
 # 檔案大小限制（10MB）
 MAX_FILE_SIZE = 10 * 1024 * 1024
 
+# 串流上傳每次讀取的大小（每個上傳請求在記憶體中只保留一個區塊）
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', str(64 * 1024)))
+
+# multipart 請求中檔案以外欄位（邊界、元數據）的容許大小
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+
+# 內容定址的共用檔案（參考計數由 entry_files 觸發器維護）
+BLOBS_TABLE = 'evidence_blobs'
+
+# ref_count 歸零的 blob 保留多久才清除（涵蓋上傳中、尚未建立記錄的檔案）與每次清除的上限
+BLOB_SWEEP_GRACE_SECONDS = int(os.getenv('BLOB_SWEEP_GRACE_SECONDS', '3600'))
+BLOB_SWEEP_BATCH_SIZE = int(os.getenv('BLOB_SWEEP_BATCH_SIZE', '200'))
+
+# 預覽縮圖最長邊像素（縮圖路徑含此大小）
+THUMBNAIL_SIZE = int(os.getenv('THUMBNAIL_SIZE', '320'))
+
+# 批次上傳的檔案數上限與同時上傳到 Storage 的執行緒數
+MAX_BATCH_FILES = int(os.getenv('MAX_BATCH_UPLOAD_FILES', '20'))
+BATCH_UPLOAD_WORKERS = int(os.getenv('BATCH_UPLOAD_WORKERS', '4'))
+
 
 def validate_file_size(file_size: int) -> None:
     """
@@ -50,6 +74,56 @@ def validate_file_size(file_size: int) -> None:
         raise ValueError("File is empty")
 
 
+@contextmanager
+def spool_upload_stream(
+    stream: BinaryIO,
+    max_size: int = MAX_FILE_SIZE,
+    chunk_size: int = UPLOAD_CHUNK_SIZE
+) -> Iterator[Tuple[BinaryIO, int, str]]:
+    """
+    以固定大小區塊讀取上傳串流並暫存到磁碟
+
+    讀取時即檢查大小（超過上限立即中止）並計算 SHA-256；暫存檔以唯讀檔案物件
+    交給 Storage client 串流送出，離開 with 區塊時刪除
+
+    Args:
+        stream: 上傳檔案串流（例如: FileStorage.stream）
+        max_size: 檔案大小上限（bytes）
+        chunk_size: 每次讀取的大小
+
+    Yields:
+        (暫存檔案物件, 檔案大小, SHA-256 十六進位摘要)
+
+    Raises:
+        ValueError: 檔案過大或為空檔案
+    """
+    fd, spool_path = tempfile.mkstemp(prefix='evidence-upload-')
+    try:
+        file_size = 0
+        digest = hashlib.sha256()
+        with os.fdopen(fd, 'wb') as spool:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                file_size += len(chunk)
+                if file_size > max_size:
+                    raise ValueError(f"File size exceeds maximum limit of {max_size / 1024 / 1024}MB")
+                digest.update(chunk)
+                spool.write(chunk)
+
+        validate_file_size(file_size)
+
+        with open(spool_path, 'rb') as spooled:
+            yield spooled, file_size, digest.hexdigest()
+
+    finally:
+        try:
+            os.remove(spool_path)
+        except OSError as e:
+            logger.warning(f"Failed to remove upload spool {spool_path}: {str(e)}")
+
+
 def validate_file_type(mime_type: str, filename: str) -> str:
     """
     驗證檔案類型
@@ -184,9 +258,147 @@ def generate_file_path(
     return path
 
 
+def get_blob_path(user_id: str, content_sha256: str) -> str:
+    """
+    取得內容定址的儲存路徑（以用戶 ID 為第一層，沿用 Storage 的擁有者權限規則）
+
+    Args:
+        user_id: 用戶 ID
+        content_sha256: 檔案內容 SHA-256
+
+    Returns:
+        檔案路徑：{user_id}/blobs/{sha256 前兩碼}/{sha256}
+    """
+    return f"{user_id}/blobs/{content_sha256[:2]}/{content_sha256}"
+
+
+def get_thumbnail_path(file_path: str, size: int = THUMBNAIL_SIZE) -> str:
+    """
+    取得預覽縮圖的儲存路徑（由原檔路徑決定，以用戶 ID 為第一層）
+
+    Args:
+        file_path: 原檔儲存路徑
+        size: 縮圖最長邊像素
+
+    Returns:
+        縮圖路徑：{user_id}/_derivatives/{原檔路徑其餘部分}/thumb-{size}.webp
+    """
+    owner, _, rest = file_path.partition('/')
+    return f"{owner}/_derivatives/{rest}/thumb-{size}.webp"
+
+
+def find_evidence_blob(supabase, user_id: str, content_sha256: str) -> Optional[Dict[str, Any]]:
+    """
+    查詢用戶是否已有相同內容的檔案
+
+    Args:
+        supabase: Supabase client
+        user_id: 用戶 ID
+        content_sha256: 檔案內容 SHA-256
+
+    Returns:
+        blob 記錄（仍被參考時）；否則回傳 None
+    """
+    result = supabase.table(BLOBS_TABLE)\
+        .select('storage_path, ref_count')\
+        .eq('owner_id', user_id)\
+        .eq('sha256', content_sha256)\
+        .limit(1)\
+        .execute()
+
+    blob = result.data[0] if result.data else None
+    return blob if blob and blob.get('ref_count', 0) > 0 else None
+
+
+def _remove_blob_objects(supabase, storage_paths: Sequence[str]) -> None:
+    paths = [path for storage_path in storage_paths for path in (storage_path, get_thumbnail_path(storage_path))]
+    try:
+        supabase.storage.from_('evidence').remove(paths)
+        logger.info(f"Removed {len(storage_paths)} unreferenced blob(s) from storage")
+    except Exception as e:
+        logger.warning(f"Failed to remove unreferenced blobs {list(storage_paths)}: {str(e)}")
+
+
+def sweep_unreferenced_blobs(
+    supabase,
+    grace_seconds: int = BLOB_SWEEP_GRACE_SECONDS,
+    limit: int = BLOB_SWEEP_BATCH_SIZE
+) -> int:
+    """
+    清除 ref_count 已歸零一段時間的 blob
+
+    刪除檔案記錄（後端 delete_evidence_file、前端直接刪除 entry_files、刪除 energy_entries
+    連帶刪除）或上傳失敗交出的檔案（abandon_evidence_blobs）都只會讓 ref_count 歸零，由此定期清除。
+    保留期間可避免同時進行的去重上傳（看到 ref_count > 0 而略過寫入）指向已刪除的 Storage 物件
+
+    Args:
+        supabase: Supabase client
+        grace_seconds: 歸零後保留的秒數
+        limit: 本次最多清除的數量
+
+    Returns:
+        清除的 blob 數量
+    """
+    cutoff = (datetime.now(timezone.utc) - timedelta(seconds=grace_seconds)).isoformat()
+
+    candidates = supabase.table(BLOBS_TABLE)\
+        .select('sha256')\
+        .eq('ref_count', 0)\
+        .lt('updated_at', cutoff)\
+        .order('updated_at')\
+        .limit(limit)\
+        .execute()
+
+    digests = sorted({blob['sha256'] for blob in candidates.data or []})
+    if not digests:
+        return 0
+
+    # 條件刪除：期間內又被參考（ref_count > 0 或 updated_at 更新）的 blob 不會被刪
+    result = supabase.table(BLOBS_TABLE)\
+        .delete()\
+        .in_('sha256', digests)\
+        .eq('ref_count', 0)\
+        .lt('updated_at', cutoff)\
+        .execute()
+
+    removed = result.data or []
+    if removed:
+        _remove_blob_objects(supabase, [blob['storage_path'] for blob in removed])
+    return len(removed)
+
+
+def abandon_evidence_blobs(supabase, user_id: str, blobs: Sequence[Tuple[str, str, int]]) -> None:
+    """
+    上傳失敗時交出已寫入的內容定址檔案（不直接刪除 Storage 物件）
+
+    是否已有其他上傳的記錄參考同一 blob 無法在這裡原子地判斷，因此只補上
+    ref_count 為 0 的 blob 記錄（已存在時不變），由 ref_count 歸零的清理流程處理
+
+    Args:
+        supabase: Supabase client
+        user_id: 用戶 ID
+        blobs: [(content_sha256, storage_path, file_size)]
+    """
+    if not blobs:
+        return
+
+    try:
+        supabase.table(BLOBS_TABLE).upsert(
+            [
+                {'owner_id': user_id, 'sha256': sha256, 'storage_path': path, 'file_size': size, 'ref_count': 0}
+                for sha256, path, size in blobs
+            ],
+            on_conflict='owner_id,sha256',
+            ignore_duplicates=True
+        ).execute()
+        logger.warning(f"Rolling back: left {len(blobs)} content-addressed file(s) for unreferenced blob cleanup")
+    except Exception as rollback_error:
+        logger.error(f"Rollback failed: {str(rollback_error)}")
+
+
 def upload_file_to_storage(
     supabase,
-    file_data: bytes,
+    file_data: Union[bytes, BinaryIO],
     file_path: str,
     mime_type: str
 ) -> Dict[str, Any]:
@@ -195,7 +407,7 @@ def upload_file_to_storage(
 
     Args:
         supabase: Supabase client
-        file_data: 檔案二進制數據
+        file_data: 檔案二進制數據，或已開啟的檔案物件（由 Storage client 分塊串流送出）
         file_path: 儲存路徑
         mime_type: MIME 類型
 
@@ -225,6 +437,58 @@ def upload_file_to_storage(
         raise Exception(f"Failed to upload file to storage: {str(e)}")
 
 
+def download_file_from_storage(supabase, file_path: str) -> bytes:
+    """
+    從 Supabase Storage 下載檔案
+
+    Args:
+        supabase: Supabase client
+        file_path: 儲存路徑
+
+    Returns:
+        檔案二進制數據
+
+    Raises:
+        Exception: 下載失敗
+    """
+    try:
+        return supabase.storage.from_('evidence').download(file_path)
+    except Exception as e:
+        logger.error(f"Storage download failed: {file_path}: {str(e)}")
+        raise Exception(f"Failed to download file from storage: {str(e)}")
+
+
+def build_file_record(
+    user_id: str,
+    entry_id: str,
+    file_path: str,
+    filename: str,
+    mime_type: str,
+    file_size: int,
+    page_key: str,
+    file_type: str,
+    month: Optional[int] = None,
+    record_id: Optional[str] = None,
+    content_sha256: Optional[str] = None
+) -> Dict[str, Any]:
+    """組合 entry_files 資料列（參數同 create_file_record）"""
+    file_record = {
+        'owner_id': user_id,
+        'entry_id': entry_id,
+        'file_path': file_path,
+        'file_name': filename,
+        'mime_type': mime_type,
+        'file_size': file_size,
+        'page_key': page_key,
+        'file_type': file_type,
+        'month': month,
+        'record_id': record_id
+    }
+    if content_sha256:
+        file_record['content_sha256'] = content_sha256
+    return file_record
+
+
 def create_file_record(
     supabase,
     user_id: str,
@@ -236,7 +500,8 @@ def create_file_record(
     page_key: str,
     file_type: str,
     month: Optional[int] = None,
-    record_id: Optional[str] = None
+    record_id: Optional[str] = None,
+    content_sha256: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     建立檔案資料庫記錄
@@ -253,6 +518,7 @@ def create_file_record(
         file_type: 檔案類型
         month: 月份（可選）
         record_id: 記錄 ID（可選）
+        content_sha256: 檔案內容 SHA-256（內容定址檔案）
 
     Returns:
         建立的檔案記錄
@@ -260,18 +526,19 @@ def create_file_record(
     Raises:
         Exception: 建立失敗
     """
-    file_record = {
-        'owner_id': user_id,
-        'entry_id': entry_id,
-        'file_path': file_path,
-        'file_name': filename,
-        'mime_type': mime_type,
-        'file_size': file_size,
-        'page_key': page_key,
-        'file_type': file_type,
-        'month': month,
-        'record_id': record_id
-    }
+    file_record = build_file_record(
+        user_id=user_id,
+        entry_id=entry_id,
+        file_path=file_path,
+        filename=filename,
+        mime_type=mime_type,
+        file_size=file_size,
+        page_key=page_key,
+        file_type=file_type,
+        month=month,
+        record_id=record_id,
+        content_sha256=content_sha256
+    )
 
     logger.info(f"Creating file record for user {user_id}")
 
@@ -290,7 +557,7 @@ def upload_evidence_file(
     supabase,
     user_id: str,
     entry_id: str,
-    file_data: bytes,
+    file_data: Union[bytes, BinaryIO],
     filename: str,
     file_size: int,
     mime_type: str,
@@ -299,16 +566,20 @@ def upload_evidence_file(
     file_type: str,
     standard: str = '64',
     month: Optional[int] = None,
-    record_id: Optional[str] = None
+    record_id: Optional[str] = None,
+    content_sha256: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     上傳證據檔案（使用 pseudo-transaction 模式）
 
+    檔案依內容 SHA-256 存放；同一用戶已有相同內容時不寫入 Storage，
+    只建立指向共用檔案的記錄
+
     Args:
         supabase: Supabase client
         user_id: 用戶 ID
         entry_id: 能源條目 ID
-        file_data: 檔案二進制數據
+        file_data: 檔案二進制數據或檔案物件（見 spool_upload_stream）
         filename: 原始檔案名稱
         file_size: 檔案大小（bytes）
         mime_type: MIME 類型
@@ -318,9 +589,10 @@ def upload_evidence_file(
         standard: ISO 標準代碼
         month: 月份（可選）
         record_id: 記錄 ID（可選）
+        content_sha256: 檔案內容 SHA-256（檔案物件須提供，bytes 會自動計算）
 
     Returns:
-        建立的檔案記錄（包含 file_id）
+        建立的檔案記錄（包含 file_id、deduplicated）
 
     Raises:
         Exception: 上傳失敗時拋出異常，並自動回滾
@@ -332,38 +604,49 @@ def upload_evidence_file(
         validate_file_size(file_size)
         validated_mime_type = validate_file_type(mime_type, filename)
 
-        # 2. 生成檔案路徑
-        file_path = generate_file_path(
-            user_id=user_id,
-            page_key=page_key,
-            standard=standard,
-            filename=filename,
-            month=month
-        )
-
-        # 3. 上傳到 Storage
-        upload_result = upload_file_to_storage(
-            supabase=supabase,
-            file_data=file_data,
-            file_path=file_path,
-            mime_type=validated_mime_type
-        )
-
-        uploaded_file_path = upload_result['path']
+        # 2. 決定檔案路徑：有內容摘要時使用內容定址路徑
+        if content_sha256 is None and isinstance(file_data, (bytes, bytearray)):
+            content_sha256 = hashlib.sha256(file_data).hexdigest()
+
+        deduplicated = False
+        if content_sha256:
+            file_path = get_blob_path(user_id, content_sha256)
+            deduplicated = find_evidence_blob(supabase, user_id, content_sha256) is not None
+        else:
+            file_path = generate_file_path(
+                user_id=user_id,
+                page_key=page_key,
+                standard=standard,
+                filename=filename,
+                month=month
+            )
+
+        # 3. 上傳到 Storage（相同內容已存在時略過）
+        if deduplicated:
+            logger.info(f"Reusing stored blob for duplicate upload: {file_path}")
+        else:
+            upload_result = upload_file_to_storage(
+                supabase=supabase,
+                file_data=file_data,
+                file_path=file_path,
+                mime_type=validated_mime_type
+            )
+            uploaded_file_path = upload_result['path']
 
         # 4. 建立資料庫記錄
         file_record = create_file_record(
             supabase=supabase,
             user_id=user_id,
             entry_id=entry_id,
-            file_path=uploaded_file_path,
+            file_path=file_path,
             filename=filename,
             mime_type=validated_mime_type,
             file_size=file_size,
             page_key=page_key,
             file_type=file_type,
             month=month,
-            record_id=record_id
+            record_id=record_id,
+            content_sha256=content_sha256
         )
 
         return {
@@ -371,32 +654,212 @@ def upload_evidence_file(
             'file_id': file_record['id'],
             'file_path': file_record['file_path'],
             'file_name': file_record['file_name'],
-            'file_size': file_record['file_size']
+            'file_size': file_record['file_size'],
+            'mime_type': file_record['mime_type'],
+            'deduplicated': deduplicated
         }
 
     except Exception as e:
         logger.error(f"Error uploading file: {str(e)}")
 
-        # 5. 錯誤回滾：如果上傳了檔案，刪除它
-        if uploaded_file_path:
-            try:
-                logger.warning(f"Rolling back: deleting file from storage {uploaded_file_path}")
-                supabase.storage.from_('evidence').remove([uploaded_file_path])
-                logger.info(f"Successfully rolled back file {uploaded_file_path}")
-            except Exception as rollback_error:
-                logger.error(f"Rollback failed: {str(rollback_error)}")
+        # 5. 錯誤回滾：如果上傳了檔案，刪除它（內容定址檔案可能已被其他記錄參考，不直接刪除）
+        if uploaded_file_path and content_sha256:
+            abandon_evidence_blobs(supabase, user_id, [(content_sha256, uploaded_file_path, file_size)])
+        elif uploaded_file_path:
+            rollback_uploaded_files(supabase, [uploaded_file_path])
 
         # 重新拋出原始錯誤
         raise
 
 
+def rollback_uploaded_files(supabase, file_paths: Sequence[str]) -> None:
+    """
+    錯誤回滾：從 Storage 刪除本次上傳寫入的檔案
+
+    Args:
+        supabase: Supabase client
+        file_paths: 本次寫入的儲存路徑
+    """
+    if not file_paths:
+        return
+
+    try:
+        logger.warning(f"Rolling back: deleting {len(file_paths)} file(s) from storage {list(file_paths)}")
+        supabase.storage.from_('evidence').remove(list(file_paths))
+        logger.info(f"Successfully rolled back {len(file_paths)} file(s)")
+    except Exception as rollback_error:
+        logger.error(f"Rollback failed: {str(rollback_error)}")
+
+
+def upload_evidence_batch(
+    supabase,
+    user_id: str,
+    items: Sequence[Dict[str, Any]],
+    max_workers: int = BATCH_UPLOAD_WORKERS
+) -> List[Dict[str, Any]]:
+    """
+    批次上傳證據檔案（全部成功或全部回滾）
+
+    先驗證全部檔案，再以有上限的執行緒池平行上傳到 Storage（同一批次或已存在的
+    相同內容只寫入一次），最後一次 insert 全部 entry_files 記錄；任一步驟失敗時
+    回滾本批次已寫入的檔案（內容定址檔案見 abandon_evidence_blobs）
+
+    Args:
+        supabase: Supabase client
+        user_id: 用戶 ID
+        items: 檔案列表，每筆含 upload_evidence_file 的參數
+               （file_data, filename, file_size, mime_type, content_sha256, page_key,
+               period_year, file_type, standard, month, entry_id, record_id）
+        max_workers: 同時上傳的執行緒數
+
+    Returns:
+        每個檔案的上傳結果（順序同 items）
+
+    Raises:
+        ValueError: 檔案數超過上限或任一檔案驗證失敗
+        Exception: 上傳或建立記錄失敗（已回滾）
+    """
+    if not items:
+        raise ValueError("No files provided")
+    if len(items) > MAX_BATCH_FILES:
+        raise ValueError(f"Too many files: {len(items)} (maximum {MAX_BATCH_FILES})")
+
+    # 1. 驗證全部檔案
+    mime_types = []
+    for index, item in enumerate(items):
+        try:
+            validate_file_size(item['file_size'])
+            mime_types.append(validate_file_type(item.get('mime_type') or '', item['filename']))
+        except ValueError as e:
+            raise ValueError(f"File {index + 1} ({item['filename']}): {str(e)}")
+
+    # 2. 決定路徑：一次查詢已存在的相同內容，同批次相同內容只上傳一次
+    digests = [
+        item.get('content_sha256') or (
+            hashlib.sha256(item['file_data']).hexdigest()
+            if isinstance(item['file_data'], (bytes, bytearray)) else None
+        )
+        for item in items
+    ]
+    known = sorted({digest for digest in digests if digest})
+    stored = set()
+    if known:
+        result = supabase.table(BLOBS_TABLE)\
+            .select('sha256, ref_count')\
+            .eq('owner_id', user_id)\
+            .in_('sha256', known)\
+            .execute()
+        stored = {blob['sha256'] for blob in result.data or [] if blob.get('ref_count', 0) > 0}
+
+    file_paths = []
+    writes = {}
+    for index, (item, digest) in enumerate(zip(items, digests)):
+        if digest:
+            file_path = get_blob_path(user_id, digest)
+        else:
+            file_path = generate_file_path(
+                user_id=user_id,
+                page_key=item['page_key'],
+                standard=item.get('standard') or '64',
+                filename=item['filename'],
+                month=item.get('month')
+            )
+        file_paths.append(file_path)
+        if digest not in stored and file_path not in writes:
+            writes[file_path] = index
+
+    uploaded_paths: List[str] = []
+
+    try:
+        # 3. 平行上傳到 Storage
+        if writes:
+            executor = ThreadPoolExecutor(
+                max_workers=max(1, min(max_workers, len(writes))),
+                thread_name_prefix='evidence-upload'
+            )
+            try:
+                futures = {
+                    file_path: executor.submit(
+                        upload_file_to_storage, supabase, items[index]['file_data'], file_path, mime_types[index]
+                    )
+                    for file_path, index in writes.items()
+                }
+                errors = []
+                for file_path, future in futures.items():
+                    try:
+                        uploaded_paths.append(future.result()['path'])
+                    except Exception as e:
+                        errors.append(f"{items[writes[file_path]]['filename']}: {str(e)}")
+            finally:
+                executor.shutdown(wait=True)
+
+            if errors:
+                raise Exception(f"Failed to upload {len(errors)} file(s) to storage: {'; '.join(errors)}")
+
+        # 4. 一次建立全部檔案記錄
+        records = [
+            build_file_record(
+                user_id=user_id,
+                entry_id=item.get('entry_id'),
+                file_path=file_path,
+                filename=item['filename'],
+                mime_type=mime_type,
+                file_size=item['file_size'],
+                page_key=item['page_key'],
+                file_type=item['file_type'],
+                month=item.get('month'),
+                record_id=item.get('record_id'),
+                content_sha256=digest
+            )
+            for item, file_path, mime_type, digest in zip(items, file_paths, mime_types, digests)
+        ]
+
+        logger.info(f"Creating {len(records)} file records for user {user_id}")
+        result = supabase.table('entry_files').insert(records).execute()
+        if not result.data or len(result.data) != len(records):
+            raise Exception("Failed to create file records: no data returned")
+
+    except Exception as e:
+        logger.error(f"Error uploading file batch: {str(e)}")
+        # 內容定址檔案交給 ref_count 歸零的清理流程，其他檔案直接刪除
+        written = set(uploaded_paths)
+        abandon_evidence_blobs(supabase, user_id, [
+            (digests[index], file_path, items[index]['file_size'])
+            for file_path, index in writes.items()
+            if file_path in written and digests[index]
+        ])
+        rollback_uploaded_files(supabase, [
+            file_path for file_path, index in writes.items()
+            if file_path in written and not digests[index]
+        ])
+        raise
+
+    logger.info(
+        f"Batch uploaded {len(items)} files for user {user_id}: "
+        f"{len(uploaded_paths)} written, {len(items) - len(uploaded_paths)} deduplicated"
+    )
+
+    return [
+        {
+            'success': True,
+            'file_id': record['id'],
+            'file_path': record['file_path'],
+            'file_name': record['file_name'],
+            'file_size': record['file_size'],
+            'mime_type': record['mime_type'],
+            'deduplicated': file_path not in writes or writes[file_path] != index
+        }
+        for index, (record, file_path) in enumerate(zip(result.data, file_paths))
+    ]
+
+
 def delete_evidence_file(
     supabase,
     user_id: str,
     file_id: str
 ) -> Dict[str, Any]:
     """
-    刪除證據檔案
+    刪除證據檔案（內容定址檔案在最後一筆參考刪除後才移除 Storage 物件）
 
     Args:
         supabase: Supabase client
@@ -412,7 +875,7 @@ def delete_evidence_file(
     try:
         # 1. 驗證權限：檢查檔案是否屬於該用戶
         existing = supabase.table('entry_files')\
-            .select('id, owner_id, file_path')\
+            .select('id, owner_id, file_path, content_sha256')\
             .eq('id', file_id)\
             .single()\
             .execute()
@@ -424,11 +887,22 @@ def delete_evidence_file(
             raise Exception(f"Permission denied: file does not belong to user")
 
         file_path = existing.data['file_path']
+        content_sha256 = existing.data.get('content_sha256')
+
+        if content_sha256:
+            # 共用檔案：只刪除記錄（觸發器遞減參考計數），Storage 物件由 sweep_unreferenced_blobs 過保留期後清除
+            logger.info(f"Deleting file record: {file_id}")
+            supabase.table('entry_files').delete().eq('id', file_id).execute()
+
+            return {
+                'success': True,
+                'file_id': file_id
+            }
 
         # 2. 從 Storage 刪除檔案
         try:
             logger.info(f"Deleting file from storage: {file_path}")
-            supabase.storage.from_('evidence').remove([file_path])
+            supabase.storage.from_('evidence').remove([file_path, get_thumbnail_path(file_path)])
             logger.info(f"Successfully deleted from storage: {file_path}")
         except Exception as storage_error:
             logger.warning(f"Storage deletion failed (continuing): {str(storage_error)}")
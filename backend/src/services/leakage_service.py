@@ -0,0 +1,461 @@
+"""
+冷媒與六氟化硫逸散排放計算服務
+
+讀取冷媒 (refrigerant) 與 SF6 條目 payload 中的設備記錄，依冷媒種類查詢 GWP、
+依設備類別套用年洩漏率；所有條目的所有設備一次以陣列運算完成
+"""
+import json
+import logging
+import os
+import re
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .carbon_service import round_emissions, DEFAULT_GWP_SET
+from .emission_factor_service import BACKEND_DIR, EmissionFactorError, UnknownGwpSetError
+
+logger = logging.getLogger(__name__)
+
+# 冷媒 GWP 與設備洩漏率資料檔（相對路徑以 backend 目錄為基準）
+REFRIGERANTS_FILE = os.getenv('REFRIGERANTS_FILE', os.path.join('data', 'refrigerants.json'))
+
+# 逸散排放條目：page_key → payload 中的設備記錄欄位（與前端一致）
+LEAKAGE_RECORD_FIELDS = {
+    'refrigerant': 'refrigerantData',
+    'sf6': 'sf6Data',
+}
+
+# 每批讀取的條目數
+LEAKAGE_QUERY_BATCH_SIZE = 500
+
+LEAKAGE_ENTRY_COLUMNS = 'id, owner_id, page_key, period_year, payload'
+
+
+def normalize_refrigerant_name(name: Any) -> str:
+    """
+    正規化冷媒名稱（R-410A、r410a、410A 視為相同）
+
+    Args:
+        name: 冷媒名稱
+
+    Returns:
+        正規化後的名稱（大寫、去除空白與連字號，數字開頭補 R）
+    """
+    normalized = re.sub(r'[\s_\-]', '', str(name or '').upper())
+    if normalized[:1].isdigit():
+        normalized = f'R{normalized}'
+    return normalized
+
+
+class RefrigerantTable:
+    """
+    冷媒 GWP 與設備洩漏率查詢表
+
+    - gwp_table: (冷媒數 × GWP 版本數) 矩陣，由組成比例矩陣 × 成分 GWP 矩陣一次算出
+    - leakage_rates: 各設備類別的年洩漏率
+    """
+
+    def __init__(
+        self,
+        components: Dict[str, Dict[str, float]],
+        refrigerants: Dict[str, Dict[str, float]],
+        equipment_classes: Dict[str, Dict[str, Any]],
+        default_equipment_class: str,
+        sf6_equipment_class: str
+    ):
+        """
+        Args:
+            components: 成分 GWP {成分: {GWP 版本: GWP}}
+            refrigerants: 冷媒組成 {冷媒: {成分: 重量比例}}
+            equipment_classes: 設備類別 {類別: {label, leakage_rate, keywords}}
+            default_equipment_class: 無法辨識設備類型時使用的類別
+            sf6_equipment_class: SF6 設備使用的類別
+
+        Raises:
+            EmissionFactorError: 資料格式錯誤
+        """
+        if not components or not refrigerants or not equipment_classes:
+            raise EmissionFactorError('Refrigerant table requires components, refrigerants and equipment classes')
+
+        component_names = list(components)
+        component_index = {name: index for index, name in enumerate(component_names)}
+        self.gwp_set_names = list(next(iter(components.values())))
+        self._gwp_index = {name: index for index, name in enumerate(self.gwp_set_names)}
+
+        component_gwp = np.zeros((len(component_names), len(self.gwp_set_names)), dtype=np.float64)
+        for row, name in enumerate(component_names):
+            if set(components[name]) != set(self.gwp_set_names):
+                raise EmissionFactorError(f'Component {name} must define GWP for {self.gwp_set_names}')
+            component_gwp[row] = [components[name][gwp_set] for gwp_set in self.gwp_set_names]
+
+        # 組成比例矩陣 (冷媒 × 成分)
+        self.refrigerant_names = list(refrigerants)
+        composition = np.zeros((len(self.refrigerant_names), len(component_names)), dtype=np.float64)
+        for row, name in enumerate(self.refrigerant_names):
+            for component, fraction in refrigerants[name].items():
+                if component not in component_index:
+                    raise EmissionFactorError(f'Unknown refrigerant component: {component}')
+                composition[row, component_index[component]] = float(fraction)
+
+        self.gwp_table = composition @ component_gwp
+
+        # 名稱索引；單一成分的冷媒也可用成分名稱查詢（例如 HFC-134a）
+        self._refrigerant_index: Dict[str, int] = {}
+        for row, name in enumerate(self.refrigerant_names):
+            self._refrigerant_index[normalize_refrigerant_name(name)] = row
+            if len(refrigerants[name]) == 1:
+                self._refrigerant_index.setdefault(normalize_refrigerant_name(next(iter(refrigerants[name]))), row)
+
+        # 設備類別與關鍵字（較長的關鍵字優先比對）
+        self.equipment_class_names = list(equipment_classes)
+        self.equipment_class_labels = [equipment_classes[name].get('label', name) for name in self.equipment_class_names]
+        self.leakage_rates = np.array(
+            [float(equipment_classes[name]['leakage_rate']) for name in self.equipment_class_names],
+            dtype=np.float64
+        )
+        self._class_index = {name: index for index, name in enumerate(self.equipment_class_names)}
+        self._keywords: List[Tuple[str, int]] = sorted(
+            (
+                (keyword.lower(), index)
+                for index, name in enumerate(self.equipment_class_names)
+                for keyword in [name, equipment_classes[name].get('label', name)] + equipment_classes[name].get('keywords', [])
+            ),
+            key=lambda item: len(item[0]),
+            reverse=True
+        )
+
+        for name in (default_equipment_class, sf6_equipment_class):
+            if name not in self._class_index:
+                raise EmissionFactorError(f'Unknown equipment class: {name}')
+        self.default_class_index = self._class_index[default_equipment_class]
+        self.sf6_class_index = self._class_index[sf6_equipment_class]
+
+    def refrigerant_index(self, name: Any) -> int:
+        """取得冷媒的列索引；找不到時回傳 -1"""
+        return self._refrigerant_index.get(normalize_refrigerant_name(name), -1)
+
+    def equipment_class_index(self, equipment_type: Any) -> Tuple[int, bool]:
+        """
+        依設備類型文字比對設備類別
+
+        Args:
+            equipment_type: 設備類型（前端自由輸入，例如「分離式冷氣」）
+
+        Returns:
+            (類別索引, 是否比對成功)；比對失敗時使用預設類別
+        """
+        text = str(equipment_type or '').strip().lower()
+        if text:
+            for keyword, index in self._keywords:
+                if keyword in text:
+                    return index, True
+        return self.default_class_index, False
+
+    def gwp_column(self, gwp_set: str) -> int:
+        """
+        取得 GWP 版本的欄位索引
+
+        Raises:
+            UnknownGwpSetError: GWP 版本不存在
+        """
+        if gwp_set not in self._gwp_index:
+            raise UnknownGwpSetError(f'Unknown GWP set: {gwp_set}')
+        return self._gwp_index[gwp_set]
+
+
+def load_refrigerant_table(path: str = None) -> RefrigerantTable:
+    """
+    從資料檔載入冷媒查詢表
+
+    Args:
+        path: 資料檔路徑（預設為 REFRIGERANTS_FILE）
+
+    Returns:
+        RefrigerantTable
+
+    Raises:
+        EmissionFactorError: 檔案格式錯誤
+    """
+    path = os.path.join(BACKEND_DIR, path or REFRIGERANTS_FILE)
+
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    try:
+        table = RefrigerantTable(
+            data['components'],
+            data['refrigerants'],
+            data['equipment_classes'],
+            data['default_equipment_class'],
+            data['sf6_equipment_class']
+        )
+    except EmissionFactorError:
+        raise
+    except (KeyError, TypeError, ValueError) as e:
+        raise EmissionFactorError(f'Invalid refrigerant file {path}: {e}')
+
+    logger.info(f"Loaded refrigerant table from {path}: {len(table.refrigerant_names)} refrigerants")
+    return table
+
+
+_table: Optional[RefrigerantTable] = None
+_table_lock = threading.Lock()
+
+
+def get_refrigerant_table() -> RefrigerantTable:
+    """取得程序內共用的冷媒查詢表（第一次呼叫時載入）"""
+    global _table
+
+    if _table is None:
+        with _table_lock:
+            if _table is None:
+                _table = load_refrigerant_table()
+
+    return _table
+
+
+def _to_float(value: Any) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _device_records(entry: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """取得條目的設備記錄（支援直接陣列或 {records: [...]}）"""
+    payload = entry.get('payload') or {}
+    data = payload.get(LEAKAGE_RECORD_FIELDS.get(entry.get('page_key'), ''))
+    if data is None:
+        data = payload.get('records')
+    if isinstance(data, dict):
+        data = data.get('records')
+    return data if isinstance(data, list) else []
+
+
+def calculate_leakage_emissions(
+    entries: Sequence[Dict[str, Any]],
+    gwp_set: str = None,
+    include_devices: bool = True
+) -> Dict[str, Any]:
+    """
+    計算多筆冷媒 / SF6 條目的逸散排放
+
+    排放量 = 填充量 (kg) × 年洩漏率 × GWP；所有設備攤平成陣列後一次計算，
+    再依條目加總
+
+    Args:
+        entries: energy_entries 資料（需含 id、owner_id、page_key、period_year、payload）
+        gwp_set: GWP 版本（預設 DEFAULT_GWP_SET）
+        include_devices: 是否回傳每台設備的明細
+
+    Returns:
+        {
+            'gwp_set': str,
+            'entries': [{
+                'entry_id', 'owner_id', 'page_key', 'year',
+                'device_count', 'total_emission', 'unknown_refrigerants', 'devices'(選填)
+            }, ...],
+            'device_count': int,
+            'total_emission': float
+        }
+
+    Raises:
+        UnknownGwpSetError: GWP 版本不存在
+    """
+    table = get_refrigerant_table()
+    gwp_set = gwp_set or DEFAULT_GWP_SET
+    gwp_column = table.gwp_column(gwp_set)
+
+    # 1. 攤平所有設備
+    entry_rows: List[int] = []
+    refrigerant_rows: List[int] = []
+    class_rows: List[int] = []
+    class_matched: List[bool] = []
+    charges: List[float] = []
+    rate_overrides: List[float] = []
+    device_info: List[Tuple[Any, str]] = []
+
+    for entry_row, entry in enumerate(entries):
+        is_sf6 = entry.get('page_key') == 'sf6'
+
+        for record in _device_records(entry):
+            if is_sf6:
+                # SF6 重量以公克填寫、洩漏率以百分比填寫
+                refrigerant_type = 'SF6'
+                charge = _to_float(record.get('sf6Weight')) / 1000
+                leakage_percent = _to_float(record.get('leakageRate'))
+                class_index, matched = table.sf6_class_index, True
+                rate_overrides.append(leakage_percent / 100 if leakage_percent > 0 else np.nan)
+            else:
+                refrigerant_type = record.get('refrigerantType') or ''
+                charge = _to_float(record.get('fillAmount'))
+                if record.get('unit') == 'gram':
+                    charge /= 1000
+                class_index, matched = table.equipment_class_index(record.get('equipmentType'))
+                rate_overrides.append(np.nan)
+
+            entry_rows.append(entry_row)
+            refrigerant_rows.append(table.refrigerant_index(refrigerant_type))
+            class_rows.append(class_index)
+            class_matched.append(matched)
+            charges.append(charge)
+            device_info.append((record.get('id'), refrigerant_type))
+
+    # 2. 向量化計算：洩漏量 × GWP
+    entry_index = np.array(entry_rows, dtype=np.intp)
+    refrigerant_index = np.array(refrigerant_rows, dtype=np.intp)
+    class_index = np.array(class_rows, dtype=np.intp)
+    overrides = np.array(rate_overrides, dtype=np.float64)
+
+    known = refrigerant_index >= 0
+    rates = np.where(np.isnan(overrides), table.leakage_rates[class_index], overrides)
+    gwp = np.where(known, table.gwp_table[np.maximum(refrigerant_index, 0), gwp_column], 0.0)
+    leaked = np.array(charges, dtype=np.float64) * rates
+    emissions = round_emissions(leaked * gwp)
+
+    entry_totals = round_emissions(np.bincount(entry_index, weights=emissions, minlength=len(entries)))
+    device_counts = np.bincount(entry_index, minlength=len(entries))
+
+    # 3. 組合結果
+    results = []
+    for entry_row, entry in enumerate(entries):
+        results.append({
+            'entry_id': entry.get('id'),
+            'owner_id': entry.get('owner_id'),
+            'page_key': entry.get('page_key'),
+            'year': entry.get('period_year'),
+            'device_count': int(device_counts[entry_row]),
+            'total_emission': float(entry_totals[entry_row]),
+            'unknown_refrigerants': []
+        })
+        if include_devices:
+            results[-1]['devices'] = []
+
+    for row, (record_id, refrigerant_type) in enumerate(device_info):
+        result = results[entry_index[row]]
+
+        if not known[row] and refrigerant_type not in result['unknown_refrigerants']:
+            result['unknown_refrigerants'].append(refrigerant_type)
+
+        if include_devices:
+            result['devices'].append({
+                'record_id': record_id,
+                'refrigerant_type': refrigerant_type,
+                'refrigerant_known': bool(known[row]),
+                'equipment_class': table.equipment_class_names[class_index[row]],
+                'equipment_class_matched': class_matched[row],
+                'charge_kg': round(float(charges[row]), 6),
+                'leakage_rate': float(rates[row]),
+                'leaked_kg': round(float(leaked[row]), 6),
+                'gwp': float(gwp[row]),
+                'emission': float(emissions[row])
+            })
+
+    unknown = sorted({name for result in results for name in result['unknown_refrigerants']})
+    if unknown:
+        logger.warning(f"Unknown refrigerant types (emission counted as 0): {unknown}")
+
+    return {
+        'gwp_set': gwp_set,
+        'entries': results,
+        'device_count': len(device_info),
+        'total_emission': round(float(entry_totals.sum()), 2)
+    }
+
+
+def get_leakage_monthly_emissions(
+    entries: Sequence[Dict[str, Any]],
+    gwp_set: str = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    取得有設備記錄的冷媒 / SF6 條目的各月逸散排放，供範疇一彙總取代「數量 × 排放係數」
+
+    年排放平均分攤到 12 個月（洩漏率為年率），四捨五入的尾差計入 12 月，各月加總等於
+    calculate_leakage_emissions 的條目總量；沒有設備記錄的條目不在結果中
+
+    Args:
+        entries: 條目列表（需含 page_key、payload）
+        gwp_set: GWP 版本（預設 DEFAULT_GWP_SET）
+
+    Returns:
+        (條目列索引, (列數 × 12) 各月排放)
+    """
+    rows = np.array([
+        row for row, entry in enumerate(entries)
+        if entry.get('page_key') in LEAKAGE_RECORD_FIELDS and _device_records(entry)
+    ], dtype=np.intp)
+
+    if not len(rows):
+        return rows, np.zeros((0, 12))
+
+    result = calculate_leakage_emissions([entries[row] for row in rows], gwp_set, include_devices=False)
+    totals = np.array([item['total_emission'] for item in result['entries']], dtype=np.float64)
+
+    monthly = np.repeat(round_emissions(totals / 12)[:, None], 12, axis=1)
+    monthly[:, -1] = round_emissions(totals - monthly[:, :-1].sum(axis=1))
+    return rows, monthly
+
+
+def iter_leakage_entries(
+    supabase,
+    year: int,
+    owner_ids: Optional[Sequence[str]] = None,
+    batch_size: int = LEAKAGE_QUERY_BATCH_SIZE
+) -> Iterator[Dict[str, Any]]:
+    """逐批讀取指定年份的冷媒 / SF6 條目"""
+    offset = 0
+    while True:
+        query = supabase.table('energy_entries')\
+            .select(LEAKAGE_ENTRY_COLUMNS)\
+            .in_('page_key', list(LEAKAGE_RECORD_FIELDS))\
+            .eq('period_year', year)
+
+        if owner_ids:
+            query = query.in_('owner_id', list(owner_ids))
+
+        result = query.order('id').range(offset, offset + batch_size - 1).execute()
+
+        rows = result.data or []
+        yield from rows
+
+        if len(rows) < batch_size:
+            return
+        offset += batch_size
+
+
+def calculate_leakage_for_year(
+    supabase,
+    year: int,
+    owner_ids: Optional[Sequence[str]] = None,
+    gwp_set: str = None,
+    include_devices: bool = False
+) -> Dict[str, Any]:
+    """
+    計算指定年份所有（或指定）用戶的冷媒 / SF6 逸散排放
+
+    Args:
+        supabase: Supabase client
+        year: 填報年份
+        owner_ids: 只計算指定用戶（None 表示全部）
+        gwp_set: GWP 版本（預設 DEFAULT_GWP_SET）
+        include_devices: 是否回傳每台設備的明細
+
+    Returns:
+        calculate_leakage_emissions 的結果，另含 year
+
+    Raises:
+        UnknownGwpSetError: GWP 版本不存在
+    """
+    get_refrigerant_table().gwp_column(gwp_set or DEFAULT_GWP_SET)
+
+    entries = list(iter_leakage_entries(supabase, year, owner_ids))
+    result = calculate_leakage_emissions(entries, gwp_set, include_devices)
+    result['year'] = year
+
+    logger.info(
+        f"Leakage calculation for {year}: {len(entries)} entries, "
+        f"{result['device_count']} devices = {result['total_emission']} kgCO2e"
+    )
+    return result
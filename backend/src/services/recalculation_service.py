@@ -0,0 +1,353 @@
+"""
+排放係數重算服務
+
+排放係數修正或採用新版係數表後，依 page_key / period_year 找出受影響的條目
+（使用索引 idx_entries_page_key、idx_entries_owner_year），以 id 為游標分批讀取，
+每批以 calculate_carbon_batch 的陣列運算重算排放，批次 upsert 到 entry_emissions。
+工作進度記錄在 emission_recalculation_jobs，中斷後由 last_entry_id 繼續。
+經後端新增或更新的條目由 refresh_entry_emissions 即時寫入 entry_emissions；
+前端直接寫入 Supabase 的條目要等下一次重算工作才會更新
+"""
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .carbon_service import calculate_carbon_batch, get_entry_monthly, MAX_BATCH_ITEMS
+from .emission_factor_service import EmissionFactorRegistry, MIN_FACTOR_YEAR, MAX_FACTOR_YEAR
+from .leakage_service import get_leakage_monthly_emissions
+
+logger = logging.getLogger(__name__)
+
+# 每批重算的條目數（不超過 calculate_carbon_batch 上限）
+RECALCULATION_BATCH_SIZE = min(int(os.getenv('RECALCULATION_BATCH_SIZE', '500')), MAX_BATCH_ITEMS)
+
+RECALCULATION_ENTRY_COLUMNS = 'id, owner_id, page_key, period_year, payload'
+
+JOBS_TABLE = 'emission_recalculation_jobs'
+EMISSIONS_TABLE = 'entry_emissions'
+
+JOB_STATUS_PENDING = 'pending'
+JOB_STATUS_RUNNING = 'running'
+JOB_STATUS_COMPLETED = 'completed'
+JOB_STATUS_FAILED = 'failed'
+
+# 程序內正在執行的工作（避免同一工作被重複啟動）
+_running_jobs = set()
+_running_lock = threading.Lock()
+
+
+class RecalculationJobError(Exception):
+    """重算工作無法執行（不存在或正在執行）"""
+    pass
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def diff_factor_registries(
+    old: EmissionFactorRegistry,
+    new: EmissionFactorRegistry,
+    years: Optional[Sequence[int]] = None
+) -> Dict[str, List[int]]:
+    """
+    比較兩份係數登錄表，找出適用係數有變動的 (page_key, 年份)
+
+    Args:
+        old: 變更前的登錄表
+        new: 變更後的登錄表
+        years: 比較的年份（預設為兩份登錄表涵蓋的所有年份）
+
+    Returns:
+        {page_key: [變動的年份, ...]}
+    """
+    page_keys = sorted(set(old.page_keys) | set(new.page_keys))
+    if years is None:
+        years = range(MIN_FACTOR_YEAR, MAX_FACTOR_YEAR + 1)
+    years = np.asarray(list(years), dtype=np.int64)
+
+    # (page_key × 年份) 網格一次查詢兩份登錄表
+    grid_keys = np.repeat(np.asarray(page_keys, dtype=object), len(years))
+    grid_years = np.tile(years, len(page_keys))
+
+    old_factors, _ = old.resolve_many(grid_keys.tolist(), grid_years)
+    new_factors, _ = new.resolve_many(grid_keys.tolist(), grid_years)
+
+    changed = ~np.isclose(old_factors, new_factors, rtol=0, atol=1e-9)
+
+    result: Dict[str, List[int]] = {}
+    for page_key, year in zip(grid_keys[changed].tolist(), grid_years[changed].tolist()):
+        result.setdefault(page_key, []).append(int(year))
+    return result
+
+
+def _entries_query(supabase, columns: str, job: Dict[str, Any], **select_options):
+    query = supabase.table('energy_entries').select(columns, **select_options)
+
+    if job.get('page_keys'):
+        query = query.in_('page_key', list(job['page_keys']))
+    if job.get('period_years'):
+        query = query.in_('period_year', list(job['period_years']))
+
+    return query
+
+
+def create_recalculation_job(
+    supabase,
+    page_keys: Optional[Sequence[str]] = None,
+    period_years: Optional[Sequence[int]] = None,
+    factor_version: Optional[str] = None,
+    reason: Optional[str] = None,
+    created_by: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    建立重算工作（計算受影響的條目數）
+
+    Args:
+        supabase: Supabase client
+        page_keys: 受影響的能源類型（None 表示全部）
+        period_years: 受影響的年份（None 表示全部）
+        factor_version: 指定係數版本（None 表示依年份套用）
+        reason: 重算原因（例如: 係數修正說明）
+        created_by: 建立者 ID
+
+    Returns:
+        工作資料（含 total_count）
+    """
+    job = {
+        'status': JOB_STATUS_PENDING,
+        'page_keys': sorted(set(page_keys)) if page_keys else None,
+        'period_years': sorted(set(int(year) for year in period_years)) if period_years else None,
+        'factor_version': factor_version,
+        'reason': reason,
+        'processed_count': 0,
+        'created_by': created_by
+    }
+
+    count_result = _entries_query(supabase, 'id', job, count='exact').limit(1).execute()
+    job['total_count'] = count_result.count or 0
+
+    result = supabase.table(JOBS_TABLE).insert(job).execute()
+    created = result.data[0]
+
+    logger.info(
+        f"Created recalculation job {created['id']}: page_keys={job['page_keys']}, "
+        f"years={job['period_years']}, {job['total_count']} entries"
+    )
+    return created
+
+
+def get_recalculation_job(supabase, job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    取得重算工作與進度
+
+    Args:
+        supabase: Supabase client
+        job_id: 工作 ID
+
+    Returns:
+        工作資料（另含 progress 百分比）；不存在時回傳 None
+    """
+    result = supabase.table(JOBS_TABLE).select('*').eq('id', job_id).limit(1).execute()
+    if not result.data:
+        return None
+
+    job = result.data[0]
+    total = job.get('total_count') or 0
+    processed = job.get('processed_count') or 0
+    job['progress'] = 100.0 if job.get('status') == JOB_STATUS_COMPLETED else (
+        round(min(processed / total, 1.0) * 100, 1) if total else 0.0
+    )
+    return job
+
+
+def recalculate_entries(
+    entries: Sequence[Dict[str, Any]],
+    factor_version: Optional[str] = None,
+    job_id: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    重算一批條目的排放量（有設備記錄的冷媒 / SF6 條目改用逸散排放）
+
+    Args:
+        entries: 條目列表（含 id, owner_id, page_key, period_year, payload）
+        factor_version: 指定係數版本
+        job_id: 重算工作 ID（寫入結果供追蹤）
+
+    Returns:
+        entry_emissions 資料列
+    """
+    if not entries:
+        return []
+
+    batch = calculate_carbon_batch([
+        {
+            'owner_id': entry['owner_id'],
+            'page_key': entry['page_key'],
+            'year': entry['period_year'],
+            'monthly_data': get_entry_monthly(entry),
+            'factor_version': factor_version
+        }
+        for entry in entries
+    ])
+
+    # 逸散排放依設備計算，沒有單一排放係數
+    items = batch['items']
+    leakage_rows, leakage_monthly = get_leakage_monthly_emissions(entries)
+    for row, monthly in zip(leakage_rows.tolist(), leakage_monthly):
+        items[row].update({
+            'total_emission': round(float(monthly.sum()), 2),
+            'monthly_emission': {str(month): float(value) for month, value in enumerate(monthly, start=1)},
+            'emission_factor': 0.0
+        })
+
+    calculated_at = _now()
+    return [
+        {
+            'entry_id': entry['id'],
+            'owner_id': entry['owner_id'],
+            'page_key': entry['page_key'],
+            'period_year': entry['period_year'],
+            'total_emission': item['total_emission'],
+            'monthly_emission': item['monthly_emission'],
+            'emission_factor': item['emission_factor'],
+            'factor_version': str(item['factor_version']),
+            'job_id': job_id,
+            'calculated_at': calculated_at
+        }
+        for entry, item in zip(entries, items)
+    ]
+
+
+def refresh_entry_emissions(supabase, entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    以目前的係數重算單一條目並寫入 entry_emissions（條目新增或更新後呼叫）
+
+    Args:
+        supabase: Supabase client
+        entry: 條目（含 id, owner_id, page_key, period_year, payload）
+
+    Returns:
+        寫入的資料列；失敗時回傳 None（條目本身已寫入，之後的重算工作會補上）
+    """
+    try:
+        row = recalculate_entries([entry])[0]
+        supabase.table(EMISSIONS_TABLE).upsert(row, on_conflict='entry_id').execute()
+        return row
+    except Exception as e:
+        logger.warning(f"Failed to refresh emissions for entry {entry.get('id')}: {str(e)}")
+        return None
+
+
+def run_recalculation_job(
+    supabase,
+    job_id: str,
+    batch_size: int = RECALCULATION_BATCH_SIZE,
+    max_batches: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    執行（或繼續）重算工作
+
+    以 id 為游標分批讀取受影響條目，每批重算後 upsert 到 entry_emissions，
+    並更新工作的 last_entry_id / processed_count；中斷後再次呼叫會從上次的游標繼續
+
+    Args:
+        supabase: Supabase client
+        job_id: 工作 ID
+        batch_size: 每批條目數
+        max_batches: 本次最多處理的批數（None 表示處理到完成）
+
+    Returns:
+        最新的工作資料
+
+    Raises:
+        RecalculationJobError: 工作不存在或正在執行
+    """
+    with _running_lock:
+        if job_id in _running_jobs:
+            raise RecalculationJobError(f'Recalculation job {job_id} is already running')
+        _running_jobs.add(job_id)
+
+    try:
+        job = get_recalculation_job(supabase, job_id)
+        if job is None:
+            raise RecalculationJobError(f'Recalculation job {job_id} not found')
+        if job['status'] == JOB_STATUS_COMPLETED:
+            return job
+
+        jobs = supabase.table(JOBS_TABLE)
+        jobs.update({'status': JOB_STATUS_RUNNING, 'error': None, 'updated_at': _now()}).eq('id', job_id).execute()
+
+        cursor = job.get('last_entry_id')
+        processed = job.get('processed_count') or 0
+        batches = 0
+
+        try:
+            while max_batches is None or batches < max_batches:
+                query = _entries_query(supabase, RECALCULATION_ENTRY_COLUMNS, job)
+                if cursor:
+                    query = query.gt('id', cursor)
+                entries = query.order('id').limit(batch_size).execute().data or []
+
+                if entries:
+                    rows = recalculate_entries(entries, job.get('factor_version'), job_id)
+                    supabase.table(EMISSIONS_TABLE).upsert(rows, on_conflict='entry_id').execute()
+
+                    cursor = entries[-1]['id']
+                    processed += len(entries)
+                    batches += 1
+
+                done = len(entries) < batch_size
+                progress = {'last_entry_id': cursor, 'processed_count': processed, 'updated_at': _now()}
+                if done:
+                    progress.update({'status': JOB_STATUS_COMPLETED, 'completed_at': _now()})
+                jobs.update(progress).eq('id', job_id).execute()
+
+                logger.info(f"Recalculation job {job_id}: {processed}/{job.get('total_count')} entries")
+
+                if done:
+                    break
+
+        except Exception as e:
+            logger.error(f"Recalculation job {job_id} failed after {processed} entries: {str(e)}")
+            jobs.update({'status': JOB_STATUS_FAILED, 'error': str(e), 'updated_at': _now()}).eq('id', job_id).execute()
+            raise
+
+        return get_recalculation_job(supabase, job_id)
+
+    finally:
+        with _running_lock:
+            _running_jobs.discard(job_id)
+
+
+def start_recalculation_job(supabase, job_id: str) -> threading.Thread:
+    """
+    在背景執行緒執行重算工作（API 立即回傳，進度由 get_recalculation_job 查詢）
+
+    Args:
+        supabase: Supabase client
+        job_id: 工作 ID
+
+    Returns:
+        背景執行緒
+
+    Raises:
+        RecalculationJobError: 工作正在執行
+    """
+    with _running_lock:
+        if job_id in _running_jobs:
+            raise RecalculationJobError(f'Recalculation job {job_id} is already running')
+
+    def run():
+        try:
+            run_recalculation_job(supabase, job_id)
+        except Exception as e:
+            logger.error(f"Background recalculation job {job_id} stopped: {str(e)}")
+
+    thread = threading.Thread(target=run, name=f'recalculation-{job_id}', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,415 @@
+"""
+組織排放彙總服務（範疇一 / 二 / 三）
+
+依公司 (profiles.company) 建立 (範疇 × 類別 × 月份 × 年度) 排放陣列並快取在記憶體，
+組合成 (公司 × 範疇 × 類別 × 月份 × 年度) 排放立方體，供報表以切片 / 分組查詢。
+條目寫入或審核時只清除該公司的快取，下次查詢時只重建該公司
+"""
+import logging
+import os
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.infrastructure.cache.ttl_cache import TTLCache
+from .carbon_service import get_entry_monthly, pack_monthly_data, round_emissions
+from .leakage_service import get_leakage_monthly_emissions
+from .dashboard_service import REPORTING_CATEGORIES
+from .emission_factor_service import get_factor_registry
+
+logger = logging.getLogger(__name__)
+
+# 公司快取時間（秒）；條目寫入時會主動清除，到期重建用於收斂未經後端的寫入
+ROLLUP_CACHE_TTL = int(os.getenv('ROLLUP_CACHE_TTL_SECONDS', '900'))
+
+# 列入彙總的條目狀態（不含暫存與退回）
+ROLLUP_STATUSES = ('submitted', 'approved')
+
+# 每批讀取筆數
+ROLLUP_QUERY_BATCH_SIZE = 1000
+
+# 以 owner_id 篩選時每次查詢的用戶數
+ROLLUP_OWNER_CHUNK_SIZE = 200
+
+ROLLUP_ENTRY_COLUMNS = 'id, owner_id, page_key, scope, period_year, payload'
+
+# 未填寫公司名稱的用戶
+UNASSIGNED_COMPANY = '未填寫'
+
+# 立方體維度（依陣列軸順序）
+DIMENSIONS = ('company', 'scope', 'category', 'month', 'year')
+
+SCOPES = [1, 2, 3]
+CATEGORIES = [category['pageKey'] for category in REPORTING_CATEGORIES]
+MONTHS = list(range(1, 13))
+
+# page_key → 範疇（entries.scope 未填寫時使用）
+_SCOPE_NUMBERS = {'範疇一': 1, '範疇二': 2, '範疇三': 3}
+DEFAULT_SCOPES = {
+    category['pageKey']: _SCOPE_NUMBERS[category['category']] for category in REPORTING_CATEGORIES
+}
+
+
+class RollupQueryError(ValueError):
+    """彙總查詢參數錯誤"""
+    pass
+
+
+class EmissionCube:
+    """
+    (公司 × 範疇 × 類別 × 月份 × 年度) 排放立方體（kgCO2e）
+    """
+
+    def __init__(self, companies: List[str], years: List[int], values: np.ndarray, version: int = 0):
+        self.companies = companies
+        self.years = years
+        self.values = values
+        self.version = version
+        self.axes = {
+            'company': companies,
+            'scope': SCOPES,
+            'category': CATEGORIES,
+            'month': MONTHS,
+            'year': years,
+        }
+
+    def query(
+        self,
+        filters: Optional[Dict[str, Sequence[Any]]] = None,
+        group_by: Sequence[str] = ('scope',)
+    ) -> Dict[str, Any]:
+        """
+        切片並依維度分組加總
+
+        Args:
+            filters: {維度: 要保留的值}（未指定的維度保留全部；不存在的值略過）
+            group_by: 分組維度（空序列表示只回傳總量）
+
+        Returns:
+            {
+                'rows': [{維度: 值, ..., 'emission': float}]（只含非零的分組）,
+                'total': float,
+                'group_by': [...]
+            }
+
+        Raises:
+            RollupQueryError: 維度名稱錯誤
+        """
+        filters = filters or {}
+        unknown = (set(filters) | set(group_by)) - set(DIMENSIONS)
+        if unknown:
+            raise RollupQueryError(f'Unknown dimensions: {sorted(unknown)}. Allowed: {list(DIMENSIONS)}')
+
+        # 各維度保留的索引
+        selected_labels = []
+        indices = []
+        for dimension in DIMENSIONS:
+            labels = self.axes[dimension]
+            if filters.get(dimension):
+                wanted = set(filters[dimension])
+                positions = [position for position, label in enumerate(labels) if label in wanted]
+            else:
+                positions = list(range(len(labels)))
+            indices.append(positions)
+            selected_labels.append([labels[position] for position in positions])
+
+        sliced = self.values[np.ix_(*indices)]
+
+        group_axes = [DIMENSIONS.index(dimension) for dimension in DIMENSIONS if dimension in group_by]
+        summed = sliced.sum(axis=tuple(axis for axis in range(len(DIMENSIONS)) if axis not in group_axes))
+
+        rows = []
+        if group_axes:
+            rounded = round_emissions(summed)
+            for position in zip(*np.nonzero(rounded)):
+                row = {
+                    DIMENSIONS[axis]: selected_labels[axis][index]
+                    for axis, index in zip(group_axes, position)
+                }
+                row['emission'] = float(rounded[position])
+                rows.append(row)
+
+        return {
+            'rows': rows,
+            'total': float(round_emissions(np.array([sliced.sum()]))[0]),
+            'group_by': [DIMENSIONS[axis] for axis in group_axes]
+        }
+
+
+def compute_entry_emissions(entries: Sequence[Dict[str, Any]]) -> np.ndarray:
+    """
+    計算條目各月排放（條目 × 12），每月四捨五入方式與 calculate_total_carbon 相同；
+    有設備記錄的冷媒 / SF6 條目改用逸散排放（填充量 × 洩漏率 × GWP）
+
+    Args:
+        entries: 條目列表（含 page_key, period_year, payload）
+
+    Returns:
+        各月排放矩陣
+    """
+    if not entries:
+        return np.zeros((0, len(MONTHS)))
+
+    values, _ = pack_monthly_data([get_entry_monthly(entry) for entry in entries])
+    factors, _ = get_factor_registry().resolve_many(
+        [entry['page_key'] for entry in entries],
+        [entry['period_year'] for entry in entries]
+    )
+    emissions = round_emissions(values * factors[:, None])
+
+    leakage_rows, leakage_monthly = get_leakage_monthly_emissions(entries)
+    emissions[leakage_rows] = leakage_monthly
+    return emissions
+
+
+def _entry_scope(entry: Dict[str, Any]) -> Optional[int]:
+    scope = entry.get('scope')
+    if scope in SCOPES:
+        return scope
+    return DEFAULT_SCOPES.get(entry.get('page_key'))
+
+
+def build_company_cubes(
+    entries: Sequence[Dict[str, Any]],
+    owner_companies: Dict[str, str],
+    companies: Iterable[str]
+) -> Dict[str, Tuple[np.ndarray, List[int]]]:
+    """
+    建立各公司的 (範疇 × 類別 × 月份 × 年度) 排放陣列
+
+    所有條目一次計算各月排放後，以 np.add.at 依 (公司, 範疇, 類別, 年度) 格位累加
+
+    Args:
+        entries: 條目列表
+        owner_companies: {owner_id: 公司}
+        companies: 要建立的公司（沒有條目的公司得到空陣列）
+
+    Returns:
+        {公司: (陣列, 年度列表)}
+    """
+    companies = list(companies)
+    company_index = {company: index for index, company in enumerate(companies)}
+    category_index = {category: index for index, category in enumerate(CATEGORIES)}
+
+    usable = []
+    for entry in entries:
+        company = owner_companies.get(entry.get('owner_id'), UNASSIGNED_COMPANY)
+        scope = _entry_scope(entry)
+        if company not in company_index or scope is None or entry.get('page_key') not in category_index:
+            continue
+        usable.append((entry, company_index[company], scope - 1, category_index[entry['page_key']]))
+
+    years = sorted({entry['period_year'] for entry, *_ in usable})
+    year_index = {year: index for index, year in enumerate(years)}
+
+    values = np.zeros((len(companies), len(SCOPES), len(CATEGORIES), len(years), len(MONTHS)))
+    if usable:
+        emissions = compute_entry_emissions([entry for entry, *_ in usable])
+        cells = tuple(np.array(axis) for axis in zip(*(
+            (company, scope, category, year_index[entry['period_year']])
+            for entry, company, scope, category in usable
+        )))
+        np.add.at(values, cells, emissions)
+
+    # 年度軸移到最後：(公司, 範疇, 類別, 月份, 年度)
+    values = values.transpose(0, 1, 2, 4, 3)
+    return {company: (values[index], years) for company, index in company_index.items()}
+
+
+def stack_company_cubes(company_cubes: Dict[str, Tuple[np.ndarray, List[int]]], version: int = 0) -> EmissionCube:
+    """
+    將各公司陣列依年度對齊後組合成立方體
+
+    Args:
+        company_cubes: {公司: (範疇 × 類別 × 月份 × 年度 陣列, 年度列表)}
+        version: 資料版本
+
+    Returns:
+        EmissionCube
+    """
+    companies = sorted(company_cubes)
+    years = sorted({year for _, company_years in company_cubes.values() for year in company_years})
+    year_index = {year: index for index, year in enumerate(years)}
+
+    values = np.zeros((len(companies), len(SCOPES), len(CATEGORIES), len(MONTHS), len(years)))
+    for row, company in enumerate(companies):
+        company_values, company_years = company_cubes[company]
+        if company_years:
+            values[row][..., [year_index[year] for year in company_years]] = company_values
+
+    return EmissionCube(companies, years, values, version)
+
+
+def _iter_rows(query_factory, batch_size: int = ROLLUP_QUERY_BATCH_SIZE) -> Iterator[Dict[str, Any]]:
+    offset = 0
+    while True:
+        result = query_factory().order('id').range(offset, offset + batch_size - 1).execute()
+        rows = result.data or []
+        yield from rows
+        if len(rows) < batch_size:
+            return
+        offset += batch_size
+
+
+def load_owner_companies(supabase) -> Dict[str, str]:
+    """讀取所有用戶的公司名稱（空白視為未填寫）"""
+    return {
+        row['id']: (row.get('company') or '').strip() or UNASSIGNED_COMPANY
+        for row in _iter_rows(lambda: supabase.table('profiles').select('id, company'))
+    }
+
+
+def iter_rollup_entries(supabase, owner_ids: Optional[Sequence[str]] = None) -> Iterator[Dict[str, Any]]:
+    """逐批讀取列入彙總的條目（指定 owner_ids 時分段查詢）"""
+    def query(owners=None):
+        builder = supabase.table('energy_entries')\
+            .select(ROLLUP_ENTRY_COLUMNS)\
+            .in_('status', list(ROLLUP_STATUSES))
+        if owners:
+            builder = builder.in_('owner_id', owners)
+        return builder
+
+    if owner_ids is None:
+        yield from _iter_rows(query)
+        return
+
+    owner_ids = list(owner_ids)
+    for start in range(0, len(owner_ids), ROLLUP_OWNER_CHUNK_SIZE):
+        chunk = owner_ids[start:start + ROLLUP_OWNER_CHUNK_SIZE]
+        yield from _iter_rows(lambda: query(chunk))
+
+
+class RollupCache:
+    """
+    各公司排放陣列的程序內快取
+
+    - 公司陣列與用戶公司對照各自有 TTL
+    - 條目寫入只清除該條目擁有者所屬公司；無法判斷公司時清除全部
+    - 資料庫讀取在鎖外進行；讀取期間有清除時，結果只用於本次查詢，不寫回快取
+    - version 在資料可能變動（清除或重建）時遞增，供下游依資料版本快取
+    """
+
+    def __init__(self, ttl: int = ROLLUP_CACHE_TTL):
+        self._cubes = TTLCache(maxsize=4096, ttl=ttl)
+        self._owners = TTLCache(maxsize=1, ttl=ttl)
+        self._lock = threading.RLock()
+        # 清除次數（判斷讀取期間是否有寫入）
+        self._generation = 0
+        self.version = 0
+
+    def get_cube(self, supabase) -> EmissionCube:
+        """取得完整立方體（只重建快取中缺少的公司）"""
+        with self._lock:
+            generation, version = self._generation, self.version
+            owner_companies = self._owners.get('owners')
+
+        if owner_companies is None:
+            owner_companies = load_owner_companies(supabase)
+            with self._lock:
+                if self._generation == generation:
+                    self._owners.set('owners', owner_companies)
+
+        companies = set(owner_companies.values())
+        with self._lock:
+            cubes = {company: self._cubes.get(company) for company in companies}
+        missing = sorted(company for company, cube in cubes.items() if cube is None)
+
+        if not missing:
+            return stack_company_cubes(cubes, version)
+
+        if len(missing) == len(companies):
+            entries = list(iter_rollup_entries(supabase))
+        else:
+            owner_ids = [owner for owner, company in owner_companies.items() if company in set(missing)]
+            entries = list(iter_rollup_entries(supabase, owner_ids))
+
+        built = build_company_cubes(entries, owner_companies, missing)
+        cubes.update(built)
+
+        with self._lock:
+            if self._generation != generation:
+                # 讀取期間有條目寫入，結果可能已過期：不寫回快取，沿用讀取前的版本
+                return stack_company_cubes(cubes, version)
+
+            for company, cube in built.items():
+                self._cubes.set(company, cube)
+            self.version += 1
+            version = self.version
+
+        logger.info(f"Rollup cache rebuilt {len(missing)} companies from {len(entries)} entries")
+        return stack_company_cubes(cubes, version)
+
+    def invalidate(self, owner_id: Optional[str] = None) -> None:
+        """
+        清除條目擁有者所屬公司的快取
+
+        Args:
+            owner_id: 條目擁有者 ID（未提供或不在公司對照中時清除全部）
+        """
+        with self._lock:
+            owner_companies = self._owners.get('owners') or {}
+            company = owner_companies.get(owner_id)
+
+            if company is None:
+                self.clear()
+                return
+
+            self._cubes.delete(company)
+            self._generation += 1
+            self.version += 1
+
+    def clear(self) -> None:
+        """清除全部快取（例如用戶公司名稱變更）"""
+        with self._lock:
+            self._cubes.clear()
+            self._owners.clear()
+            self._generation += 1
+            self.version += 1
+
+
+_rollup_cache = RollupCache()
+
+
+def get_rollup_cache() -> RollupCache:
+    """取得全域彙總快取"""
+    return _rollup_cache
+
+
+def record_rollup_write(entry_id: Optional[str], owner_id: Optional[str] = None) -> None:
+    """
+    通知彙總快取有條目寫入或審核（失敗不影響寫入本身）
+
+    Args:
+        entry_id: 條目 ID
+        owner_id: 條目擁有者 ID（未提供時清除全部公司）
+    """
+    try:
+        _rollup_cache.invalidate(owner_id)
+    except Exception as e:
+        logger.warning(f"Failed to invalidate rollup cache for entry {entry_id}: {str(e)}")
+
+
+def query_rollup(
+    supabase,
+    filters: Optional[Dict[str, Sequence[Any]]] = None,
+    group_by: Sequence[str] = ('scope',)
+) -> Dict[str, Any]:
+    """
+    查詢組織排放彙總
+
+    Args:
+        supabase: Supabase client（僅在重建快取時使用）
+        filters: {維度: 值列表}，維度為 company / scope / category / month / year
+        group_by: 分組維度
+
+    Returns:
+        EmissionCube.query 的結果，另含 axes（各維度可用的值）
+
+    Raises:
+        RollupQueryError: 維度名稱錯誤
+    """
+    cube = _rollup_cache.get_cube(supabase)
+    result = cube.query(filters, group_by)
+    result['axes'] = {'companies': cube.companies, 'years': cube.years, 'categories': CATEGORIES, 'scopes': SCOPES}
+    return result
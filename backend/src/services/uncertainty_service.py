@@ -0,0 +1,331 @@
+"""
+盤查不確定性分析服務（ISO 14064-1 蒙地卡羅法）
+
+依各能源類型的活動數據與排放係數不確定性範圍，對每個條目抽樣 N 次，
+計算各類別、各範疇與總排放量的信賴區間。抽樣與彙總全部以陣列運算完成：
+條目間獨立的活動數據常態誤差先合成為類別標準差（平方和開根號），每個類別只抽樣一次，
+同一類別共用同一個排放係數抽樣（係數誤差在條目間完全相關）
+"""
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from .carbon_service import round_emissions
+from .dashboard_service import REPORTING_CATEGORIES
+from .emission_factor_service import BACKEND_DIR, EmissionFactorError, get_factor_registry
+from .leakage_service import LEAKAGE_RECORD_FIELDS, get_leakage_monthly_emissions, iter_leakage_entries
+
+logger = logging.getLogger(__name__)
+
+# 不確定性範圍資料檔（相對路徑以 backend 目錄為基準）
+UNCERTAINTY_FILE = os.getenv('UNCERTAINTY_FILE', os.path.join('data', 'uncertainty.json'))
+
+# 未指定亂數種子時使用的固定種子（確保結果可重現）
+DEFAULT_UNCERTAINTY_SEED = int(os.getenv('UNCERTAINTY_DEFAULT_SEED', '14064'))
+
+DEFAULT_UNCERTAINTY_DRAWS = 10000
+MAX_UNCERTAINTY_DRAWS = 200000
+
+# 信賴區間半寬（百分比）對應的標準常態分位數（95% → 1.96）
+_HALF_WIDTH_Z = 1.959963984540054
+
+# 每批讀取的條目數
+UNCERTAINTY_QUERY_BATCH_SIZE = 1000
+
+UNCERTAINTY_ENTRY_COLUMNS = 'id, owner_id, page_key, period_year, amount'
+
+# page_key → 範疇（範疇一 / 範疇二 / 範疇三）
+SCOPE_MAP = {category['pageKey']: category['category'] for category in REPORTING_CATEGORIES}
+SCOPES = list(dict.fromkeys(SCOPE_MAP.values()))
+DEFAULT_SCOPE = SCOPES[0]
+
+
+class UncertaintyTable:
+    """
+    各能源類型的不確定性範圍
+
+    - activity / factor: 95% 信賴區間半寬（百分比），轉為相對標準差後使用
+    """
+
+    def __init__(self, page_keys: Dict[str, Dict[str, float]], default: Dict[str, float]):
+        self.page_keys = dict(page_keys)
+        self.default = default
+
+        for page_key, ranges in [*self.page_keys.items(), ('default', default)]:
+            for kind in ('activity', 'factor'):
+                if float(ranges[kind]) < 0:
+                    raise EmissionFactorError(f'Negative {kind} uncertainty for {page_key}')
+
+    def relative_sigmas(self, page_keys: Sequence[str], kind: str) -> np.ndarray:
+        """
+        取得相對標準差陣列
+
+        Args:
+            page_keys: 能源類型鍵值
+            kind: activity 或 factor
+
+        Returns:
+            相對標準差（半寬百分比 / 100 / 1.96）
+        """
+        half_widths = np.array(
+            [float(self.page_keys.get(page_key, self.default)[kind]) for page_key in page_keys],
+            dtype=np.float64
+        )
+        return half_widths / 100.0 / _HALF_WIDTH_Z
+
+    def describe(self) -> Dict[str, Dict[str, float]]:
+        """取得各能源類型的不確定性範圍（半寬百分比）"""
+        return {**self.page_keys, 'default': self.default}
+
+
+def load_uncertainty_table(path: str = None) -> UncertaintyTable:
+    """
+    從資料檔載入不確定性範圍
+
+    Args:
+        path: 資料檔路徑（預設為 UNCERTAINTY_FILE）
+
+    Returns:
+        UncertaintyTable
+
+    Raises:
+        EmissionFactorError: 檔案格式錯誤
+    """
+    path = os.path.join(BACKEND_DIR, path or UNCERTAINTY_FILE)
+
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    try:
+        table = UncertaintyTable(data['page_keys'], data['default'])
+    except EmissionFactorError:
+        raise
+    except (KeyError, TypeError, ValueError) as e:
+        raise EmissionFactorError(f'Invalid uncertainty file {path}: {e}')
+
+    logger.info(f"Loaded uncertainty table from {path}: {len(table.page_keys)} page keys")
+    return table
+
+
+_table: Optional[UncertaintyTable] = None
+_table_lock = threading.Lock()
+
+
+def get_uncertainty_table() -> UncertaintyTable:
+    """取得程序內共用的不確定性範圍表（第一次呼叫時載入）"""
+    global _table
+
+    if _table is None:
+        with _table_lock:
+            if _table is None:
+                _table = load_uncertainty_table()
+
+    return _table
+
+
+def _interval(samples: np.ndarray, point: np.ndarray, confidence_level: float) -> List[Dict[str, float]]:
+    """計算每一列抽樣的平均值與信賴區間"""
+    tail = (1.0 - confidence_level) / 2.0 * 100.0
+    lower, upper = np.percentile(samples, [tail, 100.0 - tail], axis=1)
+    mean = samples.mean(axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        uncertainty = np.where(mean > 0, (upper - lower) / 2.0 / mean * 100.0, 0.0)
+
+    point, mean, lower, upper = (round_emissions(values) for values in (point, mean, lower, upper))
+    uncertainty = round_emissions(uncertainty)
+
+    return [
+        {
+            'emission': float(point[row]),
+            'mean': float(mean[row]),
+            'lower': float(lower[row]),
+            'upper': float(upper[row]),
+            'uncertainty_percent': float(uncertainty[row])
+        }
+        for row in range(len(point))
+    ]
+
+
+def simulate_uncertainty(
+    entries: Sequence[Dict[str, Any]],
+    draws: int = DEFAULT_UNCERTAINTY_DRAWS,
+    seed: Optional[int] = None,
+    confidence_level: float = 0.95,
+    table: Optional[UncertaintyTable] = None
+) -> Dict[str, Any]:
+    """
+    蒙地卡羅不確定性分析
+
+    每個條目的排放 = 活動數據 × (1 + σ_A·z) × 排放係數 × (1 + σ_F·z')
+    （有設備記錄的冷媒 / SF6 條目以逸散排放為點估計）：
+    活動數據抽樣在條目間獨立，排放係數抽樣在同一類別內共用。
+    獨立常態誤差的和仍為常態，類別的活動數據標準差為 √Σ(A·F·σ_A)²，
+    因此只需 (類別 × 抽樣) 的標準常態矩陣，成本與條目數無關；範疇與總量由類別抽樣加總
+
+    Args:
+        entries: 條目列表 [{'page_key', 'period_year', 'amount'}]（冷媒 / SF6 條目另含 payload）
+        draws: 抽樣次數
+        seed: 亂數種子（預設 DEFAULT_UNCERTAINTY_SEED，相同輸入與種子結果相同）
+        confidence_level: 信賴水準（例如: 0.95）
+        table: 不確定性範圍表（預設使用資料檔）
+
+    Returns:
+        {
+            'total': {'emission', 'mean', 'lower', 'upper', 'uncertainty_percent'},
+            'scopes': {範疇: {...}},
+            'categories': {page_key: {...}},
+            'draws', 'seed', 'confidence_level', 'entry_count'
+        }
+
+    Raises:
+        ValueError: 抽樣次數或信賴水準超出範圍
+    """
+    if not 1 <= draws <= MAX_UNCERTAINTY_DRAWS:
+        raise ValueError(f'draws must be between 1 and {MAX_UNCERTAINTY_DRAWS}')
+    if not 0 < confidence_level < 1:
+        raise ValueError('confidence_level must be between 0 and 1')
+
+    table = table or get_uncertainty_table()
+    seed = DEFAULT_UNCERTAINTY_SEED if seed is None else seed
+
+    entries = [
+        entry for entry in entries
+        if entry.get('page_key') and (
+            entry.get('amount') or (entry['page_key'] in LEAKAGE_RECORD_FIELDS and entry.get('payload'))
+        )
+    ]
+    result = {
+        'draws': draws,
+        'seed': seed,
+        'confidence_level': confidence_level,
+        'entry_count': len(entries)
+    }
+
+    if not entries:
+        empty = {'emission': 0.0, 'mean': 0.0, 'lower': 0.0, 'upper': 0.0, 'uncertainty_percent': 0.0}
+        return {'total': empty, 'scopes': {}, 'categories': {}, **result}
+
+    page_keys = [entry['page_key'] for entry in entries]
+    amounts = np.array([float(entry.get('amount') or 0) for entry in entries], dtype=np.float64)
+    factors, _ = get_factor_registry().resolve_many(
+        page_keys, [entry.get('period_year') for entry in entries]
+    )
+    emissions = amounts * factors
+
+    leakage_rows, leakage_monthly = get_leakage_monthly_emissions(entries)
+    emissions[leakage_rows] = leakage_monthly.sum(axis=1)
+
+    categories, category_rows = np.unique(np.asarray(page_keys, dtype=object), return_inverse=True)
+    categories = categories.tolist()
+    category_count = len(categories)
+
+    category_points = np.bincount(category_rows, weights=emissions, minlength=category_count)
+
+    # 類別的活動數據標準差（條目誤差獨立：點估計排放 × 相對標準差的平方和開根號）
+    category_sigmas = np.sqrt(np.bincount(
+        category_rows,
+        weights=(emissions * table.relative_sigmas(page_keys, 'activity')) ** 2,
+        minlength=category_count
+    ))
+    factor_sigmas = table.relative_sigmas(categories, 'factor')
+
+    rng = np.random.default_rng(seed)
+
+    # 排放係數抽樣（類別 × 抽樣）
+    factor_draws = np.maximum(1.0 + factor_sigmas[:, None] * rng.standard_normal((category_count, draws)), 0.0)
+
+    # 活動數據抽樣（類別 × 抽樣）
+    category_samples = category_points[:, None] + category_sigmas[:, None] * rng.standard_normal((category_count, draws))
+    category_samples = np.maximum(category_samples, 0.0) * factor_draws
+
+    # 範疇 × 類別彙總
+    scope_rows = np.array([SCOPES.index(SCOPE_MAP.get(key, DEFAULT_SCOPE)) for key in categories])
+    scope_matrix = np.zeros((len(SCOPES), category_count))
+    scope_matrix[scope_rows, np.arange(category_count)] = 1.0
+    scope_samples = scope_matrix @ category_samples
+    scope_points = scope_matrix @ category_points
+    present_scopes = np.unique(scope_rows)
+
+    category_stats = _interval(category_samples, category_points, confidence_level)
+    scope_stats = _interval(scope_samples[present_scopes], scope_points[present_scopes], confidence_level)
+    total_stats = _interval(
+        category_samples.sum(axis=0, keepdims=True), category_points.sum(keepdims=True), confidence_level
+    )
+
+    return {
+        'total': total_stats[0],
+        'scopes': {SCOPES[row]: stats for row, stats in zip(present_scopes.tolist(), scope_stats)},
+        'categories': dict(zip(categories, category_stats)),
+        **result
+    }
+
+
+def iter_uncertainty_entries(
+    supabase,
+    year: int,
+    owner_ids: Optional[Sequence[str]] = None,
+    batch_size: int = UNCERTAINTY_QUERY_BATCH_SIZE
+) -> Iterator[Dict[str, Any]]:
+    """逐批讀取指定年份的條目（只取計算所需欄位）"""
+    offset = 0
+    while True:
+        query = supabase.table('energy_entries')\
+            .select(UNCERTAINTY_ENTRY_COLUMNS)\
+            .eq('period_year', year)
+
+        if owner_ids:
+            query = query.in_('owner_id', list(owner_ids))
+
+        result = query.order('id').range(offset, offset + batch_size - 1).execute()
+
+        rows = result.data or []
+        yield from rows
+
+        if len(rows) < batch_size:
+            return
+        offset += batch_size
+
+
+def calculate_inventory_uncertainty(
+    supabase,
+    year: int,
+    owner_ids: Optional[Sequence[str]] = None,
+    draws: int = DEFAULT_UNCERTAINTY_DRAWS,
+    seed: Optional[int] = None,
+    confidence_level: float = 0.95
+) -> Dict[str, Any]:
+    """
+    計算指定年份盤查結果的不確定性
+
+    Args:
+        supabase: Supabase client
+        year: 填報年份
+        owner_ids: 只計算指定用戶（None 表示全部）
+        draws: 抽樣次數
+        seed: 亂數種子
+        confidence_level: 信賴水準
+
+    Returns:
+        simulate_uncertainty 的結果，另含 year
+    """
+    entries = list(iter_uncertainty_entries(supabase, year, owner_ids))
+
+    # 冷媒 / SF6 條目另外讀取設備記錄（其他條目不需讀取 payload）
+    payloads = {entry['id']: entry.get('payload') for entry in iter_leakage_entries(supabase, year, owner_ids)}
+    for entry in entries:
+        if entry.get('id') in payloads:
+            entry['payload'] = payloads[entry['id']]
+
+    result = simulate_uncertainty(entries, draws, seed, confidence_level)
+    result['year'] = year
+
+    logger.info(
+        f"Uncertainty analysis for {year}: {result['entry_count']} entries x {draws} draws, "
+        f"total {result['total']['emission']} kgCO2e ±{result['total']['uncertainty_percent']}%"
+    )
+    return result
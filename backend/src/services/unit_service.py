@@ -0,0 +1,355 @@
+"""
+單位換算服務
+
+取代前端 unitConversions.ts：提交時將 monthly 數值與設備記錄數量換算為該能源類型
+排放係數所用的單位（例如 WD-40 為 mL、柴油為 L、天然氣為 m³），並將換算後的總量
+寫入 payload，後續彙總直接乘上排放係數、不需再換算
+"""
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class UnitConversionError(ValueError):
+    """單位無法換算（未知單位或量綱不同）"""
+    pass
+
+
+# 標準單位定義：單位 → (量綱, 換算為該量綱基準單位的倍數)
+UNIT_DEFINITIONS = {
+    # 質量（基準：kg）
+    'g': ('mass', 0.001),
+    'kg': ('mass', 1.0),
+    't': ('mass', 1000.0),
+    # 體積（基準：L）
+    'mL': ('volume', 0.001),
+    'L': ('volume', 1.0),
+    'kL': ('volume', 1000.0),
+    'm³': ('volume', 1000.0),
+    # 能源（基準：kWh）
+    'Wh': ('energy', 0.001),
+    'kWh': ('energy', 1.0),
+    'MWh': ('energy', 1000.0),
+    'GWh': ('energy', 1000000.0),
+}
+
+# 各種寫法 → 標準單位（比對時不分大小寫）
+UNIT_ALIASES = {
+    'g': 'g', 'gram': 'g', 'grams': 'g', '公克': 'g', '克': 'g',
+    'kg': 'kg', 'kgs': 'kg', 'kilogram': 'kg', '公斤': 'kg', '千克': 'kg',
+    't': 't', 'ton': 't', 'tonne': 't', '公噸': 't', '噸': 't',
+    'ml': 'mL', '毫升': 'mL',
+    'l': 'L', 'liter': 'L', 'litre': 'L', '公升': 'L', '升': 'L',
+    'kl': 'kL', '公秉': 'kL',
+    'm³': 'm³', 'm3': 'm³', 'm^3': 'm³', 'cbm': 'm³', '立方公尺': 'm³', '立方米': 'm³',
+    'wh': 'Wh',
+    'kwh': 'kWh', '度': 'kWh', '千瓦小時': 'kWh', '千瓦時': 'kWh',
+    'mwh': 'MWh', '百萬瓦小時': 'MWh',
+    'gwh': 'GWh',
+}
+
+# 各量綱的預設標準單位（能源類型未定義排放係數單位時使用）
+DIMENSION_CANONICAL_UNITS = {
+    'mass': 'kg',
+    'volume': 'L',
+    'energy': 'kWh',
+}
+
+# 各能源類型排放係數的單位（與前端 categoryConstants 的條目單位一致）
+# 換算後的 amount 與 monthly 以此單位保存，乘上排放係數即為排放量
+PAGE_CANONICAL_UNITS = {
+    'wd40': 'mL',
+    'acetylene': 'kg',
+    'refrigerant': 'kg',
+    'natural_gas': 'm³',
+    'urea': 'kg',
+    'diesel_generator': 'L',
+    'diesel': 'L',
+    'gasoline': 'L',
+    'sf6': 'kg',
+    'lpg': 'kg',
+    'fire_extinguisher': 'kg',
+    'welding_rod': 'kg',
+    'gas_cylinder': 'kg',
+    'electricity': 'kWh',
+}
+
+# 設備記錄中可能的數量欄位（依序尋找）
+RECORD_QUANTITY_FIELDS = ('fillAmount', 'sf6Weight', 'quantity', 'amount', 'usage', 'weight')
+
+# 換算後數值保留的小數位數
+NORMALIZED_DECIMALS = 6
+
+# 預先建立 (來源單位 × 目標單位) 換算係數表；量綱不同為 NaN
+UNITS: List[str] = list(UNIT_DEFINITIONS)
+UNIT_INDEX: Dict[str, int] = {unit: index for index, unit in enumerate(UNITS)}
+
+_dimensions = np.array([UNIT_DEFINITIONS[unit][0] for unit in UNITS])
+_scales = np.array([UNIT_DEFINITIONS[unit][1] for unit in UNITS], dtype=np.float64)
+
+CONVERSION_TABLE = np.where(
+    _dimensions[:, None] == _dimensions[None, :],
+    _scales[:, None] / _scales[None, :],
+    np.nan
+)
+
+
+def normalize_unit(unit: Any) -> Optional[str]:
+    """
+    將單位寫法轉為標準單位
+
+    Args:
+        unit: 單位（例如: 公升、KG、gram、度）
+
+    Returns:
+        標準單位（例如: L、kg、g、kWh）；無法辨識時回傳 None
+    """
+    if unit is None:
+        return None
+
+    text = str(unit).strip()
+    if text in UNIT_INDEX:
+        return text
+
+    return UNIT_ALIASES.get(text.lower())
+
+
+def get_unit_dimension(unit: Any) -> Optional[str]:
+    """取得單位的量綱（mass / volume / energy）；無法換算的單位回傳 None"""
+    canonical = normalize_unit(unit)
+    return UNIT_DEFINITIONS[canonical][0] if canonical else None
+
+
+def get_canonical_unit(unit: Any, page_key: Optional[str] = None) -> Optional[str]:
+    """
+    取得數值應換算成的標準單位
+
+    Args:
+        unit: 來源單位
+        page_key: 能源類型（使用該類型排放係數的單位，例如 WD-40 為 mL）
+
+    Returns:
+        標準單位；來源單位無法換算時回傳 None
+    """
+    dimension = get_unit_dimension(unit)
+    if dimension is None:
+        return None
+
+    return _dimension_target_unit(dimension, page_key)
+
+
+def _dimension_target_unit(dimension: str, page_key: Optional[str]) -> str:
+    page_unit = PAGE_CANONICAL_UNITS.get(page_key)
+    if page_unit and UNIT_DEFINITIONS[page_unit][0] == dimension:
+        return page_unit
+    return DIMENSION_CANONICAL_UNITS[dimension]
+
+
+def get_conversion_factor(from_unit: Any, to_unit: Any) -> float:
+    """
+    取得單位換算係數（value × factor = 換算後數值）
+
+    Args:
+        from_unit: 來源單位
+        to_unit: 目標單位
+
+    Returns:
+        換算係數
+
+    Raises:
+        UnitConversionError: 未知單位或量綱不同
+    """
+    return float(_conversion_factors([from_unit], to_unit)[0])
+
+
+def _unit_indices(units: Sequence[Any]) -> np.ndarray:
+    indices = np.empty(len(units), dtype=np.intp)
+    for position, unit in enumerate(units):
+        canonical = normalize_unit(unit)
+        if canonical is None:
+            raise UnitConversionError(f'Unknown unit: {unit}')
+        indices[position] = UNIT_INDEX[canonical]
+    return indices
+
+
+def _conversion_factors(from_units: Sequence[Any], to_unit: Any) -> np.ndarray:
+    to_canonical = normalize_unit(to_unit)
+    if to_canonical is None:
+        raise UnitConversionError(f'Unknown unit: {to_unit}')
+
+    # 相同寫法只解析一次
+    unique_units, inverse = np.unique(np.asarray([str(u) for u in from_units], dtype=object), return_inverse=True)
+    factors = CONVERSION_TABLE[_unit_indices(unique_units), UNIT_INDEX[to_canonical]][inverse]
+
+    if np.isnan(factors).any():
+        incompatible = sorted({str(u) for u, f in zip(from_units, factors) if np.isnan(f)})
+        raise UnitConversionError(f'Cannot convert {incompatible} to {to_canonical}')
+
+    return factors
+
+
+def convert_values(
+    values: Sequence[float],
+    from_units: Union[str, Sequence[str]],
+    to_unit: str
+) -> np.ndarray:
+    """
+    批次換算數值
+
+    Args:
+        values: 數值陣列
+        from_units: 來源單位（單一單位，或與 values 等長的單位陣列）
+        to_unit: 目標單位
+
+    Returns:
+        換算後的數值陣列
+
+    Raises:
+        UnitConversionError: 未知單位或量綱不同
+    """
+    values = np.asarray(values, dtype=np.float64)
+
+    if isinstance(from_units, str):
+        return values * get_conversion_factor(from_units, to_unit)
+
+    if len(from_units) != len(values):
+        raise UnitConversionError('from_units must have the same length as values')
+
+    if not len(values):
+        return values
+
+    return values * _conversion_factors(from_units, to_unit)
+
+
+def _find_record_lists(payload: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+    """找出 payload 中的設備 / 使用記錄陣列（直接陣列或 {records / usageRecords: [...]}）"""
+    record_lists = {}
+    for key, data in payload.items():
+        if key in ('monthly', 'normalized'):
+            continue
+        if isinstance(data, dict):
+            for nested_key in ('records', 'usageRecords'):
+                if isinstance(data.get(nested_key), list):
+                    record_lists[f'{key}.{nested_key}'] = data[nested_key]
+        elif isinstance(data, list):
+            record_lists[key] = data
+    return record_lists
+
+
+def _record_quantity(record: Dict[str, Any]) -> Optional[Tuple[str, float]]:
+    for field in RECORD_QUANTITY_FIELDS:
+        value = record.get(field)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return field, float(value)
+    return None
+
+
+def normalize_record_quantities(
+    payload: Dict[str, Any],
+    default_unit: Optional[str] = None,
+    page_key: Optional[str] = None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    換算 payload 中設備記錄的數量並依記錄陣列加總
+
+    所有記錄的數量與單位攤平成陣列後一次換算；記錄沒有 unit 欄位時使用條目單位，
+    無法換算的單位（例如: 支、瓶）略過
+
+    Args:
+        payload: 條目 payload
+        default_unit: 記錄沒有 unit 欄位時使用的單位
+        page_key: 能源類型（決定換算的目標單位）
+
+    Returns:
+        {記錄欄位: {'unit': 標準單位, 'total': 總量, 'count': 筆數}}
+    """
+    list_names: List[str] = []
+    list_rows: List[int] = []
+    quantities: List[float] = []
+    units: List[str] = []
+
+    for name, records in _find_record_lists(payload).items():
+        for record in records:
+            if not isinstance(record, dict):
+                continue
+            quantity = _record_quantity(record)
+            unit = record.get('unit') or default_unit
+            if quantity is None or get_unit_dimension(unit) is None:
+                continue
+
+            if name not in list_names:
+                list_names.append(name)
+            list_rows.append(list_names.index(name))
+            quantities.append(quantity[1])
+            units.append(unit)
+
+    if not quantities:
+        return {}
+
+    rows = np.array(list_rows, dtype=np.intp)
+    dimensions = np.array([get_unit_dimension(unit) for unit in units])
+
+    # 依量綱換算到標準單位；同一記錄陣列混用不同量綱時取第一筆的量綱
+    normalized = np.full(len(quantities), np.nan)
+    for dimension in np.unique(dimensions):
+        mask = dimensions == dimension
+        normalized[mask] = convert_values(
+            np.array(quantities)[mask],
+            [unit for unit, selected in zip(units, mask) if selected],
+            _dimension_target_unit(dimension, page_key)
+        )
+
+    result = {}
+    for row, name in enumerate(list_names):
+        selected = (rows == row) & (dimensions == dimensions[rows == row][0])
+        result[name] = {
+            'unit': _dimension_target_unit(dimensions[selected][0], page_key),
+            'total': round(float(normalized[selected].sum()), NORMALIZED_DECIMALS),
+            'count': int(selected.sum())
+        }
+    return result
+
+
+def normalize_entry_quantities(
+    page_key: str,
+    unit: str,
+    monthly: Optional[Dict[str, float]] = None,
+    payload: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    將條目的 monthly 數值與設備記錄換算為標準單位
+
+    Args:
+        page_key: 能源類型
+        unit: 條目單位（前端提交的原始寫法）
+        monthly: 月份數據 {month: value}
+        payload: 條目 payload（用於換算設備記錄）
+
+    Returns:
+        {
+            'unit': 排放係數單位（無法換算時為原始單位）,
+            'source_unit': 原始單位,
+            'factor': 換算係數,
+            'monthly': 換算後月份數據,
+            'amount': 換算後總量,
+            'records': normalize_record_quantities 的結果
+        }
+    """
+    canonical = get_canonical_unit(unit, page_key)
+    factor = get_conversion_factor(unit, canonical) if canonical else 1.0
+
+    monthly = monthly or {}
+    converted = np.round(np.array(list(monthly.values()), dtype=np.float64) * factor, NORMALIZED_DECIMALS)
+    normalized_monthly = dict(zip(monthly, converted.tolist()))
+
+    return {
+        'unit': canonical or unit,
+        'source_unit': unit,
+        'factor': factor,
+        'monthly': normalized_monthly,
+        'amount': round(sum(normalized_monthly.values()), 2),
+        'records': normalize_record_quantities(payload or {}, default_unit=unit, page_key=page_key)
+    }
@@ -0,0 +1,504 @@
+"""
+可續傳分塊上傳服務
+
+建立工作階段 → 依 offset 逐塊 PUT → 完成。每個區塊先暫存在 evidence bucket 的
+{owner_id}/_uploads/{session_id}/ 之下，區塊狀態記錄在 upload_session_chunks，
+連線中斷後客戶端查詢缺少的 offset 重送即可；全部到齊後依序串流組合為正式檔案，
+再交給 upload_evidence_file 建立 entry_files 記錄（沿用其錯誤回滾）。
+組合中的程序中斷時，超過 UPLOAD_SESSION_ASSEMBLE_TIMEOUT_SECONDS 的工作階段可再次完成；
+過期未完成的工作階段由 sweep_expired_upload_sessions 清除（POST /api/admin/storage/sweep）
+"""
+import logging
+import math
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, BinaryIO, Dict, List, Optional, Sequence
+
+from .file_service import (
+    download_file_from_storage,
+    spool_upload_stream,
+    upload_evidence_file,
+    upload_file_to_storage,
+    validate_file_size,
+    validate_file_type
+)
+
+logger = logging.getLogger(__name__)
+
+# 每個區塊的大小（最後一塊可較小）
+UPLOAD_SESSION_CHUNK_SIZE = int(os.getenv('UPLOAD_SESSION_CHUNK_SIZE', str(1024 * 1024)))
+
+# 未完成的工作階段保留時間（小時）
+UPLOAD_SESSION_TTL_HOURS = int(os.getenv('UPLOAD_SESSION_TTL_HOURS', '24'))
+
+# 組合中超過此時間（秒）未更新視為程序已中斷，可由下一次完成請求接手
+UPLOAD_SESSION_ASSEMBLE_TIMEOUT = int(os.getenv('UPLOAD_SESSION_ASSEMBLE_TIMEOUT_SECONDS', '600'))
+
+# 每次清除的過期工作階段數上限
+UPLOAD_SESSION_SWEEP_BATCH_SIZE = int(os.getenv('UPLOAD_SESSION_SWEEP_BATCH_SIZE', '100'))
+
+SESSIONS_TABLE = 'upload_sessions'
+CHUNKS_TABLE = 'upload_session_chunks'
+
+SESSION_STATUS_UPLOADING = 'uploading'
+SESSION_STATUS_ASSEMBLING = 'assembling'
+SESSION_STATUS_COMPLETED = 'completed'
+
+CHUNK_MIME_TYPE = 'application/octet-stream'
+
+
+class UploadSessionError(ValueError):
+    """區塊參數錯誤（offset 或區塊大小不符）"""
+    pass
+
+
+class UploadSessionStateError(Exception):
+    """工作階段狀態不允許此操作（已完成、組合中、已過期或區塊未到齊）"""
+    pass
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _parse_timestamp(value: str) -> datetime:
+    return datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+
+
+def get_chunk_path(owner_id: str, session_id: str, chunk_index: int) -> str:
+    """取得區塊暫存路徑"""
+    return f"{owner_id}/_uploads/{session_id}/{chunk_index:05d}"
+
+
+def get_expected_chunk_size(session: Dict[str, Any], offset: int) -> int:
+    """
+    驗證 offset 並取得該區塊應有的大小
+
+    Args:
+        session: 工作階段
+        offset: 區塊起始位置（bytes）
+
+    Returns:
+        區塊大小
+
+    Raises:
+        UploadSessionError: offset 不在區塊邊界或超出檔案大小
+    """
+    chunk_size, file_size = session['chunk_size'], session['file_size']
+
+    if offset < 0 or offset >= file_size or offset % chunk_size:
+        raise UploadSessionError(
+            f"Invalid offset {offset}: must be a multiple of {chunk_size} below {file_size}"
+        )
+
+    return min(chunk_size, file_size - offset)
+
+
+def create_upload_session(
+    supabase,
+    user_id: str,
+    filename: str,
+    file_size: int,
+    mime_type: str,
+    page_key: str,
+    period_year: int,
+    file_type: str,
+    standard: str = '64',
+    month: Optional[int] = None,
+    entry_id: Optional[str] = None,
+    record_id: Optional[str] = None,
+    chunk_size: int = UPLOAD_SESSION_CHUNK_SIZE
+) -> Dict[str, Any]:
+    """
+    建立分塊上傳工作階段
+
+    Args:
+        supabase: Supabase client
+        user_id: 用戶 ID
+        filename: 原始檔案名稱
+        file_size: 檔案大小（bytes）
+        mime_type: MIME 類型
+        page_key: 能源類型鍵值
+        period_year: 期間年份
+        file_type: 檔案類型
+        standard: ISO 標準代碼
+        month: 月份（可選）
+        entry_id: 能源條目 ID（可選）
+        record_id: 記錄 ID（可選）
+        chunk_size: 區塊大小
+
+    Returns:
+        工作階段（含進度）
+
+    Raises:
+        ValueError: 檔案過大或為空檔案
+    """
+    validate_file_size(file_size)
+
+    session = {
+        'owner_id': user_id,
+        'status': SESSION_STATUS_UPLOADING,
+        'file_name': filename,
+        'mime_type': validate_file_type(mime_type, filename),
+        'file_size': file_size,
+        'chunk_size': chunk_size,
+        'total_chunks': math.ceil(file_size / chunk_size),
+        'entry_id': entry_id,
+        'page_key': page_key,
+        'period_year': period_year,
+        'file_type': file_type,
+        'standard': standard,
+        'month': month,
+        'record_id': record_id,
+        'expires_at': (_now() + timedelta(hours=UPLOAD_SESSION_TTL_HOURS)).isoformat()
+    }
+
+    result = supabase.table(SESSIONS_TABLE).insert(session).execute()
+    if not result.data:
+        raise Exception("Failed to create upload session: no data returned")
+
+    created = result.data[0]
+    logger.info(
+        f"Created upload session {created['id']} for user {user_id}: "
+        f"{file_size} bytes in {session['total_chunks']} chunks"
+    )
+    return with_progress(created, [])
+
+
+def _load_session(supabase, user_id: str, session_id: str) -> Dict[str, Any]:
+    result = supabase.table(SESSIONS_TABLE).select('*').eq('id', session_id).limit(1).execute()
+    if not result.data:
+        raise LookupError(f"Upload session {session_id} not found")
+
+    session = result.data[0]
+    if session['owner_id'] != user_id:
+        raise PermissionError("Permission denied: upload session does not belong to user")
+
+    return session
+
+
+def _load_chunks(supabase, session_id: str) -> List[Dict[str, Any]]:
+    result = supabase.table(CHUNKS_TABLE)\
+        .select('chunk_index, chunk_size, storage_path')\
+        .eq('session_id', session_id)\
+        .order('chunk_index')\
+        .execute()
+    return result.data or []
+
+
+def _assemble_cutoff() -> str:
+    return (_now() - timedelta(seconds=UPLOAD_SESSION_ASSEMBLE_TIMEOUT)).isoformat()
+
+
+def _is_stale_assembling(session: Dict[str, Any]) -> bool:
+    """組合中但超過 UPLOAD_SESSION_ASSEMBLE_TIMEOUT 未更新（組合的程序已中斷）"""
+    return (
+        session['status'] == SESSION_STATUS_ASSEMBLING
+        and _parse_timestamp(session['updated_at']) < _parse_timestamp(_assemble_cutoff())
+    )
+
+
+def _require_uploading(session: Dict[str, Any], allow_stale: bool = False) -> None:
+    if session['status'] != SESSION_STATUS_UPLOADING and not (allow_stale and _is_stale_assembling(session)):
+        raise UploadSessionStateError(f"Upload session {session['id']} is {session['status']}")
+    if _parse_timestamp(session['expires_at']) <= _now():
+        raise UploadSessionStateError(f"Upload session {session['id']} has expired")
+
+
+def with_progress(session: Dict[str, Any], chunks: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    加上區塊進度
+
+    Args:
+        session: 工作階段
+        chunks: 已收到的區塊記錄
+
+    Returns:
+        工作階段（另含 received_chunks, received_bytes, missing_offsets, progress）
+    """
+    received = sorted({chunk['chunk_index'] for chunk in chunks})
+    received_set = set(received)
+    received_bytes = sum(chunk['chunk_size'] for chunk in chunks)
+
+    return {
+        **session,
+        'received_chunks': received,
+        'received_bytes': received_bytes,
+        'missing_offsets': [
+            index * session['chunk_size']
+            for index in range(session['total_chunks']) if index not in received_set
+        ],
+        'progress': round(min(received_bytes / session['file_size'], 1.0) * 100, 1)
+    }
+
+
+def get_upload_session(supabase, user_id: str, session_id: str) -> Dict[str, Any]:
+    """
+    取得工作階段與已收到的區塊（客戶端依 missing_offsets 續傳）
+
+    Args:
+        supabase: Supabase client
+        user_id: 用戶 ID（用於權限驗證）
+        session_id: 工作階段 ID
+
+    Returns:
+        工作階段（含進度）
+
+    Raises:
+        LookupError: 工作階段不存在
+        PermissionError: 工作階段不屬於該用戶
+    """
+    session = _load_session(supabase, user_id, session_id)
+    return with_progress(session, _load_chunks(supabase, session_id))
+
+
+def upload_session_chunk(
+    supabase,
+    user_id: str,
+    session_id: str,
+    offset: int,
+    stream: BinaryIO
+) -> Dict[str, Any]:
+    """
+    上傳一個區塊（重送同一 offset 會覆寫）
+
+    Args:
+        supabase: Supabase client
+        user_id: 用戶 ID（用於權限驗證）
+        session_id: 工作階段 ID
+        offset: 區塊起始位置（bytes）
+        stream: 區塊資料串流
+
+    Returns:
+        工作階段（含進度）
+
+    Raises:
+        LookupError: 工作階段不存在
+        PermissionError: 工作階段不屬於該用戶
+        UploadSessionError: offset 或區塊大小不符
+        UploadSessionStateError: 工作階段已完成、組合中或已過期
+    """
+    session = _load_session(supabase, user_id, session_id)
+    _require_uploading(session)
+
+    expected_size = get_expected_chunk_size(session, offset)
+    chunk_index = offset // session['chunk_size']
+    chunk_path = get_chunk_path(session['owner_id'], session_id, chunk_index)
+
+    try:
+        with spool_upload_stream(stream, max_size=expected_size) as (spooled, chunk_size, _):
+            if chunk_size != expected_size:
+                raise UploadSessionError(f"Chunk at offset {offset} must be {expected_size} bytes, got {chunk_size}")
+            upload_file_to_storage(supabase, spooled, chunk_path, CHUNK_MIME_TYPE)
+    except UploadSessionError:
+        raise
+    except ValueError:
+        raise UploadSessionError(f"Chunk at offset {offset} must be {expected_size} bytes")
+
+    supabase.table(CHUNKS_TABLE).upsert({
+        'session_id': session_id,
+        'chunk_index': chunk_index,
+        'chunk_size': expected_size,
+        'storage_path': chunk_path,
+        'received_at': _now().isoformat()
+    }, on_conflict='session_id,chunk_index').execute()
+
+    supabase.table(SESSIONS_TABLE).update({'updated_at': _now().isoformat()}).eq('id', session_id).execute()
+
+    logger.info(f"Upload session {session_id}: received chunk {chunk_index + 1}/{session['total_chunks']}")
+    return with_progress(session, _load_chunks(supabase, session_id))
+
+
+class StoredChunkStream:
+    """依序下載暫存區塊的唯讀串流（同一時間只保留一個區塊在記憶體中）"""
+
+    def __init__(self, supabase, chunk_paths: Sequence[str]):
+        self._supabase = supabase
+        self._paths = list(chunk_paths)
+        self._buffer = memoryview(b'')
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._buffer and self._paths:
+            self._buffer = memoryview(download_file_from_storage(self._supabase, self._paths.pop(0)))
+
+        if size is None or size < 0:
+            size = len(self._buffer)
+
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return bytes(data)
+
+
+def _remove_chunks(supabase, session_id: str, chunks: Sequence[Dict[str, Any]]) -> None:
+    if chunks:
+        try:
+            supabase.storage.from_('evidence').remove([chunk['storage_path'] for chunk in chunks])
+        except Exception as e:
+            logger.warning(f"Failed to remove chunks of upload session {session_id}: {str(e)}")
+    supabase.table(CHUNKS_TABLE).delete().eq('session_id', session_id).execute()
+
+
+def _completed_result(session: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'success': True,
+        'file_id': session['file_id'],
+        'file_path': session['file_path'],
+        'file_name': session['file_name'],
+        'file_size': session['file_size'],
+        'mime_type': session['mime_type']
+    }
+
+
+def complete_upload_session(supabase, user_id: str, session_id: str) -> Dict[str, Any]:
+    """
+    組合全部區塊並建立檔案記錄（已完成的工作階段重複呼叫會回傳相同結果）
+
+    Args:
+        supabase: Supabase client
+        user_id: 用戶 ID（用於權限驗證）
+        session_id: 工作階段 ID
+
+    Returns:
+        與 upload_evidence_file 相同格式的上傳結果
+
+    Raises:
+        LookupError: 工作階段不存在
+        PermissionError: 工作階段不屬於該用戶
+        UploadSessionStateError: 區塊未到齊、正在組合或已過期
+        Exception: 組合或上傳失敗（工作階段回到 uploading，可再次完成）
+    """
+    session = _load_session(supabase, user_id, session_id)
+    if session['status'] == SESSION_STATUS_COMPLETED:
+        return _completed_result(session)
+    _require_uploading(session, allow_stale=True)
+
+    chunks = _load_chunks(supabase, session_id)
+    missing = with_progress(session, chunks)['missing_offsets']
+    if missing:
+        raise UploadSessionStateError(f"Upload session {session_id} is missing chunks at offsets {missing[:10]}")
+
+    # 以狀態條件更新取得組合權，避免重複完成；組合逾時的工作階段以 updated_at 條件接手
+    claim = supabase.table(SESSIONS_TABLE)\
+        .update({'status': SESSION_STATUS_ASSEMBLING, 'updated_at': _now().isoformat()})\
+        .eq('id', session_id)
+    if session['status'] == SESSION_STATUS_ASSEMBLING:
+        logger.warning(f"Reclaiming upload session {session_id} stuck in assembling since {session['updated_at']}")
+        claim = claim.eq('status', SESSION_STATUS_ASSEMBLING).lt('updated_at', _assemble_cutoff())
+    else:
+        claim = claim.eq('status', SESSION_STATUS_UPLOADING)
+    claimed = claim.execute()
+    if not claimed.data:
+        raise UploadSessionStateError(f"Upload session {session_id} is already being completed")
+
+    try:
+        stream = StoredChunkStream(supabase, [chunk['storage_path'] for chunk in chunks])
+        with spool_upload_stream(stream, max_size=session['file_size']) as (spooled, file_size, content_sha256):
+            if file_size != session['file_size']:
+                raise UploadSessionStateError(
+                    f"Assembled size {file_size} does not match declared size {session['file_size']}"
+                )
+
+            result = upload_evidence_file(
+                supabase=supabase,
+                user_id=user_id,
+                entry_id=session.get('entry_id'),
+                file_data=spooled,
+                filename=session['file_name'],
+                file_size=file_size,
+                mime_type=session['mime_type'],
+                page_key=session['page_key'],
+                period_year=session['period_year'],
+                file_type=session['file_type'],
+                standard=session.get('standard') or '64',
+                month=session.get('month'),
+                record_id=session.get('record_id'),
+                content_sha256=content_sha256
+            )
+
+    except Exception as e:
+        logger.error(f"Failed to complete upload session {session_id}: {str(e)}")
+        supabase.table(SESSIONS_TABLE)\
+            .update({'status': SESSION_STATUS_UPLOADING, 'updated_at': _now().isoformat()})\
+            .eq('id', session_id)\
+            .execute()
+        raise
+
+    completed_at = _now().isoformat()
+    supabase.table(SESSIONS_TABLE).update({
+        'status': SESSION_STATUS_COMPLETED,
+        'file_id': result['file_id'],
+        'file_path': result['file_path'],
+        'updated_at': completed_at,
+        'completed_at': completed_at
+    }).eq('id', session_id).execute()
+
+    _remove_chunks(supabase, session_id, chunks)
+
+    logger.info(f"Completed upload session {session_id}: file {result['file_id']}")
+    return result
+
+
+def abort_upload_session(supabase, user_id: str, session_id: str) -> Dict[str, Any]:
+    """
+    取消工作階段並刪除已上傳的區塊
+
+    Args:
+        supabase: Supabase client
+        user_id: 用戶 ID（用於權限驗證）
+        session_id: 工作階段 ID
+
+    Returns:
+        {'success': True, 'session_id': str}
+
+    Raises:
+        LookupError: 工作階段不存在
+        PermissionError: 工作階段不屬於該用戶
+        UploadSessionStateError: 工作階段已完成或正在組合
+    """
+    session = _load_session(supabase, user_id, session_id)
+    if session['status'] != SESSION_STATUS_UPLOADING and not _is_stale_assembling(session):
+        raise UploadSessionStateError(f"Upload session {session_id} is {session['status']}")
+
+    _remove_chunks(supabase, session_id, _load_chunks(supabase, session_id))
+    supabase.table(SESSIONS_TABLE).delete().eq('id', session_id).execute()
+
+    logger.info(f"Aborted upload session {session_id}")
+    return {'success': True, 'session_id': session_id}
+
+
+def sweep_expired_upload_sessions(supabase, limit: int = UPLOAD_SESSION_SWEEP_BATCH_SIZE) -> int:
+    """
+    清除過期未完成的工作階段與暫存區塊（使用索引 idx_upload_sessions_expires，供排程定期呼叫）
+
+    仍在組合中且未逾時的工作階段留到下一次清除
+
+    Args:
+        supabase: Supabase client
+        limit: 本次最多清除的工作階段數
+
+    Returns:
+        清除的工作階段數
+    """
+    expired = supabase.table(SESSIONS_TABLE)\
+        .select('id, status, updated_at')\
+        .neq('status', SESSION_STATUS_COMPLETED)\
+        .lt('expires_at', _now().isoformat())\
+        .order('expires_at')\
+        .limit(limit)\
+        .execute()
+
+    removed = 0
+    for session in expired.data or []:
+        if session['status'] == SESSION_STATUS_ASSEMBLING and not _is_stale_assembling(session):
+            continue
+
+        _remove_chunks(supabase, session['id'], _load_chunks(supabase, session['id']))
+        supabase.table(SESSIONS_TABLE)\
+            .delete()\
+            .eq('id', session['id'])\
+            .eq('status', session['status'])\
+            .execute()
+        removed += 1
+
+    if removed:
+        logger.info(f"Removed {removed} expired upload sessions")
+    return removed
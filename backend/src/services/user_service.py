@@ -0,0 +1,98 @@
+"""
+用戶管理服務
+以批次查詢取代逐一查詢（避免 N+1）
+"""
+from typing import Dict, Any, List
+import logging
+
+logger = logging.getLogger(__name__)
+
+# auth.users 分頁大小（GoTrue 上限為 1000）
+AUTH_USERS_PAGE_SIZE = 1000
+
+
+def get_entry_counts_by_owner(supabase) -> Dict[str, int]:
+    """
+    以單一聚合查詢取得每位用戶的填報數量
+
+    Args:
+        supabase: Supabase client
+
+    Returns:
+        {owner_id: entries_count}
+    """
+    result = supabase.rpc('get_entry_counts_by_owner', {}).execute()
+
+    return {
+        row['owner_id']: int(row['entries_count'])
+        for row in (result.data or [])
+    }
+
+
+def get_auth_emails(supabase) -> Dict[str, str]:
+    """
+    分頁批次取得 auth.users 的 email
+
+    Args:
+        supabase: Supabase client
+
+    Returns:
+        {user_id: email}
+    """
+    emails = {}
+    page = 1
+
+    while True:
+        users = supabase.auth.admin.list_users(page=page, per_page=AUTH_USERS_PAGE_SIZE)
+
+        for user in users:
+            if user.email:
+                emails[user.id] = user.email
+
+        if len(users) < AUTH_USERS_PAGE_SIZE:
+            break
+        page += 1
+
+    return emails
+
+
+def list_users_with_entry_counts(supabase) -> List[Dict[str, Any]]:
+    """
+    取得所有用戶及其填報數量
+
+    固定三次查詢（profiles、聚合填報數量、auth.users 分頁），在記憶體中合併
+
+    Args:
+        supabase: Supabase client
+
+    Returns:
+        用戶列表
+    """
+    profiles_result = supabase.table('profiles').select('*').execute()
+
+    if not profiles_result.data:
+        return []
+
+    entry_counts = get_entry_counts_by_owner(supabase)
+
+    # 取得 email 失敗時改用 profiles.email，不影響整體列表
+    try:
+        auth_emails = get_auth_emails(supabase)
+    except Exception as e:
+        logger.warning(f"Failed to list auth users, falling back to profile emails: {str(e)}")
+        auth_emails = {}
+
+    users = []
+    for profile in profiles_result.data:
+        user_id = profile['id']
+        users.append({
+            'id': user_id,
+            'email': auth_emails.get(user_id) or profile.get('email') or 'N/A',
+            'display_name': profile.get('display_name', 'N/A'),
+            'role': profile.get('role', 'user'),
+            'is_active': profile.get('is_active', True),
+            'company': profile.get('company', 'N/A'),
+            'entries_count': entry_counts.get(user_id, 0)
+        })
+
+    return users
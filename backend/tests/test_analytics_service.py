@@ -0,0 +1,150 @@
+"""
+排放趨勢分析服務單元測試
+"""
+import numpy as np
+import pytest
+from unittest.mock import MagicMock
+from src.services.analytics_service import (
+    calculate_yoy,
+    build_scenario_arrays,
+    simulate_reduction_paths,
+    get_emission_trends,
+    ScenarioError
+)
+from src.services.rollup_service import CATEGORIES, build_company_cubes, stack_company_cubes
+
+DIESEL = CATEGORIES.index('diesel')
+ELECTRICITY = CATEGORIES.index('electricity')
+
+
+def base_vector(diesel=0.0, electricity=0.0):
+    vector = np.zeros(len(CATEGORIES))
+    vector[DIESEL] = diesel
+    vector[ELECTRICITY] = electricity
+    return vector
+
+
+def make_cube(version=1):
+    entries = [
+        {'id': 'e1', 'owner_id': 'u1', 'page_key': 'diesel', 'period_year': 2023, 'payload': {'monthly': {'1': 1000.0}}},
+        {'id': 'e2', 'owner_id': 'u1', 'page_key': 'diesel', 'period_year': 2024, 'payload': {'monthly': {'1': 800.0}}},
+        {'id': 'e3', 'owner_id': 'u2', 'page_key': 'electricity', 'period_year': 2024, 'payload': {'monthly': {'1': 1000.0}}},
+    ]
+    owners = {'u1': 'A公司', 'u2': 'B公司'}
+    return stack_company_cubes(build_company_cubes(entries, owners, ['A公司', 'B公司']), version)
+
+
+@pytest.fixture
+def rollup_cache(monkeypatch):
+    cache = MagicMock()
+    cache.get_cube.return_value = make_cube()
+    monkeypatch.setattr('src.services.analytics_service.get_rollup_cache', lambda: cache)
+    return cache
+
+
+class TestCalculateYoy:
+    """測試逐年增減"""
+
+    def test_year_and_category_deltas(self):
+        """測試年度總量與類別增減"""
+        matrix = np.vstack([base_vector(diesel=100.0), base_vector(diesel=80.0, electricity=50.0)])
+
+        result = calculate_yoy([2023, 2024], matrix)
+
+        assert result['by_year'][1] == {
+            'year': 2024, 'emission': 130.0, 'previous_year': 2023, 'delta': 30.0, 'delta_percent': 30.0
+        }
+        diesel, electricity = result['by_category']
+        assert diesel['delta'] == -20.0 and diesel['delta_percent'] == -20.0
+        assert diesel['name'] == '柴油(移動源)'
+        assert electricity['previous_emission'] == 0.0 and electricity['delta_percent'] is None
+
+    def test_single_year(self):
+        """測試只有一個年度"""
+        result = calculate_yoy([2024], base_vector(diesel=10.0)[None, :])
+        assert result['by_year'][0]['delta'] is None
+        assert result['by_category'] == []
+
+
+class TestReductionPaths:
+    """測試減量情境推估"""
+
+    def test_efficiency_compounds(self):
+        """測試節能逐年複利"""
+        paths = simulate_reduction_paths(base_vector(diesel=100.0), 2024, 2026, [{'efficiency_percent': 10}])
+
+        assert paths.shape == (1, 2, len(CATEGORIES))
+        assert paths[0, :, DIESEL] == pytest.approx([90.0, 81.0])
+
+    def test_fuel_switch_moves_emissions(self):
+        """測試能源轉換依排放係數比例轉移排放（線性完成）"""
+        scenario = {'fuel_switches': [{'from_category': 'diesel', 'to_category': 'electricity', 'share': 0.5, 'conversion': 2.0}]}
+
+        paths = simulate_reduction_paths(base_vector(diesel=2606.8), 2024, 2026, [scenario])
+
+        # 2606.8 kgCO2e = 1000 L 柴油；目標年一半改用電力 500 L × 2 kWh/L × 0.509
+        assert paths[0, -1, DIESEL] == pytest.approx(1303.4)
+        assert paths[0, -1, ELECTRICITY] == pytest.approx(509.0)
+        assert paths[0, 0, DIESEL] == pytest.approx(2606.8 * 0.75)
+
+    def test_scenarios_evaluated_together(self):
+        """測試多個情境一次計算"""
+        scenarios = [{'efficiency_percent': 0}, {'efficiency_percent': 5}, {'category_efficiency': {'diesel': 50}}]
+        paths = simulate_reduction_paths(base_vector(diesel=100.0, electricity=100.0), 2024, 2025, scenarios)
+
+        assert paths[:, 0, :].sum(axis=1) == pytest.approx([200.0, 190.0, 150.0])
+
+    @pytest.mark.parametrize('scenario', [
+        {'category_efficiency': {'unknown': 5}},
+        {'fuel_switches': [{'from_category': 'diesel', 'to_category': 'diesel', 'share': 0.5}]},
+        {'fuel_switches': [
+            {'from_category': 'diesel', 'to_category': 'electricity', 'share': 0.7},
+            {'from_category': 'diesel', 'to_category': 'gasoline', 'share': 0.5}
+        ]},
+    ])
+    def test_invalid_scenarios(self, scenario):
+        """測試情境參數錯誤"""
+        with pytest.raises(ScenarioError):
+            build_scenario_arrays([scenario], 2024)
+
+
+class TestGetEmissionTrends:
+    """測試趨勢分析"""
+
+    def test_trends_and_projection(self, rollup_cache):
+        """測試逐年比較與目標評估"""
+        result = get_emission_trends(
+            MagicMock(), scenarios=[{'name': '節能', 'efficiency_percent': 10}],
+            target_year=2026, target_reduction_percent=20
+        )
+
+        assert result['years'] == [2023, 2024]
+        assert result['by_year'][1]['emission'] == round(800 * 2.6068 + 509, 2)
+
+        projection = result['projection']
+        assert projection['base_year'] == 2024
+        assert projection['target_emission'] == round(projection['base_emission'] * 0.8, 2)
+        assert projection['required_annual_reduction_percent'] == round((1 - 0.8 ** 0.5) * 100, 2)
+
+        scenario = projection['scenarios'][0]
+        assert [point['year'] for point in scenario['path']] == [2025, 2026]
+        assert scenario['reduction_percent'] == 19.0
+        assert scenario['meets_target'] is False
+
+    def test_company_filter(self, rollup_cache):
+        """測試只計算指定公司"""
+        result = get_emission_trends(MagicMock(), companies=['B公司'])
+        assert [item['emission'] for item in result['by_year']] == [0.0, 509.0]
+
+    def test_cached_per_data_version(self, rollup_cache, monkeypatch):
+        """測試相同資料版本使用快取，資料版本改變後重新計算"""
+        first = get_emission_trends(MagicMock(), companies=['A公司'], target_year=2030)
+        assert get_emission_trends(MagicMock(), companies=['A公司'], target_year=2030) is first
+
+        rollup_cache.get_cube.return_value = make_cube(version=2)
+        assert get_emission_trends(MagicMock(), companies=['A公司'], target_year=2030) is not first
+
+    def test_invalid_target_year(self, rollup_cache):
+        """測試目標年早於基準年"""
+        with pytest.raises(ScenarioError):
+            get_emission_trends(MagicMock(), base_year=2024, target_year=2023)
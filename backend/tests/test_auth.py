@@ -0,0 +1,217 @@
+"""
+Token 驗證單元測試
+重點：本地 JWT 驗證與遠端回退
+"""
+import time
+from datetime import datetime, timezone
+import pytest
+import jwt
+from unittest.mock import Mock, patch
+from utils import auth
+from utils.auth import (
+    verify_token_locally,
+    resolve_token_identity,
+    get_user_from_token,
+    UnknownSigningKeyError
+)
+
+JWT_SECRET = 'test-jwt-secret-with-enough-length-for-hs256'
+
+
+def make_token(secret=JWT_SECRET, expires_in=3600, **claims):
+    """產生測試用 token"""
+    payload = {
+        'sub': 'user-123',
+        'email': 'user@example.com',
+        'aud': 'authenticated',
+        'exp': int(time.time()) + expires_in,
+        **claims
+    }
+    return jwt.encode(payload, secret, algorithm='HS256')
+
+
+@pytest.fixture
+def jwt_secret(monkeypatch):
+    monkeypatch.setenv('SUPABASE_JWT_SECRET', JWT_SECRET)
+
+
+class TestVerifyTokenLocally:
+    """測試本地 token 驗證"""
+
+    def test_valid_token(self, jwt_secret):
+        """測試有效 token"""
+        claims = verify_token_locally(make_token())
+        assert claims['sub'] == 'user-123'
+        assert claims['email'] == 'user@example.com'
+
+    def test_expired_token(self, jwt_secret):
+        """測試過期 token"""
+        assert verify_token_locally(make_token(expires_in=-60)) is None
+
+    def test_invalid_signature(self, jwt_secret):
+        """測試簽章錯誤"""
+        token = make_token(secret='another-secret-with-enough-length-for-hs256')
+        assert verify_token_locally(token) is None
+
+    def test_wrong_audience(self, jwt_secret):
+        """測試 audience 錯誤"""
+        assert verify_token_locally(make_token(aud='anon')) is None
+
+    def test_malformed_token(self, jwt_secret):
+        """測試格式錯誤的 token"""
+        assert verify_token_locally('not-a-jwt') is None
+
+    def test_missing_secret_raises_unknown_key(self, monkeypatch):
+        """測試未設定 secret 時需回退遠端"""
+        monkeypatch.delenv('SUPABASE_JWT_SECRET', raising=False)
+        with pytest.raises(UnknownSigningKeyError):
+            verify_token_locally(make_token())
+
+
+class TestResolveTokenIdentity:
+    """測試 token 身分解析"""
+
+    def test_local_verification_skips_remote(self, jwt_secret):
+        """測試本地驗證成功時不呼叫遠端"""
+        with patch.object(auth, 'fetch_remote_user') as mock_remote:
+            identity = resolve_token_identity(make_token())
+
+        assert identity['id'] == 'user-123'
+        assert identity['email'] == 'user@example.com'
+        assert identity['exp'] > time.time()
+        mock_remote.assert_not_called()
+
+    def test_invalid_token_does_not_fall_back(self, jwt_secret):
+        """測試簽章錯誤時不回退遠端"""
+        with patch.object(auth, 'fetch_remote_user') as mock_remote:
+            identity = resolve_token_identity(make_token(expires_in=-60))
+
+        assert identity is None
+        mock_remote.assert_not_called()
+
+    def test_unknown_key_falls_back_to_remote(self, monkeypatch):
+        """測試未知金鑰時回退遠端驗證"""
+        monkeypatch.delenv('SUPABASE_JWT_SECRET', raising=False)
+        remote_identity = {'id': 'user-123', 'email': 'user@example.com'}
+        issued = int(time.time()) - 60
+
+        with patch.object(auth, 'fetch_remote_user', return_value=remote_identity) as mock_remote:
+            identity = resolve_token_identity(make_token(iat=issued))
+
+        assert identity == {'id': 'user-123', 'email': 'user@example.com', 'iat': issued}
+        mock_remote.assert_called_once()
+
+    def test_remote_mode(self, jwt_secret, monkeypatch):
+        """測試 remote 模式一律呼叫遠端"""
+        monkeypatch.setattr(auth, 'AUTH_VERIFY_MODE', 'remote')
+
+        with patch.object(auth, 'fetch_remote_user', return_value=None) as mock_remote:
+            identity = resolve_token_identity(make_token())
+
+        assert identity is None
+        mock_remote.assert_called_once()
+
+
+@pytest.fixture(autouse=True)
+def clear_auth_caches():
+    auth._identity_cache.clear()
+    auth._profile_cache.clear()
+
+
+def make_supabase_with_profile(**profile):
+    """建立回傳指定 profile 的 mock Supabase client"""
+    mock_supabase = Mock()
+    mock_supabase.table.return_value.select.return_value.eq.return_value.single.return_value.execute.return_value = Mock(
+        data={'role': 'user', 'is_active': True, **profile}
+    )
+    return mock_supabase
+
+
+class TestGetUserFromToken:
+    """測試從 header 取得用戶"""
+
+    def test_missing_bearer_prefix(self):
+        """測試缺少 Bearer 前綴"""
+        assert get_user_from_token('Token abc') is None
+
+    def test_user_with_profile(self, jwt_secret):
+        """測試成功取得用戶與 profile"""
+        mock_supabase = make_supabase_with_profile(role='admin', display_name='Admin', company='ACME')
+
+        with patch.object(auth, 'get_supabase_admin', return_value=mock_supabase):
+            user = get_user_from_token(f'Bearer {make_token()}')
+
+        assert user['id'] == 'user-123'
+        assert user['email'] == 'user@example.com'
+        assert user['role'] == 'admin'
+        assert user['company'] == 'ACME'
+
+
+class TestUserCache:
+    """測試已解析用戶快取與失效"""
+
+    def test_repeated_requests_hit_cache(self, jwt_secret):
+        """測試同一 token 重複請求只查詢一次 profile"""
+        mock_supabase = make_supabase_with_profile()
+        header = f'Bearer {make_token()}'
+
+        with patch.object(auth, 'get_supabase_admin', return_value=mock_supabase), \
+                patch.object(auth, 'resolve_token_identity', wraps=resolve_token_identity) as mock_resolve:
+            get_user_from_token(header)
+            get_user_from_token(header)
+            user = get_user_from_token(header)
+
+        assert user['id'] == 'user-123'
+        assert mock_resolve.call_count == 1
+        assert mock_supabase.table.call_count == 1
+        assert auth.get_auth_cache_stats()['profile']['hits'] >= 2
+
+    def test_invalidate_reloads_profile(self, jwt_secret):
+        """測試清除快取後重新讀取 profile（角色變更立即生效）"""
+        header = f'Bearer {make_token()}'
+
+        with patch.object(auth, 'get_supabase_admin', return_value=make_supabase_with_profile(role='user')):
+            assert get_user_from_token(header)['role'] == 'user'
+
+        with patch.object(auth, 'get_supabase_admin', return_value=make_supabase_with_profile(role='admin')):
+            assert get_user_from_token(header)['role'] == 'user'  # 仍為快取值
+            auth.invalidate_user_cache('user-123')
+            assert get_user_from_token(header)['role'] == 'admin'
+
+    def test_revoke_writes_profile(self, jwt_secret):
+        """測試強制登出將時間寫入 profile 並清除快取"""
+        mock_supabase = make_supabase_with_profile()
+        header = f'Bearer {make_token()}'
+
+        with patch.object(auth, 'get_supabase_admin', return_value=mock_supabase):
+            get_user_from_token(header)
+            auth.invalidate_user_cache('user-123', revoke_tokens=True)
+
+        values = mock_supabase.table.return_value.update.call_args.args[0]
+        assert values['tokens_revoked_at']
+        mock_supabase.table.return_value.update.return_value.eq.assert_called_once_with('id', 'user-123')
+        assert auth._profile_cache.get('user-123') is None
+
+    def test_revoked_profile_rejects_existing_tokens(self, jwt_secret):
+        """測試拒絕強制登出前與同一秒簽發的 token"""
+        revoked = int(time.time()) - 10
+        revoked_at = datetime.fromtimestamp(revoked + 0.5, timezone.utc).isoformat()
+
+        with patch.object(auth, 'get_supabase_admin',
+                          return_value=make_supabase_with_profile(tokens_revoked_at=revoked_at)):
+            assert get_user_from_token(f'Bearer {make_token(iat=revoked - 10)}') is None
+            assert get_user_from_token(f'Bearer {make_token(iat=revoked)}') is None
+            assert get_user_from_token(f'Bearer {make_token(iat=revoked + 1)}') is not None
+
+    def test_remote_identity_uses_token_iat(self, monkeypatch):
+        """測試遠端驗證的身分同樣依 token 的 iat 判斷是否已強制登出"""
+        monkeypatch.setattr(auth, 'AUTH_VERIFY_MODE', 'remote')
+        revoked = int(time.time()) - 10
+        revoked_at = datetime.fromtimestamp(revoked + 0.5, timezone.utc).isoformat()
+
+        with patch.object(auth, 'fetch_remote_user',
+                          side_effect=lambda token: {'id': 'user-123', 'email': 'user@example.com'}):
+            with patch.object(auth, 'get_supabase_admin',
+                              return_value=make_supabase_with_profile(tokens_revoked_at=revoked_at)):
+                assert get_user_from_token(f'Bearer {make_token(iat=revoked - 10)}') is None
+                assert get_user_from_token(f'Bearer {make_token(iat=revoked + 1)}') is not None
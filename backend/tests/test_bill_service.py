@@ -0,0 +1,117 @@
+"""
+帳單月份分配服務單元測試
+"""
+import numpy as np
+import pytest
+from src.services.bill_service import (
+    parse_roc_dates,
+    get_month_bounds,
+    build_overlap_matrix,
+    distribute_bills,
+    distribute_entry_bills,
+    BillDistributionError
+)
+
+
+class TestParseRocDates:
+    """測試民國日期轉換"""
+
+    def test_valid_dates(self):
+        """測試有效日期"""
+        dates = parse_roc_dates(['113/01/01', '112/12/31', '113/02/29'])
+        assert dates.tolist() == [
+            np.datetime64('2024-01-01').item(),
+            np.datetime64('2023-12-31').item(),
+            np.datetime64('2024-02-29').item()
+        ]
+
+    @pytest.mark.parametrize('value', ['113-01-01', '113/02/30', '', 'abc'])
+    def test_invalid_dates(self, value):
+        """測試格式錯誤或不存在的日期"""
+        with pytest.raises(BillDistributionError):
+            parse_roc_dates([value])
+
+
+class TestOverlapMatrix:
+    """測試重疊天數矩陣"""
+
+    def test_month_bounds_leap_year(self):
+        """測試閏年月份起訖日"""
+        starts, ends = get_month_bounds(2024)
+        days = (ends - starts).astype(int) + 1
+        assert days.tolist() == [31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
+
+    def test_bill_across_year_boundary(self):
+        """測試跨年度帳單只計入目標年度的天數"""
+        starts = parse_roc_dates(['112/12/15'])
+        ends = parse_roc_dates(['113/02/14'])
+
+        overlap = build_overlap_matrix(starts, ends, 2024)
+
+        assert overlap.shape == (1, 12)
+        assert overlap[0, :3].tolist() == [31, 14, 0]
+        assert overlap.sum() == 45
+
+
+class TestDistributeBills:
+    """測試帳單用量分配"""
+
+    def test_two_month_bill(self):
+        """測試跨兩個月的帳單（與前端計算結果一致）"""
+        result = distribute_bills(
+            [{'billingStart': '113/01/16', 'billingEnd': '113/03/15', 'billingUnits': 600}], 2024
+        )
+
+        # 1/16~3/15 共 60 天：1 月 16 天、2 月 29 天、3 月 15 天
+        assert result['monthly'] == {'1': 160.0, '2': 290.0, '3': 150.0}
+        assert result['total'] == 600.0
+        assert result['count'] == 1
+
+    def test_prorates_days_outside_year(self):
+        """測試落在年度外的天數不計入"""
+        result = distribute_bills(
+            [{'billingStart': '112/12/02', 'billingEnd': '113/01/31', 'billingUnits': 610}], 2024
+        )
+
+        assert result['monthly'] == {'1': 310.0}
+        assert result['total'] == 310.0
+
+    def test_multiple_bills_and_meters(self):
+        """測試多筆帳單與表號彙總"""
+        bills = [
+            {'billingStart': '113/01/01', 'billingEnd': '113/01/31', 'billingUnits': 100, 'meterId': 'm-1'},
+            {'billingStart': '113/01/01', 'billingEnd': '113/01/31', 'billingUnits': 50, 'meterId': 'm-2'},
+            {'billingStart': '113/02/01', 'billingEnd': '113/02/29', 'billingUnits': 80, 'meterId': 'm-1'},
+        ]
+
+        result = distribute_bills(bills, 2024)
+
+        assert result['monthly'] == {'1': 150.0, '2': 80.0}
+        assert result['meters'] == {'m-1': {'1': 100.0, '2': 80.0}, 'm-2': {'1': 50.0}}
+
+    def test_incomplete_bills_skipped(self):
+        """測試未填寫起訖日的帳單略過"""
+        result = distribute_bills([{'billingStart': '', 'billingEnd': '113/01/31', 'billingUnits': 10}], 2024)
+        assert result == {'monthly': {}, 'meters': {}, 'total': 0.0, 'count': 0}
+
+    def test_start_after_end(self):
+        """測試計費起日晚於訖日"""
+        with pytest.raises(BillDistributionError):
+            distribute_bills([{'billingStart': '113/03/01', 'billingEnd': '113/02/01', 'billingUnits': 10}], 2024)
+
+
+class TestDistributeEntryBills:
+    """測試條目帳單分配"""
+
+    def test_non_bill_page(self):
+        """測試非帳單類型不處理"""
+        assert distribute_entry_bills('diesel', 2024, {'billData': []}) is None
+
+    def test_natural_gas(self):
+        """測試天然氣帳單"""
+        payload = {'billData': [{'billingStart': '113/05/01', 'billingEnd': '113/05/31', 'billingUnits': 42.5}]}
+        assert distribute_entry_bills('natural_gas', 2024, payload) == {'5': 42.5}
+
+    def test_no_bills(self):
+        """測試沒有帳單時沿用前端月份數據"""
+        assert distribute_entry_bills('electricity', 2024, {'meterData': []}) is None
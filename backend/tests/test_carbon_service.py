@@ -1,11 +1,23 @@
 """
 碳排放計算服務單元測試
 """
+import random
+import numpy as np
 import pytest
+from unittest.mock import Mock
+from src.services import carbon_service
+from src.services.emission_factor_service import UnknownGwpSetError
 from src.services.carbon_service import (
     get_emission_factor,
     calculate_monthly_emission,
-    calculate_total_carbon
+    calculate_total_carbon,
+    calculate_carbon_batch,
+    pack_monthly_data,
+    round_emissions,
+    calculate_gas_breakdown,
+    get_entry_gas_breakdown,
+    invalidate_entry_gas_breakdown,
+    MAX_BATCH_ITEMS
 )
 
 
@@ -158,6 +170,7 @@ class TestCalculateTotalCarbon:
         assert 'total_emission' in result
         assert 'monthly_emission' in result
         assert 'emission_factor' in result
+        assert 'factor_version' in result
         assert 'formula' in result
 
         # 確認型別正確
@@ -178,3 +191,235 @@ class TestCalculateTotalCarbon:
 
         # 12 * 10000 * 2.6068 = 312816.0
         assert result['total_emission'] == 312816.0
+
+
+class TestRoundEmissions:
+    """測試向量化四捨五入"""
+
+    def test_matches_python_round(self):
+        """測試與 Python round() 結果一致（包含接近 .5 的值）"""
+        values = np.array([2.675, 1.005, 0.125, 0.135, 260.68, 1e-9, 1234567.895])
+        result = round_emissions(values)
+
+        assert result.tolist() == [round(v, 2) for v in values.tolist()]
+
+
+class TestPackMonthlyData:
+    """測試月份數據打包"""
+
+    def test_values_and_mask(self):
+        """測試打包為項目數 × 12 矩陣"""
+        values, mask = pack_monthly_data([{"1": 10.0, "12": 5.0}, {"3": 0.0}])
+
+        assert values.shape == (2, 12)
+        assert values[0, 0] == 10.0
+        assert values[0, 11] == 5.0
+        assert mask[1, 2]
+        assert mask.sum() == 3
+
+    def test_invalid_month(self):
+        """測試無效月份"""
+        with pytest.raises(ValueError):
+            pack_monthly_data([{"13": 1.0}])
+
+    def test_duplicate_month(self):
+        """測試重複月份（例如 1 與 01）"""
+        with pytest.raises(ValueError):
+            pack_monthly_data([{"1": 1.0, "01": 2.0}])
+
+
+class TestCalculateCarbonBatch:
+    """測試批次碳排放計算"""
+
+    def test_matches_single_calculation(self):
+        """測試批次結果與逐筆計算完全一致"""
+        rng = random.Random(42)
+        page_keys = ['diesel', 'gasoline', 'electricity', 'sf6', 'urea', 'unknown_type']
+        items = []
+        for index in range(500):
+            monthly_data = {
+                str(month): round(rng.uniform(0, 5000), rng.choice([0, 1, 2, 3]))
+                for month in range(1, 13) if rng.random() < 0.7
+            }
+            items.append({
+                'owner_id': f'user-{index % 7}',
+                'page_key': rng.choice(page_keys),
+                'year': rng.choice([2023, 2024]),
+                'monthly_data': monthly_data
+            })
+
+        result = calculate_carbon_batch(items)
+
+        assert result['count'] == 500
+        for item, batch_result in zip(items, result['items']):
+            expected = calculate_total_carbon(item['page_key'], item['monthly_data'], item['year'])
+            assert batch_result['total_emission'] == expected['total_emission']
+            assert batch_result['monthly_emission'] == expected['monthly_emission']
+            assert batch_result['emission_factor'] == expected['emission_factor']
+            assert batch_result['factor_version'] == expected['factor_version']
+            assert batch_result['formula'] == expected['formula']
+            assert batch_result['owner_id'] == item['owner_id']
+
+    def test_grand_total(self):
+        """測試總排放量"""
+        result = calculate_carbon_batch([
+            {'page_key': 'diesel', 'year': 2024, 'monthly_data': {"1": 100.0}},
+            {'page_key': 'electricity', 'year': 2024, 'monthly_data': {"1": 1000.0, "2": 500.0}}
+        ])
+
+        assert result['items'][0]['total_emission'] == 260.68
+        assert result['items'][1]['total_emission'] == 763.5
+        assert result['total_emission'] == 1024.18
+        assert result['items'][0]['owner_id'] is None
+
+    def test_only_provided_months_returned(self):
+        """測試只回傳有提供的月份"""
+        result = calculate_carbon_batch([
+            {'page_key': 'diesel', 'year': 2024, 'monthly_data': {"3": 10.0, "1": 0.0}}
+        ])
+
+        assert result['items'][0]['monthly_emission'] == {"3": 26.07, "1": 0.0}
+
+    def test_unknown_factor_version(self):
+        """測試指定不存在的係數版本"""
+        with pytest.raises(ValueError):
+            calculate_carbon_batch([
+                {'page_key': 'diesel', 'year': 2024, 'monthly_data': {"1": 1.0}, 'factor_version': '0.0.0'}
+            ])
+
+    def test_empty_items(self):
+        """測試空批次"""
+        assert calculate_carbon_batch([]) == {'items': [], 'total_emission': 0.0, 'count': 0}
+
+    def test_too_many_items(self):
+        """測試超過項目上限"""
+        items = [{'page_key': 'diesel', 'year': 2024, 'monthly_data': {}}] * (MAX_BATCH_ITEMS + 1)
+        with pytest.raises(ValueError):
+            calculate_carbon_batch(items)
+
+
+class TestCalculateGasBreakdown:
+    """測試分氣體排放計算"""
+
+    def test_diesel_ar5(self):
+        """測試柴油 AR5 分氣體結果"""
+        result = calculate_gas_breakdown('diesel', {"1": 100.0, "2": 50.0}, 2024, gwp_set='AR5')
+
+        assert result['breakdown_available'] is True
+        assert result['gwp'] == {'CO2': 1.0, 'CH4': 28.0, 'N2O': 265.0}
+        assert result['gases']['CO2']['mass'] == 390.9
+        assert result['monthly_gases']["1"] == {'CO2': 260.6, 'CH4': 0.38, 'N2O': 3.63}
+        assert result['monthly_emission']["1"] == 264.61
+        assert result['total_emission'] == round(sum(result['monthly_emission'].values()), 2)
+
+    def test_switching_gwp_keeps_masses(self):
+        """測試切換 GWP 版本時質量不變、CO2e 依權重改變"""
+        ar5 = calculate_gas_breakdown('gasoline', {"1": 1000.0}, 2024, gwp_set='AR5')
+        ar6 = calculate_gas_breakdown('gasoline', {"1": 1000.0}, 2024, gwp_set='AR6')
+
+        for gas in ('CO2', 'CH4', 'N2O'):
+            assert ar5['gases'][gas]['mass'] == ar6['gases'][gas]['mass']
+        assert ar5['gases']['CO2']['emission'] == ar6['gases']['CO2']['emission']
+        assert ar5['gases']['N2O']['emission'] < ar6['gases']['N2O']['emission']
+
+    def test_default_gwp_set(self):
+        """測試未指定 GWP 版本時使用預設值"""
+        result = calculate_gas_breakdown('diesel', {"1": 1.0}, 2024)
+        assert result['gwp_set'] == carbon_service.DEFAULT_GWP_SET
+
+    def test_without_gas_factors_falls_back(self):
+        """測試沒有分氣體係數的類型以綜合係數計算"""
+        result = calculate_gas_breakdown('electricity', {"1": 1000.0}, 2024)
+
+        assert result['breakdown_available'] is False
+        assert result['gases'] == {}
+        assert result['total_emission'] == calculate_total_carbon('electricity', {"1": 1000.0}, 2024)['total_emission']
+
+    def test_unknown_gwp_set(self):
+        """測試不存在的 GWP 版本"""
+        with pytest.raises(UnknownGwpSetError):
+            calculate_gas_breakdown('diesel', {"1": 1.0}, 2024, gwp_set='AR3')
+
+
+@pytest.fixture
+def clear_gas_caches():
+    carbon_service._gas_mass_cache.clear()
+    carbon_service._gas_breakdown_cache.clear()
+    yield
+    carbon_service._gas_mass_cache.clear()
+    carbon_service._gas_breakdown_cache.clear()
+
+
+def make_supabase_with_entry(**entry):
+    """建立回傳指定條目的 mock Supabase client"""
+    mock_supabase = Mock()
+    data = [{
+        'id': 'entry-1',
+        'owner_id': 'user-1',
+        'page_key': 'diesel',
+        'period_year': 2024,
+        'payload': {'monthly': {"1": 100.0, "2": 50.0}},
+        **entry
+    }] if entry.get('id', 'entry-1') else []
+    mock_supabase.table.return_value.select.return_value.eq.return_value.limit.return_value.execute.return_value = Mock(data=data)
+    return mock_supabase
+
+
+@pytest.mark.usefixtures('clear_gas_caches')
+class TestEntryGasBreakdown:
+    """測試條目分氣體排放與快取"""
+
+    def test_entry_breakdown(self):
+        """測試條目結果與直接計算一致"""
+        mock_supabase = make_supabase_with_entry()
+
+        result = get_entry_gas_breakdown(mock_supabase, 'entry-1', gwp_set='AR5', user_id='user-1')
+        expected = calculate_gas_breakdown('diesel', {"1": 100.0, "2": 50.0}, 2024, gwp_set='AR5')
+
+        assert result['entry_id'] == 'entry-1'
+        assert result['owner_id'] == 'user-1'
+        assert result['total_emission'] == expected['total_emission']
+        assert result['gases'] == expected['gases']
+
+    def test_entry_breakdown_uses_normalized_monthly(self):
+        """測試使用換算為係數單位後的月份數據"""
+        mock_supabase = make_supabase_with_entry(payload={
+            'monthly': {"1": 100000.0},
+            'normalized': {'unit': 'L', 'source_unit': 'mL', 'monthly': {"1": 100.0}}
+        })
+
+        result = get_entry_gas_breakdown(mock_supabase, 'entry-1', gwp_set='AR5')
+        expected = calculate_gas_breakdown('diesel', {"1": 100.0}, 2024, gwp_set='AR5')
+
+        assert result['total_emission'] == expected['total_emission']
+
+    def test_cached_per_entry_and_gwp_set(self):
+        """測試同一條目切換 GWP 版本不重新查詢資料庫"""
+        mock_supabase = make_supabase_with_entry()
+
+        get_entry_gas_breakdown(mock_supabase, 'entry-1', gwp_set='AR5')
+        get_entry_gas_breakdown(mock_supabase, 'entry-1', gwp_set='AR6')
+        get_entry_gas_breakdown(mock_supabase, 'entry-1', gwp_set='AR5')
+
+        assert mock_supabase.table.call_count == 1
+        assert carbon_service._gas_breakdown_cache.hits == 1
+
+    def test_invalidate_reloads_entry(self):
+        """測試條目更新後重新讀取"""
+        mock_supabase = make_supabase_with_entry()
+
+        get_entry_gas_breakdown(mock_supabase, 'entry-1', gwp_set='AR5')
+        invalidate_entry_gas_breakdown('entry-1')
+        get_entry_gas_breakdown(mock_supabase, 'entry-1', gwp_set='AR5')
+
+        assert mock_supabase.table.call_count == 2
+
+    def test_permission_denied(self):
+        """測試條目不屬於該用戶"""
+        with pytest.raises(PermissionError):
+            get_entry_gas_breakdown(make_supabase_with_entry(), 'entry-1', user_id='user-2')
+
+    def test_entry_not_found(self):
+        """測試條目不存在"""
+        with pytest.raises(LookupError):
+            get_entry_gas_breakdown(make_supabase_with_entry(id=None), 'missing')
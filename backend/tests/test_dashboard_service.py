@@ -0,0 +1,153 @@
+"""
+儀表板統計服務單元測試
+重點：狀態統計讀取觸發器維護的計數表，用戶進度與最近活動只讀取少量資料列
+"""
+from collections import Counter
+from unittest.mock import MagicMock
+from src.services.dashboard_service import (
+    fetch_status_counts,
+    build_submission_statistics,
+    build_reporting_progress,
+    build_pending_entries,
+    build_owner_activities,
+    fetch_owner_entries,
+    fetch_recent_activities,
+    get_dashboard_summary,
+    REPORTING_CATEGORIES
+)
+
+USER_ID = 'user-1'
+
+COUNTS = [
+    {'kind': 'entry', 'status': 'submitted', 'count': 1},
+    {'kind': 'entry', 'status': 'approved', 'count': 1},
+    {'kind': 'entry', 'status': 'rejected', 'count': 1},
+    {'kind': 'entry', 'status': 'saved', 'count': 2},
+    {'kind': 'review', 'status': 'approved', 'count': 4},
+    {'kind': 'review', 'status': 'needs_fix', 'count': 1}
+]
+
+OWNER_ROWS = [
+    {'id': 'e1', 'owner_id': USER_ID, 'page_key': 'diesel', 'category': '柴油(移動源)', 'status': 'submitted',
+     'updated_at': '2024-03-01T00:00:00'},
+    {'id': 'e2', 'owner_id': USER_ID, 'page_key': 'electricity', 'category': '外購電力', 'status': 'approved',
+     'updated_at': '2024-04-01T00:00:00'}
+]
+
+RECENT_ENTRIES = [
+    {'owner_id': USER_ID, 'page_key': 'electricity', 'category': '外購電力', 'status': 'approved',
+     'updated_at': '2024-04-01T00:00:00'}
+]
+
+RECENT_REVIEWS = [
+    {'status': 'needs_fix', 'created_at': '2024-05-01T00:00:00',
+     'energy_entries': {'owner_id': USER_ID, 'page_key': 'diesel', 'category': '柴油(移動源)'}}
+]
+
+
+def make_supabase(counts=COUNTS, owner_rows=OWNER_ROWS):
+    """建立 mock Supabase client（rpc 回傳彙總，依資料表回傳不同資料列）"""
+    mock_supabase = MagicMock()
+    mock_supabase.rpc.return_value.execute.return_value = MagicMock(data=counts)
+
+    queries = {}
+    for name, rows in (('energy_entries', owner_rows), ('entry_reviews', RECENT_REVIEWS)):
+        query = MagicMock()
+        for method in ('select', 'eq', 'order', 'limit'):
+            getattr(query, method).return_value = query
+        query.execute.return_value = MagicMock(data=rows)
+        queries[name] = query
+
+    mock_supabase.table.side_effect = lambda name: queries[name]
+    return mock_supabase
+
+
+class TestStatusCounts:
+    """測試狀態統計"""
+
+    def test_counts_from_rpc(self):
+        """測試由資料庫彙總函式取得條目與審核數"""
+        mock_supabase = make_supabase()
+
+        counts = fetch_status_counts(mock_supabase)
+
+        mock_supabase.rpc.assert_called_once_with('get_dashboard_counts', {})
+        assert counts['entries']['saved'] == 2
+        assert counts['reviews'] == Counter({'approved': 4, 'needs_fix': 1})
+
+    def test_submission_statistics(self):
+        """測試未知狀態計入 submitted"""
+        stats = build_submission_statistics(Counter({'submitted': 1, 'approved': 1, 'rejected': 1, 'saved': 2}))
+        assert (stats['submitted'], stats['approved'], stats['rejected'], stats['total']) == (3, 1, 1, 5)
+
+
+class TestOwnerProgress:
+    """測試用戶填報進度"""
+
+    def test_reporting_progress(self):
+        """測試用戶填報進度"""
+        entries = fetch_owner_entries(make_supabase(), USER_ID, 2024)
+        progress = build_reporting_progress(entries)
+
+        assert progress['total'] == len(REPORTING_CATEGORIES)
+        assert progress['completed'] == 2
+        assert progress['byStatus'] == {'submitted': 1, 'approved': 1, 'rejected': 0, 'returned': 0}
+
+    def test_pending_entries(self):
+        """測試待填項目"""
+        entries = fetch_owner_entries(make_supabase(), USER_ID, 2024)
+        pending = [item['pageKey'] for item in build_pending_entries(entries)]
+
+        assert 'diesel' not in pending
+        assert len(pending) == len(REPORTING_CATEGORIES) - 2
+
+    def test_duplicate_category_keeps_latest(self):
+        """測試同一類別有多筆時取最後更新的一筆"""
+        rows = OWNER_ROWS + [dict(OWNER_ROWS[0], id='e0', status='saved', updated_at='2024-01-01T00:00:00')]
+        entries = fetch_owner_entries(make_supabase(owner_rows=rows), USER_ID, 2024)
+        assert entries['diesel']['id'] == 'e1'
+
+    def test_recent_activities_for_user(self):
+        """測試用戶最近活動依更新時間排序"""
+        activities = build_owner_activities(fetch_owner_entries(make_supabase(), USER_ID, 2024))
+
+        assert [a['status'] for a in activities] == ['approved', 'submitted']
+        assert activities[0]['type'] == '審核通過'
+        assert activities[0]['description'] == '外購電力 - 外購電力'
+
+
+class TestRecentActivities:
+    """測試全體最近活動"""
+
+    def test_merges_entries_and_reviews(self):
+        """測試條目寫入與審核記錄依時間合併"""
+        activities = fetch_recent_activities(make_supabase(owner_rows=RECENT_ENTRIES))
+
+        assert [a['type'] for a in activities] == ['要求修正', '審核通過']
+        assert activities[0]['description'] == '柴油(移動源) - 柴油(移動源)'
+        assert activities[0]['ownerId'] == USER_ID
+
+
+class TestGetDashboardSummary:
+    """測試儀表板統計查詢"""
+
+    def test_owner_summary(self):
+        """測試用戶統計（狀態統計讀取計數表，用戶條目以索引查詢）"""
+        mock_supabase = make_supabase()
+
+        summary = get_dashboard_summary(mock_supabase, owner_id=USER_ID, year=2024)
+
+        mock_supabase.rpc.assert_called_once_with('get_dashboard_counts', {})
+        assert mock_supabase.table.call_count == 1
+        assert summary['submission_statistics']['total'] == 5
+        assert summary['review_statistics'] == {'approved': 4, 'needs_fix': 1}
+        assert summary['reporting_progress']['completed'] == 2
+
+    def test_reflects_current_counts(self):
+        """測試每次查詢反映計數表目前的狀態（含前端直接寫入）"""
+        get_dashboard_summary(make_supabase())
+
+        changed = COUNTS[:1] + [{'kind': 'entry', 'status': 'approved', 'count': 3}]
+        summary = get_dashboard_summary(make_supabase(counts=changed))
+
+        assert summary['submission_statistics']['approved'] == 3
@@ -0,0 +1,251 @@
+"""
+預覽衍生檔服務單元測試
+重點：縮圖大小與格式、PDF 第一頁算繪、背景排程去重與縮圖讀取
+"""
+import io
+import threading
+
+import pypdfium2 as pdfium
+import pytest
+from PIL import Image
+from unittest.mock import MagicMock, patch
+from src.services import derivative_service
+from src.services.derivative_service import (
+    render_thumbnail,
+    generate_thumbnail,
+    schedule_thumbnail,
+    schedule_derivatives,
+    resolve_thumbnail,
+    load_thumbnail,
+    supports_thumbnail,
+    NoPreviewError,
+    UnrenderableFileError
+)
+from src.services.file_service import get_thumbnail_path
+
+
+def make_png(width=2000, height=1000, mode='RGB'):
+    output = io.BytesIO()
+    Image.new(mode, (width, height), color=(200, 30, 30) if mode == 'RGB' else (200, 30, 30, 128)).save(output, 'PNG')
+    return output.getvalue()
+
+
+def make_pdf(width=595, height=842):
+    pdf = pdfium.PdfDocument.new()
+    pdf.new_page(width, height)
+    output = io.BytesIO()
+    pdf.save(output)
+    pdf.close()
+    return output.getvalue()
+
+
+def open_webp(content):
+    image = Image.open(io.BytesIO(content))
+    assert image.format == 'WEBP'
+    return image
+
+
+class TestRenderThumbnail:
+    """測試縮圖產生"""
+
+    def test_image_thumbnail(self):
+        """測試圖片縮到最長邊並保持比例"""
+        content = make_png()
+        thumbnail = render_thumbnail(content, 'image/png', size=320)
+
+        assert open_webp(thumbnail).size == (320, 160)
+        assert len(thumbnail) < len(content)
+
+    def test_transparent_image(self):
+        """測試保留透明度"""
+        thumbnail = render_thumbnail(make_png(mode='RGBA'), 'image/png', size=100)
+        assert open_webp(thumbnail).mode == 'RGBA'
+
+    def test_pdf_first_page(self):
+        """測試 PDF 第一頁直接以縮圖大小算繪"""
+        thumbnail = render_thumbnail(make_pdf(), 'application/pdf', size=320)
+        assert max(open_webp(thumbnail).size) == 320
+
+    def test_unsupported_type(self):
+        """測試不支援的類型"""
+        assert not supports_thumbnail('application/zip')
+        with pytest.raises(ValueError):
+            render_thumbnail(b'PK', 'application/zip')
+
+    @pytest.mark.parametrize('content, mime_type', [
+        (b'not an image', 'image/png'),
+        (make_png()[:100], 'image/png'),
+        (b'%PDF-1.7 broken', 'application/pdf')
+    ])
+    def test_corrupt_file(self, content, mime_type):
+        """測試損毀的圖片與 PDF"""
+        with pytest.raises(UnrenderableFileError):
+            render_thumbnail(content, mime_type)
+
+    def test_decompression_bomb(self, monkeypatch):
+        """測試像素過多的圖片不解碼"""
+        monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 1000)
+        with pytest.raises(UnrenderableFileError):
+            render_thumbnail(make_png(), 'image/png')
+
+
+class TestThumbnailPath:
+    """測試縮圖路徑"""
+
+    def test_path_under_owner(self):
+        """測試縮圖路徑以用戶 ID 為第一層"""
+        assert get_thumbnail_path('user-1/blobs/ab/abcd', 320) == 'user-1/_derivatives/blobs/ab/abcd/thumb-320.webp'
+
+
+@pytest.fixture(autouse=True)
+def failed_cache(monkeypatch):
+    cache = derivative_service.TTLCache(maxsize=16, ttl=60)
+    monkeypatch.setattr(derivative_service, '_failed_cache', cache)
+    return cache
+
+
+class TestGenerateThumbnail:
+    """測試產生並儲存縮圖"""
+
+    def test_uploads_webp(self):
+        """測試下載原檔後上傳 WebP 縮圖"""
+        supabase = MagicMock()
+        bucket = supabase.storage.from_.return_value
+        bucket.download.return_value = make_png()
+
+        path = generate_thumbnail(supabase, 'user-1/blobs/ab/abcd', 'image/png')
+
+        assert path == get_thumbnail_path('user-1/blobs/ab/abcd')
+        args = bucket.upload.call_args
+        assert args.args[0] == path
+        assert args.kwargs['file_options']['content-type'] == 'image/webp'
+        open_webp(args.args[1])
+
+    def test_unsupported_skips_download(self):
+        """測試不支援的類型不下載原檔"""
+        supabase = MagicMock()
+        assert generate_thumbnail(supabase, 'user-1/a.xlsx', 'application/vnd.ms-excel') is None
+        supabase.storage.from_.return_value.download.assert_not_called()
+
+    def test_unrenderable_not_retried(self):
+        """測試無法算繪的檔案記錄失敗，之後不再排程也不再下載"""
+        supabase = MagicMock()
+        bucket = supabase.storage.from_.return_value
+        bucket.download.return_value = b'not an image'
+
+        with pytest.raises(UnrenderableFileError):
+            generate_thumbnail(supabase, 'user-1/x/broken.png', 'image/png')
+
+        bucket.upload.assert_not_called()
+        assert schedule_thumbnail(supabase, 'user-1/x/broken.png', 'image/png') is None
+        thumbnail = {'file_path': 'user-1/x/broken.png', 'mime_type': 'image/png',
+                     'thumbnail_path': get_thumbnail_path('user-1/x/broken.png')}
+        with pytest.raises(UnrenderableFileError):
+            load_thumbnail(supabase, thumbnail)
+        assert bucket.download.call_count == 1
+
+
+class TestScheduleThumbnail:
+    """測試背景排程"""
+
+    def test_same_thumbnail_scheduled_once(self):
+        """測試同一縮圖產生中時不重複排程"""
+        release = threading.Event()
+        calls = []
+
+        def slow_generate(supabase, file_path, mime_type):
+            calls.append(file_path)
+            release.wait(5)
+
+        with patch.object(derivative_service, '_generate_in_background', side_effect=slow_generate):
+            first = schedule_thumbnail(MagicMock(), 'user-1/x/a.png', 'image/png')
+            second = schedule_thumbnail(MagicMock(), 'user-1/x/a.png', 'image/png')
+            release.set()
+            first.result(5)
+
+        assert first is second
+        assert calls == ['user-1/x/a.png']
+
+    def test_skips_deduplicated_and_unsupported(self):
+        """測試重複內容與不支援的類型不排程"""
+        with patch.object(derivative_service, 'schedule_thumbnail', wraps=schedule_thumbnail) as schedule, \
+                patch.object(derivative_service, '_generate_in_background'):
+            count = schedule_derivatives(MagicMock(), [
+                {'file_path': 'user-1/x/a.png', 'mime_type': 'image/png', 'deduplicated': True},
+                {'file_path': 'user-1/x/b.zip', 'mime_type': 'application/zip', 'deduplicated': False},
+                {'file_path': 'user-1/x/c.pdf', 'mime_type': 'application/pdf', 'deduplicated': False}
+            ])
+
+        assert count == 1
+        assert schedule.call_count == 2
+
+
+def make_file_supabase(file):
+    supabase = MagicMock()
+    supabase.table.return_value.select.return_value.eq.return_value.limit.return_value.execute.return_value.data = (
+        [file] if file else []
+    )
+    return supabase
+
+
+FILE = {
+    'id': 'file-1',
+    'owner_id': 'user-1',
+    'file_path': 'user-1/blobs/ab/abcd',
+    'mime_type': 'application/pdf',
+    'content_sha256': 'abcd'
+}
+
+
+class TestResolveThumbnail:
+    """測試縮圖權限與 ETag"""
+
+    def test_owner(self):
+        """測試擁有者取得縮圖路徑與 ETag"""
+        thumbnail = resolve_thumbnail(make_file_supabase(FILE), 'user-1', 'file-1')
+
+        assert thumbnail['thumbnail_path'] == get_thumbnail_path(FILE['file_path'])
+        assert thumbnail['etag'].startswith('abcd-')
+
+    def test_admin_can_read_other_users(self):
+        """測試管理員可取得其他用戶的縮圖"""
+        assert resolve_thumbnail(make_file_supabase(FILE), 'admin-1', 'file-1', is_admin=True)
+
+    def test_other_user(self):
+        """測試其他用戶無權限"""
+        with pytest.raises(PermissionError):
+            resolve_thumbnail(make_file_supabase(FILE), 'user-2', 'file-1')
+
+    def test_not_found_and_no_preview(self):
+        """測試檔案不存在與不支援預覽"""
+        with pytest.raises(LookupError):
+            resolve_thumbnail(make_file_supabase(None), 'user-1', 'missing')
+        with pytest.raises(NoPreviewError):
+            resolve_thumbnail(make_file_supabase({**FILE, 'mime_type': 'text/csv'}), 'user-1', 'file-1')
+
+
+class TestLoadThumbnail:
+    """測試讀取縮圖"""
+
+    def test_missing_schedules_generation(self):
+        """測試尚未產生時排程並回傳 None"""
+        supabase = MagicMock()
+        supabase.storage.from_.return_value.download.side_effect = Exception('Object not found')
+        thumbnail = {'file_path': 'user-1/x/new.pdf', 'mime_type': 'application/pdf',
+                     'thumbnail_path': get_thumbnail_path('user-1/x/new.pdf')}
+
+        with patch.object(derivative_service, 'schedule_thumbnail') as schedule:
+            assert load_thumbnail(supabase, thumbnail) is None
+
+        schedule.assert_called_once_with(supabase, 'user-1/x/new.pdf', 'application/pdf')
+
+    def test_cached_after_download(self):
+        """測試讀取後快取，不重複下載"""
+        supabase = MagicMock()
+        supabase.storage.from_.return_value.download.return_value = b'webp'
+        thumbnail = {'file_path': 'user-1/x/cached.png', 'mime_type': 'image/png',
+                     'thumbnail_path': get_thumbnail_path('user-1/x/cached.png')}
+
+        assert load_thumbnail(supabase, thumbnail) == b'webp'
+        assert load_thumbnail(supabase, thumbnail) == b'webp'
+        assert supabase.storage.from_.return_value.download.call_count == 1
@@ -0,0 +1,294 @@
+"""
+排放係數登錄服務單元測試
+"""
+import json
+import pytest
+from unittest.mock import MagicMock
+from src.services import emission_factor_service
+from src.services.emission_factor_service import (
+    EmissionFactorRegistry,
+    EmissionFactorError,
+    UnknownFactorVersionError,
+    UnknownGwpSetError,
+    load_factor_registry,
+    get_factor_registry,
+    reload_factor_registry,
+    publish_factor_registry,
+    sync_factor_registry
+)
+
+
+VERSIONS = [
+    {
+        'version': '6.0.4',
+        'effective_from': 2020,
+        'factors': {'diesel': 2.6068, 'electricity': 0.509},
+        'gas_factors': {'diesel': {'CO2': 2.606, 'CH4': 0.0001, 'N2O': 0.00002}}
+    },
+    {
+        'version': '7.0.0',
+        'effective_from': 2024,
+        'factors': {'electricity': 0.494}
+    }
+]
+
+
+GWP_SETS = {
+    'AR5': {'CO2': 1, 'CH4': 28, 'N2O': 265},
+    'AR6': {'CO2': 1, 'CH4': 29.8, 'N2O': 273}
+}
+
+
+@pytest.fixture
+def registry():
+    return EmissionFactorRegistry(VERSIONS, gwp_sets=GWP_SETS)
+
+
+class TestResolve:
+    """測試單一係數查詢"""
+
+    def test_year_selects_version(self, registry):
+        """測試依年份選擇生效中的版本"""
+        assert registry.resolve('electricity', 2023) == (0.509, '6.0.4')
+        assert registry.resolve('electricity', 2024) == (0.494, '7.0.0')
+        assert registry.resolve('electricity', 2030) == (0.494, '7.0.0')
+
+    def test_unchanged_factor_inherited(self, registry):
+        """測試新版本未列出的係數沿用前一版本"""
+        assert registry.resolve('diesel', 2024) == (2.6068, '7.0.0')
+
+    def test_year_before_first_version(self, registry):
+        """測試早於第一版的年份使用第一版"""
+        assert registry.resolve('electricity', 2015) == (0.509, '6.0.4')
+
+    def test_no_year_uses_latest(self, registry):
+        """測試未指定年份時使用最新版本"""
+        assert registry.resolve('electricity') == (0.494, '7.0.0')
+
+    def test_explicit_version(self, registry):
+        """測試指定版本優先於年份"""
+        assert registry.resolve('electricity', 2024, factor_version='6.0.4') == (0.509, '6.0.4')
+
+    def test_unknown_version(self, registry):
+        """測試不存在的版本"""
+        with pytest.raises(UnknownFactorVersionError):
+            registry.resolve('diesel', 2024, factor_version='9.9.9')
+
+    def test_unknown_page_key(self, registry):
+        """測試未知能源類型返回預設值"""
+        assert registry.resolve('unknown', 2024) == (1.0, '7.0.0')
+
+
+class TestGasFactors:
+    """測試分氣體係數與 GWP"""
+
+    def test_gas_factors_inherited(self, registry):
+        """測試新版本沿用前一版本的分氣體係數"""
+        vector, version = registry.resolve_gas_factors('diesel', 2024)
+
+        assert version == '7.0.0'
+        assert vector.tolist() == [2.606, 0.0001, 0.00002]
+
+    def test_missing_gas_factors(self, registry):
+        """測試沒有分氣體係數的類型"""
+        assert registry.resolve_gas_factors('electricity', 2024) == (None, '7.0.0')
+
+    def test_gwp_vector(self, registry):
+        """測試 GWP 權重向量"""
+        assert registry.gwp_vector('AR6').tolist() == [1.0, 29.8, 273.0]
+
+    def test_unknown_gwp_set(self, registry):
+        """測試不存在的 GWP 版本"""
+        with pytest.raises(UnknownGwpSetError):
+            registry.gwp_vector('AR3')
+
+
+class TestResolveMany:
+    """測試批次係數查詢"""
+
+    def test_matches_single_resolve(self, registry):
+        """測試批次結果與單一查詢一致"""
+        page_keys = ['diesel', 'electricity', 'unknown', 'electricity', 'zzz']
+        years = [2021, 2023, 2024, 2026, 2099]
+
+        factors, versions = registry.resolve_many(page_keys, years)
+
+        for index, (page_key, year) in enumerate(zip(page_keys, years)):
+            assert (factors[index], versions[index]) == registry.resolve(page_key, year)
+
+    def test_explicit_versions(self, registry):
+        """測試逐項指定版本"""
+        factors, versions = registry.resolve_many(
+            ['electricity', 'electricity'], [2024, 2024], [None, '6.0.4']
+        )
+
+        assert factors.tolist() == [0.494, 0.509]
+        assert versions.tolist() == ['7.0.0', '6.0.4']
+
+    def test_unknown_version(self, registry):
+        """測試批次中含不存在的版本"""
+        with pytest.raises(UnknownFactorVersionError):
+            registry.resolve_many(['diesel'], [2024], ['9.9.9'])
+
+
+class TestRegistryValidation:
+    """測試登錄表資料驗證"""
+
+    def test_empty_versions(self):
+        """測試沒有任何版本"""
+        with pytest.raises(EmissionFactorError):
+            EmissionFactorRegistry([])
+
+    def test_duplicate_version(self):
+        """測試重複版本名稱"""
+        with pytest.raises(EmissionFactorError):
+            EmissionFactorRegistry([VERSIONS[0], {**VERSIONS[1], 'version': '6.0.4'}])
+
+    def test_describe(self, registry):
+        """測試登錄表摘要"""
+        assert registry.describe() == {
+            'versions': ['6.0.4', '7.0.0'],
+            'latest_version': '7.0.0',
+            'page_keys': ['diesel', 'electricity'],
+            'gases': ['CO2', 'CH4', 'N2O'],
+            'gwp_sets': ['AR5', 'AR6']
+        }
+
+    def test_gas_factors_for_unknown_page_key(self):
+        """測試分氣體係數對應不存在的能源類型"""
+        versions = [{**VERSIONS[0], 'gas_factors': {'lpg': {'CO2': 1.0}}}]
+        with pytest.raises(EmissionFactorError):
+            EmissionFactorRegistry(versions)
+
+    def test_incomplete_gwp_set(self):
+        """測試 GWP 版本缺少氣體"""
+        with pytest.raises(EmissionFactorError):
+            EmissionFactorRegistry(VERSIONS, gwp_sets={'AR5': {'CO2': 1, 'CH4': 28}})
+
+
+class TestLoadFactorRegistry:
+    """測試資料檔載入"""
+
+    def test_load_from_file(self, tmp_path):
+        """測試從資料檔載入"""
+        path = tmp_path / 'factors.json'
+        path.write_text(json.dumps({'default_factor': 2.0, 'versions': VERSIONS}), encoding='utf-8')
+
+        registry = load_factor_registry(str(path))
+
+        assert registry.version_names == ['6.0.4', '7.0.0']
+        assert registry.resolve('unknown', 2024) == (2.0, '7.0.0')
+
+    def test_invalid_file(self, tmp_path):
+        """測試格式錯誤的資料檔"""
+        path = tmp_path / 'factors.json'
+        path.write_text(json.dumps({'versions': [{'version': '1'}]}), encoding='utf-8')
+
+        with pytest.raises(EmissionFactorError):
+            load_factor_registry(str(path))
+
+    def test_bundled_file(self):
+        """測試隨附的係數資料檔可正常載入"""
+        registry = load_factor_registry()
+        assert registry.resolve('diesel', 2024)[0] == 2.6068
+
+    def test_reload_replaces_shared_registry(self, tmp_path, monkeypatch):
+        """測試重新載入後共用登錄表立即更新"""
+        monkeypatch.setattr(emission_factor_service, '_registry', None)
+        path = tmp_path / 'factors.json'
+        path.write_text(json.dumps({'versions': VERSIONS}), encoding='utf-8')
+
+        reload_factor_registry(str(path))
+
+        assert get_factor_registry().latest_version == '7.0.0'
+
+
+class FakeFactorTables:
+    """簡化的 emission_factor_tables（只支援係數同步使用的查詢）"""
+
+    def __init__(self):
+        self.rows = []
+        self.queries = 0
+
+    def _latest(self):
+        self.queries += 1
+        return MagicMock(data=[{'id': row['id'], 'checksum': row['checksum']} for row in self.rows[-1:]])
+
+    def _by_id(self, column, value):
+        rows = [row for row in self.rows if row[column] == value]
+        return MagicMock(limit=lambda count: MagicMock(execute=lambda: MagicMock(data=rows)))
+
+    def _insert(self, values):
+        return MagicMock(execute=lambda: self.rows.append({'id': len(self.rows) + 1, **values}))
+
+    def table(self, name):
+        query = MagicMock()
+        query.select.return_value.order.return_value.limit.return_value.execute.side_effect = self._latest
+        query.select.return_value.eq.side_effect = self._by_id
+        query.insert.side_effect = self._insert
+        return query
+
+
+def write_factors(tmp_path, electricity_2024):
+    versions = json.loads(json.dumps(VERSIONS))
+    versions[1]['factors']['electricity'] = electricity_2024
+    path = tmp_path / f'factors-{electricity_2024}.json'
+    path.write_text(json.dumps({'versions': versions}), encoding='utf-8')
+    return str(path)
+
+
+@pytest.fixture
+def worker(monkeypatch):
+    """模擬一個剛啟動、尚未同步的 worker"""
+    def start(path=None):
+        monkeypatch.setattr(emission_factor_service, '_registry', load_factor_registry(path))
+        monkeypatch.setattr(emission_factor_service, '_synced_at', None)
+    start()
+    return start
+
+
+@pytest.mark.usefixtures('worker')
+class TestSharedFactorRegistry:
+    """測試係數表發佈與各 worker 同步"""
+
+    def test_other_worker_syncs_published(self, tmp_path, worker):
+        """測試其他 worker 同步發佈的係數"""
+        supabase = FakeFactorTables()
+        _, published = publish_factor_registry(supabase, write_factors(tmp_path, 0.474))
+
+        worker()
+        registry = sync_factor_registry(supabase)
+
+        assert registry.checksum == published.checksum
+        assert get_factor_registry().resolve('electricity', 2024)[0] == 0.474
+
+    def test_diff_baseline_is_published_version(self, tmp_path, worker):
+        """測試變更前的版本取自上次發佈，而非處理請求的 worker"""
+        supabase = FakeFactorTables()
+        _, first = publish_factor_registry(supabase, write_factors(tmp_path, 0.474))
+
+        worker(write_factors(tmp_path, 0.474))
+        previous, registry = publish_factor_registry(supabase, write_factors(tmp_path, 0.45))
+
+        assert previous.checksum == first.checksum
+        assert registry.resolve('electricity', 2024)[0] == 0.45
+        assert len(supabase.rows) == 2
+
+    def test_unchanged_not_published_again(self, tmp_path):
+        """測試資料相同時不新增發佈記錄"""
+        supabase = FakeFactorTables()
+        path = write_factors(tmp_path, 0.474)
+
+        publish_factor_registry(supabase, path)
+        publish_factor_registry(supabase, path)
+
+        assert len(supabase.rows) == 1
+
+    def test_sync_interval(self):
+        """測試同步間隔內不重複查詢"""
+        supabase = FakeFactorTables()
+
+        sync_factor_registry(supabase)
+        sync_factor_registry(supabase)
+
+        assert supabase.queries == 1
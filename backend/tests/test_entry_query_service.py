@@ -0,0 +1,269 @@
+"""
+能源條目查詢服務單元測試
+重點：keyset pagination 游標與查詢條件
+"""
+import pytest
+from unittest.mock import MagicMock
+from src.services.entry_query_service import (
+    encode_cursor,
+    decode_cursor,
+    list_entries_page,
+    iter_entries,
+    iter_ndjson,
+    build_entry_columns,
+    nest_payload_projection,
+    InvalidCursorError,
+    InvalidFieldsError,
+    ALL_ENTRIES_COLUMNS,
+    USER_ENTRIES_COLUMNS,
+    ENTRY_FIELDS
+)
+
+ENTRY_ID_1 = '11111111-1111-1111-1111-111111111111'
+ENTRY_ID_2 = '22222222-2222-2222-2222-222222222222'
+ENTRY_ID_3 = '33333333-3333-3333-3333-333333333333'
+
+
+def make_supabase(rows, count=None):
+    """建立 mock Supabase client（所有 builder 方法回傳同一個 query）"""
+    mock_supabase = MagicMock()
+    query = MagicMock()
+    mock_supabase.table.return_value.select.return_value = query
+    for method in ('eq', 'gte', 'lte', 'or_', 'order', 'limit'):
+        getattr(query, method).return_value = query
+    query.execute.return_value = MagicMock(data=rows, count=count)
+    return mock_supabase, query
+
+
+class TestCursor:
+    """測試游標編碼"""
+
+    def test_round_trip(self):
+        """測試編碼後可解碼"""
+        cursor = encode_cursor({'period_start': '2024-01-01', 'id': ENTRY_ID_1})
+        assert decode_cursor(cursor) == ('2024-01-01', ENTRY_ID_1)
+
+    def test_cursor_is_url_safe(self):
+        """測試游標不含需要編碼的字元"""
+        cursor = encode_cursor({'period_start': '2024-01-01', 'id': ENTRY_ID_1})
+        assert all(c.isalnum() or c in '-_' for c in cursor)
+
+    def test_invalid_cursor(self):
+        """測試格式錯誤的游標"""
+        with pytest.raises(InvalidCursorError):
+            decode_cursor('not-a-cursor')
+
+    def test_cursor_injection_rejected(self):
+        """測試游標內容無法注入篩選條件"""
+        cursor = encode_cursor({'period_start': '2024-01-01),or(id.neq.x', 'id': ENTRY_ID_1})
+        with pytest.raises(InvalidCursorError):
+            decode_cursor(cursor)
+
+
+class TestListEntriesPage:
+    """測試分頁查詢"""
+
+    def test_first_page_with_more(self):
+        """測試第一頁且有下一頁"""
+        rows = [
+            {'id': ENTRY_ID_3, 'period_start': '2024-01-01'},
+            {'id': ENTRY_ID_2, 'period_start': '2024-01-01'},
+            {'id': ENTRY_ID_1, 'period_start': '2023-01-01'}
+        ]
+        mock_supabase, query = make_supabase(rows)
+
+        page = list_entries_page(mock_supabase, page_size=2)
+
+        assert len(page['entries']) == 2
+        assert decode_cursor(page['next_cursor']) == ('2024-01-01', ENTRY_ID_2)
+        assert page['total'] is None
+        query.limit.assert_called_once_with(3)
+        query.or_.assert_not_called()
+
+    def test_last_page(self):
+        """測試最後一頁"""
+        mock_supabase, _ = make_supabase([{'id': ENTRY_ID_1, 'period_start': '2024-01-01'}])
+
+        page = list_entries_page(mock_supabase, page_size=2)
+
+        assert len(page['entries']) == 1
+        assert page['next_cursor'] is None
+
+    def test_cursor_applies_keyset_filter(self):
+        """測試游標轉換為 keyset 條件"""
+        mock_supabase, query = make_supabase([])
+        cursor = encode_cursor({'period_start': '2024-01-01', 'id': ENTRY_ID_2})
+
+        list_entries_page(mock_supabase, cursor=cursor)
+
+        query.or_.assert_called_once_with(
+            f'period_start.lt.2024-01-01,and(period_start.eq.2024-01-01,id.lt.{ENTRY_ID_2})'
+        )
+
+    def test_filters_applied(self):
+        """測試篩選條件"""
+        mock_supabase, query = make_supabase([])
+
+        list_entries_page(
+            mock_supabase,
+            columns=USER_ENTRIES_COLUMNS,
+            owner_id='user-1',
+            from_date='2024-01-01',
+            to_date='2024-12-31',
+            category='柴油(移動源)'
+        )
+
+        mock_supabase.table.return_value.select.assert_called_once_with(*USER_ENTRIES_COLUMNS, count=None, head=False)
+        query.gte.assert_called_once_with('period_start', '2024-01-01')
+        query.lte.assert_called_once_with('period_start', '2024-12-31')
+        assert query.eq.call_count == 2
+
+    def test_total_on_first_page(self):
+        """測試第一頁在同一查詢計算估計總數"""
+        mock_supabase, _ = make_supabase([], count=42)
+
+        page = list_entries_page(mock_supabase, include_total=True)
+
+        assert page['total'] == 42
+        assert mock_supabase.table.call_count == 1
+        assert mock_supabase.table.return_value.select.call_args.kwargs['count'] == 'estimated'
+
+    def test_total_on_later_page(self):
+        """測試後續頁面以 HEAD 查詢計算總數"""
+        mock_supabase, _ = make_supabase([], count=42)
+        cursor = encode_cursor({'period_start': '2024-01-01', 'id': ENTRY_ID_2})
+
+        page = list_entries_page(mock_supabase, cursor=cursor, include_total=True)
+
+        assert page['total'] == 42
+        assert mock_supabase.table.call_count == 2
+        assert mock_supabase.table.return_value.select.call_args.kwargs['head'] is True
+
+
+class TestBuildEntryColumns:
+    """測試欄位投影"""
+
+    def test_defaults_unchanged(self):
+        """測試未指定參數時使用預設欄位"""
+        assert build_entry_columns(None, None, ALL_ENTRIES_COLUMNS) == ALL_ENTRIES_COLUMNS
+
+    def test_sparse_fields_without_payload(self):
+        """測試指定欄位時預設不取 payload，並自動加入 keyset 欄位"""
+        columns = build_entry_columns('category,status', None, ALL_ENTRIES_COLUMNS)
+
+        assert columns == ('id', 'period_start', 'category', 'status')
+
+    def test_embeds(self):
+        """測試關聯資料"""
+        columns = build_entry_columns('id,owner,reviews', None, ALL_ENTRIES_COLUMNS)
+
+        assert 'profiles!energy_entries_owner_id_fkey(display_name)' in columns
+        assert 'entry_reviews(*)' in columns
+
+    def test_payload_projection(self):
+        """測試 payload JSON path 投影"""
+        columns = build_entry_columns('id', 'monthly,unit', ALL_ENTRIES_COLUMNS)
+
+        assert 'payload__monthly:payload->monthly' in columns
+        assert 'payload__unit:payload->unit' in columns
+        assert 'payload' not in columns
+
+    def test_full_payload(self):
+        """測試完整 payload"""
+        assert 'payload' in build_entry_columns('id', 'true', ALL_ENTRIES_COLUMNS)
+
+    def test_exclude_payload_keeps_all_columns(self):
+        """測試未指定 fields 但排除 payload"""
+        columns = build_entry_columns(None, 'false', USER_ENTRIES_COLUMNS)
+
+        assert '*' not in columns
+        assert 'payload' not in columns
+        assert set(ENTRY_FIELDS) <= set(columns)
+        assert 'entry_reviews(*)' in columns
+
+    def test_unknown_field_rejected(self):
+        """測試不在白名單的欄位"""
+        with pytest.raises(InvalidFieldsError):
+            build_entry_columns('id,password', None, ALL_ENTRIES_COLUMNS)
+
+    def test_injection_rejected(self):
+        """測試欄位注入"""
+        with pytest.raises(InvalidFieldsError):
+            build_entry_columns('id,profiles(*)', None, ALL_ENTRIES_COLUMNS)
+        with pytest.raises(InvalidFieldsError):
+            build_entry_columns('id', 'monthly->>1', ALL_ENTRIES_COLUMNS)
+
+
+class TestNestPayloadProjection:
+    """測試 payload 投影結果重組"""
+
+    def test_nested(self):
+        """測試別名欄位組回 payload"""
+        rows = [{'id': '1', 'payload__monthly': {'1': 10}, 'payload__unit': None}]
+
+        assert nest_payload_projection(rows) == [{'id': '1', 'payload': {'monthly': {'1': 10}}}]
+
+    def test_no_projection(self):
+        """測試無投影欄位時不變"""
+        rows = [{'id': '1', 'payload': {'monthly': {}}}]
+        assert nest_payload_projection(rows) == [{'id': '1', 'payload': {'monthly': {}}}]
+
+
+class TestIterEntries:
+    """測試串流逐頁查詢"""
+
+    def test_pages_until_exhausted(self):
+        """測試依游標逐頁查詢直到沒有下一頁"""
+        mock_supabase, query = make_supabase([])
+        query.execute.side_effect = [
+            MagicMock(data=[
+                {'id': ENTRY_ID_3, 'period_start': '2024-01-01'},
+                {'id': ENTRY_ID_2, 'period_start': '2024-01-01'},
+                {'id': ENTRY_ID_1, 'period_start': '2023-01-01'}
+            ], count=None),
+            MagicMock(data=[{'id': ENTRY_ID_1, 'period_start': '2023-01-01'}], count=None)
+        ]
+
+        rows = list(iter_entries(mock_supabase, batch_size=2))
+
+        assert [row['id'] for row in rows] == [ENTRY_ID_3, ENTRY_ID_2, ENTRY_ID_1]
+        assert query.execute.call_count == 2
+        query.or_.assert_called_once_with(
+            f'period_start.lt.2024-01-01,and(period_start.eq.2024-01-01,id.lt.{ENTRY_ID_2})'
+        )
+
+    def test_lazy_until_iterated(self):
+        """測試迭代前不查詢資料庫"""
+        mock_supabase, query = make_supabase([])
+
+        rows = iter_entries(mock_supabase)
+
+        query.execute.assert_not_called()
+        assert list(rows) == []
+
+    def test_invalid_cursor_raises_immediately(self):
+        """測試游標錯誤在開始串流前就拋出"""
+        mock_supabase, _ = make_supabase([])
+        with pytest.raises(InvalidCursorError):
+            iter_entries(mock_supabase, cursor='not-a-cursor')
+
+
+class TestIterNdjson:
+    """測試 NDJSON 輸出"""
+
+    def test_one_line_per_row(self):
+        """測試每筆資料輸出一行"""
+        lines = list(iter_ndjson([{'id': 1, 'category': '柴油'}, {'id': 2}]))
+
+        assert lines == ['{"id": 1, "category": "柴油"}\n', '{"id": 2}\n']
+
+    def test_error_line_on_failure(self):
+        """測試中途失敗時輸出錯誤行"""
+        def rows():
+            yield {'id': 1}
+            raise RuntimeError('connection lost')
+
+        lines = list(iter_ndjson(rows()))
+
+        assert len(lines) == 2
+        assert '"STREAM_ERROR"' in lines[1]
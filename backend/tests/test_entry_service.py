@@ -12,6 +12,7 @@ from src.services.entry_service import (
     update_energy_entry,
     CATEGORY_MAP
 )
+from src.services.rollup_service import compute_entry_emissions
 
 
 class TestGetCategoryFromPageKey:
@@ -183,6 +184,73 @@ class TestCreateEnergyEntry:
         assert 'weldingRodData' in upsert_call['payload']
         assert upsert_call['payload']['weldingRodData']['specs'][0]['name'] == 'E7018_0.05'
 
+    def test_bill_page_monthly_computed_from_bills(self):
+        """測試外購電力的月份數據由伺服器依帳單計算"""
+        mock_supabase = Mock()
+        mock_table = Mock()
+        mock_supabase.table.return_value = mock_table
+        mock_table.upsert.return_value.execute.return_value.data = [{'id': 'test-entry-id'}]
+
+        create_energy_entry(
+            supabase=mock_supabase,
+            user_id='user-123',
+            page_key='electricity',
+            period_year=2024,
+            unit='kWh',
+            monthly={"1": 999.0},
+            payload={'billData': [
+                {'billingStart': '113/01/01', 'billingEnd': '113/01/31', 'billingUnits': 310},
+                {'billingStart': '113/02/01', 'billingEnd': '113/02/29', 'billingUnits': 290}
+            ]}
+        )
+
+        upsert_call = mock_table.upsert.call_args[0][0]
+        assert upsert_call['payload']['monthly'] == {"1": 310.0, "2": 290.0}
+        assert upsert_call['amount'] == 600.0
+
+    def test_wd40_emission_uses_factor_unit(self):
+        """測試 WD-40 以 ML 提交時 amount 與 unit 一致，排放量不縮小 1000 倍"""
+        mock_supabase = Mock()
+        mock_table = Mock()
+        mock_supabase.table.return_value = mock_table
+        mock_table.upsert.return_value.execute.return_value.data = [{'id': 'test-entry-id'}]
+
+        create_energy_entry(
+            supabase=mock_supabase,
+            user_id='user-123',
+            page_key='wd40',
+            period_year=2024,
+            unit='ML',
+            monthly={"1": 500.0, "2": 300.0}
+        )
+
+        upsert_call = mock_table.upsert.call_args[0][0]
+        assert upsert_call['unit'] == 'mL'
+        assert upsert_call['amount'] == 800.0
+        # WD-40 排放係數 0.5 kgCO2e / mL
+        assert compute_entry_emissions([upsert_call]).sum() == pytest.approx(400.0)
+
+    def test_writes_entry_emissions(self):
+        """測試新增條目後即時寫入 entry_emissions"""
+        mock_supabase = MagicMock()
+        mock_supabase.table.return_value.upsert.side_effect = lambda values, on_conflict=None: MagicMock(
+            execute=MagicMock(return_value=MagicMock(data=[{'id': 'test-entry-id', **values}]))
+        )
+
+        create_energy_entry(
+            supabase=mock_supabase,
+            user_id='user-123',
+            page_key='wd40',
+            period_year=2024,
+            unit='ML',
+            monthly={"1": 500.0, "2": 300.0}
+        )
+
+        mock_supabase.table.assert_any_call('entry_emissions')
+        row = mock_supabase.table.return_value.upsert.call_args_list[-1].args[0]
+        assert row['entry_id'] == 'test-entry-id'
+        assert row['total_emission'] == pytest.approx(400.0)
+
     def test_rollback_on_exception(self):
         """測試發生例外時執行 rollback"""
         # Mock Supabase client
@@ -278,6 +346,32 @@ class TestUpdateEnergyEntry:
         assert 'amount' in result['updated_fields']
         assert 'payload' in result['updated_fields']
 
+    def test_update_converts_from_source_unit(self):
+        """測試更新時以原始提交單位換算（unit 欄位已是換算後單位）"""
+        mock_supabase = Mock()
+        mock_table = Mock()
+        mock_supabase.table.return_value = mock_table
+        mock_table.select.return_value.eq.return_value.single.return_value.execute.return_value.data = {
+            'id': 'entry-123',
+            'owner_id': 'user-123',
+            'page_key': 'wd40',
+            'period_year': 2024,
+            'unit': 'mL',
+            'payload': {'monthly': {"1": 0.5}, 'normalized': {'source_unit': 'L'}}
+        }
+
+        update_energy_entry(
+            supabase=mock_supabase,
+            entry_id='entry-123',
+            user_id='user-123',
+            monthly={"1": 0.5, "2": 0.25}
+        )
+
+        update_data = mock_table.update.call_args[0][0]
+        assert update_data['unit'] == 'mL'
+        assert update_data['amount'] == 750.0
+        assert update_data['payload']['normalized']['source_unit'] == 'L'
+
     def test_permission_denied(self):
         """測試權限驗證：不同用戶無法更新"""
         # Mock Supabase client
@@ -0,0 +1,332 @@
+"""
+匯出服務單元測試
+重點：檔名規則、各類別轉換與 Excel 快取
+"""
+import io
+import zipfile
+import pytest
+from unittest.mock import MagicMock, patch
+from openpyxl import load_workbook
+from src.services import export_service
+from src.services.export_service import (
+    smart_file_rename,
+    handle_duplicate_file_name,
+    convert_entry,
+    write_entries_workbook,
+    get_or_build_entries_export,
+    build_file_naming_context,
+    iter_downloaded_evidence,
+    stream_evidence_zip,
+    NoExportDataError
+)
+
+USER_ID = '550e8400-e29b-41d4-a716-446655440000'
+
+
+def make_supabase(tables):
+    """建立 mock Supabase client（依表名回傳固定資料）"""
+    mock_supabase = MagicMock()
+
+    def table(name):
+        query = MagicMock()
+        for method in ('select', 'in_', 'eq', 'order', 'range', 'limit'):
+            getattr(query, method).return_value = query
+        query.execute.return_value = MagicMock(data=tables.get(name, []), count=len(tables.get(name, [])))
+        return query
+
+    mock_supabase.table.side_effect = table
+    return mock_supabase
+
+
+class TestSmartFileRename:
+    """測試佐證檔名規則"""
+
+    def test_msds(self):
+        """測試 MSDS 檔案"""
+        file = {'file_type': 'msds'}
+        assert smart_file_rename('a.pdf', 'urea', file) == '尿素_MSDS安全資料表.pdf'
+
+    def test_generator_location(self):
+        """測試發電機銘牌"""
+        file = {'file_type': 'other'}
+        assert smart_file_rename('x.jpg', 'diesel_generator', file, generator_location='A棟') == 'A棟_發電機佐證銘牌.jpg'
+
+    def test_group_index(self):
+        """測試組別"""
+        file = {'file_type': 'usage_evidence'}
+        assert smart_file_rename('x.png', 'diesel', file, group_index=1) == '柴油(移動源)_第二組.png'
+        assert smart_file_rename('x.png', 'diesel', file, group_index=10) == '柴油(移動源)_第11組.png'
+
+    def test_month_sources(self):
+        """測試月份來源優先順序"""
+        assert smart_file_rename('x.pdf', 'septic_tank', {'month': 3}) == '化糞池_3月_使用證明.pdf'
+        assert smart_file_rename('x.pdf', 'septic_tank', {'month': 3}, month=5) == '化糞池_5月_使用證明.pdf'
+        assert smart_file_rename('bill_12月.pdf', 'septic_tank', None) == '化糞池_資料.pdf'
+        assert smart_file_rename('bill_12月.pdf', 'septic_tank', {'month': None}) == '化糞池_12月_使用證明.pdf'
+        assert smart_file_rename('bill_07_x.pdf', 'septic_tank', {'month': None}) == '化糞池_7月_使用證明.pdf'
+
+    def test_fallback(self):
+        """測試一般檔案"""
+        assert smart_file_rename('photo.jpg', 'lpg', {'file_type': 'other'}) == '液化石油氣_資料.jpg'
+
+    def test_duplicate_names(self):
+        """測試重複檔名第一個不加編號"""
+        existing = set()
+        names = [handle_duplicate_file_name('a.pdf', existing) for _ in range(3)]
+        assert names == ['a.pdf', 'a_1.pdf', 'a_2.pdf']
+
+
+class TestConvertEntry:
+    """測試條目轉換"""
+
+    def test_diesel_records_with_groups(self):
+        """測試柴油記錄與組別檔名"""
+        entry = {'id': 'e1', 'page_key': 'diesel', 'payload': {'dieselData': [
+            {'id': 'r1', 'date': '2024-01-05', 'quantity': 10, 'groupId': 'g1'},
+            {'id': 'r2', 'date': '2024-01-06', 'quantity': 0, 'groupId': 'g1'},
+            {'id': 'r3', 'date': '2024-02-01', 'quantity': '5.5', 'groupId': 'g2'}
+        ]}}
+        files = [
+            {'file_name': 'a.jpg', 'file_type': 'usage_evidence', 'record_id': 'r3'},
+            {'file_name': 'b.jpg', 'file_type': 'usage_evidence', 'record_id': 'r3'}
+        ]
+
+        rows = convert_entry(entry, files)['柴油(移動源)']
+
+        assert rows == [
+            {'日期': '2024-01-05', '使用量(L)': 10, '佐證檔案': ''},
+            {'日期': '2024-02-01', '使用量(L)': 5.5, '佐證檔案': '柴油(移動源)_第二組.jpg, 柴油(移動源)_第二組_1.jpg'}
+        ]
+
+    def test_records_wrapper_format(self):
+        """測試 {records: [...]} 格式"""
+        entry = {'id': 'e1', 'page_key': 'gasoline', 'payload': {'gasolineData': {'records': [
+            {'id': 'r1', 'date': '2024-01-05', 'quantity': 3}
+        ]}}}
+        assert len(convert_entry(entry, [])['汽油']) == 1
+
+    def test_diesel_generator_split_by_mode(self):
+        """測試柴油發電機依 mode 分工作表"""
+        test_entry = {'id': 'e1', 'page_key': 'diesel_generator', 'payload': {
+            'mode': 'test',
+            'generators': [{'id': 'g1', 'generatorLocation': 'B1', 'powerRating': 500}]
+        }}
+        refuel_entry = {'id': 'e2', 'page_key': 'diesel_generator', 'payload': {
+            'dieselGeneratorData': [{'id': 'r1', 'date': '2024-03-01', 'quantity': 20}]
+        }}
+
+        test_rows = convert_entry(test_entry, [])['柴油發電機（測試）']
+        refuel_rows = convert_entry(refuel_entry, [])['柴油發電機（加油）']
+
+        assert test_rows[0]['位置'] == 'B1'
+        assert test_rows[0]['功率(kW)'] == 500
+        assert refuel_rows[0]['使用量(L)'] == 20
+
+    def test_electricity(self):
+        """測試電費單電表對應與帳單檔案"""
+        entry = {'id': 'e1', 'page_key': 'electricity', 'payload': {
+            'meters': [{'id': 'm1', 'meterNumber': '01-2345'}],
+            'billData': [
+                {'meterId': 'm1', 'billingStartDate': '113/01/01', 'billingEndDate': '113/02/01', 'billingUnits': 1200},
+                {'meterId': 'unknown', 'billingUnits': 800}
+            ]
+        }}
+        files = [{'file_name': 'bill.pdf', 'file_type': 'usage_evidence', 'record_index': 1}]
+
+        rows = convert_entry(entry, files)['電費單']
+
+        assert rows[0]['電表電號'] == '01-2345'
+        assert rows[0]['佐證檔案'] == ''
+        assert rows[1]['電表電號'] == ''
+        assert rows[1]['佐證檔案'] == '電費單_資料.pdf'
+
+    def test_wd40_columns(self):
+        """測試 WD-40 動態欄位與含碳率"""
+        entry = {'id': 'e1', 'page_key': 'wd40', 'unit': 'ML', 'payload': {
+            'unitCapacity': 400, 'carbonRate': 80,
+            'monthlyQuantity': {'10': 2, '2': 1, '3': 0},
+            'monthly': {'10': 800, '2': 400}
+        }}
+
+        rows = convert_entry(entry, [])['WD-40']
+
+        assert [row['月份'] for row in rows] == ['2月', '10月']
+        assert list(rows[0]) == ['月份', '單位容量(ML/罐)', '使用數量(罐)', '總使用量(ML)', '含碳率(%)', '佐證檔案']
+
+    def test_employee_commute_keeps_zero(self):
+        """測試員工通勤保留 0 值"""
+        entry = {'id': 'e1', 'page_key': 'employee_commute', 'payload': {'monthly': {'1': 0, '2': '', '3': 12}}}
+        assert convert_entry(entry, [])['員工通勤'] == [
+            {'月份': '1月', '使用量': 0},
+            {'月份': '3月', '使用量': 12}
+        ]
+
+    def test_unknown_page_uses_simple_monthly(self):
+        """測試未知頁面使用純月份格式並以 page_key 為工作表名稱"""
+        entry = {'id': 'e1', 'page_key': 'sf6', 'payload': {'monthly': {'1': 2}}}
+        assert convert_entry(entry, [])['sf6'][0]['使用量'] == 2
+
+
+ENTRIES = [
+    {'id': 'e1', 'owner_id': USER_ID, 'page_key': 'diesel', 'payload': {
+        'dieselData': [{'id': 'r1', 'date': '2024-01-05', 'quantity': 10}]
+    }},
+    {'id': 'e2', 'owner_id': USER_ID, 'page_key': 'septic_tank', 'payload': {'monthly': {'1': 5}}}
+]
+
+
+class TestWriteEntriesWorkbook:
+    """測試 Excel 產生"""
+
+    def test_sheets_written(self, tmp_path):
+        """測試每個類別一個工作表"""
+        mock_supabase = make_supabase({
+            'energy_entries': ENTRIES,
+            'entry_files': [{'entry_id': 'e2', 'file_name': 'x.pdf', 'file_type': 'usage_evidence', 'month': 1}]
+        })
+        output = tmp_path / 'out.xlsx'
+
+        sheet_count = write_entries_workbook(mock_supabase, [USER_ID], 2024, str(output))
+
+        workbook = load_workbook(output)
+        assert sheet_count == 2
+        assert workbook.sheetnames == ['柴油(移動源)', '化糞池']
+        rows = list(workbook['化糞池'].values)
+        assert rows == [('月份', '使用量', '佐證檔案'), ('1月', 5, '化糞池_1月_使用證明.pdf')]
+
+    def test_no_data(self, tmp_path):
+        """測試沒有資料時拋出錯誤"""
+        mock_supabase = make_supabase({})
+        with pytest.raises(NoExportDataError):
+            write_entries_workbook(mock_supabase, [USER_ID], 2024, str(tmp_path / 'out.xlsx'))
+
+
+class TestExportCache:
+    """測試匯出檔快取"""
+
+    @pytest.fixture(autouse=True)
+    def cache_dir(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(export_service, 'EXPORT_CACHE_DIR', str(tmp_path))
+        return tmp_path
+
+    def test_same_version_reuses_file(self):
+        """測試資料版本相同時不重新產生"""
+        mock_supabase = make_supabase({'energy_entries': ENTRIES})
+
+        with patch.object(export_service, 'get_export_data_version', return_value='v1'), \
+                patch.object(export_service, 'write_entries_workbook', wraps=write_entries_workbook) as mock_write:
+            first = get_or_build_entries_export(mock_supabase, [USER_ID], 2024)
+            second = get_or_build_entries_export(mock_supabase, [USER_ID], 2024)
+
+        assert first == second
+        assert mock_write.call_count == 1
+
+    def test_new_version_replaces_old_file(self, cache_dir):
+        """測試資料版本變更時重新產生並移除舊檔"""
+        mock_supabase = make_supabase({'energy_entries': ENTRIES})
+
+        with patch.object(export_service, 'get_export_data_version', side_effect=['v1', 'v2']):
+            first = get_or_build_entries_export(mock_supabase, [USER_ID], 2024)
+            second = get_or_build_entries_export(mock_supabase, [USER_ID], 2024)
+
+        assert first != second
+        assert [p.name for p in cache_dir.iterdir()] == [second.rsplit('/', 1)[-1]]
+
+    def test_failed_build_leaves_no_file(self, cache_dir):
+        """測試產生失敗時不留下暫存檔"""
+        mock_supabase = make_supabase({})
+
+        with patch.object(export_service, 'get_export_data_version', return_value='v1'):
+            with pytest.raises(NoExportDataError):
+                get_or_build_entries_export(mock_supabase, [USER_ID], 2024)
+
+        assert list(cache_dir.iterdir()) == []
+
+
+class TestFileNamingContext:
+    """測試佐證檔名上下文"""
+
+    def test_group_index(self):
+        """測試依記錄 groupId 計算組別"""
+        entry = {'page_key': 'gasoline', 'payload': {'gasolineData': [
+            {'id': 'r1', 'groupId': 'g1'},
+            {'id': 'r2', 'groupId': 'g2'}
+        ]}}
+        assert build_file_naming_context(entry, {'record_id': 'r2'}) == {'group_index': 1}
+
+    def test_generator_location(self):
+        """測試發電機測試版位置"""
+        entry = {'page_key': 'diesel_generator', 'payload': {
+            'mode': 'test', 'generators': [{'id': 'g1', 'generatorLocation': 'B1'}]
+        }}
+        assert build_file_naming_context(entry, {'record_id': 'g1'}) == {'generator_location': 'B1'}
+
+    def test_month(self):
+        """測試月份"""
+        assert build_file_naming_context({'page_key': 'septic_tank'}, {'month': 4}) == {'month': 4}
+
+
+def make_storage_supabase(tables, contents):
+    """建立 mock Supabase client（storage 依路徑回傳內容，找不到時拋出例外）"""
+    mock_supabase = make_supabase(tables)
+
+    def download(path):
+        if path not in contents:
+            raise Exception('Object not found')
+        return contents[path]
+
+    mock_supabase.storage.from_.return_value.download.side_effect = download
+    return mock_supabase
+
+
+class TestEvidenceZip:
+    """測試佐證檔案 ZIP 串流"""
+
+    def test_downloads_keep_input_order(self):
+        """測試並行下載仍依原順序產出"""
+        tasks = [(f'f{i}.pdf', {'file_path': f'p{i}'}) for i in range(10)]
+        mock_supabase = make_storage_supabase({}, {f'p{i}': f'{i}'.encode() for i in range(10)})
+
+        results = list(iter_downloaded_evidence(mock_supabase, tasks, max_workers=3))
+
+        assert [content for _, _, content, _ in results] == [f'{i}'.encode() for i in range(10)]
+
+    def test_zip_contents(self):
+        """測試 ZIP 依類別分資料夾並列出失敗檔案"""
+        mock_supabase = make_storage_supabase({
+            'energy_entries': ENTRIES,
+            'entry_files': [
+                {'entry_id': 'e2', 'file_name': 'a.pdf', 'file_path': 'u/a.pdf', 'file_type': 'usage_evidence', 'month': 1},
+                {'entry_id': 'e2', 'file_name': 'b.pdf', 'file_path': 'u/b.pdf', 'file_type': 'usage_evidence', 'month': 1},
+                {'entry_id': 'e2', 'file_name': 'lost.pdf', 'file_path': 'u/lost.pdf', 'file_type': 'usage_evidence'}
+            ]
+        }, {'u/a.pdf': b'A', 'u/b.pdf': b'B'})
+
+        data = b''.join(stream_evidence_zip(mock_supabase, [USER_ID], 2024, include_excel=False))
+
+        archive = zipfile.ZipFile(io.BytesIO(data))
+        assert archive.namelist() == ['化糞池/化糞池_1月_使用證明.pdf', '化糞池/化糞池_1月_使用證明_1.pdf', '下載失敗清單.txt']
+        assert archive.read('化糞池/化糞池_1月_使用證明_1.pdf') == b'B'
+        assert 'lost.pdf' in archive.read('下載失敗清單.txt').decode('utf-8')
+
+    def test_zip_includes_excel(self, tmp_path, monkeypatch):
+        """測試 ZIP 附上填報資料 Excel"""
+        monkeypatch.setattr(export_service, 'EXPORT_CACHE_DIR', str(tmp_path))
+        mock_supabase = make_storage_supabase({'energy_entries': ENTRIES}, {})
+
+        with patch.object(export_service, 'get_export_data_version', return_value='v1'):
+            data = b''.join(stream_evidence_zip(mock_supabase, [USER_ID], 2024))
+
+        archive = zipfile.ZipFile(io.BytesIO(data))
+        assert archive.namelist() == ['能源填報資料_2024.xlsx']
+        assert archive.testzip() is None
+
+    def test_interrupted_export_still_valid_zip(self):
+        """測試查詢中斷時仍產生合法 ZIP 並註記"""
+        mock_supabase = MagicMock()
+        mock_supabase.table.side_effect = Exception('database unavailable')
+
+        data = b''.join(stream_evidence_zip(mock_supabase, [USER_ID], 2024))
+
+        archive = zipfile.ZipFile(io.BytesIO(data))
+        assert '匯出中斷' in archive.read('下載失敗清單.txt').decode('utf-8')
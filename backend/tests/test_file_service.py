@@ -2,9 +2,14 @@
 檔案上傳服務單元測試
 重點：檔案驗證與 rollback 機制
 """
+import hashlib
+import io
+import os
+
 import pytest
 from unittest.mock import Mock, MagicMock
 from src.services.file_service import (
+    spool_upload_stream,
     validate_file_size,
     validate_file_type,
     infer_mime_type,
@@ -13,7 +18,11 @@ from src.services.file_service import (
     upload_file_to_storage,
     create_file_record,
     upload_evidence_file,
+    upload_evidence_batch,
     delete_evidence_file,
+    get_blob_path,
+    sweep_unreferenced_blobs,
+    MAX_BATCH_FILES,
     MAX_FILE_SIZE
 )
 
@@ -44,6 +53,53 @@ class TestValidateFileSize:
         assert "empty" in str(exc_info.value).lower()
 
 
+class TestSpoolUploadStream:
+    """測試串流暫存上傳檔案"""
+
+    def test_reads_in_chunks(self):
+        """測試分塊讀取並回傳檔案物件與大小"""
+        content = b'abcdefghij' * 100
+        stream = io.BytesIO(content)
+        stream.read = Mock(wraps=stream.read)
+
+        with spool_upload_stream(stream, chunk_size=64) as (spooled, file_size, content_sha256):
+            assert file_size == len(content)
+            assert content_sha256 == hashlib.sha256(content).hexdigest()
+            assert spooled.read() == content
+            spool_path = spooled.name
+
+        assert all(call.args == (64,) for call in stream.read.call_args_list)
+        assert not os.path.exists(spool_path)
+
+    def test_stops_when_too_large(self):
+        """測試超過上限時立即中止，不讀完整個串流"""
+        stream = io.BytesIO(b'x' * 1000)
+
+        with pytest.raises(ValueError) as exc_info:
+            with spool_upload_stream(stream, max_size=100, chunk_size=64):
+                pass
+
+        assert "exceeds maximum limit" in str(exc_info.value)
+        assert stream.tell() == 128
+
+    def test_empty_stream(self):
+        """測試空檔案"""
+        with pytest.raises(ValueError) as exc_info:
+            with spool_upload_stream(io.BytesIO(b'')):
+                pass
+
+        assert "File is empty" in str(exc_info.value)
+
+    def test_spool_removed_on_error(self):
+        """測試上傳失敗時仍刪除暫存檔"""
+        with pytest.raises(RuntimeError):
+            with spool_upload_stream(io.BytesIO(b'data')) as (spooled, _, _):
+                spool_path = spooled.name
+                raise RuntimeError('upload failed')
+
+        assert not os.path.exists(spool_path)
+
+
 class TestValidateFileType:
     """測試檔案類型驗證"""
 
@@ -200,6 +256,22 @@ class TestUploadFileToStorage:
         assert result['path'] == file_path
         mock_bucket.upload.assert_called_once()
 
+    def test_upload_file_object(self):
+        """測試直接傳入檔案物件（不先讀成 bytes）"""
+        mock_supabase = Mock()
+        mock_bucket = Mock()
+        mock_supabase.storage.from_.return_value = mock_bucket
+
+        with spool_upload_stream(io.BytesIO(b'test file content')) as (spooled, _, _):
+            upload_file_to_storage(
+                supabase=mock_supabase,
+                file_data=spooled,
+                file_path='user-123/64/diesel/test.pdf',
+                mime_type='application/pdf'
+            )
+
+        assert mock_bucket.upload.call_args.args[1] is spooled
+
     def test_upload_failure(self):
         """測試上傳失敗"""
         # Mock Supabase storage to raise error
@@ -409,3 +481,246 @@ class TestDeleteEvidenceFile:
             )
 
         assert "not found" in str(exc_info.value)
+
+
+def make_blob_supabase(blob=None, created=None):
+    """依資料表回傳不同 mock（evidence_blobs / entry_files）"""
+    mock_supabase = MagicMock()
+    blobs = MagicMock()
+    files = MagicMock()
+
+    blobs.select.return_value.eq.return_value.eq.return_value.limit.return_value.execute.return_value.data = (
+        [blob] if blob else []
+    )
+    files.insert.side_effect = lambda record: MagicMock(execute=MagicMock(
+        return_value=MagicMock(data=[{'id': 'file-1', **record}] if created is None else created)
+    ))
+
+    mock_supabase.table.side_effect = lambda name: blobs if name == 'evidence_blobs' else files
+    return mock_supabase, blobs, files
+
+
+def upload_bytes(mock_supabase, content=b'bill'):
+    return upload_evidence_file(
+        supabase=mock_supabase,
+        user_id='user-123',
+        entry_id='entry-456',
+        file_data=content,
+        filename='bill.pdf',
+        file_size=len(content),
+        mime_type='application/pdf',
+        page_key='electricity',
+        period_year=2024,
+        file_type='usage_evidence',
+        month=1
+    )
+
+
+class TestContentAddressedStorage:
+    """測試內容定址去重"""
+
+    def test_blob_path(self):
+        """測試路徑以用戶 ID 為第一層"""
+        digest = hashlib.sha256(b'bill').hexdigest()
+        assert get_blob_path('user-123', digest) == f'user-123/blobs/{digest[:2]}/{digest}'
+
+    def test_new_content_is_uploaded(self):
+        """測試新內容寫入內容定址路徑並記錄摘要"""
+        mock_supabase, _, files = make_blob_supabase()
+        digest = hashlib.sha256(b'bill').hexdigest()
+
+        result = upload_bytes(mock_supabase)
+
+        bucket = mock_supabase.storage.from_.return_value
+        assert bucket.upload.call_args.args[0] == get_blob_path('user-123', digest)
+        assert files.insert.call_args.args[0]['content_sha256'] == digest
+        assert result['deduplicated'] is False
+
+    def test_duplicate_skips_storage_write(self):
+        """測試相同內容不再寫入 Storage，記錄指向共用檔案"""
+        digest = hashlib.sha256(b'bill').hexdigest()
+        mock_supabase, _, _ = make_blob_supabase(blob={'storage_path': 'x', 'ref_count': 2})
+
+        result = upload_bytes(mock_supabase)
+
+        mock_supabase.storage.from_.return_value.upload.assert_not_called()
+        assert result['file_path'] == get_blob_path('user-123', digest)
+        assert result['deduplicated'] is True
+
+    def test_unreferenced_blob_is_rewritten(self):
+        """測試參考計數為 0 的 blob 視為不存在"""
+        mock_supabase, _, _ = make_blob_supabase(blob={'storage_path': 'x', 'ref_count': 0})
+
+        result = upload_bytes(mock_supabase)
+
+        mock_supabase.storage.from_.return_value.upload.assert_called_once()
+        assert result['deduplicated'] is False
+
+    def test_duplicate_record_failure_keeps_blob(self):
+        """測試重複上傳建立記錄失敗時不刪除共用檔案"""
+        mock_supabase, _, _ = make_blob_supabase(blob={'storage_path': 'x', 'ref_count': 1}, created=[])
+
+        with pytest.raises(Exception):
+            upload_bytes(mock_supabase)
+
+        mock_supabase.storage.from_.return_value.remove.assert_not_called()
+
+    def test_new_blob_record_failure_keeps_blob(self):
+        """測試建立記錄失敗時不刪除內容定址檔案（可能已被同時上傳的記錄參考），交給歸零清理"""
+        mock_supabase, blobs, _ = make_blob_supabase(created=[])
+
+        with pytest.raises(Exception):
+            upload_bytes(mock_supabase)
+
+        mock_supabase.storage.from_.return_value.remove.assert_not_called()
+        rows = blobs.upsert.call_args.args[0]
+        assert [row['ref_count'] for row in rows] == [0]
+        assert blobs.upsert.call_args.kwargs['ignore_duplicates'] is True
+
+    def test_delete_shared_file_keeps_blob(self):
+        """測試刪除共用檔案的記錄時不直接移除 Storage 物件，交給保留期後的定期清除"""
+        mock_supabase, blobs, files = make_blob_supabase()
+        files.select.return_value.eq.return_value.single.return_value.execute.return_value.data = {
+            'id': 'file-1', 'owner_id': 'user-123', 'file_path': 'user-123/blobs/aa/aaa', 'content_sha256': 'a' * 64
+        }
+
+        result = delete_evidence_file(mock_supabase, 'user-123', 'file-1')
+
+        assert result['success'] is True
+        files.delete.return_value.eq.assert_called_with('id', 'file-1')
+        blobs.delete.assert_not_called()
+        mock_supabase.storage.from_.return_value.remove.assert_not_called()
+
+    def test_sweep_removes_stale_unreferenced_blobs(self):
+        """測試定期清除歸零超過保留時間的 blob（條件刪除後才移除 Storage 物件）"""
+        mock_supabase, blobs, _ = make_blob_supabase()
+        blobs.select.return_value.eq.return_value.lt.return_value.order.return_value.limit.return_value\
+            .execute.return_value.data = [{'sha256': 'b' * 64}, {'sha256': 'a' * 64}]
+        blobs.delete.return_value.in_.return_value.eq.return_value.lt.return_value.execute.return_value.data = [
+            {'storage_path': 'user-123/blobs/aa/aaa'}
+        ]
+
+        assert sweep_unreferenced_blobs(mock_supabase, grace_seconds=60) == 1
+
+        blobs.delete.return_value.in_.assert_called_once_with('sha256', ['a' * 64, 'b' * 64])
+        blobs.delete.return_value.in_.return_value.eq.assert_called_once_with('ref_count', 0)
+        mock_supabase.storage.from_.return_value.remove.assert_called_once_with(
+            ['user-123/blobs/aa/aaa', 'user-123/_derivatives/blobs/aa/aaa/thumb-320.webp']
+        )
+
+    def test_sweep_nothing_to_remove(self):
+        """測試沒有可清除的 blob"""
+        mock_supabase, blobs, _ = make_blob_supabase()
+        blobs.select.return_value.eq.return_value.lt.return_value.order.return_value.limit.return_value\
+            .execute.return_value.data = []
+
+        assert sweep_unreferenced_blobs(mock_supabase) == 0
+        blobs.delete.assert_not_called()
+
+
+def make_batch_supabase(stored=(), insert_data=None, fail_upload=None):
+    """批次上傳使用的 mock：記錄寫入 Storage 的路徑，可指定失敗的檔案"""
+    mock_supabase = MagicMock()
+    blobs = MagicMock()
+    files = MagicMock()
+    bucket = mock_supabase.storage.from_.return_value
+    written = []
+
+    def upload(path, data, file_options=None):
+        if fail_upload and fail_upload in path:
+            raise Exception('network error')
+        written.append(path)
+
+    bucket.upload.side_effect = upload
+    blobs.select.return_value.eq.return_value.in_.return_value.execute.return_value.data = [
+        {'sha256': digest, 'ref_count': 1} for digest in stored
+    ]
+    files.insert.side_effect = lambda records: MagicMock(execute=MagicMock(return_value=MagicMock(
+        data=[{'id': f'file-{i}', **record} for i, record in enumerate(records)] if insert_data is None else insert_data
+    )))
+    mock_supabase.table.side_effect = lambda name: blobs if name == 'evidence_blobs' else files
+    return mock_supabase, files, written
+
+
+def batch_item(content, filename='bill.pdf', month=1):
+    return {
+        'file_data': content,
+        'filename': filename,
+        'file_size': len(content),
+        'mime_type': 'application/pdf',
+        'page_key': 'electricity',
+        'period_year': 2024,
+        'file_type': 'usage_evidence',
+        'month': month
+    }
+
+
+class TestUploadEvidenceBatch:
+    """測試批次上傳"""
+
+    def test_bulk_insert_and_dedup(self):
+        """測試一次 insert 全部記錄，同批次相同內容只寫入一次"""
+        mock_supabase, files, written = make_batch_supabase()
+
+        results = upload_evidence_batch(mock_supabase, 'user-123', [
+            batch_item(b'jan', month=1), batch_item(b'feb', month=2), batch_item(b'jan', month=3)
+        ])
+
+        assert files.insert.call_count == 1
+        assert len(files.insert.call_args.args[0]) == 3
+        assert sorted(written) == sorted({get_blob_path('user-123', hashlib.sha256(c).hexdigest()) for c in (b'jan', b'feb')})
+        assert [r['deduplicated'] for r in results] == [False, False, True]
+        assert results[0]['file_path'] == results[2]['file_path']
+
+    def test_existing_blob_not_written(self):
+        """測試已存在的內容不寫入 Storage"""
+        mock_supabase, _, written = make_batch_supabase(stored=[hashlib.sha256(b'jan').hexdigest()])
+
+        results = upload_evidence_batch(mock_supabase, 'user-123', [batch_item(b'jan'), batch_item(b'feb')])
+
+        assert written == [get_blob_path('user-123', hashlib.sha256(b'feb').hexdigest())]
+        assert results[0]['deduplicated'] is True
+
+    def test_validation_failure_writes_nothing(self):
+        """測試任一檔案驗證失敗時不寫入任何檔案"""
+        mock_supabase, files, written = make_batch_supabase()
+        too_large = batch_item(b'x', filename='big.pdf')
+        too_large['file_size'] = MAX_FILE_SIZE + 1
+
+        with pytest.raises(ValueError) as exc_info:
+            upload_evidence_batch(mock_supabase, 'user-123', [batch_item(b'jan'), too_large])
+
+        assert 'File 2 (big.pdf)' in str(exc_info.value)
+        assert written == []
+        files.insert.assert_not_called()
+
+    def test_upload_failure_rolls_back(self):
+        """測試部分檔案上傳失敗時，已寫入的檔案交給歸零清理而不直接刪除"""
+        failing_digest = hashlib.sha256(b'feb').hexdigest()
+        mock_supabase, files, written = make_batch_supabase(fail_upload=failing_digest)
+
+        with pytest.raises(Exception) as exc_info:
+            upload_evidence_batch(mock_supabase, 'user-123', [batch_item(b'jan'), batch_item(b'feb')])
+
+        assert 'Failed to upload 1 file(s)' in str(exc_info.value)
+        files.insert.assert_not_called()
+        mock_supabase.storage.from_.return_value.remove.assert_not_called()
+        abandoned = mock_supabase.table('evidence_blobs').upsert.call_args.args[0]
+        assert [row['storage_path'] for row in abandoned] == written
+
+    def test_insert_failure_rolls_back(self):
+        """測試建立記錄失敗時交出全部已寫入的檔案"""
+        mock_supabase, _, written = make_batch_supabase(insert_data=[])
+
+        with pytest.raises(Exception):
+            upload_evidence_batch(mock_supabase, 'user-123', [batch_item(b'jan'), batch_item(b'feb')])
+
+        abandoned = mock_supabase.table('evidence_blobs').upsert.call_args.args[0]
+        assert sorted(row['storage_path'] for row in abandoned) == sorted(written) and len(written) == 2
+        assert all(row['ref_count'] == 0 for row in abandoned)
+        mock_supabase.storage.from_.return_value.remove.assert_not_called()
+
+    def test_too_many_files(self):
+        """測試超過檔案數上限"""
+        with pytest.raises(ValueError):
+            upload_evidence_batch(MagicMock(), 'user-123', [batch_item(b'x')] * (MAX_BATCH_FILES + 1))
@@ -0,0 +1,218 @@
+"""
+冷媒與 SF6 逸散排放計算服務單元測試
+"""
+import pytest
+from unittest.mock import Mock
+from src.services.emission_factor_service import EmissionFactorError, UnknownGwpSetError
+from src.services.leakage_service import (
+    RefrigerantTable,
+    normalize_refrigerant_name,
+    get_refrigerant_table,
+    calculate_leakage_emissions,
+    calculate_leakage_for_year,
+    get_leakage_monthly_emissions
+)
+
+
+def make_refrigerant_entry(entry_id='entry-1', owner_id='user-1', records=None):
+    return {
+        'id': entry_id,
+        'owner_id': owner_id,
+        'page_key': 'refrigerant',
+        'period_year': 2024,
+        'payload': {'refrigerantData': records or []}
+    }
+
+
+def make_sf6_entry(entry_id='entry-2', owner_id='user-2', records=None):
+    return {
+        'id': entry_id,
+        'owner_id': owner_id,
+        'page_key': 'sf6',
+        'period_year': 2024,
+        'payload': {'sf6Data': records or []}
+    }
+
+
+class TestNormalizeRefrigerantName:
+    """測試冷媒名稱正規化"""
+
+    @pytest.mark.parametrize('name', ['R-410A', 'r410a', '410A', 'R 410A', 'R_410a'])
+    def test_variants(self, name):
+        """測試不同寫法視為相同冷媒"""
+        assert normalize_refrigerant_name(name) == 'R410A'
+
+    def test_empty(self):
+        """測試空值"""
+        assert normalize_refrigerant_name(None) == ''
+
+
+class TestRefrigerantTable:
+    """測試冷媒查詢表"""
+
+    def test_blend_gwp_from_composition(self):
+        """測試混合冷媒 GWP 依組成比例計算"""
+        table = get_refrigerant_table()
+        row = table.refrigerant_index('R-410A')
+
+        assert table.gwp_table[row, table.gwp_column('AR5')] == pytest.approx(1923.5)
+        assert table.gwp_table[row, table.gwp_column('AR4')] == pytest.approx(2087.5)
+
+    def test_component_alias(self):
+        """測試單一成分冷媒可用成分名稱查詢"""
+        table = get_refrigerant_table()
+        assert table.refrigerant_index('HFC-134a') == table.refrigerant_index('R-134a')
+
+    def test_unknown_refrigerant(self):
+        """測試未知冷媒"""
+        assert get_refrigerant_table().refrigerant_index('R-600a') == -1
+
+    def test_equipment_class_keywords(self):
+        """測試設備類型關鍵字比對（較長關鍵字優先）"""
+        table = get_refrigerant_table()
+
+        index, matched = table.equipment_class_index('分離式冷氣')
+        assert table.equipment_class_names[index] == 'air_conditioner'
+        assert matched
+
+        index, _ = table.equipment_class_index('冷凍車')
+        assert table.equipment_class_names[index] == 'transport_refrigeration'
+
+    def test_unmatched_equipment_uses_default(self):
+        """測試無法辨識的設備類型使用預設類別"""
+        table = get_refrigerant_table()
+        index, matched = table.equipment_class_index('其他設備')
+
+        assert index == table.default_class_index
+        assert not matched
+
+    def test_unknown_gwp_set(self):
+        """測試不存在的 GWP 版本"""
+        with pytest.raises(UnknownGwpSetError):
+            get_refrigerant_table().gwp_column('AR3')
+
+    def test_unknown_component(self):
+        """測試冷媒組成包含未定義成分"""
+        with pytest.raises(EmissionFactorError):
+            RefrigerantTable(
+                {'HFC-32': {'AR5': 677}},
+                {'R-410A': {'HFC-32': 0.5, 'HFC-125': 0.5}},
+                {'ac': {'leakage_rate': 0.05}},
+                'ac',
+                'ac'
+            )
+
+
+class TestCalculateLeakageEmissions:
+    """測試逸散排放計算"""
+
+    def test_refrigerant_device(self):
+        """測試冷媒設備：填充量 × 洩漏率 × GWP"""
+        entry = make_refrigerant_entry(records=[
+            {'id': 'd1', 'equipmentType': '分離式冷氣', 'refrigerantType': 'R410A', 'fillAmount': 1200, 'unit': 'gram'}
+        ])
+
+        result = calculate_leakage_emissions([entry], gwp_set='AR5')
+        device = result['entries'][0]['devices'][0]
+
+        assert device['charge_kg'] == 1.2
+        assert device['leakage_rate'] == 0.055
+        assert device['gwp'] == pytest.approx(1923.5)
+        assert device['emission'] == round(1.2 * 0.055 * 1923.5, 2)
+        assert result['entries'][0]['total_emission'] == device['emission']
+
+    def test_sf6_uses_recorded_leakage_rate(self):
+        """測試 SF6 優先使用記錄中的年洩漏率（公克、百分比）"""
+        entry = make_sf6_entry(records=[
+            {'id': 's1', 'sf6Weight': 5000, 'leakageRate': 1.0},
+            {'id': 's2', 'sf6Weight': 2000, 'leakageRate': 0}
+        ])
+
+        result = calculate_leakage_emissions([entry], gwp_set='AR5')
+        devices = result['entries'][0]['devices']
+
+        assert devices[0]['leakage_rate'] == 0.01
+        assert devices[0]['emission'] == 1175.0
+        assert devices[1]['leakage_rate'] == get_refrigerant_table().leakage_rates[get_refrigerant_table().sf6_class_index]
+
+    def test_many_entries_aggregated(self):
+        """測試多用戶多設備一次計算並依條目加總"""
+        entries = [
+            make_refrigerant_entry('e1', 'u1', [
+                {'id': 'a', 'equipmentType': '冰水機', 'refrigerantType': 'R-134a', 'fillAmount': 100, 'unit': 'kg'},
+                {'id': 'b', 'equipmentType': '冰箱', 'refrigerantType': 'R-600a', 'fillAmount': 0.1, 'unit': 'kg'}
+            ]),
+            make_refrigerant_entry('e2', 'u2', []),
+            make_sf6_entry('e3', 'u3', [{'id': 'c', 'sf6Weight': 1000, 'leakageRate': 0.5}])
+        ]
+
+        result = calculate_leakage_emissions(entries, gwp_set='AR6', include_devices=False)
+
+        assert result['device_count'] == 3
+        assert [e['device_count'] for e in result['entries']] == [2, 0, 1]
+        assert result['entries'][0]['total_emission'] == round(100 * 0.085 * 1530, 2)
+        assert result['entries'][0]['unknown_refrigerants'] == ['R-600a']
+        assert result['entries'][2]['total_emission'] == 126.0
+        assert result['total_emission'] == round(13005.0 + 126.0, 2)
+        assert 'devices' not in result['entries'][0]
+
+    def test_records_wrapper(self):
+        """測試 payload 使用 {records: [...]} 或 records 欄位"""
+        entry = make_refrigerant_entry()
+        entry['payload'] = {'records': [{'equipmentType': '冷氣', 'refrigerantType': 'R-32', 'fillAmount': 1, 'unit': 'kg'}]}
+
+        result = calculate_leakage_emissions([entry])
+        assert result['entries'][0]['device_count'] == 1
+
+    def test_empty(self):
+        """測試沒有條目"""
+        result = calculate_leakage_emissions([])
+        assert result['device_count'] == 0
+        assert result['total_emission'] == 0.0
+
+
+class TestLeakageMonthlyEmissions:
+    """測試範疇一彙總使用的各月逸散排放"""
+
+    def test_spread_over_months(self):
+        """測試年排放分攤到 12 個月，加總等於條目總量；沒有設備記錄的條目不取代"""
+        records = [{'id': 'd1', 'refrigerantType': 'R-410A', 'fillAmount': 2.3, 'unit': 'kg', 'equipmentType': '冷氣'}]
+        entries = [
+            {'page_key': 'diesel', 'payload': {'monthly': {'1': 10.0}}},
+            make_refrigerant_entry(records=records),
+            make_refrigerant_entry(entry_id='entry-3'),
+        ]
+
+        rows, monthly = get_leakage_monthly_emissions(entries)
+
+        total = calculate_leakage_emissions([entries[1]])['total_emission']
+        assert rows.tolist() == [1]
+        assert monthly.shape == (1, 12)
+        assert round(monthly.sum(), 2) == total
+        assert monthly[0, 0] == round(total / 12, 2)
+
+
+class TestCalculateLeakageForYear:
+    """測試依年份讀取條目並計算"""
+
+    def test_queries_leakage_entries(self):
+        """測試只查詢冷媒 / SF6 條目並套用用戶篩選"""
+        mock_supabase = Mock()
+        query = mock_supabase.table.return_value.select.return_value.in_.return_value.eq.return_value
+        query.in_.return_value.order.return_value.range.return_value.execute.return_value = Mock(
+            data=[make_sf6_entry(records=[{'id': 's1', 'sf6Weight': 1000, 'leakageRate': 1.0}])]
+        )
+
+        result = calculate_leakage_for_year(mock_supabase, 2024, owner_ids=['user-2'])
+
+        mock_supabase.table.return_value.select.return_value.in_.assert_called_with('page_key', ['refrigerant', 'sf6'])
+        query.in_.assert_called_with('owner_id', ['user-2'])
+        assert result['year'] == 2024
+        assert result['device_count'] == 1
+
+    def test_unknown_gwp_set_before_query(self):
+        """測試 GWP 版本錯誤時不查詢資料庫"""
+        mock_supabase = Mock()
+        with pytest.raises(UnknownGwpSetError):
+            calculate_leakage_for_year(mock_supabase, 2024, gwp_set='AR3')
+        mock_supabase.table.assert_not_called()
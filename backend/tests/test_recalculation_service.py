@@ -0,0 +1,230 @@
+"""
+排放係數重算服務單元測試
+重點：受影響條目篩選、分批游標與中斷後繼續
+"""
+import pytest
+from unittest.mock import MagicMock
+from src.services.recalculation_service import (
+    diff_factor_registries,
+    recalculate_entries,
+    create_recalculation_job,
+    get_recalculation_job,
+    run_recalculation_job,
+    refresh_entry_emissions,
+    RecalculationJobError
+)
+from src.services.emission_factor_service import EmissionFactorRegistry
+from src.services.leakage_service import calculate_leakage_emissions
+
+
+def make_entry(index, page_key='electricity', year=2024, monthly=None):
+    return {
+        'id': f'00000000-0000-0000-0000-{index:012d}',
+        'owner_id': 'user-1',
+        'page_key': page_key,
+        'period_year': year,
+        'payload': {'monthly': monthly if monthly is not None else {'1': 100.0}}
+    }
+
+
+class FakeQuery:
+    """簡化的 PostgREST query builder（只支援重算服務使用的方法）"""
+
+    def __init__(self, db, table):
+        self.db, self.table, self.filters = db, table, []
+        self.action, self.values, self.limit_count = 'select', None, None
+
+    def select(self, columns, count=None):
+        return self
+
+    def insert(self, values):
+        self.action, self.values = 'insert', values
+        return self
+
+    def update(self, values):
+        self.action, self.values = 'update', values
+        return self
+
+    def upsert(self, values, on_conflict=None):
+        self.action, self.values = 'upsert', values
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def in_(self, column, values):
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: row.get(column) > value)
+        return self
+
+    def order(self, column):
+        return self
+
+    def limit(self, count):
+        self.limit_count = count
+        return self
+
+    def execute(self):
+        rows = self.db.tables.setdefault(self.table, [])
+        if self.action == 'insert':
+            row = {'id': f'job-{len(rows) + 1}', **self.values}
+            rows.append(row)
+            return MagicMock(data=[row])
+        if self.action == 'upsert':
+            self.db.upserts.append(self.values)
+            return MagicMock(data=self.values)
+
+        matched = sorted((row for row in rows if all(f(row) for f in self.filters)), key=lambda r: r['id'])
+        if self.action == 'update':
+            for row in matched:
+                row.update(self.values)
+            return MagicMock(data=matched)
+
+        count = len(matched)
+        return MagicMock(data=[dict(row) for row in matched[:self.limit_count]], count=count)
+
+
+class FakeSupabase:
+    def __init__(self, entries):
+        self.tables = {'energy_entries': entries}
+        self.upserts = []
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+def make_registry(electricity_2024):
+    return EmissionFactorRegistry([
+        {'version': 'v1', 'effective_from': 2020, 'factors': {'electricity': 0.509, 'diesel': 2.6}},
+        {'version': 'v2', 'effective_from': 2024, 'factors': {'electricity': electricity_2024}}
+    ])
+
+
+class TestDiffFactorRegistries:
+    """測試係數變動比對"""
+
+    def test_changed_page_keys_and_years(self):
+        """測試只回傳係數有變動的能源類型與年份"""
+        changed = diff_factor_registries(make_registry(0.494), make_registry(0.474), years=[2023, 2024, 2025])
+        assert changed == {'electricity': [2024, 2025]}
+
+    def test_no_changes(self):
+        """測試係數相同"""
+        assert diff_factor_registries(make_registry(0.494), make_registry(0.494), years=[2024]) == {}
+
+
+class TestRecalculateEntries:
+    """測試批次重算"""
+
+    def test_uses_normalized_monthly(self):
+        """測試優先使用換算為標準單位後的月份數據"""
+        entry = make_entry(1, page_key='diesel', monthly={'1': 1000.0})
+        entry['payload']['normalized'] = {'monthly': {'1': 10.0}}
+
+        rows = recalculate_entries([entry, make_entry(2, monthly={})], job_id='job-1')
+
+        assert rows[0]['entry_id'] == entry['id']
+        assert rows[0]['total_emission'] == round(10.0 * 2.6068, 2)
+        assert rows[0]['job_id'] == 'job-1'
+        assert rows[1]['total_emission'] == 0.0
+
+    def test_refrigerant_uses_leakage(self):
+        """測試冷媒條目以逸散排放重算"""
+        entry = make_entry(1, page_key='refrigerant', monthly={'1': 10.0})
+        entry['payload']['refrigerantData'] = [
+            {'id': 'd1', 'refrigerantType': 'R-410A', 'fillAmount': 10.0, 'unit': 'kg', 'equipmentType': '冷氣'}
+        ]
+
+        row = recalculate_entries([entry])[0]
+
+        assert row['total_emission'] == calculate_leakage_emissions([entry])['total_emission']
+        assert len(row['monthly_emission']) == 12
+        assert row['emission_factor'] == 0.0
+
+
+class TestRefreshEntryEmissions:
+    """測試條目寫入後即時更新 entry_emissions"""
+
+    def test_upserts_row(self):
+        """測試以目前係數重算並寫入"""
+        supabase = FakeSupabase([])
+        entry = make_entry(1, page_key='diesel', monthly={'1': 10.0})
+
+        row = refresh_entry_emissions(supabase, entry)
+
+        assert supabase.upserts == [row]
+        assert row['entry_id'] == entry['id']
+        assert row['total_emission'] == round(10.0 * 2.6068, 2)
+        assert row['job_id'] is None
+
+    def test_failure_does_not_raise(self):
+        """測試寫入失敗不影響條目本身"""
+        supabase = MagicMock()
+        supabase.table.return_value.upsert.side_effect = Exception('down')
+
+        assert refresh_entry_emissions(supabase, make_entry(1)) is None
+
+
+class TestRecalculationJob:
+    """測試重算工作"""
+
+    def test_create_counts_affected_entries(self):
+        """測試依 page_key / 年份計算受影響條目數"""
+        supabase = FakeSupabase([make_entry(1), make_entry(2, year=2023), make_entry(3, page_key='diesel')])
+
+        job = create_recalculation_job(supabase, page_keys=['electricity'], period_years=[2024])
+
+        assert job['total_count'] == 1
+        assert job['status'] == 'pending'
+
+    def test_run_in_batches(self):
+        """測試分批重算並完成"""
+        supabase = FakeSupabase([make_entry(i) for i in range(1, 6)])
+        job = create_recalculation_job(supabase, page_keys=['electricity'])
+
+        result = run_recalculation_job(supabase, job['id'], batch_size=2)
+
+        assert result['status'] == 'completed'
+        assert result['processed_count'] == 5
+        assert result['progress'] == 100.0
+        assert [len(batch) for batch in supabase.upserts] == [2, 2, 1]
+
+    def test_resume_after_interruption(self):
+        """測試中斷後從游標繼續，不重複處理"""
+        supabase = FakeSupabase([make_entry(i) for i in range(1, 6)])
+        job = create_recalculation_job(supabase)
+
+        partial = run_recalculation_job(supabase, job['id'], batch_size=2, max_batches=1)
+        assert partial['status'] == 'running'
+        assert partial['progress'] == 40.0
+
+        result = run_recalculation_job(supabase, job['id'], batch_size=2)
+
+        processed_ids = [row['entry_id'] for batch in supabase.upserts for row in batch]
+        assert processed_ids == [make_entry(i)['id'] for i in range(1, 6)]
+        assert result['status'] == 'completed'
+
+    def test_failure_recorded(self, monkeypatch):
+        """測試失敗時記錄錯誤，可再繼續"""
+        supabase = FakeSupabase([make_entry(1)])
+        job = create_recalculation_job(supabase)
+
+        def fail(*args, **kwargs):
+            raise ValueError('boom')
+
+        monkeypatch.setattr('src.services.recalculation_service.recalculate_entries', fail)
+        with pytest.raises(ValueError):
+            run_recalculation_job(supabase, job['id'])
+
+        failed = get_recalculation_job(supabase, job['id'])
+        assert failed['status'] == 'failed'
+        assert failed['error'] == 'boom'
+
+    def test_missing_job(self):
+        """測試工作不存在"""
+        with pytest.raises(RecalculationJobError):
+            run_recalculation_job(FakeSupabase([]), 'missing')
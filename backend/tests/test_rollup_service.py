@@ -0,0 +1,185 @@
+"""
+組織排放彙總服務單元測試
+重點：立方體切片分組與依公司清除快取
+"""
+import pytest
+from unittest.mock import MagicMock
+from src.services.leakage_service import calculate_leakage_emissions
+from src.services.rollup_service import (
+    build_company_cubes,
+    stack_company_cubes,
+    compute_entry_emissions,
+    RollupCache,
+    RollupQueryError,
+    UNASSIGNED_COMPANY
+)
+
+OWNER_COMPANIES = {'u1': 'A公司', 'u2': 'A公司', 'u3': 'B公司'}
+
+
+def make_entry(entry_id, owner_id, page_key, monthly, year=2024, scope=None):
+    return {
+        'id': entry_id,
+        'owner_id': owner_id,
+        'page_key': page_key,
+        'scope': scope,
+        'period_year': year,
+        'payload': {'monthly': monthly}
+    }
+
+
+ENTRIES = [
+    make_entry('e1', 'u1', 'diesel', {'1': 100.0, '2': 100.0}),
+    make_entry('e2', 'u2', 'electricity', {'1': 1000.0}),
+    make_entry('e3', 'u3', 'diesel', {'3': 10.0}, year=2023),
+    make_entry('e4', 'u3', 'employee_commute', {'1': 5.0}),
+]
+
+
+def make_cube(entries=ENTRIES):
+    companies = set(OWNER_COMPANIES.values())
+    return stack_company_cubes(build_company_cubes(entries, OWNER_COMPANIES, companies))
+
+
+def make_supabase(profiles, entries):
+    """建立 mock Supabase client（依資料表回傳不同資料）"""
+    mock_supabase = MagicMock()
+    queries = {}
+    for name, rows in (('profiles', profiles), ('energy_entries', entries)):
+        query = MagicMock()
+        for method in ('select', 'in_', 'order', 'range'):
+            getattr(query, method).return_value = query
+        query.execute.return_value = MagicMock(data=rows)
+        queries[name] = query
+    mock_supabase.table.side_effect = lambda name: queries[name]
+    return mock_supabase, queries
+
+
+class TestComputeEntryEmissions:
+    """測試條目各月排放"""
+
+    def test_refrigerant_uses_leakage(self):
+        """測試有設備記錄的冷媒條目以逸散排放計算，不使用「數量 × 係數」"""
+        entry = make_entry('e5', 'u1', 'refrigerant', {'1': 10.0})
+        entry['payload']['refrigerantData'] = [
+            {'id': 'd1', 'refrigerantType': 'R-410A', 'fillAmount': 10.0, 'unit': 'kg', 'equipmentType': '冷氣'}
+        ]
+
+        emissions = compute_entry_emissions([ENTRIES[0], entry])
+
+        expected = calculate_leakage_emissions([entry])['total_emission']
+        assert round(emissions[1].sum(), 2) == expected
+        assert round(emissions[1].sum(), 2) != 10.0
+        assert emissions[0].sum() == pytest.approx(2 * round(100 * 2.6068, 2))
+
+
+class TestEmissionCube:
+    """測試排放立方體"""
+
+    def test_shape_and_axes(self):
+        """測試立方體維度"""
+        cube = make_cube()
+
+        assert cube.companies == ['A公司', 'B公司']
+        assert cube.years == [2023, 2024]
+        assert cube.values.shape == (2, 3, len(cube.axes['category']), 12, 2)
+
+    def test_group_by_scope(self):
+        """測試依範疇分組（scope 欄位空白時依 page_key 判斷）"""
+        result = make_cube().query(group_by=['scope'])
+
+        assert result['rows'] == [
+            {'scope': 1, 'emission': round(210 * 2.6068, 2)},
+            {'scope': 2, 'emission': round(1000 * 0.509, 2)}
+        ]
+        assert result['total'] == round(210 * 2.6068 + 509, 2)
+
+    def test_slice_and_dice(self):
+        """測試切片後依公司與月份分組"""
+        result = make_cube().query(
+            filters={'year': [2024], 'category': ['diesel', 'electricity']},
+            group_by=['company', 'month']
+        )
+
+        assert result['rows'] == [
+            {'company': 'A公司', 'month': 1, 'emission': round(100 * 2.6068 + 509, 2)},
+            {'company': 'A公司', 'month': 2, 'emission': round(100 * 2.6068, 2)}
+        ]
+
+    def test_total_only(self):
+        """測試不分組只回傳總量"""
+        result = make_cube().query(filters={'company': ['B公司']}, group_by=[])
+        assert result['rows'] == []
+        assert result['total'] == round(10 * 2.6068, 2)
+
+    def test_unknown_dimension(self):
+        """測試維度名稱錯誤"""
+        with pytest.raises(RollupQueryError):
+            make_cube().query(group_by=['owner'])
+
+    def test_explicit_scope_column(self):
+        """測試使用條目的 scope 欄位"""
+        entries = [make_entry('e1', 'u1', 'electricity', {'1': 100.0}, scope=3)]
+        result = make_cube(entries).query(group_by=['scope'])
+        assert result['rows'] == [{'scope': 3, 'emission': 50.9}]
+
+
+class TestRollupCache:
+    """測試彙總快取"""
+
+    def test_blank_company_unassigned(self):
+        """測試未填寫公司的用戶"""
+        supabase, _ = make_supabase([{'id': 'u1', 'company': ' '}], [ENTRIES[0]])
+        cube = RollupCache().get_cube(supabase)
+        assert cube.companies == [UNASSIGNED_COMPANY]
+
+    def test_cached_until_invalidated(self):
+        """測試快取命中，條目寫入後只重建該公司"""
+        profiles = [{'id': owner, 'company': company} for owner, company in OWNER_COMPANIES.items()]
+        supabase, queries = make_supabase(profiles, ENTRIES)
+        cache = RollupCache()
+
+        cache.get_cube(supabase)
+        cache.get_cube(supabase)
+        assert queries['energy_entries'].execute.call_count == 1
+
+        cache.invalidate('u3')
+        queries['energy_entries'].execute.return_value = MagicMock(data=[ENTRIES[2]])
+        cube = cache.get_cube(supabase)
+
+        queries['energy_entries'].in_.assert_called_with('owner_id', ['u3'])
+        assert cube.query(filters={'company': ['A公司']}, group_by=[])['total'] == round(200 * 2.6068 + 509, 2)
+        assert cube.query(filters={'company': ['B公司']}, group_by=[])['total'] == round(10 * 2.6068, 2)
+
+    def test_write_during_load_not_cached(self):
+        """測試讀取期間有條目寫入時結果不寫回快取"""
+        profiles = [{'id': owner, 'company': company} for owner, company in OWNER_COMPANIES.items()]
+        supabase, queries = make_supabase(profiles, ENTRIES)
+        cache = RollupCache()
+
+        def write_during_load():
+            cache.invalidate('u3')
+            return MagicMock(data=ENTRIES)
+
+        queries['energy_entries'].execute.side_effect = write_during_load
+        first = cache.get_cube(supabase)
+
+        queries['energy_entries'].execute.side_effect = None
+        queries['energy_entries'].execute.return_value = MagicMock(data=ENTRIES)
+        second = cache.get_cube(supabase)
+
+        assert queries['energy_entries'].execute.call_count == 2
+        assert second.version > first.version
+
+    def test_unknown_owner_clears_all(self):
+        """測試無法判斷公司時清除全部"""
+        profiles = [{'id': owner, 'company': company} for owner, company in OWNER_COMPANIES.items()]
+        supabase, queries = make_supabase(profiles, ENTRIES)
+        cache = RollupCache()
+
+        cache.get_cube(supabase)
+        cache.invalidate('new-user')
+        cache.get_cube(supabase)
+
+        assert queries['profiles'].execute.call_count == 2
+        assert queries['energy_entries'].execute.call_count == 2
@@ -0,0 +1,67 @@
+"""
+Supabase admin client 單元測試
+重點：程序內單例與重置
+"""
+import os
+import pytest
+from unittest.mock import patch
+from utils import supabase_admin
+from utils.supabase_admin import get_supabase_admin, reset_supabase_admin
+
+
+@pytest.fixture(autouse=True)
+def supabase_env(monkeypatch):
+    monkeypatch.setenv('SUPABASE_URL', 'https://example.supabase.co')
+    monkeypatch.setenv('SUPABASE_SERVICE_ROLE_KEY', 'service-role-key')
+    reset_supabase_admin()
+    yield
+    reset_supabase_admin()
+
+
+class TestGetSupabaseAdmin:
+    """測試共用 client"""
+
+    def test_client_is_reused(self):
+        """測試重複呼叫只建立一次 client"""
+        with patch.object(supabase_admin, 'create_client') as mock_create:
+            first = get_supabase_admin()
+            second = get_supabase_admin()
+
+        assert first is second
+        mock_create.assert_called_once()
+
+    def test_storage_does_not_change_postgrest_base_url(self):
+        """測試使用 storage 後 postgrest 仍指向 /rest/v1"""
+        supabase = get_supabase_admin()
+        supabase.storage.from_('evidence')
+        supabase.table('entry_files')
+
+        assert str(supabase.postgrest.session.base_url).rstrip('/').endswith('/rest/v1')
+        assert str(supabase.storage.session.base_url).rstrip('/').endswith('/storage/v1')
+
+    def test_reset_recreates_client(self):
+        """測試重置後重新建立 client"""
+        with patch.object(supabase_admin, 'create_client') as mock_create:
+            get_supabase_admin()
+            reset_supabase_admin()
+            get_supabase_admin()
+
+        assert mock_create.call_count == 2
+
+    def test_new_process_recreates_client(self):
+        """測試 fork 後（pid 改變）重新建立 client"""
+        with patch.object(supabase_admin, 'create_client') as mock_create:
+            get_supabase_admin()
+            with patch.object(supabase_admin.os, 'getpid', return_value=os.getpid() + 1):
+                get_supabase_admin()
+
+        assert mock_create.call_count == 2
+
+    def test_missing_env_raises(self, monkeypatch):
+        """測試缺少環境變數"""
+        monkeypatch.delenv('SUPABASE_SERVICE_ROLE_KEY')
+
+        with pytest.raises(ValueError) as exc_info:
+            get_supabase_admin()
+
+        assert 'SUPABASE_SERVICE_ROLE_KEY' in str(exc_info.value)
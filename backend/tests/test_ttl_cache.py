@@ -0,0 +1,75 @@
+"""
+TTL + LRU 快取單元測試
+"""
+import time
+import pytest
+from src.infrastructure.cache.ttl_cache import TTLCache
+
+
+class TestTTLCache:
+    """測試 TTL + LRU 快取"""
+
+    def test_set_and_get(self):
+        """測試寫入與讀取"""
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache.set('a', 1)
+        assert cache.get('a') == 1
+        assert cache.get('missing') is None
+        assert cache.get('missing', 'default') == 'default'
+
+    def test_expired_entry(self):
+        """測試過期資料"""
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache.set('a', 1, ttl=0.01)
+        time.sleep(0.02)
+        assert cache.get('a') is None
+        assert len(cache) == 0
+
+    def test_non_positive_ttl_not_stored(self):
+        """測試 ttl <= 0 不寫入"""
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache.set('a', 1, ttl=0)
+        assert len(cache) == 0
+
+    def test_lru_eviction(self):
+        """測試超過容量時淘汰最久未使用的資料"""
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')      # a 變為最近使用
+        cache.set('c', 3)   # 淘汰 b
+
+        assert cache.get('a') == 1
+        assert cache.get('b') is None
+        assert cache.get('c') == 3
+        assert cache.stats()['evictions'] == 1
+
+    def test_delete_and_delete_where(self):
+        """測試刪除"""
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache.set('a', {'id': 'u1'})
+        cache.set('b', {'id': 'u2'})
+        cache.set('c', {'id': 'u1'})
+
+        assert cache.delete('b') is True
+        assert cache.delete('b') is False
+        assert cache.delete_where(lambda _, v: v['id'] == 'u1') == 2
+        assert len(cache) == 0
+
+    def test_stats(self):
+        """測試命中統計"""
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache.set('a', 1)
+        cache.get('a')
+        cache.get('b')
+
+        stats = cache.stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+        assert stats['hit_rate'] == 0.5
+        assert stats['size'] == 1
+
+    def test_invalid_maxsize(self):
+        """測試無效容量"""
+        with pytest.raises(ValueError):
+            TTLCache(maxsize=0)
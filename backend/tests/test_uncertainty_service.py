@@ -0,0 +1,151 @@
+"""
+盤查不確定性分析服務單元測試
+"""
+import numpy as np
+import pytest
+from unittest.mock import Mock
+from src.services.uncertainty_service import (
+    UncertaintyTable,
+    simulate_uncertainty,
+    calculate_inventory_uncertainty,
+    get_uncertainty_table,
+    MAX_UNCERTAINTY_DRAWS
+)
+from src.services.emission_factor_service import EmissionFactorError
+from src.services.leakage_service import calculate_leakage_emissions
+
+
+def make_entries():
+    return [
+        {'page_key': 'diesel', 'period_year': 2024, 'amount': 1000.0},
+        {'page_key': 'diesel', 'period_year': 2024, 'amount': 500.0},
+        {'page_key': 'electricity', 'period_year': 2024, 'amount': 20000.0},
+        {'page_key': 'employee_commute', 'period_year': 2024, 'amount': 0},
+    ]
+
+
+class TestUncertaintyTable:
+    """測試不確定性範圍表"""
+
+    def test_relative_sigmas(self):
+        """測試半寬百分比換算為相對標準差"""
+        table = UncertaintyTable({'diesel': {'activity': 1.96, 'factor': 3.92}}, {'activity': 19.6, 'factor': 0})
+
+        assert table.relative_sigmas(['diesel', 'unknown'], 'activity') == pytest.approx([0.01, 0.1], rel=1e-3)
+        assert table.relative_sigmas(['diesel'], 'factor') == pytest.approx([0.02], rel=1e-3)
+
+    def test_negative_range(self):
+        """測試負值範圍"""
+        with pytest.raises(EmissionFactorError):
+            UncertaintyTable({'diesel': {'activity': -1, 'factor': 1}}, {'activity': 1, 'factor': 1})
+
+    def test_data_file_loaded(self):
+        """測試資料檔包含所有能源類型"""
+        ranges = get_uncertainty_table().describe()
+        assert 'electricity' in ranges
+        assert 'default' in ranges
+
+
+class TestSimulateUncertainty:
+    """測試蒙地卡羅抽樣"""
+
+    def test_point_estimates_and_intervals(self):
+        """測試點估計與信賴區間"""
+        result = simulate_uncertainty(make_entries(), draws=20000)
+
+        diesel = result['categories']['diesel']
+        assert diesel['emission'] == round(1500 * 2.6068, 2)
+        assert diesel['lower'] < diesel['emission'] < diesel['upper']
+
+        assert result['entry_count'] == 3
+        assert set(result['scopes']) == {'範疇一', '範疇二'}
+        assert result['total']['emission'] == pytest.approx(
+            diesel['emission'] + result['categories']['electricity']['emission'], abs=0.01
+        )
+
+    def test_interval_width_matches_input_ranges(self):
+        """測試單一條目的不確定性接近活動數據與係數範圍的合成（√(a² + f²)）"""
+        table = UncertaintyTable({'diesel': {'activity': 3.0, 'factor': 4.0}}, {'activity': 0, 'factor': 0})
+
+        result = simulate_uncertainty(
+            [{'page_key': 'diesel', 'period_year': 2024, 'amount': 100.0}], draws=100000, table=table
+        )
+
+        assert result['total']['uncertainty_percent'] == pytest.approx(5.0, abs=0.2)
+
+    def test_reproducible_with_seed(self):
+        """測試相同種子結果相同，不同種子結果不同"""
+        first = simulate_uncertainty(make_entries(), draws=5000, seed=7)
+        second = simulate_uncertainty(make_entries(), draws=5000, seed=7)
+        other = simulate_uncertainty(make_entries(), draws=5000, seed=8)
+
+        assert first == second
+        assert first['total'] != other['total']
+
+    def test_activity_draws_independent_across_entries(self):
+        """測試條目間活動數據誤差獨立（拆成 10 筆時不確定性約縮小為 1/√10）"""
+        table = UncertaintyTable({'diesel': {'activity': 10.0, 'factor': 0}}, {'activity': 0, 'factor': 0})
+        single = [{'page_key': 'diesel', 'period_year': 2024, 'amount': 1000.0}]
+        split = [{'page_key': 'diesel', 'period_year': 2024, 'amount': 100.0}] * 10
+
+        single_percent = simulate_uncertainty(single, draws=100000, table=table)['total']['uncertainty_percent']
+        split_percent = simulate_uncertainty(split, draws=100000, table=table)['total']['uncertainty_percent']
+
+        assert split_percent == pytest.approx(single_percent / np.sqrt(10), rel=0.05)
+
+    def test_factor_draws_shared_within_category(self):
+        """測試同類別條目共用係數抽樣（拆分條目不會縮小係數誤差）"""
+        table = UncertaintyTable({'diesel': {'activity': 0, 'factor': 10.0}}, {'activity': 0, 'factor': 0})
+        single = [{'page_key': 'diesel', 'period_year': 2024, 'amount': 1000.0}]
+        split = [{'page_key': 'diesel', 'period_year': 2024, 'amount': 100.0}] * 10
+
+        assert simulate_uncertainty(single, draws=20000, table=table)['total']['uncertainty_percent'] == \
+            pytest.approx(simulate_uncertainty(split, draws=20000, table=table)['total']['uncertainty_percent'], abs=0.01)
+
+    def test_no_entries(self):
+        """測試沒有條目"""
+        result = simulate_uncertainty([], draws=100)
+        assert result['total']['emission'] == 0.0
+        assert result['categories'] == {}
+
+    @pytest.mark.parametrize('draws, confidence_level', [(0, 0.95), (MAX_UNCERTAINTY_DRAWS + 1, 0.95), (100, 1.0)])
+    def test_invalid_parameters(self, draws, confidence_level):
+        """測試參數超出範圍"""
+        with pytest.raises(ValueError):
+            simulate_uncertainty(make_entries(), draws=draws, confidence_level=confidence_level)
+
+
+    def test_refrigerant_point_estimate_uses_leakage(self):
+        """測試冷媒條目以逸散排放為點估計（沒有 amount 也納入）"""
+        refrigerant = {
+            'page_key': 'refrigerant',
+            'period_year': 2024,
+            'amount': 0,
+            'payload': {'refrigerantData': [
+                {'id': 'd1', 'refrigerantType': 'R-410A', 'fillAmount': 10.0, 'unit': 'kg', 'equipmentType': '冷氣'}
+            ]}
+        }
+
+        result = simulate_uncertainty(make_entries() + [refrigerant], draws=1000)
+
+        expected = calculate_leakage_emissions([refrigerant])['total_emission']
+        assert result['categories']['refrigerant']['emission'] == pytest.approx(expected, abs=0.01)
+        assert result['entry_count'] == 4
+
+
+class TestCalculateInventoryUncertainty:
+    """測試讀取條目並計算"""
+
+    def test_reads_entries_for_year(self):
+        """測試依年份與用戶讀取條目"""
+        mock_supabase = Mock()
+        query = mock_supabase.table.return_value.select.return_value.eq.return_value
+        query.in_.return_value.order.return_value.range.return_value.execute.return_value = Mock(data=make_entries())
+        leakage_query = mock_supabase.table.return_value.select.return_value.in_.return_value.eq.return_value
+        leakage_query.in_.return_value.order.return_value.range.return_value.execute.return_value = Mock(data=[])
+
+        result = calculate_inventory_uncertainty(mock_supabase, 2024, owner_ids=['user-1'], draws=1000)
+
+        assert result['year'] == 2024
+        assert result['entry_count'] == 3
+        query.in_.assert_called_once_with('owner_id', ['user-1'])
@@ -0,0 +1,161 @@
+"""
+單位換算服務單元測試
+"""
+import numpy as np
+import pytest
+from src.services.unit_service import (
+    normalize_unit,
+    get_canonical_unit,
+    get_conversion_factor,
+    convert_values,
+    normalize_record_quantities,
+    normalize_entry_quantities,
+    UnitConversionError,
+    CONVERSION_TABLE,
+    UNIT_INDEX
+)
+
+
+class TestNormalizeUnit:
+    """測試單位寫法正規化"""
+
+    @pytest.mark.parametrize('raw, expected', [
+        ('公升', 'L'), ('L', 'L'), ('KG', 'kg'), ('gram', 'g'), ('g', 'g'),
+        ('m³', 'm³'), ('m3', 'm³'), ('度', 'kWh'), ('kWh', 'kWh'), ('MWh', 'MWh'), (' 公斤 ', 'kg')
+    ])
+    def test_aliases(self, raw, expected):
+        """測試各種寫法"""
+        assert normalize_unit(raw) == expected
+
+    def test_unknown_unit(self):
+        """測試無法換算的單位"""
+        assert normalize_unit('瓶') is None
+        assert normalize_unit(None) is None
+
+
+class TestConversionTable:
+    """測試換算係數表"""
+
+    def test_same_dimension(self):
+        """測試同量綱換算"""
+        assert get_conversion_factor('gram', 'kg') == 0.001
+        assert get_conversion_factor('MWh', '度') == 1000.0
+        assert get_conversion_factor('m³', 'L') == 1000.0
+
+    def test_incompatible_dimension(self):
+        """測試不同量綱無法換算"""
+        assert np.isnan(CONVERSION_TABLE[UNIT_INDEX['kg'], UNIT_INDEX['L']])
+        with pytest.raises(UnitConversionError):
+            get_conversion_factor('kg', 'L')
+
+    def test_unknown_unit(self):
+        """測試未知單位"""
+        with pytest.raises(UnitConversionError):
+            get_conversion_factor('支', 'kg')
+
+    def test_canonical_unit(self):
+        """測試標準單位為排放係數的單位（天然氣維持 m³、WD-40 維持 mL）"""
+        assert get_canonical_unit('公升', 'diesel') == 'L'
+        assert get_canonical_unit('g', 'sf6') == 'kg'
+        assert get_canonical_unit('m³', 'natural_gas') == 'm³'
+        assert get_canonical_unit('ML', 'wd40') == 'mL'
+        assert get_canonical_unit('ML', 'other_energy_sources') == 'L'
+        assert get_canonical_unit('次', 'generator_test') is None
+
+
+class TestConvertValues:
+    """測試批次換算"""
+
+    def test_single_unit(self):
+        """測試單一來源單位"""
+        assert convert_values([1000, 2500], 'g', 'kg').tolist() == [1.0, 2.5]
+
+    def test_mixed_units(self):
+        """測試逐筆來源單位"""
+        result = convert_values([1200, 0.8, 2], ['gram', 'kg', '公噸'], 'kg')
+        assert result.tolist() == pytest.approx([1.2, 0.8, 2000.0])
+
+    def test_mixed_incompatible(self):
+        """測試混有不同量綱的單位"""
+        with pytest.raises(UnitConversionError):
+            convert_values([1, 2], ['kg', 'L'], 'kg')
+
+    def test_length_mismatch(self):
+        """測試單位數量與數值不符"""
+        with pytest.raises(UnitConversionError):
+            convert_values([1, 2], ['kg'], 'kg')
+
+
+class TestNormalizeRecordQuantities:
+    """測試設備記錄換算"""
+
+    def test_refrigerant_records(self):
+        """測試冷媒記錄（gram / kg 混用）"""
+        payload = {'refrigerantData': [
+            {'fillAmount': 1200, 'unit': 'gram'},
+            {'fillAmount': 0.8, 'unit': 'kg'}
+        ]}
+
+        assert normalize_record_quantities(payload) == {
+            'refrigerantData': {'unit': 'kg', 'total': 2.0, 'count': 2}
+        }
+
+    def test_default_unit_for_records_without_unit(self):
+        """測試記錄沒有 unit 欄位時使用條目單位（SF6 以公克填寫）"""
+        payload = {'sf6Data': [{'sf6Weight': 5000}, {'sf6Weight': 3000}]}
+
+        result = normalize_record_quantities(payload, default_unit='g')
+        assert result['sf6Data'] == {'unit': 'kg', 'total': 8.0, 'count': 2}
+
+    def test_nested_records_and_unconvertible_units(self):
+        """測試 {records: [...]} 格式與無法換算的單位"""
+        payload = {
+            'data': {'records': [{'quantity': 3, 'unit': '瓶'}, {'quantity': 2, 'unit': 'L'}]},
+            'monthly': {'1': 5}
+        }
+
+        assert normalize_record_quantities(payload) == {
+            'data.records': {'unit': 'L', 'total': 2.0, 'count': 1}
+        }
+
+
+class TestNormalizeEntryQuantities:
+    """測試條目換算"""
+
+    def test_gram_to_kg(self):
+        """測試公克換算為公斤"""
+        result = normalize_entry_quantities('sf6', 'g', {'1': 8000.0})
+
+        assert result['unit'] == 'kg'
+        assert result['source_unit'] == 'g'
+        assert result['monthly'] == {'1': 8.0}
+        assert result['amount'] == 8.0
+
+    def test_same_unit(self):
+        """測試已是標準單位"""
+        result = normalize_entry_quantities('diesel', '公升', {'1': 100.0, '2': 200.0})
+
+        assert result['unit'] == 'L'
+        assert result['factor'] == 1.0
+        assert result['amount'] == 300.0
+
+    def test_wd40_stays_in_factor_unit(self):
+        """測試 WD-40 以排放係數單位 mL 保存（公升換算為 mL）"""
+        assert normalize_entry_quantities('wd40', 'ML', {'1': 500.0})['monthly'] == {'1': 500.0}
+
+        result = normalize_entry_quantities('wd40', 'L', {'1': 0.5})
+        assert result['unit'] == 'mL'
+        assert result['amount'] == 500.0
+
+    def test_unconvertible_unit_passes_through(self):
+        """測試無法換算的單位維持原值"""
+        result = normalize_entry_quantities('generator_test', '次', {'1': 3.0})
+
+        assert result['unit'] == '次'
+        assert result['monthly'] == {'1': 3.0}
+
+    def test_no_monthly(self):
+        """測試沒有月份數據（Type 5）"""
+        result = normalize_entry_quantities('employee_commute', 'km', None)
+        assert result['monthly'] == {}
+        assert result['amount'] == 0
@@ -0,0 +1,386 @@
+"""
+可續傳分塊上傳服務單元測試
+重點：offset 驗證、區塊重送、中斷後續傳與完成時的組合
+"""
+import io
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from unittest.mock import MagicMock
+from src.services.upload_session_service import (
+    create_upload_session,
+    get_upload_session,
+    upload_session_chunk,
+    complete_upload_session,
+    abort_upload_session,
+    sweep_expired_upload_sessions,
+    get_expected_chunk_size,
+    StoredChunkStream,
+    UploadSessionError,
+    UploadSessionStateError
+)
+
+
+class FakeQuery:
+    """簡化的 PostgREST query builder（只支援上傳服務使用的方法）"""
+
+    def __init__(self, db, table):
+        self.db, self.table, self.filters = db, table, []
+        self.action, self.values = 'select', None
+
+    def select(self, columns):
+        return self
+
+    def insert(self, values):
+        self.action, self.values = 'insert', values
+        return self
+
+    def update(self, values):
+        self.action, self.values = 'update', values
+        return self
+
+    def upsert(self, values, on_conflict=None, ignore_duplicates=False):
+        self.action, self.values, self.conflict = 'upsert', values, on_conflict.split(',')
+        self.ignore_duplicates = ignore_duplicates
+        return self
+
+    def delete(self):
+        self.action = 'delete'
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def neq(self, column, value):
+        self.filters.append(lambda row: row.get(column) != value)
+        return self
+
+    def lt(self, column, value):
+        self.filters.append(lambda row: row.get(column) < value)
+        return self
+
+    def order(self, column):
+        return self
+
+    def limit(self, count):
+        return self
+
+    def execute(self):
+        rows = self.db.tables.setdefault(self.table, [])
+        if self.action == 'insert':
+            row = {'id': f'session-{len(rows) + 1}', **self.values}
+            rows.append(row)
+            return MagicMock(data=[row])
+        if self.action == 'upsert':
+            upserted = []
+            for values in (self.values if isinstance(self.values, list) else [self.values]):
+                key = [values[column] for column in self.conflict]
+                existing = [row for row in rows if [row[column] for column in self.conflict] == key]
+                if existing and self.ignore_duplicates:
+                    continue
+                rows[:] = [row for row in rows if row not in existing]
+                rows.append(dict(values))
+                upserted.append(values)
+            return MagicMock(data=upserted)
+
+        matched = [row for row in rows if all(f(row) for f in self.filters)]
+        if self.action == 'update':
+            for row in matched:
+                row.update(self.values)
+        elif self.action == 'delete':
+            rows[:] = [row for row in rows if row not in matched]
+        return MagicMock(data=[dict(row) for row in sorted(matched, key=lambda r: r.get('chunk_index', 0))])
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.tables = {}
+        self.objects = {}
+        self.upload_count = 0
+
+        bucket = MagicMock()
+        bucket.upload.side_effect = self._upload
+        bucket.download.side_effect = lambda path: self.objects[path]
+        bucket.remove.side_effect = lambda paths: [self.objects.pop(path, None) for path in paths]
+        self.storage = MagicMock()
+        self.storage.from_.return_value = bucket
+
+    def _upload(self, path, file_data, file_options=None):
+        self.upload_count += 1
+        self.objects[path] = file_data if isinstance(file_data, bytes) else file_data.read()
+
+    def table(self, name):
+        if name == 'entry_files':
+            return self._entry_files()
+        return FakeQuery(self, name)
+
+    def _entry_files(self):
+        table = MagicMock()
+        table.insert.side_effect = lambda record: MagicMock(
+            execute=MagicMock(return_value=MagicMock(data=[{'id': 'file-1', **record}]))
+        )
+        return table
+
+
+def minutes_ago(minutes):
+    return (datetime.now(timezone.utc) - timedelta(minutes=minutes)).isoformat()
+
+
+def new_session(supabase, file_size=10, chunk_size=4):
+    return create_upload_session(
+        supabase,
+        user_id='user-1',
+        filename='bill.pdf',
+        file_size=file_size,
+        mime_type='application/pdf',
+        page_key='electricity',
+        period_year=2024,
+        file_type='usage_evidence',
+        month=1,
+        chunk_size=chunk_size
+    )
+
+
+class TestCreateUploadSession:
+    """測試建立工作階段"""
+
+    def test_chunk_layout(self):
+        """測試區塊數與缺少的 offset"""
+        session = new_session(FakeSupabase())
+
+        assert session['total_chunks'] == 3
+        assert session['missing_offsets'] == [0, 4, 8]
+        assert session['progress'] == 0.0
+
+    def test_file_too_large(self):
+        """測試宣告大小超過上限"""
+        with pytest.raises(ValueError):
+            new_session(FakeSupabase(), file_size=100 * 1024 * 1024)
+
+
+class TestExpectedChunkSize:
+    """測試 offset 驗證"""
+
+    def test_last_chunk_is_smaller(self):
+        """測試最後一塊大小"""
+        session = {'chunk_size': 4, 'file_size': 10}
+        assert get_expected_chunk_size(session, 0) == 4
+        assert get_expected_chunk_size(session, 8) == 2
+
+    def test_invalid_offsets(self):
+        """測試不在區塊邊界或超出檔案的 offset"""
+        session = {'chunk_size': 4, 'file_size': 10}
+        for offset in (-4, 3, 12):
+            with pytest.raises(UploadSessionError):
+                get_expected_chunk_size(session, offset)
+
+
+class TestUploadSessionChunk:
+    """測試上傳區塊"""
+
+    def test_resume_after_interruption(self):
+        """測試中斷後只需補傳缺少的區塊"""
+        supabase = FakeSupabase()
+        session = new_session(supabase)
+
+        upload_session_chunk(supabase, 'user-1', session['id'], 0, io.BytesIO(b'abcd'))
+        upload_session_chunk(supabase, 'user-1', session['id'], 8, io.BytesIO(b'ij'))
+
+        progress = get_upload_session(supabase, 'user-1', session['id'])
+        assert progress['missing_offsets'] == [4]
+        assert progress['received_bytes'] == 6
+
+    def test_resend_overwrites(self):
+        """測試重送同一區塊不會重複計算"""
+        supabase = FakeSupabase()
+        session = new_session(supabase)
+
+        upload_session_chunk(supabase, 'user-1', session['id'], 0, io.BytesIO(b'abcd'))
+        progress = upload_session_chunk(supabase, 'user-1', session['id'], 0, io.BytesIO(b'abcd'))
+
+        assert progress['received_chunks'] == [0]
+        assert progress['received_bytes'] == 4
+
+    def test_wrong_chunk_size(self):
+        """測試區塊大小不符"""
+        supabase = FakeSupabase()
+        session = new_session(supabase)
+
+        for data in (b'abc', b'abcde'):
+            with pytest.raises(UploadSessionError):
+                upload_session_chunk(supabase, 'user-1', session['id'], 0, io.BytesIO(data))
+
+        assert supabase.tables.get('upload_session_chunks', []) == []
+
+    def test_other_user(self):
+        """測試不能上傳到其他用戶的工作階段"""
+        supabase = FakeSupabase()
+        session = new_session(supabase)
+
+        with pytest.raises(PermissionError):
+            upload_session_chunk(supabase, 'user-2', session['id'], 0, io.BytesIO(b'abcd'))
+
+    def test_session_not_found(self):
+        """測試工作階段不存在"""
+        with pytest.raises(LookupError):
+            get_upload_session(FakeSupabase(), 'user-1', 'missing')
+
+    def test_expired_session(self):
+        """測試過期的工作階段"""
+        supabase = FakeSupabase()
+        session = new_session(supabase)
+        supabase.tables['upload_sessions'][0]['expires_at'] = (
+            datetime.now(timezone.utc) - timedelta(minutes=1)
+        ).isoformat()
+
+        with pytest.raises(UploadSessionStateError):
+            upload_session_chunk(supabase, 'user-1', session['id'], 0, io.BytesIO(b'abcd'))
+
+
+class TestCompleteUploadSession:
+    """測試完成上傳"""
+
+    def upload_all(self, supabase, session_id):
+        for offset, data in ((8, b'ij'), (0, b'abcd'), (4, b'efgh')):
+            upload_session_chunk(supabase, 'user-1', session_id, offset, io.BytesIO(data))
+
+    def test_assembles_in_order(self):
+        """測試依 offset 順序組合並建立檔案記錄，之後刪除暫存區塊"""
+        supabase = FakeSupabase()
+        session = new_session(supabase)
+        self.upload_all(supabase, session['id'])
+
+        result = complete_upload_session(supabase, 'user-1', session['id'])
+
+        assert result['file_id'] == 'file-1'
+        assert result['file_size'] == 10
+        assert supabase.objects == {result['file_path']: b'abcdefghij'}
+        assert supabase.tables['upload_session_chunks'] == []
+        assert supabase.tables['upload_sessions'][0]['status'] == 'completed'
+
+    def test_complete_is_idempotent(self):
+        """測試重複完成回傳相同結果且不重新上傳"""
+        supabase = FakeSupabase()
+        session = new_session(supabase)
+        self.upload_all(supabase, session['id'])
+
+        first = complete_upload_session(supabase, 'user-1', session['id'])
+        uploads = supabase.upload_count
+        second = complete_upload_session(supabase, 'user-1', session['id'])
+
+        assert second['file_id'] == first['file_id']
+        assert supabase.upload_count == uploads
+
+    def test_missing_chunks(self):
+        """測試區塊未到齊"""
+        supabase = FakeSupabase()
+        session = new_session(supabase)
+        upload_session_chunk(supabase, 'user-1', session['id'], 0, io.BytesIO(b'abcd'))
+
+        with pytest.raises(UploadSessionStateError) as exc_info:
+            complete_upload_session(supabase, 'user-1', session['id'])
+
+        assert '[4, 8]' in str(exc_info.value)
+
+    def test_failure_returns_to_uploading(self):
+        """測試建立記錄失敗時工作階段可再次完成，組合後的檔案交給歸零清理"""
+        supabase = FakeSupabase()
+        session = new_session(supabase)
+        self.upload_all(supabase, session['id'])
+
+        failing = MagicMock()
+        failing.insert.return_value.execute.return_value.data = []
+        supabase._entry_files = lambda: failing
+
+        with pytest.raises(Exception):
+            complete_upload_session(supabase, 'user-1', session['id'])
+
+        assert supabase.tables['upload_sessions'][0]['status'] == 'uploading'
+        blob = supabase.tables['evidence_blobs'][0]
+        assert blob['ref_count'] == 0 and blob['storage_path'] in supabase.objects
+
+    def test_stale_assembling_reclaimed(self):
+        """測試組合中途中斷逾時後可再次完成"""
+        supabase = FakeSupabase()
+        session = new_session(supabase)
+        self.upload_all(supabase, session['id'])
+        supabase.tables['upload_sessions'][0].update({'status': 'assembling', 'updated_at': minutes_ago(60)})
+
+        result = complete_upload_session(supabase, 'user-1', session['id'])
+
+        assert result['file_id'] == 'file-1'
+        assert supabase.tables['upload_sessions'][0]['status'] == 'completed'
+
+    def test_assembling_in_progress(self):
+        """測試組合中且未逾時不能重複完成"""
+        supabase = FakeSupabase()
+        session = new_session(supabase)
+        self.upload_all(supabase, session['id'])
+        supabase.tables['upload_sessions'][0].update({'status': 'assembling', 'updated_at': minutes_ago(1)})
+
+        with pytest.raises(UploadSessionStateError):
+            complete_upload_session(supabase, 'user-1', session['id'])
+
+
+class TestAbortUploadSession:
+    """測試取消上傳"""
+
+    def test_removes_chunks(self):
+        """測試刪除已上傳區塊與工作階段"""
+        supabase = FakeSupabase()
+        session = new_session(supabase)
+        upload_session_chunk(supabase, 'user-1', session['id'], 0, io.BytesIO(b'abcd'))
+
+        abort_upload_session(supabase, 'user-1', session['id'])
+
+        assert supabase.objects == {}
+        assert supabase.tables['upload_sessions'] == []
+
+
+class TestSweepExpiredUploadSessions:
+    """測試清除過期工作階段"""
+
+    def test_removes_expired_sessions_and_chunks(self):
+        """測試只清除過期未完成的工作階段與其暫存區塊"""
+        supabase = FakeSupabase()
+        sessions = [new_session(supabase) for _ in range(4)]
+        for session in sessions:
+            upload_session_chunk(supabase, 'user-1', session['id'], 0, io.BytesIO(b'abcd'))
+
+        rows = supabase.tables['upload_sessions']
+        rows[0].update({'expires_at': minutes_ago(1)})
+        rows[1].update({'expires_at': minutes_ago(1), 'status': 'completed'})
+        rows[2].update({'expires_at': minutes_ago(1), 'status': 'assembling', 'updated_at': minutes_ago(1)})
+
+        assert sweep_expired_upload_sessions(supabase) == 1
+
+        assert [row['id'] for row in rows] == [session['id'] for session in sessions[1:]]
+        assert {chunk['session_id'] for chunk in supabase.tables['upload_session_chunks']} == {
+            session['id'] for session in sessions[1:]
+        }
+        assert len(supabase.objects) == 3
+
+    def test_stale_assembling_removed(self):
+        """測試過期且組合逾時的工作階段一併清除"""
+        supabase = FakeSupabase()
+        new_session(supabase)
+        supabase.tables['upload_sessions'][0].update({
+            'expires_at': minutes_ago(1), 'status': 'assembling', 'updated_at': minutes_ago(60)
+        })
+
+        assert sweep_expired_upload_sessions(supabase) == 1
+        assert supabase.tables['upload_sessions'] == []
+
+
+class TestStoredChunkStream:
+    """測試區塊串流"""
+
+    def test_reads_across_chunks(self):
+        """測試讀取大小跨越區塊邊界"""
+        supabase = FakeSupabase()
+        supabase.objects = {'a': b'abcd', 'b': b'efgh', 'c': b'ij'}
+        stream = StoredChunkStream(supabase, ['a', 'b', 'c'])
+
+        parts = iter(lambda: stream.read(3), b'')
+        assert b''.join(parts) == b'abcdefghij'
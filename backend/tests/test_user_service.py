@@ -0,0 +1,121 @@
+"""
+用戶管理服務單元測試
+重點：批次查詢（無 N+1）
+"""
+import pytest
+from unittest.mock import Mock
+from src.services.user_service import (
+    get_entry_counts_by_owner,
+    get_auth_emails,
+    list_users_with_entry_counts,
+    AUTH_USERS_PAGE_SIZE
+)
+
+
+def make_auth_user(user_id, email):
+    user = Mock()
+    user.id = user_id
+    user.email = email
+    return user
+
+
+def make_supabase(profiles, counts, auth_pages):
+    """建立 mock Supabase client"""
+    mock_supabase = Mock()
+    mock_supabase.table.return_value.select.return_value.execute.return_value = Mock(data=profiles)
+    mock_supabase.rpc.return_value.execute.return_value = Mock(data=counts)
+    mock_supabase.auth.admin.list_users.side_effect = auth_pages
+    return mock_supabase
+
+
+class TestGetEntryCountsByOwner:
+    """測試填報數量聚合"""
+
+    def test_counts_mapped_by_owner(self):
+        """測試聚合結果轉為 dict"""
+        mock_supabase = make_supabase([], [
+            {'owner_id': 'u1', 'entries_count': 3},
+            {'owner_id': 'u2', 'entries_count': '5'}
+        ], [])
+
+        assert get_entry_counts_by_owner(mock_supabase) == {'u1': 3, 'u2': 5}
+        mock_supabase.rpc.assert_called_once_with('get_entry_counts_by_owner', {})
+
+    def test_empty_result(self):
+        """測試無資料"""
+        mock_supabase = make_supabase([], None, [])
+        assert get_entry_counts_by_owner(mock_supabase) == {}
+
+
+class TestGetAuthEmails:
+    """測試 auth.users 分頁取得"""
+
+    def test_single_page(self):
+        """測試單頁"""
+        mock_supabase = make_supabase([], [], [[make_auth_user('u1', 'a@example.com')]])
+
+        assert get_auth_emails(mock_supabase) == {'u1': 'a@example.com'}
+        mock_supabase.auth.admin.list_users.assert_called_once_with(page=1, per_page=AUTH_USERS_PAGE_SIZE)
+
+    def test_multiple_pages(self):
+        """測試滿頁時繼續取下一頁"""
+        full_page = [make_auth_user(f'u{i}', f'u{i}@example.com') for i in range(AUTH_USERS_PAGE_SIZE)]
+        last_page = [make_auth_user('last', 'last@example.com')]
+        mock_supabase = make_supabase([], [], [full_page, last_page])
+
+        emails = get_auth_emails(mock_supabase)
+
+        assert len(emails) == AUTH_USERS_PAGE_SIZE + 1
+        assert mock_supabase.auth.admin.list_users.call_count == 2
+
+
+class TestListUsersWithEntryCounts:
+    """測試用戶列表"""
+
+    def test_merges_counts_and_emails(self):
+        """測試合併填報數量與 email"""
+        profiles = [
+            {'id': 'u1', 'display_name': 'A', 'role': 'admin', 'is_active': True, 'company': 'X'},
+            {'id': 'u2', 'display_name': 'B', 'email': 'b-profile@example.com'}
+        ]
+        mock_supabase = make_supabase(
+            profiles,
+            [{'owner_id': 'u1', 'entries_count': 4}],
+            [[make_auth_user('u1', 'a@example.com')]]
+        )
+
+        users = list_users_with_entry_counts(mock_supabase)
+
+        assert users[0]['email'] == 'a@example.com'
+        assert users[0]['entries_count'] == 4
+        assert users[0]['role'] == 'admin'
+        assert users[1]['email'] == 'b-profile@example.com'
+        assert users[1]['entries_count'] == 0
+        assert users[1]['role'] == 'user'
+
+    def test_query_count_independent_of_user_count(self):
+        """測試查詢次數不隨用戶數增加"""
+        profiles = [{'id': f'u{i}'} for i in range(500)]
+        mock_supabase = make_supabase(profiles, [], [[]])
+
+        users = list_users_with_entry_counts(mock_supabase)
+
+        assert len(users) == 500
+        assert mock_supabase.table.call_count == 1
+        assert mock_supabase.rpc.call_count == 1
+        assert mock_supabase.auth.admin.list_users.call_count == 1
+        mock_supabase.auth.admin.get_user_by_id.assert_not_called()
+
+    def test_auth_failure_falls_back(self):
+        """測試 auth 查詢失敗時仍回傳列表"""
+        mock_supabase = make_supabase([{'id': 'u1'}], [], Exception('auth down'))
+
+        users = list_users_with_entry_counts(mock_supabase)
+
+        assert users[0]['email'] == 'N/A'
+
+    def test_no_profiles(self):
+        """測試無用戶"""
+        mock_supabase = make_supabase([], [], [])
+        assert list_users_with_entry_counts(mock_supabase) == []
+        mock_supabase.rpc.assert_not_called()
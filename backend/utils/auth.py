@@ -1,58 +1,353 @@
 import os
+import time
+import hashlib
+import threading
 import requests
-from typing import Optional, Dict
+import jwt
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any
 from .supabase_admin import get_supabase_admin
+from src.infrastructure.cache.ttl_cache import TTLCache
 
-def get_user_from_token(auth_header: str) -> Optional[Dict]:
+# Token 驗證模式：local（本地驗證簽章，未知金鑰時才回退遠端）或 remote（每次呼叫 /auth/v1/user）
+AUTH_VERIFY_MODE = os.getenv('AUTH_VERIFY_MODE', 'local')
+
+# JWKS 重新整理間隔（秒）
+JWKS_REFRESH_INTERVAL = int(os.getenv('AUTH_JWKS_REFRESH_SECONDS', '600'))
+
+# 遇到未知 kid 時，兩次強制重新整理之間的最短間隔（秒），避免偽造 kid 打爆 JWKS 端點
+JWKS_MIN_REFETCH_INTERVAL = 30
+
+# Supabase access token 的 audience
+JWT_AUDIENCE = os.getenv('SUPABASE_JWT_AUDIENCE', 'authenticated')
+
+# 已解析用戶快取設定
+AUTH_CACHE_TTL = float(os.getenv('AUTH_CACHE_TTL_SECONDS', '60'))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv('AUTH_CACHE_MAX_ENTRIES', '1024'))
+
+# 簽章演算法
+HMAC_ALGORITHMS = ['HS256']
+ASYMMETRIC_ALGORITHMS = ['RS256', 'ES256']
+
+
+class UnknownSigningKeyError(Exception):
+    """本地無法取得對應的簽章金鑰（需回退遠端驗證）"""
+    pass
+
+
+class JWKSCache:
     """
-    從 Authorization header 中解析 token 並取得用戶資料（包含角色）
+    Supabase JWKS 金鑰快取
+
+    依 kid 快取公鑰，超過 refresh_interval 或遇到未知 kid 時重新下載
     """
-    if not auth_header or not auth_header.startswith('Bearer '):
+
+    def __init__(self, jwks_url: str, refresh_interval: int = JWKS_REFRESH_INTERVAL):
+        self.jwks_url = jwks_url
+        self.refresh_interval = refresh_interval
+        self._keys: Dict[str, jwt.PyJWK] = {}
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+
+    def _is_stale(self) -> bool:
+        return time.monotonic() - self._fetched_at > self.refresh_interval
+
+    def _refresh(self) -> None:
+        """下載 JWKS 並重建金鑰表（呼叫端需持有鎖）"""
+        self._fetched_at = time.monotonic()
+        response = requests.get(self.jwks_url, timeout=5)
+        response.raise_for_status()
+
+        keys = {}
+        for jwk_data in response.json().get('keys', []):
+            kid = jwk_data.get('kid')
+            if not kid:
+                continue
+            try:
+                keys[kid] = jwt.PyJWK(jwk_data)
+            except jwt.exceptions.PyJWKError as e:
+                print(f"Skipping unsupported JWK {kid}: {e}")
+
+        self._keys = keys
+
+    def get_key(self, kid: str) -> jwt.PyJWK:
+        """
+        依 kid 取得公鑰
+
+        Raises:
+            UnknownSigningKeyError: 重新整理後仍找不到 kid，或 JWKS 無法下載
+        """
+        with self._lock:
+            try:
+                if self._is_stale():
+                    self._refresh()
+                elif kid not in self._keys and time.monotonic() - self._fetched_at > JWKS_MIN_REFETCH_INTERVAL:
+                    self._refresh()
+            except Exception as e:
+                print(f"Error refreshing JWKS: {e}")
+
+            key = self._keys.get(kid)
+
+        if key is None:
+            raise UnknownSigningKeyError(f"Unknown signing key: {kid}")
+        return key
+
+
+_jwks_cache: Optional[JWKSCache] = None
+_jwks_cache_lock = threading.Lock()
+
+
+def get_jwks_cache() -> Optional[JWKSCache]:
+    """取得全域 JWKS 快取（依 SUPABASE_URL 延遲建立）"""
+    global _jwks_cache
+
+    if _jwks_cache is None:
+        supabase_url = os.getenv('SUPABASE_URL')
+        if not supabase_url:
+            return None
+        with _jwks_cache_lock:
+            if _jwks_cache is None:
+                _jwks_cache = JWKSCache(f'{supabase_url}/auth/v1/.well-known/jwks.json')
+
+    return _jwks_cache
+
+
+def verify_token_locally(access_token: str) -> Optional[Dict]:
+    """
+    在本地驗證 access token 的簽章與有效期限
+
+    HS256 token 使用 SUPABASE_JWT_SECRET 驗證；RS256/ES256 token 依 kid 從 JWKS 快取取得公鑰
+
+    Returns:
+        驗證通過的 claims；簽章錯誤、過期或格式錯誤時回傳 None
+
+    Raises:
+        UnknownSigningKeyError: 本地沒有可用的金鑰（呼叫端應回退遠端驗證）
+    """
+    try:
+        header = jwt.get_unverified_header(access_token)
+    except jwt.InvalidTokenError:
         return None
-    
-    access_token = auth_header.replace('Bearer ', '')
-    
+
+    algorithm = header.get('alg')
+
+    if algorithm in HMAC_ALGORITHMS:
+        jwt_secret = os.getenv('SUPABASE_JWT_SECRET')
+        if not jwt_secret:
+            raise UnknownSigningKeyError("SUPABASE_JWT_SECRET is not configured")
+        key = jwt_secret
+    elif algorithm in ASYMMETRIC_ALGORITHMS:
+        jwks_cache = get_jwks_cache()
+        if jwks_cache is None or not header.get('kid'):
+            raise UnknownSigningKeyError("No JWKS available for token")
+        key = jwks_cache.get_key(header['kid']).key
+    else:
+        return None
+
+    try:
+        claims = jwt.decode(
+            access_token,
+            key,
+            algorithms=[algorithm],
+            audience=JWT_AUDIENCE,
+            options={'require': ['exp', 'sub']}
+        )
+    except jwt.InvalidTokenError as e:
+        print(f"Local token verification failed: {e}")
+        return None
+
+    return claims
+
+
+def fetch_remote_user(access_token: str) -> Optional[Dict]:
+    """
+    呼叫 Supabase Auth API (/auth/v1/user) 驗證 token
+
+    Returns:
+        {'id': str, 'email': str}；驗證失敗時回傳 None
+    """
     supabase_url = os.getenv('SUPABASE_URL')
     supabase_anon_key = os.getenv('SUPABASE_ANON_KEY')
-    
+
     if not supabase_url or not supabase_anon_key:
         return None
-    
+
+    headers = {
+        'Authorization': f'Bearer {access_token}',
+        'apikey': supabase_anon_key,
+        'Content-Type': 'application/json'
+    }
+
+    response = requests.get(
+        f'{supabase_url}/auth/v1/user',
+        headers=headers,
+        timeout=10
+    )
+
+    if response.status_code != 200:
+        return None
+
+    user_data = response.json()
+    if not user_data.get('id'):
+        return None
+
+    return {'id': user_data['id'], 'email': user_data.get('email')}
+
+
+def resolve_token_identity(access_token: str) -> Optional[Dict]:
+    """
+    解析 token 對應的用戶身分
+
+    local 模式下先在本地驗證，只有在找不到簽章金鑰時才回退遠端驗證
+
+    Returns:
+        {'id': str, 'email': str, 'iat': int}（本地驗證時另含 'exp'）；驗證失敗時回傳 None
+    """
+    if AUTH_VERIFY_MODE == 'local':
+        try:
+            claims = verify_token_locally(access_token)
+            if claims is None:
+                return None
+            return {
+                'id': claims['sub'],
+                'email': claims.get('email'),
+                'iat': claims.get('iat'),
+                'exp': claims['exp']
+            }
+        except UnknownSigningKeyError as e:
+            print(f"Falling back to remote token verification: {e}")
+
+    identity = fetch_remote_user(access_token)
+    if identity:
+        # token 已由遠端驗證，iat 只用於比對強制登出時間
+        try:
+            identity['iat'] = jwt.decode(access_token, options={'verify_signature': False}).get('iat')
+        except jwt.InvalidTokenError:
+            identity['iat'] = None
+    return identity
+
+
+# token hash -> identity
+_identity_cache = TTLCache(maxsize=AUTH_CACHE_MAX_ENTRIES, ttl=AUTH_CACHE_TTL)
+# user id -> profile（含強制登出時間 tokens_revoked_at，各 worker 最多延遲 AUTH_CACHE_TTL 生效）
+_profile_cache = TTLCache(maxsize=AUTH_CACHE_MAX_ENTRIES, ttl=AUTH_CACHE_TTL)
+
+
+def _hash_token(access_token: str) -> str:
+    return hashlib.sha256(access_token.encode('utf-8')).hexdigest()
+
+
+def _is_revoked(identity: Dict, profile: Dict) -> bool:
+    """
+    檢查 token 是否在該用戶被強制登出時已簽發
+
+    強制登出時間記錄在 profiles.tokens_revoked_at，所有 worker 共用。
+    iat 只精確到秒，與強制登出同一秒簽發的 token 也一併拒絕；沒有 iat 的 token 視為已撤銷
+    """
+    revoked_at = profile.get('tokens_revoked_at')
+    if not revoked_at:
+        return False
+
+    revoked_epoch = datetime.fromisoformat(revoked_at.replace('Z', '+00:00')).timestamp()
+    return (identity.get('iat') or 0) <= revoked_epoch
+
+
+def get_cached_identity(access_token: str) -> Optional[Dict]:
+    """
+    取得 token 對應的身分（依 token hash 快取）
+
+    快取時間不超過 token 本身的剩餘有效期限
+    """
+    token_key = _hash_token(access_token)
+    identity = _identity_cache.get(token_key)
+
+    if identity is None:
+        identity = resolve_token_identity(access_token)
+        if not identity:
+            return None
+
+        ttl = AUTH_CACHE_TTL
+        if identity.get('exp'):
+            ttl = min(ttl, identity['exp'] - time.time())
+        _identity_cache.set(token_key, identity, ttl=ttl)
+
+    return identity
+
+
+def get_cached_profile(user_id: str) -> Optional[Dict]:
+    """取得用戶 profile（依 user id 快取）"""
+    profile = _profile_cache.get(user_id)
+
+    if profile is None:
+        supabase = get_supabase_admin()
+        profile_result = supabase.table('profiles').select('*').eq('id', user_id).single().execute()
+        profile = profile_result.data
+        if not profile:
+            return None
+        _profile_cache.set(user_id, profile)
+
+    return profile
+
+
+def invalidate_user_cache(user_id: str, revoke_tokens: bool = False) -> None:
+    """
+    清除指定用戶的快取（角色、啟用狀態變更後呼叫）
+
+    Args:
+        user_id: 用戶 ID
+        revoke_tokens: 是否同時拒絕該用戶目前已簽發的 token（強制登出，
+            寫入 profiles.tokens_revoked_at，其他 worker 在 profile 快取過期後生效）
+    """
+    if revoke_tokens:
+        supabase = get_supabase_admin()
+        supabase.table('profiles')\
+            .update({'tokens_revoked_at': datetime.now(timezone.utc).isoformat()})\
+            .eq('id', user_id)\
+            .execute()
+
+    _profile_cache.delete(user_id)
+    _identity_cache.delete_where(lambda _, identity: identity['id'] == user_id)
+
+
+def get_auth_cache_stats() -> Dict[str, Any]:
+    """取得認證快取統計"""
+    return {
+        'identity': _identity_cache.stats(),
+        'profile': _profile_cache.stats()
+    }
+
+
+def get_user_from_token(auth_header: str) -> Optional[Dict]:
+    """
+    從 Authorization header 中解析 token 並取得用戶資料（包含角色）
+    """
+    if not auth_header or not auth_header.startswith('Bearer '):
+        return None
+
+    access_token = auth_header.replace('Bearer ', '')
+
     try:
-        # 先從 Supabase Auth API 取得基本用戶資訊
-        headers = {
-            'Authorization': f'Bearer {access_token}',
-            'apikey': supabase_anon_key,
-            'Content-Type': 'application/json'
-        }
-        
-        response = requests.get(
-            f'{supabase_url}/auth/v1/user',
-            headers=headers,
-            timeout=10
-        )
-        
-        if response.status_code == 200:
-            user_data = response.json()
-            user_id = user_data.get('id')
-            
-            if user_id:
-                # 使用 admin client 取得 profile 資料（包含角色）
-                supabase = get_supabase_admin()
-                profile_result = supabase.table('profiles').select('*').eq('id', user_id).single().execute()
-                
-                if profile_result.data:
-                    return {
-                        'id': user_id,
-                        'email': user_data.get('email'),
-                        'role': profile_result.data.get('role', 'user'),
-                        'display_name': profile_result.data.get('display_name'),
-                        'is_active': profile_result.data.get('is_active', True),
-                        'company': profile_result.data.get('company')
-                    }
-        
-        return None
-            
+        # 先驗證 token 取得基本用戶資訊
+        identity = get_cached_identity(access_token)
+
+        if identity:
+            user_id = identity['id']
+
+            # 使用 admin client 取得 profile 資料（包含角色）
+            profile = get_cached_profile(user_id)
+
+            if profile and not _is_revoked(identity, profile):
+                return {
+                    'id': user_id,
+                    'email': identity.get('email'),
+                    'role': profile.get('role', 'user'),
+                    'display_name': profile.get('display_name'),
+                    'is_active': profile.get('is_active', True),
+                    'company': profile.get('company')
+                }
+
+        return None
+
     except Exception as e:
         print(f"Error getting user from token: {e}")
-        return None
\ No newline at end of file
+        return None
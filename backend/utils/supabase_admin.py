@@ -1,16 +1,87 @@
 import os
-from supabase import create_client, Client
+import threading
+from typing import Optional
+from supabase import create_client, Client, ClientOptions
+
+# 逾時設定（秒）
+SUPABASE_READ_TIMEOUT = float(os.getenv('SUPABASE_READ_TIMEOUT_SECONDS', '30'))
+
+_client: Optional[Client] = None
+_client_pid: Optional[int] = None
+_client_lock = threading.Lock()
+
 
 def get_supabase_admin() -> Client:
     """
-    建立 Supabase admin client
+    取得 Supabase admin client（程序內共用單例）
     使用 service role key，僅限後端使用
+
+    第一次呼叫時建立，之後重複使用同一個 client（postgrest、storage 各自保有
+    keep-alive 連線）；fork 之後的子程序會自動重建
+
+    注意：不可透過 ClientOptions(httpx_client=...) 讓子 client 共用同一個
+    httpx.Client，postgrest 與 storage3 建立時都會覆寫其 base_url
     """
-    url = os.getenv('SUPABASE_URL')
-    service_role_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
-    
-    if not url or not service_role_key:
-        raise ValueError('Missing SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY environment variables')
-    
-    supabase: Client = create_client(url, service_role_key)
-    return supabase
\ No newline at end of file
+    global _client, _client_pid
+
+    if _client is not None and _client_pid == os.getpid():
+        return _client
+
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            return _client
+
+        url = os.getenv('SUPABASE_URL')
+        service_role_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
+
+        if not url or not service_role_key:
+            raise ValueError('Missing SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY environment variables')
+
+        options = ClientOptions(
+            auto_refresh_token=False,
+            persist_session=False,
+            postgrest_client_timeout=SUPABASE_READ_TIMEOUT,
+            storage_client_timeout=SUPABASE_READ_TIMEOUT
+        )
+
+        _client = create_client(url, service_role_key, options=options)
+        _client_pid = os.getpid()
+
+    return _client
+
+
+def reset_supabase_admin(close: bool = True) -> None:
+    """
+    丟棄目前的 client，下次呼叫 get_supabase_admin 時重建
+
+    Args:
+        close: 是否關閉子 client 的連線。fork 後的子程序應傳入 False，
+               避免關閉與父程序共用的 socket
+    """
+    global _client, _client_pid
+
+    with _client_lock:
+        if close and _client is not None and _client_pid == os.getpid():
+            # 只關閉已建立的子 client（postgrest / storage 為延遲建立）
+            for name in ('_postgrest', '_storage'):
+                sub_client = getattr(_client, name, None)
+                session = getattr(sub_client, 'session', None)
+                try:
+                    if session is not None:
+                        session.close()
+                except Exception as e:
+                    print(f"Error closing Supabase HTTP client: {e}")
+
+        _client = None
+        _client_pid = None
+
+
+def _reset_after_fork() -> None:
+    global _client_lock
+    # 父程序可能在 fork 當下持有鎖，子程序需換一把新的
+    _client_lock = threading.Lock()
+    reset_supabase_admin(close=False)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
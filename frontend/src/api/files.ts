@@ -34,6 +34,7 @@ export interface EvidenceFile {
   record_index?: number | null  // 記錄索引（用於多筆記錄頁面）- 舊做法
   record_id?: string | null  // 記錄 ID（穩定 ID）- 舊做法
   record_ids?: string[] | null  // 記錄 IDs（多對一關係）- 新做法
+  content_sha256?: string | null  // 內容定址的共用檔案（後端上傳），Storage 物件依參考計數刪除
   file_type: 'msds' | 'usage_evidence' | 'other' | 'heat_value_evidence' | 'annual_evidence' | 'nameplate_evidence' | 'sf6_nameplate' | 'sf6_certificate'  // 檔案類型欄位 (必填)
   // Join fields from energy_entries
   status?: 'saved' | 'submitted' | 'approved' | 'rejected'  // From energy_entries
@@ -196,13 +197,15 @@ async function uploadEvidenceWithValidation(file: File, meta: FileMetadata & { e
       // 如果有現有檔案且允許覆蓋，先刪除舊檔案
       if (existingFiles && existingFiles.length > 0) {
         for (const existingFile of existingFiles) {
-          // 從 Storage 刪除舊檔案
-          const { error: storageDeleteError } = await supabase.storage
-            .from('evidence')
-            .remove([existingFile.file_path])
-
-          if (storageDeleteError) {
-            console.warn('Warning: Failed to delete old file from storage:', storageDeleteError)
+          // 從 Storage 刪除舊檔案（共用檔案可能被其他記錄參考，由後端依參考計數移除）
+          if (!existingFile.content_sha256) {
+            const { error: storageDeleteError } = await supabase.storage
+              .from('evidence')
+              .remove([existingFile.file_path])
+
+            if (storageDeleteError) {
+              console.warn('Warning: Failed to delete old file from storage:', storageDeleteError)
+            }
           }
 
           // 從資料庫刪除舊記錄
@@ -1117,7 +1120,7 @@ export async function deleteEvidence(fileId: string): Promise<void> {
     // 1. 先取得檔案資訊
     const { data: fileData, error: fetchError } = await supabase
       .from('entry_files')
-      .select('file_path, owner_id')
+      .select('file_path, owner_id, content_sha256')
       .eq('id', fileId)
       // ✅ 移除 owner_id 檢查，改由 RLS Policy 控制權限
       // RLS Policy 允許刪除：(1) 管理員的任何檔案 (2) 自己 entry 下的任何檔案
@@ -1139,25 +1142,30 @@ export async function deleteEvidence(fileId: string): Promise<void> {
     })
 
     // 2. ✅ 先從 Storage 刪除實體檔案（Linus 修正：先刪實體資源，再刪索引）
-    try {
-      console.log('🗑️ [deleteEvidence] Deleting from Storage...')
-      const { error: storageError } = await supabase.storage
-        .from('evidence')
-        .remove([fileData.file_path])
-
-      if (storageError) {
-        console.warn('⚠️ [deleteEvidence] Storage deletion failed (will continue):', {
-          error: storageError,
-          message: storageError.message,
-          filePath: fileData.file_path
-        })
-        // ✅ Storage 錯誤不拋出異常 - 檔案可能已不存在，繼續清理資料庫
-      } else {
-        console.log('✅ [deleteEvidence] Storage file deleted successfully')
+    if (fileData.content_sha256) {
+      // 共用檔案可能被其他記錄參考，由後端在最後一筆參考刪除後移除
+      console.log('ℹ️ [deleteEvidence] Shared blob kept in Storage:', fileData.file_path)
+    } else {
+      try {
+        console.log('🗑️ [deleteEvidence] Deleting from Storage...')
+        const { error: storageError } = await supabase.storage
+          .from('evidence')
+          .remove([fileData.file_path])
+
+        if (storageError) {
+          console.warn('⚠️ [deleteEvidence] Storage deletion failed (will continue):', {
+            error: storageError,
+            message: storageError.message,
+            filePath: fileData.file_path
+          })
+          // ✅ Storage 錯誤不拋出異常 - 檔案可能已不存在，繼續清理資料庫
+        } else {
+          console.log('✅ [deleteEvidence] Storage file deleted successfully')
+        }
+      } catch (storageError) {
+        console.warn('⚠️ [deleteEvidence] Storage deletion exception (will continue):', storageError)
+        // ✅ Storage 異常不應阻止資料庫清理
       }
-    } catch (storageError) {
-      console.warn('⚠️ [deleteEvidence] Storage deletion exception (will continue):', storageError)
-      // ✅ Storage 異常不應阻止資料庫清理
     }
 
     // 3. ✅ 再從資料庫刪除記錄（無論 Storage 是否成功）
@@ -1218,7 +1226,7 @@ export async function adminDeleteEvidence(fileId: string): Promise<void> {
     // 2. 查詢檔案資訊（不過濾 owner_id）
     const { data: fileData, error: fetchError } = await supabase
       .from('entry_files')
-      .select('file_path, owner_id')
+      .select('file_path, owner_id, content_sha256')
       .eq('id', fileId)
       .maybeSingle()
 
@@ -1238,20 +1246,25 @@ export async function adminDeleteEvidence(fileId: string): Promise<void> {
     })
 
     // 3. 從 Storage 刪除實體檔案
-    try {
-      console.log('🗑️ [adminDeleteEvidence] Deleting from Storage...')
-      const { error: storageError } = await supabase.storage
-        .from('evidence')
-        .remove([fileData.file_path])
-
-      if (storageError) {
-        console.warn('⚠️ [adminDeleteEvidence] Storage deletion failed (will continue):', storageError)
-        // Storage 錯誤不拋出 - 檔案可能已不存在，繼續清理資料庫
-      } else {
-        console.log('✅ [adminDeleteEvidence] Storage file deleted')
+    if (fileData.content_sha256) {
+      // 共用檔案可能被其他記錄參考，由後端在最後一筆參考刪除後移除
+      console.log('ℹ️ [adminDeleteEvidence] Shared blob kept in Storage:', fileData.file_path)
+    } else {
+      try {
+        console.log('🗑️ [adminDeleteEvidence] Deleting from Storage...')
+        const { error: storageError } = await supabase.storage
+          .from('evidence')
+          .remove([fileData.file_path])
+
+        if (storageError) {
+          console.warn('⚠️ [adminDeleteEvidence] Storage deletion failed (will continue):', storageError)
+          // Storage 錯誤不拋出 - 檔案可能已不存在，繼續清理資料庫
+        } else {
+          console.log('✅ [adminDeleteEvidence] Storage file deleted')
+        }
+      } catch (storageError) {
+        console.warn('⚠️ [adminDeleteEvidence] Storage exception (will continue):', storageError)
       }
-    } catch (storageError) {
-      console.warn('⚠️ [adminDeleteEvidence] Storage exception (will continue):', storageError)
     }
 
     // 4. 從資料庫刪除記錄（不過濾 owner_id）
@@ -1525,7 +1538,7 @@ export async function cleanOrphanFiles(): Promise<{ deletedCount: number, errors
     // 1. 查詢所有當前用戶的檔案記錄
     const { data: allFiles, error: queryError } = await supabase
       .from('entry_files')
-      .select('id, file_path, entry_id, created_at')
+      .select('id, file_path, entry_id, created_at, content_sha256')
       .eq('owner_id', authResult.user.id)
 
     if (queryError) {
@@ -1574,14 +1587,18 @@ export async function cleanOrphanFiles(): Promise<{ deletedCount: number, errors
 
     for (const orphan of orphanFiles) {
       try {
-        // 先刪 Storage
-        try {
-          await supabase.storage
-            .from('evidence')
-            .remove([orphan.file_path])
-          console.log(`✅ [cleanOrphanFiles] Deleted storage file: ${orphan.file_path}`)
-        } catch (storageError) {
-          console.warn(`⚠️ [cleanOrphanFiles] Storage deletion failed (continuing):`, storageError)
+        // 先刪 Storage（共用檔案可能被其他記錄參考，由後端在最後一筆參考刪除後移除）
+        if (orphan.content_sha256) {
+          console.log(`ℹ️ [cleanOrphanFiles] Shared blob kept in Storage: ${orphan.file_path}`)
+        } else {
+          try {
+            await supabase.storage
+              .from('evidence')
+              .remove([orphan.file_path])
+            console.log(`✅ [cleanOrphanFiles] Deleted storage file: ${orphan.file_path}`)
+          } catch (storageError) {
+            console.warn(`⚠️ [cleanOrphanFiles] Storage deletion failed (continuing):`, storageError)
+          }
         }
 
         // 再刪資料庫
@@ -190,6 +190,60 @@ export async function deleteEvidenceFile(
   }
 }
 
+/** 縮圖產生中（202）時最多重試的次數 */
+const THUMBNAIL_MAX_ATTEMPTS = 5
+
+/**
+ * 取得證據檔案的預覽縮圖（WebP）
+ *
+ * 後端產生中回傳 202 時依 Retry-After 等待後重試；
+ * 類型不支援（404）或內容無法算繪（415）時回傳 null，不再重試
+ *
+ * @param fileId - 檔案 ID
+ * @returns 縮圖 Blob，無預覽時為 null
+ * @throws Error - 當請求失敗時拋出錯誤
+ *
+ * @example
+ * ```typescript
+ * const blob = await getFileThumbnail('file-uuid-456')
+ * const url = blob ? URL.createObjectURL(blob) : null
+ * ```
+ */
+export async function getFileThumbnail(fileId: string): Promise<Blob | null> {
+  const { data: { session }, error: authError } = await supabase.auth.getSession()
+
+  if (authError || !session) {
+    throw new Error('使用者未登入')
+  }
+
+  for (let attempt = 1; attempt <= THUMBNAIL_MAX_ATTEMPTS; attempt++) {
+    const response = await fetch(`${import.meta.env.VITE_API_URL || 'http://localhost:5000'}/api/files/${fileId}/thumbnail`, {
+      headers: {
+        'Authorization': `Bearer ${session.access_token}`
+      }
+    })
+
+    if (response.status === 404 || response.status === 415) {
+      return null
+    }
+
+    if (response.status === 202) {
+      const retryAfter = Number(response.headers.get('Retry-After')) || 2
+      await new Promise(resolve => setTimeout(resolve, retryAfter * 1000))
+      continue
+    }
+
+    if (!response.ok) {
+      const errorData = await response.json().catch(() => ({ error: 'Unknown error' }))
+      throw new Error(errorData.error || `HTTP ${response.status}: ${response.statusText}`)
+    }
+
+    return await response.blob()
+  }
+
+  throw new Error('縮圖產生逾時')
+}
+
 /**
  * 批次上傳檔案
  *
@@ -4,10 +4,13 @@
  * 用途：批次載入記錄中的圖片檔案縮圖，避免 API 轟炸
  *
  * 特性：
+ * - 經後端 GET /api/files/<id>/thumbnail 取得數 KB 的 WebP 縮圖，不下載原檔
  * - 泛型設計支援任何 record 類型
  * - 批次載入（BATCH_SIZE = 3）控制並發數量
  * - 自動過濾已載入的縮圖，避免重複請求
  * - Promise.allSettled 確保部分失敗不影響其他檔案
+ * - 無法預覽的檔案（後端回傳 404 / 415）不放入結果
+ * - 元件卸載時釋放建立的 object URL
  *
  * @example Type 1 使用（設備型頁面）
  * ```typescript
@@ -37,8 +40,8 @@
  * ```
  */
 
-import { useState, useEffect } from 'react'
-import { getFileUrl } from '../api/files'
+import { useState, useEffect, useRef } from 'react'
+import { getFileThumbnail } from '../api/v2/fileAPI'
 
 /**
  * 證據檔案介面（與後端一致）
@@ -77,12 +80,21 @@ export function useThumbnailLoader<T>({
   enabled = true
 }: UseThumbnailLoaderOptions<T>): Record<string, string> {
   const [thumbnails, setThumbnails] = useState<Record<string, string>>({})
+  const objectUrls = useRef<string[]>([])
+
+  // 卸載時釋放縮圖的 object URL
+  useEffect(() => {
+    return () => {
+      objectUrls.current.forEach(url => URL.revokeObjectURL(url))
+      objectUrls.current = []
+    }
+  }, [])
 
   useEffect(() => {
     if (!enabled) return
 
     const loadThumbnails = async () => {
-      const tasks: Array<{ fileId: string; loadFn: () => Promise<string> }> = []
+      const tasks: Array<{ fileId: string; loadFn: () => Promise<Blob | null> }> = []
 
       // 收集所有需要載入的圖片檔案
       records.forEach((record) => {
@@ -92,7 +104,7 @@ export function useThumbnailLoader<T>({
           if (file.mime_type.startsWith('image/') && !thumbnails[file.id]) {
             tasks.push({
               fileId: file.id,
-              loadFn: () => getFileUrl(file.file_path)
+              loadFn: () => getFileThumbnail(file.id)
             })
           }
         })
@@ -111,10 +123,12 @@ export function useThumbnailLoader<T>({
 
         // 更新成功載入的縮圖
         results.forEach((result, index) => {
-          if (result.status === 'fulfilled') {
+          if (result.status === 'fulfilled' && result.value) {
+            const url = URL.createObjectURL(result.value)
+            objectUrls.current.push(url)
             setThumbnails(prev => ({
               ...prev,
-              [batch[index].fileId]: result.value
+              [batch[index].fileId]: url
             }))
           }
         })